@@ -0,0 +1,379 @@
+"""
+Agendador assíncrono das consultas ao agente.
+
+As perguntas que precisam do LLM passam por uma fila limitada e são
+executadas por um número fixo de tarefas (`concorrencia`), respeitando um
+orçamento de tokens por minuto do provedor. As novas tentativas em erros
+429/5xx ficam em uma camada só, a de cada chamada ao LLM (cliente da OpenAI,
+GeminiLLM/ChatGemini): repetir a pergunta inteira refaria todas as iterações
+do agente e multiplicaria as tentativas. Quando um erro transitório esgota
+as tentativas do LLM, a pergunta falha e o agendador pausa o provedor
+inteiro, para que as outras requisições não esgotem a quota em cascata.
+
+A mesma pergunta já em andamento não é executada de novo: quem chega depois
+aguarda o mesmo resultado, e os seus callbacks (streaming, telemetria)
+recebem os eventos já emitidos pela execução e os seguintes.
+
+O laço asyncio roda em uma thread própria, então tanto o Streamlit
+(síncrono, via `submeter`) quanto uma API assíncrona (via `responder`)
+podem enviar perguntas.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import random
+import threading
+import time
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import get_buffer_string
+
+from cache_respostas import normalizar_pergunta
+from erros_provedor import erro_transitorio, espera_sugerida
+from telemetria import extrair_tokens
+
+
+class FilaCheia(Exception):
+    """A fila do agendador atingiu o limite; a pergunta não foi aceita."""
+
+
+class JanelaTokens:
+    """
+    Orçamento de tokens por minuto em janela deslizante de 60 s (0 desativa).
+
+    Cada execução reserva uma estimativa antes de começar e, ao terminar,
+    a reserva é corrigida para o consumo real.
+    """
+
+    def __init__(self, tokens_por_minuto):
+        self.limite = tokens_por_minuto
+        self._consumo = collections.deque()  # [instante, tokens]
+
+    def usados(self):
+        agora = time.monotonic()
+        while self._consumo and agora - self._consumo[0][0] >= 60:
+            self._consumo.popleft()
+        return sum(tokens for _, tokens in self._consumo)
+
+    async def reservar(self, tokens):
+        # Uma execução maior que o limite inteiro ainda precisa poder rodar
+        tokens = min(tokens, self.limite) if self.limite else tokens
+        while self.limite and self.usados() + tokens > self.limite:
+            await asyncio.sleep(max(0.05, self._consumo[0][0] + 60 - time.monotonic()))
+        reserva = [time.monotonic(), tokens]
+        self._consumo.append(reserva)
+        return reserva
+
+    @staticmethod
+    def ajustar(reserva, tokens):
+        reserva[1] = tokens
+
+
+class _ContadorTokens(BaseCallbackHandler):
+    """Soma os tokens de uma execução (estimados por caracteres quando o provedor não informa)."""
+
+    def __init__(self):
+        self.tokens = 0
+        self._caracteres = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs: Any) -> None:
+        self._caracteres[run_id] = sum(len(p) for p in prompts)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs: Any) -> None:
+        self._caracteres[run_id] = sum(len(str(m.content)) for lista in messages for m in lista)
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any) -> None:
+        prompt, resposta = extrair_tokens(response)
+        if prompt is None:
+            prompt = self._caracteres.get(run_id, 0) // 4
+            resposta = sum(len(g.text) for geracoes in response.generations for g in geracoes) // 4
+        self._caracteres.pop(run_id, None)
+        self.tokens += (prompt or 0) + (resposta or 0)
+
+
+# Eventos do LangChain repassados pelo _Difusor
+EVENTOS_CALLBACK = (
+    "on_llm_start", "on_chat_model_start", "on_llm_new_token", "on_llm_end", "on_llm_error",
+    "on_chain_start", "on_chain_end", "on_chain_error", "on_tool_start", "on_tool_end", "on_tool_error",
+    "on_agent_action", "on_agent_finish", "on_text", "on_retry", "on_custom_event",
+)
+
+
+class _Difusor(BaseCallbackHandler):
+    """
+    Repassa os callbacks de uma execução aos de quem a submeteu e aos de quem
+    entrou depois pela deduplicação. Quem entra recebe primeiro os eventos já
+    emitidos; para esses assinantes os eventos vão com `compartilhado=True`
+    (a telemetria não conta de novo os tokens e durações da mesma execução).
+    """
+
+    run_inline = True
+
+    def __init__(self, callbacks):
+        self._lock = threading.Lock()
+        self._assinantes = [(c, False) for c in callbacks]
+        self._historico = []
+
+    def assinar(self, callbacks):
+        with self._lock:
+            for callback in callbacks:
+                for nome, args, kwargs in self._historico:
+                    self._chamar(callback, nome, args, {**kwargs, "compartilhado": True})
+                self._assinantes.append((callback, True))
+
+    def _repassar(self, nome, args, kwargs):
+        with self._lock:
+            self._historico.append((nome, args, kwargs))
+            for callback, compartilhado in self._assinantes:
+                self._chamar(callback, nome, args, {**kwargs, "compartilhado": True} if compartilhado else kwargs)
+
+    @staticmethod
+    def _chamar(callback, nome, args, kwargs):
+        try:
+            try:
+                getattr(callback, nome)(*args, **kwargs)
+            except NotImplementedError:
+                if nome != "on_chat_model_start":
+                    raise
+                # Como no LangChain: quem não trata modelos de chat recebe as mensagens como texto
+                serializado, mensagens = args[0], args[1]
+                callback.on_llm_start(serializado, [get_buffer_string(m) for m in mensagens], *args[2:], **kwargs)
+        except Exception as e:
+            # Um callback com defeito não interrompe a execução nem os demais
+            print(f"Erro no callback {type(callback).__name__}.{nome}: {e}")
+
+
+def _repassador(nome):
+    def repassar(self, *args, **kwargs):
+        self._repassar(nome, args, kwargs)
+    repassar.__name__ = nome
+    return repassar
+
+
+for _nome in EVENTOS_CALLBACK:
+    setattr(_Difusor, _nome, _repassador(_nome))
+
+
+class _Execucao:
+    """Uma pergunta na fila, com os futuros e os callbacks de todos que a aguardam."""
+
+    def __init__(self, chave, pergunta, callbacks, contexto=None):
+        self.chave = chave
+        self.pergunta = pergunta
+        self.difusor = _Difusor(list(callbacks or []))
+        self.contexto = dict(contexto or {})
+        self.futuros = []
+        self.tarefa = None
+        self.enfileirada_em = time.monotonic()
+
+    def interessados(self):
+        return [f for f in self.futuros if not f.cancelled()]
+
+
+class AgendadorRequisicoes:
+    """
+    Args:
+        executar: Função assíncrona `executar(pergunta, callbacks)` que consulta o
+            agente. Deve propagar os erros transitórios (ver `erro_transitorio`)
+            para que o agendador pause o provedor. O `contexto` de `submeter` (ex.: o
+            id do dataset) chega como argumentos nomeados.
+        concorrencia: Execuções simultâneas no provedor.
+        tokens_por_minuto: Orçamento de tokens do provedor (0 = sem limite).
+        max_fila: Perguntas aguardando execução; acima disso `FilaCheia`.
+        pausa_s: Pausa do provedor depois de um erro transitório que esgotou as
+            novas tentativas do LLM (o Retry-After da resposta, quando houver, prevalece).
+        tokens_estimados: Estimativa inicial por pergunta (depois, média das últimas).
+        ao_evento: Função chamada com o nome de eventos (ex.: telemetria).
+    """
+
+    def __init__(self, executar, concorrencia=2, tokens_por_minuto=0, max_fila=32, pausa_s=10.0,
+                 tokens_estimados=3000, ao_evento=None):
+        self._executar_pergunta = executar
+        self.concorrencia = max(1, concorrencia)
+        self.max_fila = max_fila
+        self.pausa_s = pausa_s
+        self._ao_evento = ao_evento
+
+        self._janela = JanelaTokens(tokens_por_minuto)
+        self._consumos = collections.deque([tokens_estimados], maxlen=20)
+        self._pausa_ate = 0.0
+        self._em_andamento = {}  # chave -> _Execucao (na fila ou executando)
+        self._executando = 0
+        self._esperas = collections.deque(maxlen=200)
+        self._contadores = collections.Counter()
+
+        self._lock = threading.Lock()
+        self._loop = None
+        self._fila = None
+
+    # --- laço de eventos -------------------------------------------------
+
+    def _garantir_loop(self):
+        if self._loop is not None:
+            return self._loop
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                pronto = threading.Event()
+
+                def rodar():
+                    asyncio.set_event_loop(loop)
+                    self._fila = asyncio.Queue(maxsize=self.max_fila)
+                    for i in range(self.concorrencia):
+                        loop.create_task(self._trabalhador(), name=f"agendador-{i}")
+                    pronto.set()
+                    loop.run_forever()
+
+                threading.Thread(target=rodar, name="agendador", daemon=True).start()
+                pronto.wait()
+                self._loop = loop
+        return self._loop
+
+    def encerrar(self):
+        """Para o laço de eventos; perguntas pendentes são canceladas."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            for execucao in list(self._em_andamento.values()):
+                for futuro in execucao.futuros:
+                    futuro.cancel()
+            loop.call_soon_threadsafe(loop.stop)
+
+    def _evento(self, nome):
+        self._contadores[nome] += 1
+        if self._ao_evento is not None:
+            self._ao_evento(f"agendador_{nome}")
+
+    # --- envio --------------------------------------------------------------
+
+    def submeter(self, pergunta, callbacks=None, chave=None, contexto=None):
+        """
+        Envia a pergunta (de qualquer thread) e retorna um `concurrent.futures.Future`
+        com (resposta, raciocínio). Cancelar o futuro desiste da pergunta; a execução
+        só é interrompida quando ninguém mais a aguarda. Perguntas deduplicadas pela
+        `chave` usam o `contexto` da primeira, e os seus `callbacks` passam a receber
+        os eventos dela.
+        """
+        loop = self._garantir_loop()
+        futuro = concurrent.futures.Future()
+        chave = chave or normalizar_pergunta(pergunta)
+        loop.call_soon_threadsafe(self._registrar, chave, pergunta, callbacks, futuro, contexto)
+
+        def ao_terminar(f):
+            if f.cancelled() and self._loop is loop:
+                loop.call_soon_threadsafe(self._desistir, chave)
+
+        futuro.add_done_callback(ao_terminar)
+        return futuro
+
+    async def responder(self, pergunta, callbacks=None, chave=None, contexto=None):
+        """Versão para código assíncrono (em outro laço); cancelar a tarefa desiste da pergunta."""
+        futuro = self.submeter(pergunta, callbacks, chave, contexto)
+        try:
+            return await asyncio.wrap_future(futuro)
+        except asyncio.CancelledError:
+            futuro.cancel()
+            raise
+
+    def _registrar(self, chave, pergunta, callbacks, futuro, contexto=None):
+        if futuro.cancelled():
+            return
+        self._contadores["submetidas"] += 1
+        execucao = self._em_andamento.get(chave)
+        if execucao is not None:
+            execucao.futuros.append(futuro)
+            execucao.difusor.assinar(list(callbacks or []))
+            self._evento("deduplicadas")
+            return
+        execucao = _Execucao(chave, pergunta, callbacks, contexto)
+        execucao.futuros.append(futuro)
+        try:
+            self._fila.put_nowait(execucao)
+        except asyncio.QueueFull:
+            self._evento("rejeitadas")
+            futuro.set_exception(FilaCheia(f"Fila do agendador cheia ({self.max_fila} perguntas aguardando)."))
+            return
+        self._em_andamento[chave] = execucao
+
+    def _desistir(self, chave):
+        execucao = self._em_andamento.get(chave)
+        if execucao is None or execucao.interessados():
+            return
+        # Ninguém mais aguarda: sai da fila (ignorada pelo trabalhador) ou é interrompida
+        self._em_andamento.pop(chave, None)
+        self._evento("canceladas")
+        if execucao.tarefa is not None:
+            execucao.tarefa.cancel()
+
+    # --- execução -------------------------------------------------------------
+
+    async def _trabalhador(self):
+        while True:
+            execucao = await self._fila.get()
+            if self._em_andamento.get(execucao.chave) is not execucao:
+                continue  # cancelada enquanto aguardava
+            self._esperas.append(time.monotonic() - execucao.enfileirada_em)
+            execucao.tarefa = asyncio.ensure_future(self._executar(execucao))
+            self._executando += 1
+            try:
+                await asyncio.wait({execucao.tarefa})
+            finally:
+                self._executando -= 1
+            if self._em_andamento.get(execucao.chave) is execucao:
+                del self._em_andamento[execucao.chave]
+            self._entregar(execucao)
+
+    def _entregar(self, execucao):
+        tarefa = execucao.tarefa
+        for futuro in execucao.interessados():
+            try:
+                if tarefa.cancelled():
+                    futuro.cancel()
+                elif tarefa.exception() is not None:
+                    futuro.set_exception(tarefa.exception())
+                else:
+                    futuro.set_result(tarefa.result())
+            except concurrent.futures.InvalidStateError:
+                pass  # cancelado por quem aguardava no mesmo instante
+        if not tarefa.cancelled():
+            self._contadores["falhas" if tarefa.exception() is not None else "concluidas"] += 1
+
+    async def _executar(self, execucao):
+        espera = self._pausa_ate - time.monotonic()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        estimativa = int(sum(self._consumos) / len(self._consumos))
+        reserva = await self._janela.reservar(estimativa)
+        contador = _ContadorTokens()
+        try:
+            resultado = await self._executar_pergunta(execucao.pergunta, [execucao.difusor, contador],
+                                                      **execucao.contexto)
+        except Exception as e:
+            if erro_transitorio(e):
+                # As tentativas do LLM se esgotaram: pausa o provedor para as outras execuções
+                espera = espera_sugerida(e)
+                if espera is None:
+                    espera = random.uniform(self.pausa_s / 2, self.pausa_s)
+                self._pausa_ate = max(self._pausa_ate, time.monotonic() + espera)
+                self._evento("pausas")
+                print(f"Erro transitório do provedor ({type(e).__name__}); provedor pausado por {espera:.1f}s")
+            raise
+        finally:
+            if contador.tokens:
+                self._janela.ajustar(reserva, contador.tokens)
+        self._consumos.append(contador.tokens or estimativa)
+        return resultado
+
+    def estatisticas(self):
+        esperas = sorted(self._esperas)
+        return {
+            **{nome: self._contadores[nome] for nome in (
+                "submetidas", "deduplicadas", "rejeitadas", "canceladas", "concluidas", "falhas", "pausas")},
+            "em_fila": self._fila.qsize() if self._fila is not None else 0,
+            "executando": self._executando,
+            "concorrencia": self.concorrencia,
+            "tokens_ultimo_minuto": self._janela.usados(),
+            "tokens_por_minuto": self._janela.limite,
+            "espera_fila_p50_ms": round(esperas[len(esperas) // 2] * 1000, 1) if esperas else 0.0,
+        }
@@ -0,0 +1,277 @@
+"""
+API HTTP do chatbot (Starlette + uvicorn), sem a página do Streamlit.
+
+Serve o widget `templates/index.html` e responde em JSON, compartilhando com
+a interface do Streamlit o dataset, o agente, o cache de respostas e o
+agendador do processo (módulo `chatbot`). Rotas:
+  - POST /responder: {"mensagem": ..., "dataset": ...} -> {"resposta", "raciocinio", "erro", "duracao_s"}
+  - POST ou GET /responder/stream: a mesma pergunta, com os eventos do agente
+    (pensamentos, código, observações e tokens) como server-sent events
+  - POST /batch: {"mensagens": [...], "dataset": ...} -> respostas na mesma ordem, em paralelo
+  - GET /saude: estado dos recursos, do registro de datasets, do agendador, dos monitores
+    de dados e tempos da inicialização
+"dataset" (opcional, na query string no GET) é o id de um dos datasets de DATASETS;
+sem ele, vale o padrão. Um id desconhecido responde 404.
+  - GET /metricas: métricas da telemetria no formato do Prometheus
+As conexões são reaproveitadas entre requisições (keep-alive do HTTP/1.1).
+
+Uso (como no Procfile; a porta vem de PORT, padrão 5000):
+    python app.py
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+import chatbot
+from chatbot import get_secret
+from eventos_agente import ColetorEventos
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+API_HOST = get_secret("API_HOST", "0.0.0.0")
+API_PORTA = int(get_secret("PORT", 5000))
+# Tempo (s) que uma conexão ociosa fica aberta esperando a próxima requisição
+API_KEEPALIVE_S = int(get_secret("API_KEEPALIVE_S", 30))
+# Perguntas por chamada do /batch e quantas delas entram no agendador ao mesmo tempo
+# (o restante da fila fica livre para as perguntas interativas)
+API_BATCH_MAX = int(get_secret("API_BATCH_MAX", 100))
+API_BATCH_CONCORRENCIA = int(get_secret("API_BATCH_CONCORRENCIA", 8))
+# Origens liberadas para chamadas do navegador em outro domínio (ex.: dashboards), separadas por vírgula
+API_CORS_ORIGENS = [o.strip() for o in str(get_secret("API_CORS_ORIGENS", "")).split(",") if o.strip()]
+# Pausa sugerida (Retry-After) quando a fila do agendador está cheia
+API_ESPERA_FILA_CHEIA_S = 5
+
+chatbot.telemetria.metricas.contador("api_requisicoes_total", "Requisições HTTP da API, por rota e status")
+chatbot.telemetria.metricas.histograma("api_requisicao_duracao_segundos", "Duração das requisições HTTP da API")
+
+
+class _FilaLaco:
+    """
+    Fila para o ColetorEventos que entrega os eventos em uma asyncio.Queue.
+
+    Os callbacks do agente rodam no laço do agendador (outra thread), por isso
+    os eventos passam por `call_soon_threadsafe`.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self.eventos = asyncio.Queue()
+
+    def put(self, evento):
+        self._loop.call_soon_threadsafe(self.eventos.put_nowait, evento)
+
+
+def _medida(rota, manipulador):
+    """Conta as requisições da rota por status e registra a duração (até os cabeçalhos, no streaming)."""
+    async def medido(request):
+        inicio = time.perf_counter()
+        status = 500
+        try:
+            resposta = await manipulador(request)
+            status = resposta.status_code
+            return resposta
+        except HTTPException as e:
+            status = e.status_code
+            raise
+        finally:
+            chatbot.telemetria.metricas.inc("api_requisicoes_total", rota=rota, status=str(status))
+            chatbot.telemetria.metricas.observar("api_requisicao_duracao_segundos", time.perf_counter() - inicio,
+                                                 rota=rota)
+    return medido
+
+
+async def _ler_json(request):
+    try:
+        corpo = await request.json()
+    except ValueError:
+        raise HTTPException(400, "O corpo da requisição não é um JSON válido")
+    if not isinstance(corpo, dict):
+        raise HTTPException(400, "O corpo da requisição deve ser um objeto JSON")
+    return corpo
+
+
+def _validar_pergunta(pergunta):
+    if not isinstance(pergunta, str) or not pergunta.strip():
+        raise HTTPException(400, "Informe a pergunta em \"mensagem\" (texto não vazio)")
+    return pergunta.strip()
+
+
+async def _pergunta(request):
+    """A pergunta vem em "mensagem" (formato do widget) ou "pergunta"; no GET, na query string."""
+    if request.method == "GET":
+        return _validar_pergunta(request.query_params.get("mensagem") or request.query_params.get("pergunta"))
+    corpo = await _ler_json(request)
+    return _validar_pergunta(corpo.get("mensagem", corpo.get("pergunta")))
+
+
+async def _id_dataset(request):
+    """Id do dataset da requisição ("dataset"; no GET, na query string), validado contra o registro."""
+    if request.method == "GET":
+        id_dataset = request.query_params.get("dataset")
+    else:
+        id_dataset = (await _ler_json(request)).get("dataset")
+    if id_dataset is None:
+        return None
+    try:
+        chatbot.registro.origem(str(id_dataset))
+    except chatbot.DatasetDesconhecido as e:
+        raise HTTPException(404, str(e))
+    return str(id_dataset)
+
+
+async def _responder_uma(pergunta, callbacks=None, id_dataset=None):
+    """Resposta de uma pergunta como dicionário JSON; erros inesperados viram mensagem, como na interface."""
+    inicio = time.perf_counter()
+    try:
+        resposta, raciocinio = await chatbot.gerar_resposta_async(pergunta, callbacks, id_dataset)
+    except Exception as e:
+        print(f"Erro inesperado na API: {e}")
+        resposta, raciocinio = f"❌ **Erro inesperado:** {str(e)}", ""
+    return {
+        "resposta": resposta,
+        "raciocinio": raciocinio,
+        "erro": chatbot.classificar_erro(resposta),
+        "duracao_s": round(time.perf_counter() - inicio, 4),
+    }
+
+
+def _json_resposta(resultado):
+    # Fila cheia: 503 com Retry-After para o cliente esperar antes de tentar de novo
+    if resultado["erro"] == "fila_cheia":
+        return JSONResponse(resultado, status_code=503, headers={"Retry-After": str(API_ESPERA_FILA_CHEIA_S)})
+    return JSONResponse(resultado)
+
+
+async def responder(request):
+    pergunta = await _pergunta(request)
+    return _json_resposta(await _responder_uma(pergunta, id_dataset=await _id_dataset(request)))
+
+
+def _sse(evento):
+    return f"event: {evento['tipo']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+
+async def _eventos(pergunta, id_dataset=None):
+    """Eventos do agente enquanto ele trabalha; o último é sempre o "final", como em `gerar_resposta_stream`."""
+    fila = _FilaLaco(asyncio.get_running_loop())
+    tarefa = asyncio.create_task(_responder_uma(pergunta, [ColetorEventos(fila)], id_dataset))
+    tarefa.add_done_callback(lambda _: fila.put(None))
+    try:
+        while (evento := await fila.eventos.get()) is not None:
+            yield _sse(evento)
+        yield _sse(dict(tarefa.result(), tipo="final"))
+    finally:
+        # Cliente desconectou antes do fim: desiste da pergunta no agendador
+        if not tarefa.done():
+            tarefa.cancel()
+
+
+async def responder_stream(request):
+    pergunta = await _pergunta(request)
+    id_dataset = await _id_dataset(request)
+    return StreamingResponse(_eventos(pergunta, id_dataset), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+async def batch(request):
+    corpo = await _ler_json(request)
+    mensagens = corpo.get("mensagens", corpo.get("perguntas"))
+    if not isinstance(mensagens, list) or not mensagens:
+        raise HTTPException(400, "Informe as perguntas em \"mensagens\" (lista não vazia)")
+    if len(mensagens) > API_BATCH_MAX:
+        raise HTTPException(413, f"No máximo {API_BATCH_MAX} perguntas por chamada")
+    perguntas = [_validar_pergunta(m) for m in mensagens]
+    id_dataset = await _id_dataset(request)
+
+    inicio = time.perf_counter()
+    limite = asyncio.Semaphore(API_BATCH_CONCORRENCIA)
+
+    async def uma(pergunta):
+        async with limite:
+            return await _responder_uma(pergunta, id_dataset=id_dataset)
+
+    respostas = await asyncio.gather(*(uma(p) for p in perguntas))
+    return JSONResponse({"respostas": respostas, "duracao_s": round(time.perf_counter() - inicio, 4)})
+
+
+async def saude(request):
+    estado = {"status": "ok", "recursos": chatbot.recursos.estado()}
+    estado["pronto"] = estado["recursos"]["dataset"] is not None
+    if chatbot.agendador is not None:
+        estado["agendador"] = chatbot.agendador.estatisticas()
+    estado["registro_datasets"] = chatbot.registro.estatisticas()
+    if chatbot.monitores:
+        estado["monitor_dados"] = {id_dataset: monitor.resumo() for id_dataset, monitor in list(chatbot.monitores.items())}
+    if chatbot.cache_respostas is not None:
+        estado["cache_respostas"] = chatbot.cache_respostas.estatisticas()
+    if chatbot.roteador is not None:
+        estado["roteador"] = chatbot.roteador.estatisticas()
+    if chatbot.cache_execucoes is not None:
+        estado["cache_execucoes"] = chatbot.cache_execucoes.estatisticas()
+    estado["inicializacao"] = chatbot.tempos_inicializacao.resumo()
+    return JSONResponse(estado)
+
+
+async def metricas(request):
+    return PlainTextResponse(chatbot.telemetria.exportar_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+async def pagina_inicial(request):
+    return FileResponse(os.path.join(RAIZ, "templates", "index.html"))
+
+
+async def _erro_http(request, exc):
+    return JSONResponse({"erro": exc.detail}, status_code=exc.status_code, headers=getattr(exc, "headers", None))
+
+
+@asynccontextmanager
+async def _ciclo_de_vida(app):
+    # Dataset, LLM e agente em segundo plano: a API já responde /saude enquanto isso
+    chatbot.iniciar_aquecimento()
+    yield
+    for monitor in list(chatbot.monitores.values()):
+        monitor.parar()
+    if chatbot.agendador is not None:
+        chatbot.agendador.encerrar()
+
+
+def criar_app():
+    rotas = [
+        Route("/", pagina_inicial),
+        Route("/responder", _medida("responder", responder), methods=["POST"]),
+        Route("/responder/stream", _medida("responder_stream", responder_stream), methods=["GET", "POST"]),
+        Route("/batch", _medida("batch", batch), methods=["POST"]),
+        Route("/saude", saude),
+        Route("/metricas", metricas),
+        Mount("/static", StaticFiles(directory=os.path.join(RAIZ, "static"), check_dir=False), name="static"),
+    ]
+    middleware = []
+    if API_CORS_ORIGENS:
+        middleware.append(Middleware(CORSMiddleware, allow_origins=API_CORS_ORIGENS,
+                                     allow_methods=["GET", "POST"], allow_headers=["Content-Type"]))
+    return Starlette(routes=rotas, middleware=middleware, lifespan=_ciclo_de_vida,
+                     exception_handlers={HTTPException: _erro_http})
+
+
+app = criar_app()
+
+
+def main():
+    print(f"API do chatbot em http://{API_HOST}:{API_PORTA}/ (widget em /, perguntas em /responder)")
+    # Sem log de acesso: a cada requisição ele custaria mais que uma resposta do cache
+    uvicorn.run(app, host=API_HOST, port=API_PORTA, timeout_keep_alive=API_KEEPALIVE_S, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
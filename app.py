@@ -1,7 +1,14 @@
+import time
+
 import streamlit as st
-from chatbot import gerar_resposta
-import pandas as pd
-import os
+
+if __name__ == "__main__" and not st.runtime.exists():
+    # `python app.py` (Procfile): sobe a API HTTP e o widget em vez da página do Streamlit
+    import api
+    raise SystemExit(api.main())
+
+# O relógio da inicialização começa na primeira execução do script no processo
+from inicializacao import INICIO_PROCESSO
 
 # Configuração da página
 st.set_page_config(page_title="Chatbot de Consulta de Dados (LangChain/Pandas)", layout="wide")
@@ -11,7 +18,7 @@ st.title("🤖 Chatbot de Consulta de Dados")
 st.markdown(
     """
     Este chatbot utiliza **LangChain** e **Pandas** para responder a perguntas
-    sobre o seu arquivo de dados (`data.csv`).
+    sobre o seu arquivo de dados (`data.csv`, ou um dos datasets configurados em `DATASETS`).
     
     **Suporta múltiplos provedores:** OpenAI, Ollama (gratuito/local), Google Gemini (gratuito)
     
@@ -21,106 +28,147 @@ st.markdown(
     **Configure o provedor no arquivo `.env` usando a variável `LLM_PROVIDER`**
     """
 )
+_interface_s = time.perf_counter() - INICIO_PROCESSO
 
-# Função para obter secrets (suporta Streamlit Cloud e .env local)
-def get_secret(key, default=None):
-    """Obtém secret do Streamlit Cloud ou variável de ambiente local"""
-    try:
-        # Tenta obter do Streamlit secrets primeiro (Streamlit Cloud)
-        if hasattr(st, 'secrets') and key in st.secrets:
-            return st.secrets[key]
-    except:
-        pass
-    # Fallback para variável de ambiente (.env local)
-    return os.getenv(key, default)
+# A página já aparece enquanto o chatbot é importado e os dados são carregados;
+# o LLM e o agente são criados em segundo plano (iniciar_aquecimento, abaixo)
+with st.spinner("Preparando o chatbot..."):
+    from chatbot import (
+        gerar_resposta_stream, get_secret, iniciar_aquecimento, registro, tempos_inicializacao,
+        MOTOR_CONSULTA,
+    )
+tempos_inicializacao.registrar("interface", _interface_s, substituir=False)
+
+# O motor SQL mostra consultas SQL no lugar do código Python
+LINGUAGEM_CODIGO = "sql" if MOTOR_CONSULTA == "duckdb" else "python"
+ROTULO_CODIGO = "Consultas SQL Executadas" if MOTOR_CONSULTA == "duckdb" else "Código Python Gerado"
 
 # Mostra qual provedor está sendo usado
 llm_provider = get_secret("LLM_PROVIDER", "openai").upper()
 st.info(f"🔧 Provedor LLM configurado: **{llm_provider}**")
 
-# --- Carregamento e Exibição do DataFrame ---
-CSV_FILE_PATH = "data.csv"
-# Suporte para CSV via URL (útil para Streamlit Cloud)
-CSV_URL = get_secret("CSV_URL", None)
+# --- Escolha do Dataset ---
+# Com vários datasets em DATASETS, cada sessão escolhe o seu; o processo mantém em memória
+# os usados mais recentemente e recarrega os demais do snapshot em disco
+if len(registro.ids()) > 1:
+    id_dataset = st.sidebar.selectbox("📂 Dataset", registro.ids(), key="dataset")
+else:
+    id_dataset = registro.padrao
+origem = registro.origem(id_dataset)
 
+# --- Carregamento e Exibição do DataFrame ---
 try:
-    # Tenta carregar de URL primeiro (para Streamlit Cloud), depois do arquivo local
-    if CSV_URL:
-        df = pd.read_csv(CSV_URL)
-        st.success(f"✅ CSV carregado de URL: {CSV_URL}")
+    # O dataset é carregado uma vez por processo e é o mesmo usado pelo agente
+    # (URL quando a origem é uma URL, como a CSV_URL, senão o arquivo local)
+    with st.spinner("Carregando os dados..."):
+        dataset = registro.obter_dataset(id_dataset)
+    df = dataset.df
+    if origem.startswith(("http://", "https://")):
+        st.success(f"✅ CSV carregado de URL: {origem}")
     else:
-        df = pd.read_csv(CSV_FILE_PATH)
-        st.success(f"✅ CSV carregado do arquivo local: {CSV_FILE_PATH}")
+        st.success(f"✅ CSV carregado do arquivo local: {origem}")
     st.subheader("Amostra do DataFrame Carregado")
     st.dataframe(df.head())
-    st.info(f"DataFrame carregado com sucesso: {df.shape[0]} linhas e {df.shape[1]} colunas.")
+    if "sql" in dataset.derivados:
+        # Motor SQL: o df é só uma amostra; o total vem do snapshot consultado pelo DuckDB
+        st.info(f"Dados registrados no DuckDB: {dataset.derivados['sql'].linhas} linhas e {df.shape[1]} colunas.")
+    else:
+        st.info(f"DataFrame carregado com sucesso: {df.shape[0]} linhas e {df.shape[1]} colunas.")
 except FileNotFoundError:
-    st.error(f"Erro: Arquivo CSV não encontrado em {CSV_FILE_PATH}. Certifique-se de que 'data.csv' está no diretório correto.")
+    st.error(f"Erro: Arquivo CSV não encontrado em {origem}. Certifique-se de que o arquivo está no diretório correto.")
     st.stop()
 except Exception as e:
     st.error(f"Erro ao carregar o DataFrame: {e}")
     st.stop()
 
-# --- Inicialização do Histórico de Conversa ---
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-    st.session_state.messages.append({"role": "assistant", "content": "Olá! Eu sou um agente de dados. Pergunte-me algo sobre o DataFrame acima!"})
+# O LLM e o agente são criados em uma thread enquanto o usuário lê a página e digita
+iniciar_aquecimento()
+
+# --- Inicialização do Histórico de Conversa (um por dataset) ---
+if "conversas" not in st.session_state:
+    st.session_state.conversas = {}
 
-if "raciocinios" not in st.session_state:
-    st.session_state.raciocinios = {}
+if id_dataset not in st.session_state.conversas:
+    st.session_state.conversas[id_dataset] = {
+        "messages": [{"role": "assistant", "content": "Olá! Eu sou um agente de dados. Pergunte-me algo sobre o DataFrame acima!"}],
+        "raciocinios": {},
+    }
+conversa = st.session_state.conversas[id_dataset]
 
 # --- Exibição do Histórico de Conversa ---
-for i, message in enumerate(st.session_state.messages):
+for i, message in enumerate(conversa["messages"]):
     with st.chat_message(message["role"]):
         # Verifica se é uma mensagem de erro
-        if message["content"].startswith(("⚠️", "🔑", "❌")):
+        if message["content"].startswith(("⚠️", "🔑", "❌", "⏳")):
             st.error(message["content"])
         else:
             st.markdown(message["content"])
     
     # Exibe o raciocínio fora do chat_message para evitar problemas de renderização
-    if message["role"] == "assistant" and i in st.session_state.raciocinios:
-        raciocinio = st.session_state.raciocinios[i]
+    if message["role"] == "assistant" and i in conversa["raciocinios"]:
+        raciocinio = conversa["raciocinios"][i]
         if raciocinio and raciocinio.strip():
-            with st.expander("🔍 Raciocínio (Código Python Gerado)", expanded=False):
-                st.code(raciocinio, language="python")
+            with st.expander(f"🔍 Raciocínio ({ROTULO_CODIGO})", expanded=False):
+                st.code(raciocinio, language=LINGUAGEM_CODIGO)
 
 # --- Entrada do Usuário ---
 if prompt := st.chat_input("Digite sua pergunta sobre os dados..."):
     # 1. Adiciona a mensagem do usuário ao histórico
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    conversa["messages"].append({"role": "user", "content": prompt})
     
     # 2. Renderiza a mensagem do usuário imediatamente
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # 3. Gera a resposta
+    # 3. Gera a resposta, exibindo os passos do agente e a resposta à medida que chegam
     with st.chat_message("assistant"):
-        with st.spinner("Pensando..."):
+        etapas = st.status("Pensando...", expanded=False)
+        resultado = {"resposta": "", "raciocinio": ""}
+
+        def tokens_resposta():
             try:
-                resposta_final, raciocinio = gerar_resposta(prompt)
+                for evento in gerar_resposta_stream(prompt, id_dataset):
+                    tipo = evento["tipo"]
+                    if tipo == "pensamento":
+                        etapas.markdown(f"💭 {evento['texto']}")
+                    elif tipo == "codigo":
+                        etapas.code(evento["texto"], language=LINGUAGEM_CODIGO)
+                    elif tipo == "observacao":
+                        etapas.text(evento["texto"][:2000])
+                    elif tipo == "token":
+                        yield evento["texto"]
+                    elif tipo == "final":
+                        resultado.update(evento)
             except Exception as e:
-                resposta_final = f"❌ **Erro inesperado:** {str(e)}"
-                raciocinio = ""
+                resultado["resposta"] = f"❌ **Erro inesperado:** {str(e)}"
+
+        area_resposta = st.empty()
+        with area_resposta.container():
+            st.write_stream(tokens_resposta())
+        etapas.update(label="Concluído", state="complete")
+
+        resposta_final, raciocinio = resultado["resposta"], resultado["raciocinio"]
         
+        # Substitui o texto parcial pela resposta final já tratada
         # Verifica se é uma mensagem de erro
-        if resposta_final.startswith(("⚠️", "🔑", "❌")):
-            st.error(resposta_final)
-        else:
-            st.markdown(resposta_final)
+        with area_resposta.container():
+            if resposta_final.startswith(("⚠️", "🔑", "❌", "⏳")):
+                st.error(resposta_final)
+            else:
+                st.markdown(resposta_final)
         
         # Exibe o raciocínio se houver
         if raciocinio and raciocinio.strip():
-            with st.expander("🔍 Raciocínio (Código Python Gerado)", expanded=False):
-                st.code(raciocinio, language="python")
+            with st.expander(f"🔍 Raciocínio ({ROTULO_CODIGO})", expanded=False):
+                st.code(raciocinio, language=LINGUAGEM_CODIGO)
     
     # 4. Adiciona a resposta do assistente ao histórico
-    indice_resposta = len(st.session_state.messages)
-    st.session_state.messages.append({"role": "assistant", "content": resposta_final})
+    indice_resposta = len(conversa["messages"])
+    conversa["messages"].append({"role": "assistant", "content": resposta_final})
     
     # 5. Armazena o raciocínio se houver
     if raciocinio and raciocinio.strip():
-        st.session_state.raciocinios[indice_resposta] = raciocinio
+        conversa["raciocinios"][indice_resposta] = raciocinio
 
 # --- Aviso sobre a Chave da API ---
 llm_provider = get_secret("LLM_PROVIDER", "openai").lower()
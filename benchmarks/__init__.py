@@ -0,0 +1 @@
+"""Benchmarks offline do chatbot (executar a partir da raiz do repositório com `python -m benchmarks.<nome>`)."""
@@ -0,0 +1,197 @@
+"""
+Benchmark da API HTTP (api.py) com o LLM roteirizado, sem rede externa.
+
+Sobe `python app.py` em um subprocesso (como no Procfile) e mede, com
+clientes em threads:
+  - vazão e latência do /responder com 1 cliente em sequência (o ritmo de uma
+    sessão do Streamlit) e com vários clientes simultâneos, para perguntas
+    respondidas pelo roteador e perguntas que vão ao agente;
+  - o mesmo sem keep-alive (uma conexão nova por requisição);
+  - um /batch com as perguntas do agente contra as mesmas perguntas em sequência;
+  - o tempo até o primeiro evento do /responder/stream.
+O cache de respostas fica desativado para que toda pergunta ao agente chame o
+LLM roteirizado (com `--latencia` segundos por chamada).
+
+Uso (na raiz do repositório):
+    python -m benchmarks.api_http --requisicoes 200 --concorrencias 1,8,32 --saida benchmark_api.json
+"""
+import argparse
+import collections
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from benchmarks.comum import CORPUS, RAIZ, gravar_resultado, metadados_ambiente, percentis
+
+PERGUNTAS_ROTEADOR = [
+    "Quantas linhas e colunas o DataFrame possui?",
+    "Quais colunas existem?",
+    "Contagem por status",
+    "Média de tempoTotal por etapa",
+]
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _iniciar_api(porta, latencia):
+    ambiente = dict(os.environ, LLM_PROVIDER="roteirizado", LLM_ROTEIRO_LATENCIA_S=str(latencia),
+                    CACHE_RESPOSTAS_ATIVO="false", MONITOR_DADOS_ATIVO="false", PORT=str(porta),
+                    API_HOST="127.0.0.1")
+    processo = subprocess.Popen([sys.executable, "app.py"], cwd=RAIZ, env=ambiente,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limite = time.monotonic() + 120
+    while time.monotonic() < limite:
+        try:
+            conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=5)
+            conexao.request("GET", "/saude")
+            estado = json.loads(conexao.getresponse().read())
+            conexao.close()
+            if estado["recursos"]["agente"]:
+                return processo
+        except (OSError, ValueError, KeyError):
+            pass
+        time.sleep(0.2)
+    processo.kill()
+    raise RuntimeError("A API não ficou pronta em 120 s")
+
+
+class _Cliente(threading.local):
+    """Uma conexão por thread, reaproveitada entre requisições (keep-alive)."""
+
+    def __init__(self, porta, keepalive):
+        self.porta = porta
+        self.keepalive = keepalive
+        self.conexao = None
+
+    def post(self, caminho, corpo):
+        dados = json.dumps(corpo).encode()
+        for tentativa in range(2):
+            if self.conexao is None:
+                self.conexao = http.client.HTTPConnection("127.0.0.1", self.porta, timeout=300)
+            try:
+                self.conexao.request("POST", caminho, dados, {"Content-Type": "application/json"})
+                resposta = self.conexao.getresponse()
+                conteudo = resposta.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # O servidor fechou a conexão ociosa; abre outra uma vez
+                self.conexao.close()
+                self.conexao = None
+                if tentativa:
+                    raise
+        if not self.keepalive:
+            self.conexao.close()
+            self.conexao = None
+        return resposta.status, conteudo
+
+
+def _carga(porta, perguntas, requisicoes, concorrencia, keepalive=True):
+    cliente = _Cliente(porta, keepalive)
+    status = collections.Counter()
+
+    def uma(i):
+        inicio = time.perf_counter()
+        codigo, _ = cliente.post("/responder", {"mensagem": perguntas[i % len(perguntas)]})
+        status[codigo] += 1
+        return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concorrencia) as executor:
+        latencias = list(executor.map(uma, range(requisicoes)))
+    total = time.perf_counter() - inicio
+    return {
+        "concorrencia": concorrencia,
+        "keepalive": keepalive,
+        "requisicoes": requisicoes,
+        "requisicoes_por_s": round(requisicoes / total, 2),
+        "latencia_s": percentis(latencias),
+        "status": dict(status),
+    }
+
+
+def _batch(porta, perguntas):
+    cliente = _Cliente(porta, True)
+    inicio = time.perf_counter()
+    for pergunta in perguntas:
+        cliente.post("/responder", {"mensagem": pergunta})
+    sequencial = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    codigo, conteudo = cliente.post("/batch", {"mensagens": perguntas})
+    lote = time.perf_counter() - inicio
+    respostas = json.loads(conteudo)["respostas"] if codigo == 200 else []
+    return {
+        "perguntas": len(perguntas),
+        "sequencial_s": round(sequencial, 4),
+        "batch_s": round(lote, 4),
+        "status": codigo,
+        "respostas_com_erro": sum(1 for r in respostas if r["erro"]),
+    }
+
+
+def _primeiro_evento(porta, pergunta):
+    conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=300)
+    inicio = time.perf_counter()
+    conexao.request("GET", f"/responder/stream?mensagem={quote(pergunta)}")
+    resposta = conexao.getresponse()
+    primeiro = None
+    for linha in resposta:
+        if primeiro is None and linha.startswith(b"event:"):
+            primeiro = time.perf_counter() - inicio
+    total = time.perf_counter() - inicio
+    conexao.close()
+    return {"primeiro_evento_s": round(primeiro or total, 4), "total_s": round(total, 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requisicoes", type=int, default=200)
+    parser.add_argument("--concorrencias", default="1,8,32")
+    parser.add_argument("--latencia", type=float, default=0.2, help="Atraso (s) por chamada ao LLM roteirizado")
+    parser.add_argument("--saida", default="benchmark_api.json")
+    args = parser.parse_args()
+
+    with open(CORPUS, encoding="utf-8") as f:
+        perguntas_agente = [p["pergunta"] for p in json.load(f)["perguntas"]]
+    concorrencias = [int(c) for c in args.concorrencias.split(",") if c.strip()]
+
+    porta = _porta_livre()
+    processo = _iniciar_api(porta, args.latencia)
+    resultado = {"ambiente": metadados_ambiente(), "configuracao": vars(args), "responder": {}}
+    try:
+        for nome, perguntas in (("roteador", PERGUNTAS_ROTEADOR), ("agente", perguntas_agente)):
+            # As perguntas ao agente esperam o LLM: menos requisições para o benchmark não se arrastar
+            requisicoes = args.requisicoes if nome == "roteador" else max(len(perguntas), args.requisicoes // 4)
+            medicoes = [_carga(porta, perguntas, requisicoes, c) for c in concorrencias]
+            if nome == "roteador":
+                medicoes.append(_carga(porta, perguntas, requisicoes, max(concorrencias), keepalive=False))
+            resultado["responder"][nome] = medicoes
+            for m in medicoes:
+                print(f"{nome:>8} | {m['concorrencia']:3d} clientes{'' if m['keepalive'] else ' sem keep-alive'}:"
+                      f" {m['requisicoes_por_s']:8.1f} req/s | p50 {m['latencia_s']['p50'] * 1000:8.1f} ms"
+                      f" | p95 {m['latencia_s']['p95'] * 1000:8.1f} ms | status {m['status']}")
+        resultado["batch"] = _batch(porta, perguntas_agente)
+        print(f"   batch | {resultado['batch']['perguntas']} perguntas: {resultado['batch']['batch_s']:.2f}s"
+              f" vs {resultado['batch']['sequencial_s']:.2f}s em sequência")
+        resultado["stream"] = _primeiro_evento(porta, perguntas_agente[0])
+        print(f"  stream | primeiro evento em {resultado['stream']['primeiro_evento_s'] * 1000:.0f} ms"
+              f" de {resultado['stream']['total_s'] * 1000:.0f} ms")
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark do monitor de atualização dos dados (linhas acrescentadas ao CSV).
+
+Para cada escala de dados sintéticos grava 99% das linhas, carrega o dataset
+com as estruturas derivadas (tabelas normalizadas e cubo) e depois acrescenta
+o 1% restante ao arquivo. Mede, para o arquivo local e para a CSV_URL servida
+pelo servidor HTTP local (com e sem suporte a Range):
+  - verificação sem mudança (stat ou GET condicional respondido com 304);
+  - atualização incremental: detectar, ler só as linhas novas, atualizar os
+    derivados e trocar o dataset;
+  - recarga completa equivalente (ler o CSV inteiro e reconstruir os derivados);
+  - maior latência de `obter_dataset` em outra thread durante a atualização
+    (a troca não bloqueia as perguntas);
+e confere que a versão incremental é igual à da carga completa do arquivo.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.atualizacao --escalas 1,10 --saida benchmark_atualizacao.json
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+# O monitor é acionado manualmente aqui; o do chatbot ficaria verificando data.csv
+os.environ["MONITOR_DADOS_ATIVO"] = "false"
+
+import chatbot  # noqa: E402
+from benchmarks.comum import gravar_resultado, metadados_ambiente, percentis, sintetizar  # noqa: E402
+from benchmarks.servidor_csv import iniciar_servidor  # noqa: E402
+from carregador_dados import carregar_dataset  # noqa: E402
+from carregador_remoto import carregar_dataset_url  # noqa: E402
+from monitor_dados import MonitorDados  # noqa: E402
+from recursos import GerenciadorRecursos  # noqa: E402
+
+
+def _medir_origem(nome, df, diretorio, repeticoes):
+    caminho = os.path.join(diretorio, f"{nome}.csv")
+    cache = os.path.join(diretorio, f"cache_{nome}")
+    corte = len(df) - max(1, len(df) // 100)
+    df.iloc[:corte].to_csv(caminho, index=False)
+
+    servidor = None
+    if nome == "local":
+        carregar = lambda: carregar_dataset(caminho, diretorio_cache=cache)  # noqa: E731
+    else:
+        servidor, base = iniciar_servidor(diretorio, aceitar_range=(nome == "url"))
+        carregar = lambda: carregar_dataset_url(f"{base}/{nome}.csv", diretorio_cache=cache)  # noqa: E731
+    try:
+        dataset = chatbot.preparar_derivados(carregar())
+        recursos = GerenciadorRecursos(lambda: dataset, None, None)
+        recursos.obter_dataset()
+
+        def ao_atualizar(novo, anterior, novas_linhas):
+            if novas_linhas is None:
+                chatbot.preparar_derivados(novo)
+            else:
+                chatbot.preparar_derivados(novo, anterior, novas_linhas)
+            recursos.substituir_dataset(novo)
+
+        monitor = MonitorDados(dataset, ao_atualizar, carregar, diretorio_cache=cache)
+        inicio = time.perf_counter()
+        monitor.verificar()
+        sincronizacao = time.perf_counter() - inicio
+
+        sem_mudanca = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            assert monitor.verificar() == "sem_mudanca"
+            sem_mudanca.append(time.perf_counter() - inicio)
+
+        df.iloc[corte:].to_csv(caminho, index=False, header=False, mode="a")
+
+        # Leituras do dataset compartilhado em outra thread enquanto a atualização acontece
+        latencias, parar = [], threading.Event()
+
+        def ler():
+            while not parar.is_set():
+                inicio_leitura = time.perf_counter()
+                recursos.obter_dataset()
+                latencias.append(time.perf_counter() - inicio_leitura)
+                time.sleep(0.001)
+
+        leitor = threading.Thread(target=ler)
+        leitor.start()
+        inicio = time.perf_counter()
+        resultado = monitor.verificar()
+        incremental = time.perf_counter() - inicio
+        parar.set()
+        leitor.join()
+        atualizado = recursos.obter_dataset()
+
+        inicio = time.perf_counter()
+        # Carga do zero (cache vazio) do arquivo já com as linhas novas
+        if nome == "local":
+            completo = carregar_dataset(caminho, diretorio_cache=cache + "_completo")
+        else:
+            completo = carregar_dataset_url(f"{base}/{nome}.csv", diretorio_cache=cache + "_completo")
+        completo = chatbot.preparar_derivados(completo)
+        recarga = time.perf_counter() - inicio
+    finally:
+        if servidor is not None:
+            servidor.shutdown()
+
+    cubo_atualizado, cubo_completo = atualizado.derivados.get("cubo"), completo.derivados.get("cubo")
+    return {
+        "resultado": resultado,
+        "linhas_novas": len(df) - corte,
+        "sincronizacao_inicial_s": round(sincronizacao, 4),
+        "verificacao_sem_mudanca_s": percentis(sem_mudanca),
+        "atualizacao_incremental_s": round(incremental, 4),
+        "recarga_completa_s": round(recarga, 4),
+        "leitura_durante_troca_max_ms": round(max(latencias, default=0.0) * 1000, 3),
+        "leituras_durante_troca": len(latencias),
+        "versao_igual_carga_completa": atualizado.versao == completo.versao,
+        "linhas_iguais": len(atualizado.df) == len(completo.df) == len(df),
+        "cubo_igual": (cubo_atualizado is None or
+                       cubo_atualizado.tabela.shape == cubo_completo.tabela.shape),
+    }
+
+
+def medir_escala(fator, repeticoes):
+    df = sintetizar(fator)
+    medicao = {"fator": fator, "linhas": len(df), "origens": {}}
+    with tempfile.TemporaryDirectory() as diretorio:
+        for nome in ("local", "url", "url_sem_range"):
+            medicao["origens"][nome] = _medir_origem(nome, df, diretorio, repeticoes)
+    return medicao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", default="1,10")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--saida", default="benchmark_atualizacao.json")
+    args = parser.parse_args()
+
+    escalas = [int(e) for e in args.escalas.split(",") if e.strip()]
+    resultado = {"ambiente": metadados_ambiente(), "configuracao": vars(args), "escalas": []}
+    for fator in escalas:
+        medicao = medir_escala(fator, args.repeticoes)
+        resultado["escalas"].append(medicao)
+        for nome, origem in medicao["origens"].items():
+            print(
+                f"{fator}x ({medicao['linhas']} linhas) {nome}: {origem['resultado']}"
+                f" +{origem['linhas_novas']} linhas em {origem['atualizacao_incremental_s']:.2f}s"
+                f" vs recarga {origem['recarga_completa_s']:.2f}s"
+                f" | sem mudança p50 {origem['verificacao_sem_mudanca_s']['p50'] * 1000:.1f} ms"
+                f" | leitura durante a troca ≤ {origem['leitura_durante_troca_max_ms']:.1f} ms"
+                f" | versão igual: {origem['versao_igual_carga_completa']}"
+            )
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
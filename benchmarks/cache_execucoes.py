@@ -0,0 +1,119 @@
+"""
+Benchmark do cache de execuções da ferramenta `python_repl_ast`.
+
+Para cada escala de dados sintéticos roda as perguntas do corpus com o LLM
+roteirizado em várias "sessões" seguidas (a mesma pergunta feita por outros
+usuários, com o cache de respostas desativado para o agente rodar sempre),
+sem e com o cache de execuções, e mede o tempo na ferramenta por pergunta,
+a taxa de acerto e o tempo de execução economizado. Depois executa na
+ferramenta variações de escrita dos mesmos trechos (espaços, aspas,
+comentários), que devem acertar o cache, e trechos que alteram o `df` ou têm
+efeitos colaterais, que devem ser sempre executados.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.cache_execucoes --escalas 1,10,100 --sessoes 3 --saida benchmark_cache_execucoes.json
+"""
+import argparse
+import os
+import tempfile
+
+# Configura o pipeline antes de importar o chatbot: sem cache de respostas nem roteador
+os.environ.setdefault("MONITOR_DADOS_ATIVO", "false")
+os.environ["CACHE_RESPOSTAS_ATIVO"] = "false"
+os.environ["ROTEADOR_ATIVO"] = "false"
+
+from benchmarks.comum import (  # noqa: E402
+    CORPUS, gravar_csv_sintetico, gravar_resultado, metadados_ambiente, percentis,
+)
+from benchmarks.pipeline import MedidorFases  # noqa: E402
+from cache_execucoes import CacheExecucoes  # noqa: E402
+from carregador_dados import carregar_dataset  # noqa: E402
+import chatbot  # noqa: E402
+from llm_roteirizado import LLMRoteirizado  # noqa: E402
+
+# (trecho, trecho equivalente escrito de outro jeito)
+VARIACOES = [
+    ("df['status'].value_counts()", 'df["status"].value_counts( )'),
+    ("df.groupby('etapa')['tempoTotal'].mean()", "df.groupby( 'etapa' )[ 'tempoTotal' ].mean()  # média"),
+    ("df['executor'].nunique()", "(df['executor']).nunique()"),
+]
+# Trechos que não podem vir do cache
+COM_EFEITOS = [
+    "df['nova'] = 1",
+    "df.drop(columns=['status'], inplace=True)",
+    "df.sample(5)",
+    "import os\nos.getcwd()",
+    "df.to_csv('/tmp/saida.csv')",
+]
+
+
+def medir_modo(dataset, llm, perguntas, sessoes, cache):
+    chatbot.cache_execucoes = cache
+    agente = chatbot.criar_agente_pandas(dataset, llm)
+    agente.verbose = False
+    por_sessao = []
+    try:
+        for _ in range(sessoes):
+            tempos = []
+            for pergunta in perguntas:
+                medidor = MedidorFases()
+                chatbot._consultar_agente(pergunta, callbacks=[medidor], agente=agente)
+                tempos.append(medidor.tempo_ferramenta)
+            por_sessao.append({"ferramenta_s": percentis(tempos), "ferramenta_total_s": round(sum(tempos), 6)})
+
+        ferramenta = agente.tools[0]
+        variacoes = []
+        if cache is not None:
+            for original, variacao in VARIACOES:
+                ferramenta.run(original)
+                acertos = cache.acertos
+                ferramenta.run(variacao)
+                variacoes.append({"trecho": variacao, "acertou": cache.acertos > acertos})
+            for trecho in COM_EFEITOS:
+                # Só a decisão do cache: executar o trecho alteraria o df das próximas medições
+                variacoes.append({"trecho": trecho, "ignorado": cache.chave(trecho, dataset.versao) is None})
+    finally:
+        agente.tools[0].encerrar()
+    return {
+        "sessoes": por_sessao,
+        "variacoes": variacoes,
+        "cache": cache.estatisticas() if cache is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", default="1,10,100")
+    parser.add_argument("--sessoes", type=int, default=3)
+    parser.add_argument("--saida", default="benchmark_cache_execucoes.json")
+    args = parser.parse_args()
+
+    llm = LLMRoteirizado.de_arquivo(CORPUS)
+    perguntas = list(llm.roteiros)
+    resultado = {"ambiente": metadados_ambiente(), "configuracao": vars(args), "escalas": []}
+    with tempfile.TemporaryDirectory(prefix="bench_execucoes_") as diretorio:
+        for fator in [int(e) for e in args.escalas.split(",") if e.strip()]:
+            dataset = carregar_dataset(gravar_csv_sintetico(fator, diretorio),
+                                       diretorio_cache=os.path.join(diretorio, f"cache_x{fator}"))
+            chatbot.preparar_derivados(dataset)
+            medicao = {"fator": fator, "linhas": len(dataset.df)}
+            for nome, cache in (("sem_cache", None), ("com_cache", CacheExecucoes())):
+                medicao[nome] = medir_modo(dataset, llm, perguntas, args.sessoes, cache)
+            resultado["escalas"].append(medicao)
+
+            print(f"{fator}x ({medicao['linhas']} linhas):")
+            for nome in ("sem_cache", "com_cache"):
+                totais = " | ".join(f"{s['ferramenta_total_s'] * 1000:8.1f}" for s in medicao[nome]["sessoes"])
+                print(f"  {nome:>9}: ferramenta por sessão (ms): {totais}")
+            estatisticas = medicao["com_cache"]["cache"]
+            variacoes = medicao["com_cache"]["variacoes"]
+            print(f"  acertos {estatisticas['acertos']}/{estatisticas['acertos'] + estatisticas['falhas']}"
+                  f" ({estatisticas['taxa_acerto']:.0%}) | economizado {estatisticas['tempo_economizado_s'] * 1000:.1f} ms"
+                  f" | {estatisticas['entradas']} entradas, {estatisticas['bytes'] / 1024:.1f} KB"
+                  f" | variações que acertaram {sum(v.get('acertou', False) for v in variacoes)}/{len(VARIACOES)}"
+                  f" | trechos com efeitos ignorados {sum(v.get('ignorado', False) for v in variacoes)}/{len(COM_EFEITOS)}")
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Benchmark do cache de prefixo do prompt nos provedores.
+
+1. Estabilidade (sem rede): roda as perguntas do corpus no agente com o LLM
+   roteirizado, captura todos os prompts enviados (todas as iterações) e
+   confere que começam pela mesma parte fixa (`chatbot.prefixo_estavel`),
+   informando o tamanho dela e a fração de cada prompt que ela cobre.
+2. Provedores: para cada provedor pedido, envia o prompt da primeira iteração
+   de cada pergunta sem e com o recurso de cache do provedor e mede a fração
+   dos tokens de prompt lidos do cache e o tempo até o primeiro token:
+     - gemini_local: servidor local que imita a API do Gemini (sem rede);
+     - gemini: cache de contexto (GOOGLE_API_KEY);
+     - openai: cache automático de prefixo, com e sem `prompt_cache_key` (OPENAI_API_KEY);
+     - ollama: modelo descarregado a cada chamada e contexto padrão contra
+       `keep_alive` e `num_ctx` (servidor em OLLAMA_BASE_URL). O Ollama não
+       informa tokens em cache: a fração é estimada pelos tokens avaliados.
+   Provedores sem chave ou fora do ar são registrados como indisponíveis.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.cache_prefixo --provedores gemini_local,openai,gemini,ollama --saida benchmark_cache_prefixo.json
+"""
+import argparse
+import os
+import time
+import warnings
+
+# O benchmark não precisa do monitor verificando data.csv
+os.environ.setdefault("MONITOR_DADOS_ATIVO", "false")
+
+from langchain_core.callbacks import BaseCallbackHandler  # noqa: E402
+
+from benchmarks.comum import (  # noqa: E402
+    CORPUS, contar_tokens, gravar_resultado, metadados_ambiente, ollama_disponivel, percentis,
+)
+import chatbot  # noqa: E402
+from llm_roteirizado import LLMRoteirizado  # noqa: E402
+from telemetria import extrair_tokens, extrair_tokens_cache  # noqa: E402
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+
+class _CapturaPrompts(BaseCallbackHandler):
+    def __init__(self):
+        self.prompts = []
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.prompts.extend(prompts)
+
+
+class _UsoTokens(BaseCallbackHandler):
+    def __init__(self):
+        self.resposta = None
+
+    def on_llm_end(self, response, **kwargs):
+        self.resposta = response
+
+
+def medir_estabilidade(dataset, perguntas):
+    agente = chatbot.criar_agente_pandas(dataset, LLMRoteirizado.de_arquivo(CORPUS))
+    agente.verbose = False
+    prefixo = chatbot.prefixo_estavel(agente)
+    captura = _CapturaPrompts()
+    try:
+        for pergunta in perguntas:
+            chatbot._consultar_agente(pergunta, callbacks=[captura], agente=agente)
+    finally:
+        agente.tools[0].encerrar()
+    tokens_prefixo = contar_tokens(prefixo)
+    return prefixo, {
+        "chamadas_llm": len(captura.prompts),
+        "todas_com_o_mesmo_prefixo": all(p.startswith(prefixo) for p in captura.prompts),
+        "tokens_prefixo": tokens_prefixo,
+        "tokens_prompt": percentis([contar_tokens(p) for p in captura.prompts]),
+        "fracao_prompt_no_prefixo": percentis([tokens_prefixo / contar_tokens(p) for p in captura.prompts]),
+    }
+
+
+def _fabricas(provedor, prefixo, servidor_local):
+    """{modo: função que cria o LLM} do provedor, ou o motivo de estar indisponível."""
+    if provedor in ("gemini", "gemini_local"):
+        from llm_gemini import GeminiLLM
+        if provedor == "gemini_local":
+            opcoes = {"gemini_api_key": "teste", "transport": "rest", "api_endpoint": servidor_local.url}
+        elif chatbot.get_secret("GOOGLE_API_KEY"):
+            opcoes = {"gemini_api_key": chatbot.get_secret("GOOGLE_API_KEY"),
+                      "gemini_model_name": chatbot.get_secret("GEMINI_MODEL", "gemini-2.5-flash")}
+        else:
+            return "GOOGLE_API_KEY não configurada"
+
+        def com_cache():
+            llm = GeminiLLM(cache_contexto=True, **opcoes)
+            llm.usar_cache_contexto(prefixo)
+            return llm
+        return {"sem_cache": lambda: GeminiLLM(**opcoes), "com_cache": com_cache}
+    if provedor == "openai":
+        if not chatbot.get_secret("OPENAI_API_KEY"):
+            return "OPENAI_API_KEY não configurada"
+        from langchain_openai import ChatOpenAI
+        modelo = chatbot.get_secret("OPENAI_MODEL", "gpt-3.5-turbo")
+        return {
+            # O cache de prefixo da OpenAI é automático; a chave só melhora o roteamento
+            "sem_cache": lambda: ChatOpenAI(model=modelo, temperature=0, stream_usage=True),
+            "com_cache": lambda: ChatOpenAI(model=modelo, temperature=0, stream_usage=True,
+                                            model_kwargs={"prompt_cache_key": chatbot.OPENAI_PROMPT_CACHE_KEY}),
+        }
+    if provedor == "ollama":
+        base_url = chatbot.get_secret("OLLAMA_BASE_URL", "http://localhost:11434")
+        if not ollama_disponivel(base_url):
+            return f"Ollama fora do ar em {base_url}"
+        from langchain_community.llms import Ollama
+        modelo = chatbot.get_secret("OLLAMA_MODEL", "llama3.2")
+        return {
+            "sem_cache": lambda: Ollama(model=modelo, base_url=base_url, temperature=0, keep_alive=0),
+            "com_cache": lambda: Ollama(model=modelo, base_url=base_url, temperature=0,
+                                        keep_alive=chatbot.OLLAMA_KEEP_ALIVE, num_ctx=chatbot.OLLAMA_NUM_CTX),
+        }
+    return f"Provedor desconhecido: {provedor}"
+
+
+def medir_modo(llm, prompts):
+    primeiro_token, totais, tokens_prompt, tokens_cache = [], [], 0, 0
+    estimado = False
+    for prompt in prompts:
+        # Streaming para o tempo até o primeiro token
+        inicio = time.perf_counter()
+        primeiro = None
+        for _ in llm.stream(prompt):
+            if primeiro is None:
+                primeiro = time.perf_counter() - inicio
+        totais.append(time.perf_counter() - inicio)
+        primeiro_token.append(primeiro if primeiro is not None else totais[-1])
+
+        # Chamada simples para o uso de tokens informado pelo provedor
+        uso = _UsoTokens()
+        llm.invoke(prompt, config={"callbacks": [uso]})
+        prompt_informado, _ = extrair_tokens(uso.resposta)
+        total = prompt_informado or contar_tokens(prompt)
+        cache = extrair_tokens_cache(uso.resposta)
+        if cache is None:
+            # Ollama: prompt_eval_count conta só os tokens avaliados (fora do cache KV)
+            avaliados = (uso.resposta.generations[0][0].generation_info or {}).get("prompt_eval_count")
+            cache = max(0, total - avaliados) if avaliados is not None else 0
+            estimado = True
+        tokens_prompt += total
+        tokens_cache += cache
+    return {
+        "chamadas": len(prompts),
+        "tokens_prompt": tokens_prompt,
+        "tokens_cache": tokens_cache,
+        "fracao_cache": round(tokens_cache / tokens_prompt, 4) if tokens_prompt else 0.0,
+        "fracao_estimada": estimado,
+        "primeiro_token_s": percentis(primeiro_token),
+        "total_s": percentis(totais),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provedores", default="gemini_local,openai,gemini,ollama")
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--latencia", type=float, default=0.05, help="Latência do servidor Gemini local (s)")
+    parser.add_argument("--saida", default="benchmark_cache_prefixo.json")
+    args = parser.parse_args()
+
+    perguntas = list(LLMRoteirizado.de_arquivo(CORPUS).roteiros)
+    dataset = chatbot.recursos.obter_dataset()
+    prefixo, estabilidade = medir_estabilidade(dataset, perguntas)
+    print(f"Prefixo fixo: {estabilidade['tokens_prefixo']} tokens em {estabilidade['chamadas_llm']} chamadas"
+          f" (todas com o mesmo prefixo: {estabilidade['todas_com_o_mesmo_prefixo']};"
+          f" p50 {estabilidade['fracao_prompt_no_prefixo']['p50']:.0%} do prompt)")
+    resultado = {"ambiente": metadados_ambiente(), "configuracao": vars(args), "estabilidade": estabilidade,
+                 "provedores": {}}
+
+    # Prompt da primeira iteração de cada pergunta (o mesmo formato que o agente envia)
+    prompts = [f"{prefixo}{pergunta}\n" for pergunta in perguntas] * args.repeticoes
+    from benchmarks.gemini_local import ServidorGeminiLocal
+    with ServidorGeminiLocal(latencia_s=args.latencia) as servidor_local:
+        for provedor in [p.strip() for p in args.provedores.split(",") if p.strip()]:
+            fabricas = _fabricas(provedor, prefixo, servidor_local)
+            if isinstance(fabricas, str):
+                resultado["provedores"][provedor] = {"indisponivel": fabricas}
+                print(f"{provedor:>12}: indisponível ({fabricas})")
+                continue
+            resultado["provedores"][provedor] = {}
+            for modo, fabrica in fabricas.items():
+                try:
+                    medicao = medir_modo(fabrica(), prompts)
+                except Exception as e:
+                    medicao = {"erro": str(e)[:300]}
+                    print(f"{provedor:>12} {modo}: falhou: {medicao['erro']}")
+                    resultado["provedores"][provedor][modo] = medicao
+                    continue
+                resultado["provedores"][provedor][modo] = medicao
+                print(f"{provedor:>12} {modo:>9}: {medicao['fracao_cache']:6.1%} dos tokens de prompt em cache"
+                      f"{' (estimado)' if medicao['fracao_estimada'] else ''}"
+                      f" | primeiro token p50 {medicao['primeiro_token_s']['p50'] * 1000:7.1f} ms"
+                      f" | total p50 {medicao['total_s']['p50'] * 1000:7.1f} ms")
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark do carregamento do CSV remoto (CSV_URL) contra a leitura ingênua.
+
+Para cada escala grava um CSV sintético e o serve pelo servidor HTTP local
+(benchmarks/servidor_csv.py). Cada modo roda em um subprocesso limpo, que
+informa tempo, pico de memória (VmHWM) e tamanho do DataFrame:
+  - read_csv_url: `pd.read_csv(CSV_URL)` sem tipos, sem compressão nem cache;
+  - conteudo_inteiro: baixa o corpo inteiro em memória e depois lê com tipos
+    (o carregador anterior);
+  - streaming_identity / streaming_gzip / streaming_zstd: carregador remoto
+    com cache vazio (download em streaming, lido em blocos com tipos);
+  - revalidacao: carregador remoto com cache quente (GET condicional -> 304
+    e leitura do snapshot Arrow).
+Os bytes transferidos vêm do contador do servidor.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.carga_url --escalas 10,100 --saida benchmark_carga_url.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.comum import gravar_csv_sintetico, gravar_resultado, metadados_ambiente
+from benchmarks.servidor_csv import ZSTD_AVAILABLE, aquecer, iniciar_servidor
+
+MODOS = ("read_csv_url", "conteudo_inteiro", "streaming_identity", "streaming_gzip", "streaming_zstd", "revalidacao")
+
+
+def _pico_rss_mb():
+    # VmHWM é o pico só deste processo (ru_maxrss herda o do processo pai no Linux)
+    with open("/proc/self/status", encoding="utf-8") as f:
+        for linha in f:
+            if linha.startswith("VmHWM:"):
+                return int(linha.split()[1]) / 1024
+    return 0.0
+
+
+def _rss_atual_mb():
+    with open("/proc/self/status", encoding="utf-8") as f:
+        for linha in f:
+            if linha.startswith("VmRSS:"):
+                return int(linha.split()[1]) / 1024
+    return 0.0
+
+
+def _medir(modo, url, diretorio_cache):
+    """Roda no subprocesso: carrega a URL no modo pedido."""
+    import io
+    from urllib.request import urlopen
+
+    import pandas as pd
+
+    import carregador_remoto
+    from carregador_dados import ler_csv_tipado
+
+    if modo == "streaming_gzip":
+        carregador_remoto.ZSTD_AVAILABLE = False
+    base = _rss_atual_mb()
+    inicio = time.perf_counter()
+    if modo == "read_csv_url":
+        df = pd.read_csv(url)
+    elif modo == "conteudo_inteiro":
+        with urlopen(url) as resposta:
+            conteudo = resposta.read()
+        df, _ = ler_csv_tipado(io.BytesIO(conteudo))
+        del conteudo
+    else:
+        df = carregador_remoto.carregar_dataset_url(url, diretorio_cache=diretorio_cache).df
+    tempo = time.perf_counter() - inicio
+    return {
+        "tempo_s": round(tempo, 4),
+        "rss_base_mb": round(base, 1),
+        "pico_rss_mb": round(_pico_rss_mb(), 1),
+        "memoria_df_mb": round(df.memory_usage(deep=True).sum() / 1024 / 1024, 1),
+        "linhas": len(df),
+    }
+
+
+def _medir_em_subprocesso(modo, url, diretorio_cache):
+    saida = subprocess.run(
+        [sys.executable, "-m", "benchmarks.carga_url", "--medir", modo, url, diretorio_cache],
+        capture_output=True, text=True,
+    )
+    if saida.returncode != 0:
+        return {"erro": (saida.stderr.strip().splitlines() or [f"código {saida.returncode}"])[-1]}
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def medir_escala(fator, diretorio):
+    caminho = gravar_csv_sintetico(fator, diretorio)
+    nome = os.path.basename(caminho)
+    aquecer(caminho)
+    comprimido, url_comprimida = iniciar_servidor(diretorio)
+    simples, url_simples = iniciar_servidor(diretorio, comprimir=False)
+    medicao = {"fator": fator, "csv_mb": round(os.path.getsize(caminho) / 1024 / 1024, 1), "modos": {}}
+    try:
+        cache_quente = os.path.join(diretorio, "cache_quente")
+        for modo in MODOS:
+            if modo == "streaming_zstd" and not ZSTD_AVAILABLE:
+                continue
+            servidor, base = (simples, url_simples) if modo in ("read_csv_url", "conteudo_inteiro",
+                                                                "streaming_identity") else (comprimido, url_comprimida)
+            # revalidacao usa o cache preenchido pelo streaming_gzip
+            cache = cache_quente if modo in ("streaming_gzip", "revalidacao") else os.path.join(diretorio, f"cache_{modo}")
+            enviados = servidor.bytes_enviados
+            resultado = _medir_em_subprocesso(modo, f"{base}/{nome}", cache)
+            resultado["bytes_transferidos_mb"] = round((servidor.bytes_enviados - enviados) / 1024 / 1024, 2)
+            medicao["modos"][modo] = resultado
+    finally:
+        comprimido.shutdown()
+        simples.shutdown()
+    return medicao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", default="10,100")
+    parser.add_argument("--diretorio", default=None, help="Onde gravar os CSVs sintéticos e os caches")
+    parser.add_argument("--saida", default="benchmark_carga_url.json")
+    parser.add_argument("--medir", nargs=3, metavar=("MODO", "URL", "CACHE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(_medir(*args.medir)))
+        return
+
+    escalas = [int(e) for e in args.escalas.split(",") if e.strip()]
+    resultado = {"ambiente": metadados_ambiente(), "configuracao": vars(args), "escalas": []}
+    for fator in escalas:
+        with tempfile.TemporaryDirectory(dir=args.diretorio) as diretorio:
+            medicao = medir_escala(fator, diretorio)
+        resultado["escalas"].append(medicao)
+        print(f"{fator}x ({medicao['csv_mb']} MB de CSV):")
+        for modo, m in medicao["modos"].items():
+            if "erro" in m:
+                print(f"  {modo:>20}: falhou: {m['erro']}")
+                continue
+            print(f"  {modo:>20}: {m['tempo_s']:6.2f}s | pico {m['pico_rss_mb'] - m['rss_base_mb']:7.1f} MB acima da base"
+                  f" | df {m['memoria_df_mb']:6.1f} MB | {m['bytes_transferidos_mb']:7.2f} MB transferidos")
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Utilitários compartilhados pelos benchmarks: dados sintéticos, percentis,
+memória e gravação dos resultados em JSON.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from urllib.request import urlopen
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_ORIGINAL = os.path.join(RAIZ, "data.csv")
+CORPUS = os.path.join(RAIZ, "benchmarks", "corpus.json")
+
+
+def sintetizar(fator, origem=CSV_ORIGINAL):
+    """
+    Replica o CSV original `fator` vezes, deslocando os identificadores de
+    fluxo e etapa para que cada cópia represente registros distintos.
+    """
+    base = pd.read_csv(origem)
+    if fator == 1:
+        return base
+    deslocamento_fluxo = int(base["seqFluxo"].max()) + 1
+    deslocamento_etapa = int(base["seqEtapa"].max()) + 1
+    copias = []
+    for i in range(fator):
+        copia = base.copy()
+        copia["seqFluxo"] += i * deslocamento_fluxo
+        copia["seqEtapa"] += i * deslocamento_etapa
+        copias.append(copia)
+    return pd.concat(copias, ignore_index=True)
+
+
+def gravar_csv_sintetico(fator, diretorio):
+    """Grava o CSV sintético no diretório e retorna o caminho."""
+    caminho = os.path.join(diretorio, f"data_x{fator}.csv")
+    sintetizar(fator).to_csv(caminho, index=False)
+    return caminho
+
+
+def percentis(valores):
+    """p50, p95, média e máximo (em segundos) de uma lista de medições."""
+    if not valores:
+        return {"p50": 0.0, "p95": 0.0, "media": 0.0, "max": 0.0, "n": 0}
+    serie = pd.Series(valores, dtype="float64")
+    return {
+        "p50": round(float(serie.quantile(0.50)), 6),
+        "p95": round(float(serie.quantile(0.95)), 6),
+        "media": round(float(serie.mean()), 6),
+        "max": round(float(serie.max()), 6),
+        "n": len(valores),
+    }
+
+
+def pico_rss_mb():
+    """Pico de memória residente do processo (MB)."""
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024, 1)
+    except ImportError:
+        return 0.0
+
+
+def contar_tokens(texto):
+    """Estimativa de tokens (≈ 4 caracteres por token), suficiente para comparar execuções."""
+    return max(1, len(texto) // 4)
+
+
+def ollama_disponivel(base_url):
+    """True se há um servidor Ollama respondendo em `base_url`."""
+    try:
+        with urlopen(f"{base_url}/api/tags", timeout=2):
+            return True
+    except OSError:
+        return False
+
+
+def metadados_ambiente():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def gravar_resultado(caminho, resultado):
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"Resultado gravado em {caminho}")
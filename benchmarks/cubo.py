@@ -0,0 +1,155 @@
+"""
+Benchmark do cubo de agregados contra group-bys nas etapas (uma linha por seqEtapa).
+
+Para cada escala de dados sintéticos mede construção do cubo, atualização
+incremental com 1% de linhas novas (com e sem rematerializar a tabela,
+contra reconstruir), memória do cubo e
+do DataFrame, latência de consultas típicas (agregar x groupby), se as
+contagens batem com as etapas (inclusive depois da atualização, com etapas
+divididas entre as duas partes) e o maior erro relativo dos percentis
+aproximados.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.cubo --escalas 1,10,100 --saida benchmark_cubo.json
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.comum import gravar_resultado, metadados_ambiente, percentis, sintetizar
+from carregador_dados import aplicar_esquema, inferir_esquema
+from cubo_agregados import CuboAgregados, PERCENTIS
+
+CONSULTAS = (
+    ("etapa", "tempoTotal"),
+    ("executor", "tempoParaIniciar"),
+    (("servico", "mesCriacao"), "tempoInicioFim"),
+    (("executor", "etapa"), "tempoTotal"),
+)
+
+
+def _cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return percentis(tempos)
+
+
+def _groupby(df, por, medida):
+    por = [por] if isinstance(por, str) else list(por)
+    base = df
+    if any(d.startswith("mes") for d in por):
+        base = df.assign(mesCriacao=df["dataCriacao"].dt.strftime("%Y-%m"), mesExeFim=df["dataExeFim"].dt.strftime("%Y-%m"))
+    grupos = base.groupby(por, observed=True)[medida]
+    return grupos.agg(["size", "mean", "sum", "min", "max"]), grupos.quantile(list(PERCENTIS))
+
+
+def _erro_percentis(aproximado, df, por, medida):
+    """
+    Maior erro relativo dos percentis do cubo. O esboço devolve um valor da amostra
+    (por posição), então compara com o vizinho mais próximo entre as interpolações
+    "lower" e "higher" do pandas em vez da interpolação linear.
+    """
+    por = [por] if isinstance(por, str) else list(por)
+    base = df
+    if any(d.startswith("mes") for d in por):
+        base = df.assign(mesCriacao=df["dataCriacao"].dt.strftime("%Y-%m"), mesExeFim=df["dataExeFim"].dt.strftime("%Y-%m"))
+    grupos = base.groupby(por, observed=True)[medida]
+    erro = 0.0
+    for p in PERCENTIS:
+        obtido = aproximado[f"p{int(p * 100)}"]
+        relativos = []
+        for interpolacao in ("lower", "higher"):
+            exato = grupos.quantile(p, interpolation=interpolacao)
+            obtido_alinhado = obtido.reindex(exato.index)
+            relativos.append(np.abs(obtido_alinhado - exato) / np.maximum(np.abs(exato), 1e-9))
+        erro = max(erro, float(np.nanmax(np.fmin(*relativos))))
+    return erro
+
+
+def _contagens_exatas(cubo, etapas):
+    """True se `n` e a média do cubo batem com o groupby das etapas em todas as consultas."""
+    for por, medida in CONSULTAS:
+        exato = _groupby(etapas, por, medida)[0]
+        obtido = cubo.agregar(por, medida).reindex(exato.index)
+        if not (np.array_equal(obtido["n"], exato["size"]) and np.allclose(obtido["media"], exato["mean"], equal_nan=True)):
+            return False
+    return True
+
+
+def medir_escala(fator, repeticoes):
+    df = sintetizar(fator)
+    df = aplicar_esquema(df, inferir_esquema(df))  # mesmos tipos do dataset carregado pelo chatbot
+    # Uma linha por etapa, como TabelasNormalizadas.etapas (o cubo conta etapas, não campos)
+    etapas = df.drop_duplicates("seqEtapa")
+
+    inicio = time.perf_counter()
+    cubo = CuboAgregados.construir(df)
+    cubo.tabela
+    construcao = time.perf_counter() - inicio
+
+    corte = len(df) - max(1, len(df) // 100)
+    parcial = CuboAgregados.construir(df.iloc[:corte])
+    parcial.tabela
+    inicio = time.perf_counter()
+    parcial.atualizar(df.iloc[corte:])
+    mescla = time.perf_counter() - inicio
+    parcial.tabela
+    incremental = time.perf_counter() - inicio
+
+    consultas, erro_maximo = {}, 0.0
+    for por, medida in CONSULTAS:
+        nome = f"{'+'.join([por] if isinstance(por, str) else por)}/{medida}"
+        consultas[nome] = {
+            "cubo_s": _cronometrar(lambda: cubo.agregar(por, medida), repeticoes),
+            "groupby_s": _cronometrar(lambda: _groupby(etapas, por, medida), repeticoes),
+        }
+        erro_maximo = max(erro_maximo, _erro_percentis(cubo.agregar(por, medida), etapas, por, medida))
+
+    return {
+        "fator": fator,
+        "linhas": len(df),
+        "etapas": len(etapas),
+        "contagens_exatas": _contagens_exatas(cubo, etapas),
+        "contagens_exatas_incremental": _contagens_exatas(parcial, etapas),
+        "construcao_s": round(construcao, 4),
+        "atualizacao_1pct_s": round(incremental, 4),
+        "atualizacao_1pct_sem_tabela_s": round(mescla, 4),
+        "linhas_cubo": len(cubo.tabela),
+        "memoria_df_mb": round(df.memory_usage(deep=True).sum() / 1024 / 1024, 2),
+        "memoria_cubo_mb": round(cubo.memoria_bytes() / 1024 / 1024, 2),
+        "erro_relativo_max_percentis": round(erro_maximo, 4),
+        "consultas": consultas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", default="1,10,100")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--saida", default="benchmark_cubo.json")
+    args = parser.parse_args()
+
+    escalas = [int(e) for e in args.escalas.split(",") if e.strip()]
+    resultado = {"ambiente": metadados_ambiente(), "configuracao": vars(args), "escalas": []}
+    for fator in escalas:
+        medicao = medir_escala(fator, args.repeticoes)
+        resultado["escalas"].append(medicao)
+        ganho = np.median([c["groupby_s"]["p50"] / max(c["cubo_s"]["p50"], 1e-9) for c in medicao["consultas"].values()])
+        print(
+            f"{fator}x ({medicao['linhas']} linhas): construção {medicao['construcao_s']:.2f}s"
+            f" | +1% incremental {medicao['atualizacao_1pct_sem_tabela_s']:.2f}s"
+            f" ({medicao['atualizacao_1pct_s']:.2f}s com a tabela)"
+            f" | cubo {medicao['memoria_cubo_mb']} MB vs df {medicao['memoria_df_mb']} MB"
+            f" | consultas {ganho:.0f}x mais rápidas (mediana)"
+            f" | erro percentis ≤ {medicao['erro_relativo_max_percentis']:.1%}"
+            f" | contagens exatas {medicao['contagens_exatas']} (incremental {medicao['contagens_exatas_incremental']})"
+        )
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
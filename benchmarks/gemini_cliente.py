@@ -0,0 +1,130 @@
+"""
+Benchmark do GeminiLLM contra o servidor local que imita a API REST do Gemini.
+
+Compara, sem rede e sem chave de API:
+  - reconfigurar o cliente e recriar modelo/GenerationConfig a cada chamada
+    (comportamento antigo) com o cliente reaproveitado;
+  - perguntas em sequência com um lote em `generate` (prompts em paralelo);
+  - tempo até o primeiro token com streaming e tempo total;
+  - chamadas bem-sucedidas com erros 429/503 injetados (novas tentativas).
+
+Uso (na raiz do repositório):
+    python -m benchmarks.gemini_cliente --chamadas 20 --latencia 0.05 --saida benchmark_gemini.json
+"""
+import argparse
+import time
+import warnings
+
+from benchmarks.comum import CORPUS, gravar_resultado, metadados_ambiente, percentis
+from benchmarks.gemini_local import ServidorGeminiLocal
+from llm_gemini import GeminiLLM
+from llm_roteirizado import LLMRoteirizado
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+
+def _cronometrar(funcao, vezes):
+    tempos = []
+    for i in range(vezes):
+        inicio = time.perf_counter()
+        funcao(i)
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def medir(servidor, perguntas, chamadas, taxa_erros):
+    import google.generativeai as genai
+
+    def novo_llm(**opcoes):
+        return GeminiLLM(gemini_api_key="teste", transport="rest", api_endpoint=servidor.url, **opcoes)
+
+    def pergunta(i):
+        return perguntas[i % len(perguntas)]
+
+    llm = novo_llm()
+    llm.invoke(pergunta(0))  # aquece a conexão
+
+    def sem_reuso(i):
+        # O que o wrapper antigo fazia: configure + GenerativeModel + GenerationConfig por chamada
+        genai.configure(api_key="teste", transport="rest", client_options={"api_endpoint": servidor.url})
+        modelo = genai.GenerativeModel(llm.gemini_model_name)
+        config = genai.types.GenerationConfig(temperature=0, max_output_tokens=4096, top_p=0.95, top_k=40)
+        modelo.generate_content(pergunta(i), generation_config=config).text
+
+    resultado = {
+        "sem_reuso_s": percentis(_cronometrar(sem_reuso, chamadas)),
+        "com_reuso_s": percentis(_cronometrar(lambda i: llm.invoke(pergunta(i)), chamadas)),
+    }
+    llm = novo_llm()  # sem_reuso trocou o cliente global; recria com a configuração padrão
+
+    lote = [pergunta(i) for i in range(chamadas)]
+    inicio = time.perf_counter()
+    for p in lote:
+        llm.invoke(p)
+    resultado["sequencial_total_s"] = round(time.perf_counter() - inicio, 4)
+    inicio = time.perf_counter()
+    llm.generate(lote)
+    resultado["lote_total_s"] = round(time.perf_counter() - inicio, 4)
+
+    primeiros, totais = [], []
+    for i in range(chamadas):
+        inicio = time.perf_counter()
+        primeiro = None
+        for _ in llm.stream(pergunta(i)):
+            if primeiro is None:
+                primeiro = time.perf_counter() - inicio
+        primeiros.append(primeiro or 0.0)
+        totais.append(time.perf_counter() - inicio)
+    resultado["stream_primeiro_token_s"] = percentis(primeiros)
+    resultado["stream_total_s"] = percentis(totais)
+
+    servidor.taxa_erros = taxa_erros
+    llm = novo_llm(espera_base_s=0.05, espera_max_s=0.5)
+    sucessos = 0
+    inicio = time.perf_counter()
+    for i in range(chamadas):
+        try:
+            llm.invoke(pergunta(i))
+            sucessos += 1
+        except Exception:
+            pass
+    resultado["com_erros"] = {
+        "taxa_erros": taxa_erros,
+        "sucessos": sucessos,
+        "chamadas": chamadas,
+        "total_s": round(time.perf_counter() - inicio, 4),
+    }
+    servidor.taxa_erros = 0.0
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chamadas", type=int, default=20)
+    parser.add_argument("--latencia", type=float, default=0.05, help="Latência simulada do servidor (s)")
+    parser.add_argument("--intervalo-pedaco", type=float, default=0.01, help="Intervalo entre pedaços do streaming (s)")
+    parser.add_argument("--taxa-erros", type=float, default=0.3, help="Fração de respostas 429/503 no último teste")
+    parser.add_argument("--saida", default="benchmark_gemini.json")
+    args = parser.parse_args()
+
+    perguntas = list(LLMRoteirizado.de_arquivo(CORPUS).roteiros)
+    with ServidorGeminiLocal(latencia_s=args.latencia, intervalo_pedaco_s=args.intervalo_pedaco) as servidor:
+        medicao = medir(servidor, perguntas, args.chamadas, args.taxa_erros)
+        medicao["requisicoes_servidor"] = dict(servidor.requisicoes)
+
+    print(f"chamada p50: sem reuso {medicao['sem_reuso_s']['p50'] * 1000:.1f} ms"
+          f" | com reuso {medicao['com_reuso_s']['p50'] * 1000:.1f} ms")
+    print(f"{args.chamadas} perguntas: sequencial {medicao['sequencial_total_s']:.2f}s | lote {medicao['lote_total_s']:.2f}s")
+    print(f"streaming p50: primeiro token {medicao['stream_primeiro_token_s']['p50'] * 1000:.1f} ms"
+          f" | total {medicao['stream_total_s']['p50'] * 1000:.1f} ms")
+    erros = medicao["com_erros"]
+    print(f"com {erros['taxa_erros']:.0%} de erros: {erros['sucessos']}/{erros['chamadas']} chamadas bem-sucedidas")
+    gravar_resultado(args.saida, {
+        "ambiente": metadados_ambiente(),
+        "configuracao": vars(args),
+        "resultado": medicao,
+    })
+
+
+if __name__ == "__main__":
+    main()
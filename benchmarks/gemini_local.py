@@ -0,0 +1,249 @@
+"""
+Servidor HTTP local que imita a API REST do Gemini (v1beta).
+
+Atende `models/{modelo}:generateContent`, `:streamGenerateContent` (array JSON
+ou SSE com `alt=sse`), a listagem de modelos e o cache de contexto
+(`cachedContents`, com o mínimo de tokens do provedor; as gerações que usam o
+cache informam `cachedContentTokenCount`). O texto gerado vem das
+transcrições do corpus (como o LLM roteirizado), com latência configurável
+e injeção de erros 429/503 para exercitar as novas tentativas. Requisições com
+`tools` (o `ChatGemini`) recebem as transcrições como chamadas de função, como
+o `ChatRoteirizado` as reproduz.
+
+Uso:
+    with ServidorGeminiLocal(latencia_s=0.05, taxa_erros=0.1) as servidor:
+        llm = GeminiLLM(gemini_api_key="teste", transport="rest", api_endpoint=servidor.url)
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.comum import CORPUS, contar_tokens
+from llm_roteirizado import CHAMADA_MALFORMADA, RESPOSTA_DESCONHECIDA, LLMRoteirizado, _mensagem_ferramentas
+
+MODELOS = ("gemini-2.5-flash", "gemini-2.0-flash", "gemini-2.5-pro")
+ROTA_GERACAO = re.compile(r"^/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)$")
+ROTA_CACHE = re.compile(r"^/v1beta/(cachedContents)(?:/([^/]+))?$")
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Cabeçalho e corpo saem em escritas separadas; sem isso, conexões reaproveitadas
+    # esperariam o ACK atrasado do cliente (~40 ms) e distorceriam as medições
+    disable_nagle_algorithm = True
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _json(self, status, corpo):
+        dados = json.dumps(corpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _erro(self, status, mensagem, situacao):
+        self._json(status, {"error": {"code": status, "message": mensagem, "status": situacao}})
+
+    def do_GET(self):
+        servidor = self.server.estado
+        servidor.registrar("listar_modelos")
+        if self.path.split("?")[0] != "/v1beta/models":
+            return self._erro(404, "Not found", "NOT_FOUND")
+        modelos = [{"name": f"models/{nome}", "supportedGenerationMethods": ["generateContent"]} for nome in MODELOS]
+        self._json(200, {"models": modelos})
+
+    def do_DELETE(self):
+        rota = ROTA_CACHE.match(self.path.split("?")[0])
+        if rota is None or not self.server.estado.remover_cache(f"cachedContents/{rota.group(2)}"):
+            return self._erro(404, "Not found", "NOT_FOUND")
+        self._json(200, {})
+
+    def _criar_cache(self, corpo):
+        servidor = self.server.estado
+        servidor.registrar("criar_cache")
+        texto = _texto([corpo.get("systemInstruction") or {}] + corpo.get("contents", []))
+        tokens = contar_tokens(texto)
+        if tokens < servidor.min_tokens_cache:
+            return self._erro(400, f"Cached content is too small. total_token_count={tokens}, "
+                                   f"min_total_token_count={servidor.min_tokens_cache}", "INVALID_ARGUMENT")
+        nome = servidor.guardar_cache(texto, corpo.get("tools"))
+        agora = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        expira = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 3600))
+        self._json(200, {"name": nome, "model": corpo.get("model"), "createTime": agora, "updateTime": agora,
+                         "expireTime": expira, "usageMetadata": {"totalTokenCount": tokens}})
+
+    def do_POST(self):
+        servidor = self.server.estado
+        caminho, _, consulta = self.path.partition("?")
+        corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if ROTA_CACHE.match(caminho):
+            return self._criar_cache(corpo)
+        rota = ROTA_GERACAO.match(caminho)
+        if rota is None:
+            return self._erro(404, "Not found", "NOT_FOUND")
+        modelo, metodo = rota.groups()
+        servidor.registrar(metodo)
+        if modelo not in MODELOS:
+            return self._erro(404, f"models/{modelo} is not found for API version v1beta", "NOT_FOUND")
+
+        time.sleep(servidor.latencia_s)
+        if servidor.sortear_erro():
+            status, situacao = random.choice(((429, "RESOURCE_EXHAUSTED"), (503, "UNAVAILABLE")))
+            return self._erro(status, "Resource has been exhausted (e.g. check quota).", situacao)
+
+        prompt = _texto([corpo.get("systemInstruction") or {}] + corpo.get("contents", []))
+        em_cache, ferramentas = "", corpo.get("tools")
+        if corpo.get("cachedContent"):
+            cache = servidor.obter_cache(corpo["cachedContent"])
+            if cache is None:
+                return self._erro(404, f"{corpo['cachedContent']} not found", "NOT_FOUND")
+            em_cache, ferramentas = cache
+            prompt = em_cache + prompt
+        if ferramentas:
+            partes, motivo = _resposta_ferramentas(servidor.llm, corpo.get("contents", []))
+            texto = "".join(parte.get("text", "") + json.dumps(parte.get("functionCall", "")) for parte in partes)
+        else:
+            texto = servidor.llm._resposta_para(prompt)
+            partes, motivo = None, "STOP"
+        uso = {"promptTokenCount": contar_tokens(prompt), "candidatesTokenCount": contar_tokens(texto)}
+        if em_cache:
+            uso["cachedContentTokenCount"] = contar_tokens(em_cache)
+        uso["totalTokenCount"] = uso["promptTokenCount"] + uso["candidatesTokenCount"]
+
+        if metodo == "generateContent":
+            return self._json(200, _resposta(texto, uso, partes, motivo))
+        if partes is not None:
+            # Chamadas de função chegam inteiras, em um só pedaço
+            pedacos = [None]
+        else:
+            pedacos = [texto[i:i + servidor.tamanho_pedaco]
+                       for i in range(0, len(texto), servidor.tamanho_pedaco)] or [""]
+        sse = "alt=sse" in consulta
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if sse else "application/json; charset=UTF-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for indice, pedaco in enumerate(pedacos):
+            if indice:
+                time.sleep(servidor.intervalo_pedaco_s)
+            ultimo = indice == len(pedacos) - 1
+            item = json.dumps(_resposta(pedaco, uso if ultimo else None, partes, motivo if ultimo else None))
+            if sse:
+                dados = f"data: {item}\r\n\r\n"
+            else:
+                dados = ("[" if indice == 0 else ",\r\n") + item + ("]" if indice == len(pedacos) - 1 else "")
+            self._pedaco(dados.encode("utf-8"))
+        self._pedaco(b"")
+
+    def _pedaco(self, dados):
+        self.wfile.write(f"{len(dados):X}\r\n".encode() + dados + b"\r\n")
+        self.wfile.flush()
+
+
+def _texto(conteudos):
+    textos = []
+    for conteudo in conteudos:
+        for parte in conteudo.get("parts", []):
+            textos.append(parte.get("text", ""))
+            if "functionResponse" in parte:
+                textos.append(json.dumps(parte["functionResponse"].get("response", {}), ensure_ascii=False))
+    return "".join(textos)
+
+
+def _resposta_ferramentas(llm, conteudos):
+    """(partes, finishReason) da iteração atual, como o ChatRoteirizado reproduz a transcrição."""
+    # A pergunta é o último texto do usuário; cada resultado de função depois dele é uma iteração
+    posicao = max((i for i, c in enumerate(conteudos) if c.get("role") == "user"
+                   and any("text" in parte for parte in c.get("parts", []))), default=-1)
+    pergunta = _texto([conteudos[posicao]]) if posicao >= 0 else ""
+    iteracao = sum("functionResponse" in parte for c in conteudos[posicao + 1:] for parte in c.get("parts", []))
+    respostas = llm.roteiros.get(pergunta) or [RESPOSTA_DESCONHECIDA]
+    mensagem = _mensagem_ferramentas(respostas[min(iteracao, len(respostas) - 1)], iteracao)
+    if mensagem.response_metadata.get("finish_reason") == CHAMADA_MALFORMADA:
+        # O Gemini devolve a chamada malformada sem conteúdo
+        return [], CHAMADA_MALFORMADA
+    partes = [{"text": mensagem.content}] if mensagem.content else []
+    partes += [{"functionCall": {"name": c["name"], "args": c["args"]}} for c in mensagem.tool_calls]
+    return partes, "STOP"
+
+
+def _resposta(texto, uso=None, partes=None, motivo="STOP"):
+    candidato = {"content": {"parts": [{"text": texto}] if partes is None else partes, "role": "model"}, "index": 0}
+    if motivo:
+        candidato["finishReason"] = motivo
+    resposta = {"candidates": [candidato]}
+    if uso:
+        resposta["usageMetadata"] = uso
+    return resposta
+
+
+class ServidorGeminiLocal:
+    """
+    Args:
+        latencia_s: Atraso antes de cada resposta (tempo até o primeiro pedaço).
+        taxa_erros: Fração das gerações que respondem 429 ou 503.
+        tamanho_pedaco / intervalo_pedaco_s: Como o streaming divide o texto.
+        min_tokens_cache: Tamanho mínimo de um cache de contexto (o do gemini-2.5-flash).
+    """
+
+    def __init__(self, latencia_s=0.0, taxa_erros=0.0, tamanho_pedaco=16, intervalo_pedaco_s=0.0, corpus=CORPUS,
+                 min_tokens_cache=1024):
+        self.latencia_s = latencia_s
+        self.min_tokens_cache = min_tokens_cache
+        self.caches = {}
+        self.taxa_erros = taxa_erros
+        self.tamanho_pedaco = tamanho_pedaco
+        self.intervalo_pedaco_s = intervalo_pedaco_s
+        self.llm = LLMRoteirizado.de_arquivo(corpus)
+        self.requisicoes = {}
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    @property
+    def url(self):
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def registrar(self, metodo):
+        with self._lock:
+            self.requisicoes[metodo] = self.requisicoes.get(metodo, 0) + 1
+
+    def guardar_cache(self, texto, ferramentas=None):
+        with self._lock:
+            nome = f"cachedContents/local{len(self.caches) + 1}"
+            self.caches[nome] = (texto, ferramentas)
+        return nome
+
+    def obter_cache(self, nome):
+        with self._lock:
+            return self.caches.get(nome)
+
+    def remover_cache(self, nome):
+        with self._lock:
+            return self.caches.pop(nome, None) is not None
+
+    def sortear_erro(self):
+        return self.taxa_erros and random.random() < self.taxa_erros
+
+    def iniciar(self):
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Manipulador)
+        self._servidor.daemon_threads = True
+        self._servidor.estado = self
+        threading.Thread(target=self._servidor.serve_forever, name="gemini-local", daemon=True).start()
+        return self
+
+    def encerrar(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.encerrar()
@@ -0,0 +1,120 @@
+"""
+Benchmark da partida a frio do chatbot (cada medição em um processo novo).
+
+Para cada modo mede, a partir do início do processo: a importação do
+`chatbot`, o momento em que a interface teria os dados para mostrar (dataset
+carregado) e a latência da primeira pergunta feita depois de `--espera`
+segundos (o usuário lendo a página e digitando), além dos tempos por fase
+registrados em `chatbot.tempos_inicializacao`:
+  - antecipado: o agente do LangChain e o Streamlit importados junto com o
+    chatbot e o agente criado na primeira pergunta (como antes das
+    importações sob demanda);
+  - primeira_pergunta: importações sob demanda, agente criado na primeira pergunta;
+  - segundo_plano: importações sob demanda e agente criado pelo aquecimento
+    em segundo plano enquanto o usuário digita.
+Também lista as importações mais caras do `chatbot` (`python -X importtime`).
+
+Uso (na raiz do repositório):
+    python -m benchmarks.inicializacao --repeticoes 5 --espera 2 --saida benchmark_inicializacao.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+from benchmarks.comum import RAIZ, gravar_resultado, metadados_ambiente, percentis
+
+MODOS = ("antecipado", "primeira_pergunta", "segundo_plano")
+PERGUNTA = "Qual executor aparece em mais registros?"
+
+# Executado em um processo novo: o tempo conta a partir do início do interpretador
+SCRIPT = """
+import json, sys, time
+inicio = time.perf_counter()
+if {antecipado}:
+    import langchain_experimental.agents.agent_toolkits, streamlit  # noqa: F401
+import chatbot
+importado = time.perf_counter()
+chatbot.recursos.obter_dataset()
+interface = time.perf_counter()
+chatbot.iniciar_aquecimento()
+time.sleep({espera})
+pergunta = time.perf_counter()
+chatbot.gerar_resposta({pergunta!r})
+fim = time.perf_counter()
+print("\\x00" + json.dumps({{
+    "importacao_s": importado - inicio,
+    "interface_pronta_s": interface - inicio,
+    "primeira_resposta_s": fim - pergunta,
+    "fases": chatbot.tempos_inicializacao.resumo(),
+    "modulos": len(sys.modules),
+}}))
+"""
+
+
+def _ambiente(modo):
+    return dict(os.environ, LLM_PROVIDER="roteirizado", CACHE_RESPOSTAS_ATIVO="false", ROTEADOR_ATIVO="false",
+                MONITOR_DADOS_ATIVO="false", CACHE_EXECUCOES_ATIVO="false",
+                AQUECIMENTO_AGENTE="segundo_plano" if modo == "segundo_plano" else "primeira_pergunta")
+
+
+def medir_modo(modo, repeticoes, espera):
+    codigo = SCRIPT.format(antecipado=modo == "antecipado", espera=espera, pergunta=PERGUNTA)
+    execucoes = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=_ambiente(modo),
+                               capture_output=True, text=True, check=True).stdout
+        execucoes.append(json.loads(saida.rsplit("\x00", 1)[1]))
+    fases = {}
+    for execucao in execucoes:
+        for fase, tempos in execucao["fases"].items():
+            fases.setdefault(fase, []).append(tempos["duracao_ms"] / 1000)
+    return {
+        "importacao_s": percentis([e["importacao_s"] for e in execucoes]),
+        "interface_pronta_s": percentis([e["interface_pronta_s"] for e in execucoes]),
+        "primeira_resposta_s": percentis([e["primeira_resposta_s"] for e in execucoes]),
+        "fases_s": {fase: percentis(valores) for fase, valores in fases.items()},
+        "modulos": execucoes[-1]["modulos"],
+    }
+
+
+def importacoes_mais_caras(limite=15):
+    """As importações de primeiro nível do `chatbot` que mais custam (tempo acumulado)."""
+    saida = subprocess.run([sys.executable, "-X", "importtime", "-c", "import chatbot"], cwd=RAIZ,
+                           env=_ambiente("primeira_pergunta"), capture_output=True, text=True, check=True).stderr
+    modulos = []
+    for linha in saida.splitlines():
+        encontrado = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)", linha)
+        # Nível 1: importados diretamente pelo chatbot (e pelos módulos do projeto)
+        if encontrado and len(encontrado.group(2)) == 3:
+            modulos.append((int(encontrado.group(1)) / 1e6, encontrado.group(3)))
+    return [{"modulo": nome, "acumulado_s": round(tempo, 4)} for tempo, nome in sorted(modulos, reverse=True)[:limite]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--espera", type=float, default=2.0,
+                        help="Segundos entre a interface pronta e a primeira pergunta")
+    parser.add_argument("--saida", default="benchmark_inicializacao.json")
+    args = parser.parse_args()
+
+    resultado = {"ambiente": metadados_ambiente(), "configuracao": vars(args), "modos": {}}
+    for modo in MODOS:
+        medicao = resultado["modos"][modo] = medir_modo(modo, args.repeticoes, args.espera)
+        print(f"{modo:>17}: importação p50 {medicao['importacao_s']['p50'] * 1000:7.0f} ms"
+              f" | interface pronta p50 {medicao['interface_pronta_s']['p50'] * 1000:7.0f} ms"
+              f" | primeira resposta p50 {medicao['primeira_resposta_s']['p50'] * 1000:7.0f} ms"
+              f" | {medicao['modulos']} módulos")
+        print("                   fases (p50 ms): " + ", ".join(
+            f"{fase} {tempos['p50'] * 1000:.0f}" for fase, tempos in medicao["fases_s"].items()))
+    resultado["importacoes_mais_caras"] = importacoes_mais_caras()
+    print("Importações mais caras do chatbot: " + ", ".join(
+        f"{m['modulo']} {m['acumulado_s'] * 1000:.0f} ms" for m in resultado["importacoes_mais_caras"][:8]))
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
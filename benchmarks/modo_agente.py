@@ -0,0 +1,149 @@
+"""
+Compara o agente ReAct com o agente de chamada de ferramentas (AGENTE_MODO).
+
+Para cada provedor roda as perguntas do corpus nos dois modos e mede chamadas
+ao LLM por pergunta (e por resposta obtida), perguntas perdidas (mensagem de
+erro, falha de parsing do ReAct ou limite de iterações), respostas sem o
+código executado, tokens de prompt e latência:
+  - roteirizado: as transcrições do corpus (sem rede), reproduzidas como texto
+    ReAct e como chamadas de ferramentas (`ChatRoteirizado`). O corpus inclui
+    saídas fora do formato ReAct, como as que os modelos produzem na prática;
+    uma ação sem "Action Input:" é reproduzida no modo ferramentas como chamada
+    malformada e conta como falha nos dois modos;
+  - openai, gemini e ollama: o provedor real, quando há chave ou servidor.
+    No Ollama, o modo ferramentas só existe para modelos com a capacidade
+    "tools" (e com o pacote langchain-ollama instalado).
+
+Uso (na raiz do repositório):
+    python -m benchmarks.modo_agente --provedores roteirizado,openai,gemini,ollama --saida benchmark_modo_agente.json
+"""
+import argparse
+import os
+import time
+import warnings
+
+# O benchmark não precisa do monitor verificando data.csv nem de respostas em cache
+os.environ.setdefault("MONITOR_DADOS_ATIVO", "false")
+os.environ["CACHE_RESPOSTAS_ATIVO"] = "false"
+
+from benchmarks.comum import CORPUS, gravar_resultado, metadados_ambiente, ollama_disponivel, percentis  # noqa: E402
+from benchmarks.pipeline import MedidorFases  # noqa: E402
+import chatbot  # noqa: E402
+from llm_roteirizado import ChatRoteirizado, LLMRoteirizado  # noqa: E402
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+MODOS = ("react", "ferramentas")
+SEM_CODIGO = "O agente não forneceu o código Python para esta consulta."
+LIMITE_ITERACOES = "Agent stopped due to iteration limit or time limit."
+
+
+def _fabricas(provedor):
+    """{modo: função que cria o LLM} do provedor, ou o motivo de estar indisponível."""
+    if provedor == "roteirizado":
+        return {"react": lambda: LLMRoteirizado.de_arquivo(CORPUS),
+                "ferramentas": lambda: ChatRoteirizado.de_arquivo(CORPUS)}
+    chaves = {"openai": "OPENAI_API_KEY", "gemini": "GOOGLE_API_KEY"}
+    if provedor in chaves and not chatbot.get_secret(chaves[provedor]):
+        return f"{chaves[provedor]} não configurada"
+    if provedor not in ("openai", "gemini", "ollama"):
+        return f"Provedor desconhecido: {provedor}"
+    base_url = chatbot.get_secret("OLLAMA_BASE_URL", "http://localhost:11434")
+    if provedor == "ollama" and not ollama_disponivel(base_url):
+        return f"Ollama fora do ar em {base_url}"
+
+    def fabrica(modo):
+        def criar():
+            chatbot.LLM_PROVIDER = provedor
+            return chatbot.criar_llm(modo)
+        return criar
+    return {modo: fabrica(modo) for modo in MODOS}
+
+
+def medir_modo(modo, llm, dataset, perguntas, repeticoes):
+    if modo == "ferramentas" and not chatbot.suporta_ferramentas(llm):
+        return {"indisponivel": "o modelo não tem chamada de ferramentas"}
+    agente = chatbot.criar_agente_pandas(dataset, llm, modo)
+    agente.verbose = False
+
+    totais, iteracoes, iteracoes_respondidas, tokens = [], [], [], []
+    falhas, falhas_parsing, sem_codigo, por_pergunta = 0, 0, 0, {}
+    try:
+        for _ in range(repeticoes):
+            for pergunta in perguntas:
+                medidor = MedidorFases()
+                inicio = time.perf_counter()
+                resposta, raciocinio = chatbot._consultar_agente(pergunta, callbacks=[medidor], agente=agente)
+                totais.append(time.perf_counter() - inicio)
+                iteracoes.append(medidor.iteracoes)
+                tokens.append(medidor.tokens_prompt)
+                # Falha de parsing do ReAct ou chamada malformada no modo ferramentas: a resposta é o
+                # que deu para recuperar do erro (sem o resultado)
+                falhou = bool(chatbot._eh_mensagem_erro(resposta) or medidor.falha_parsing
+                              or resposta.startswith(LIMITE_ITERACOES))
+                falhas += falhou
+                falhas_parsing += medidor.falha_parsing
+                sem_codigo += not falhou and raciocinio in ("", SEM_CODIGO)
+                if not falhou:
+                    iteracoes_respondidas.append(medidor.iteracoes)
+                por_pergunta.setdefault(pergunta, []).append({
+                    "iteracoes": medidor.iteracoes,
+                    "falhou": falhou,
+                    "falha_parsing": medidor.falha_parsing,
+                    "resposta": resposta[:200],
+                })
+    finally:
+        agente.tools[0].encerrar()
+
+    return {
+        "perguntas": len(totais),
+        "chamadas_llm": sum(iteracoes),
+        "iteracoes": percentis(iteracoes),
+        "iteracoes_por_resposta": round(sum(iteracoes) / max(1, len(totais) - falhas), 3),
+        "iteracoes_perguntas_respondidas": percentis(iteracoes_respondidas),
+        "perguntas_com_falha": falhas,
+        "perguntas_com_falha_parsing": falhas_parsing,
+        "respostas_sem_codigo": sem_codigo,
+        "tokens_prompt": percentis(tokens),
+        "total_s": percentis(totais),
+        "por_pergunta": por_pergunta,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provedores", default="roteirizado,openai,gemini,ollama")
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--saida", default="benchmark_modo_agente.json")
+    args = parser.parse_args()
+
+    perguntas = list(LLMRoteirizado.de_arquivo(CORPUS).roteiros)
+    dataset = chatbot.recursos.obter_dataset()
+    resultado = {"ambiente": metadados_ambiente(), "configuracao": vars(args), "provedores": {}}
+    for provedor in [p.strip() for p in args.provedores.split(",") if p.strip()]:
+        fabricas = _fabricas(provedor)
+        if isinstance(fabricas, str):
+            resultado["provedores"][provedor] = {"indisponivel": fabricas}
+            print(f"{provedor:>12}: indisponível ({fabricas})")
+            continue
+        resultado["provedores"][provedor] = {}
+        for modo, fabrica in fabricas.items():
+            try:
+                medicao = medir_modo(modo, fabrica(), dataset, perguntas, args.repeticoes)
+            except Exception as e:
+                medicao = {"indisponivel": str(e)[:300]}
+            resultado["provedores"][provedor][modo] = medicao
+            if "indisponivel" in medicao:
+                print(f"{provedor:>12} {modo:>11}: indisponível ({medicao['indisponivel']})")
+                continue
+            print(f"{provedor:>12} {modo:>11}: {medicao['chamadas_llm']} chamadas ao LLM"
+                  f" ({medicao['iteracoes_por_resposta']:.2f} por resposta)"
+                  f" | falhas {medicao['perguntas_com_falha']}/{medicao['perguntas']}"
+                  f" (parsing {medicao['perguntas_com_falha_parsing']})"
+                  f" | sem código {medicao['respostas_sem_codigo']}"
+                  f" | total p50 {medicao['total_s']['p50'] * 1000:.1f} ms")
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
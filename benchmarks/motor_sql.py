@@ -0,0 +1,208 @@
+"""
+Benchmark de escala do motor SQL (DuckDB) contra o pandas em memória.
+
+Gera snapshots Parquet sintéticos de 10 mil a 100 milhões de linhas a partir do
+`data.csv` (cópias com seqFluxo/seqEtapa deslocados, geradas dentro do DuckDB,
+sem passar pelo pandas) e, para cada escala, mede em um subprocesso limpo:
+  - duckdb: abrir o motor e a latência de consultas típicas (contagem de
+    etapas, média por executor na view `etapas`, filtro seletivo e ranking);
+  - pandas: ler o snapshot inteiro em um DataFrame e as mesmas consultas
+    (até --max-linhas-pandas, acima disso o pandas não cabe na memória).
+Também mede a conversão CSV -> Parquet até --max-linhas-csv.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.motor_sql --escalas 10000,100000,1000000,10000000,100000000 --saida benchmark_motor_sql.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.comum import CSV_ORIGINAL, gravar_resultado, metadados_ambiente, percentis
+
+# nome -> (SQL no motor DuckDB, mesma consulta em pandas). Contagens distintas usam
+# GROUP BY em subconsulta, que o DuckDB leva ao disco; count(DISTINCT) precisa caber na memória
+CONSULTAS = {
+    "quantas_etapas": (
+        "SELECT count(*) FROM (SELECT seqEtapa FROM dados GROUP BY seqEtapa)",
+        lambda df: df["seqEtapa"].nunique(),
+    ),
+    "media_tempoTotal_por_executor": (
+        "SELECT executor, avg(tempoTotal) FROM etapas GROUP BY executor",
+        lambda df: df.drop_duplicates("seqEtapa").groupby("executor", observed=True)["tempoTotal"].mean(),
+    ),
+    "filtro_seletivo": (
+        "SELECT count(*) FROM dados WHERE etapa = 'REVISÃO' AND tempoTotal > 55 AND dataCriacao >= '2025-01-01'",
+        lambda df: int(((df["etapa"] == "REVISÃO") & (df["tempoTotal"] > 55)
+                        & (df["dataCriacao"] >= "2025-01-01")).sum()),
+    ),
+    "top_servicos": (
+        "SELECT servico, count(*) AS n FROM (SELECT servico, seqFluxo FROM dados GROUP BY ALL) "
+        "GROUP BY servico ORDER BY n DESC LIMIT 5",
+        lambda df: df.groupby("servico", observed=True)["seqFluxo"].nunique().nlargest(5),
+    ),
+}
+
+
+def gerar_parquet(linhas, destino, origem=CSV_ORIGINAL):
+    """Snapshot Parquet com `linhas` linhas replicando o CSV original dentro do DuckDB."""
+    import duckdb
+
+    from motor_sql import LINHAS_POR_GRUPO
+
+    conexao = duckdb.connect()
+    conexao.execute(f"CREATE TABLE base AS SELECT * FROM read_csv_auto('{origem}', header=true)")
+    base, fluxo, etapa = conexao.execute("SELECT count(*), max(seqFluxo) + 1, max(seqEtapa) + 1 FROM base").fetchone()
+    copias = -(-linhas // base)
+    conexao.execute(
+        f"COPY (SELECT * REPLACE (seqFluxo + r * {fluxo} AS seqFluxo, seqEtapa + r * {etapa} AS seqEtapa) "
+        f"FROM range({copias}) t(r), base LIMIT {linhas}) "
+        f"TO '{destino}' (FORMAT parquet, ROW_GROUP_SIZE {LINHAS_POR_GRUPO})"
+    )
+    conexao.close()
+
+
+def _cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return percentis(tempos)
+
+
+def _medir_duckdb(arquivo, repeticoes, limite_memoria):
+    from motor_sql import MotorDuckDB
+
+    inicio = time.perf_counter()
+    motor = MotorDuckDB(arquivo, limite_memoria=limite_memoria)
+    abertura = time.perf_counter() - inicio
+    consultas = {nome: _cronometrar(lambda: motor.consultar(sql), repeticoes) for nome, (sql, _) in CONSULTAS.items()}
+    return {"abertura_s": round(abertura, 4), "consultas": consultas}
+
+
+def _medir_pandas(arquivo, repeticoes, limite_memoria):
+    import pandas as pd
+
+    inicio = time.perf_counter()
+    df = pd.read_parquet(arquivo)
+    for coluna in ("etapa", "executor", "servico"):
+        df[coluna] = df[coluna].astype("category")
+    carga = time.perf_counter() - inicio
+    consultas = {nome: _cronometrar(lambda: consulta(df), repeticoes) for nome, (_, consulta) in CONSULTAS.items()}
+    return {"carga_s": round(carga, 4), "consultas": consultas}
+
+
+def _medir_em_subprocesso(motor, arquivo, repeticoes, limite_memoria):
+    """Cada motor roda em um processo novo para que a memória de um não contamine o outro."""
+    saida = subprocess.run(
+        [sys.executable, "-m", "benchmarks.motor_sql", "--medir", motor, arquivo,
+         "--repeticoes", str(repeticoes), "--limite-memoria", limite_memoria or ""],
+        capture_output=True, text=True,
+    )
+    if saida.returncode < 0:
+        # SIGKILL costuma ser o OOM killer: os dados não couberam na memória
+        return {"erro": f"processo encerrado pelo sinal {-saida.returncode}"}
+    if saida.returncode != 0:
+        return {"erro": (saida.stderr.strip().splitlines() or ["processo encerrado"])[-1]}
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def medir_escala(linhas, args, diretorio):
+    arquivo = os.path.join(diretorio, f"dados_{linhas}.parquet")
+    inicio = time.perf_counter()
+    gerar_parquet(linhas, arquivo)
+    medicao = {
+        "linhas": linhas,
+        "geracao_s": round(time.perf_counter() - inicio, 4),
+        "parquet_mb": round(os.path.getsize(arquivo) / 1024 / 1024, 2),
+    }
+    if linhas <= args.max_linhas_csv:
+        import duckdb
+
+        from motor_sql import converter_para_parquet
+
+        csv = os.path.join(diretorio, f"dados_{linhas}.csv")
+        duckdb.connect().execute(f"COPY (SELECT * FROM read_parquet('{arquivo}')) TO '{csv}' (HEADER)")
+        inicio = time.perf_counter()
+        converter_para_parquet(csv, os.path.join(diretorio, f"convertido_{linhas}.parquet"))
+        medicao["conversao_csv_s"] = round(time.perf_counter() - inicio, 4)
+        medicao["csv_mb"] = round(os.path.getsize(csv) / 1024 / 1024, 2)
+        os.remove(csv)
+        os.remove(os.path.join(diretorio, f"convertido_{linhas}.parquet"))
+    medicao["duckdb"] = _medir_em_subprocesso("duckdb", arquivo, args.repeticoes, args.limite_memoria)
+    if linhas <= args.max_linhas_pandas:
+        medicao["pandas"] = _medir_em_subprocesso("pandas", arquivo, args.repeticoes, args.limite_memoria)
+    os.remove(arquivo)
+    return medicao
+
+
+def _resumo(medicao):
+    duck = medicao["duckdb"]
+    partes = [f"{medicao['linhas']:>11,} linhas ({medicao['parquet_mb']} MB parquet)"]
+    if "erro" in duck:
+        return partes[0] + f" | duckdb falhou: {duck['erro']}"
+    p50 = {nome: c["p50"] for nome, c in duck["consultas"].items()}
+    partes.append(f"duckdb pico {duck['pico_rss_mb']:.0f} MB, consultas p50 {min(p50.values()) * 1000:.0f}"
+                  f"-{max(p50.values()) * 1000:.0f} ms")
+    pandas = medicao.get("pandas")
+    if pandas and "erro" not in pandas:
+        ganho = sorted(pandas["consultas"][n]["p50"] / max(p50[n], 1e-9) for n in p50)
+        partes.append(f"pandas carga {pandas['carga_s']:.2f}s pico {pandas['pico_rss_mb']:.0f} MB"
+                      f" (duckdb {ganho[0]:.1f}x-{ganho[-1]:.1f}x)")
+    elif pandas:
+        partes.append(f"pandas falhou: {pandas['erro']}")
+    return " | ".join(partes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", default="10000,100000,1000000,10000000,100000000")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--max-linhas-pandas", type=int, default=10_000_000)
+    parser.add_argument("--max-linhas-csv", type=int, default=1_000_000)
+    parser.add_argument("--limite-memoria", default="2GB", help="memory_limit do DuckDB (acima dele usa disco)")
+    parser.add_argument("--diretorio", default=None, help="Onde gravar os snapshots temporários")
+    parser.add_argument("--saida", default="benchmark_motor_sql.json")
+    parser.add_argument("--medir", nargs=2, metavar=("MOTOR", "ARQUIVO"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        motor, arquivo = args.medir
+        medir = _medir_duckdb if motor == "duckdb" else _medir_pandas
+        resultado = medir(arquivo, args.repeticoes, args.limite_memoria or None)
+        resultado["pico_rss_mb"] = round(_pico_rss_mb(), 1)
+        print(json.dumps(resultado))
+        return
+
+    escalas = [int(e) for e in args.escalas.split(",") if e.strip()]
+    resultado = {"ambiente": metadados_ambiente(), "configuracao": vars(args), "escalas": []}
+    with tempfile.TemporaryDirectory(dir=args.diretorio) as diretorio:
+        for linhas in escalas:
+            medicao = medir_escala(linhas, args, diretorio)
+            resultado["escalas"].append(medicao)
+            print(_resumo(medicao), flush=True)
+    gravar_resultado(args.saida, resultado)
+
+
+def _pico_rss_mb():
+    # No Linux o ru_maxrss herda o pico do processo pai através do fork; o VmHWM é só deste processo
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for linha in f:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reporta em bytes, Linux em KB
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark das tabelas normalizadas (fluxos, etapas, campos) contra o
+DataFrame largo no layout EAV.
+
+Para cada escala de dados sintéticos mede o tempo de normalização, a memória
+das tabelas contra a do DataFrame e a latência de consultas típicas escritas
+corretamente nos dois formatos (no DataFrame largo elas precisam remover as
+linhas repetidas da etapa). Também registra o quanto a versão ingênua no
+DataFrame largo, sem remover repetições, erra.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.normalizacao --escalas 1,10,100 --saida benchmark_normalizacao.json
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.comum import gravar_resultado, metadados_ambiente, percentis, sintetizar
+from carregador_dados import aplicar_esquema, inferir_esquema
+from tabelas_normalizadas import TabelasNormalizadas
+
+# nome -> (consulta no DataFrame largo, consulta nas tabelas normalizadas)
+CONSULTAS = {
+    "quantas_etapas": (
+        lambda df: df["seqEtapa"].nunique(),
+        lambda t: len(t.etapas),
+    ),
+    "media_tempoTotal_por_executor": (
+        lambda df: df.drop_duplicates("seqEtapa").groupby("executor", observed=True)["tempoTotal"].mean(),
+        lambda t: t.etapas.groupby("executor", observed=True)["tempoTotal"].mean(),
+    ),
+    "media_tempoTotal_por_servico": (
+        lambda df: df.drop_duplicates("seqEtapa").groupby("servico", observed=True)["tempoTotal"].mean(),
+        lambda t: t.etapas.merge(t.fluxos, on="seqFluxo").groupby("servico", observed=True)["tempoTotal"].mean(),
+    ),
+    "etapas_pessoa_juridica_sim": (
+        lambda df: df.loc[(df["nomeCampo"] == "PESSOA_JURIDICA") & (df["valor"] == "Sim"), "seqEtapa"].nunique(),
+        lambda t: int((t.campos["PESSOA_JURIDICA"] == "Sim").sum()),
+    ),
+}
+
+# Versões ingênuas no DataFrame largo (contam a mesma etapa uma vez por campo)
+INGENUAS = {
+    "quantas_etapas": lambda df: len(df),
+    "media_tempoTotal_por_executor": lambda df: df.groupby("executor", observed=True)["tempoTotal"].mean(),
+}
+
+
+def _cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return percentis(tempos)
+
+
+def _diferenca_relativa(obtido, esperado):
+    if isinstance(esperado, pd.Series):
+        obtido = obtido.reindex(esperado.index)
+        return float(np.nanmax(np.abs(obtido - esperado) / np.maximum(np.abs(esperado), 1e-9)))
+    return abs(obtido - esperado) / max(abs(esperado), 1e-9)
+
+
+def medir_escala(fator, repeticoes):
+    df = sintetizar(fator)
+    df = aplicar_esquema(df, inferir_esquema(df))  # mesmos tipos do dataset carregado pelo chatbot
+    tabelas = TabelasNormalizadas.construir(df)
+
+    consultas = {}
+    for nome, (larga, normalizada) in CONSULTAS.items():
+        esperado = larga(df)
+        consultas[nome] = {
+            "df_largo_s": _cronometrar(lambda: larga(df), repeticoes),
+            "normalizadas_s": _cronometrar(lambda: normalizada(tabelas), repeticoes),
+            "diferenca_relativa": round(_diferenca_relativa(normalizada(tabelas), esperado), 6),
+        }
+        if nome in INGENUAS:
+            consultas[nome]["erro_ingenuo_df_largo"] = round(_diferenca_relativa(INGENUAS[nome](df), esperado), 4)
+
+    return {
+        "fator": fator,
+        "linhas": len(df),
+        "etapas": len(tabelas.etapas),
+        "fluxos": len(tabelas.fluxos),
+        "normalizacao_s": round(tabelas.tempo_construcao, 4),
+        "memoria_df_mb": round(df.memory_usage(deep=True).sum() / 1024 / 1024, 2),
+        "memoria_tabelas_mb": round(tabelas.memoria_bytes() / 1024 / 1024, 2),
+        "memoria_por_tabela_mb": {
+            nome: round(t.memory_usage(deep=True).sum() / 1024 / 1024, 2)
+            for nome, t in tabelas.como_dicionario().items()
+        },
+        "consultas": consultas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", default="1,10,100")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--saida", default="benchmark_normalizacao.json")
+    args = parser.parse_args()
+
+    escalas = [int(e) for e in args.escalas.split(",") if e.strip()]
+    resultado = {"ambiente": metadados_ambiente(), "configuracao": vars(args), "escalas": []}
+    for fator in escalas:
+        medicao = medir_escala(fator, args.repeticoes)
+        resultado["escalas"].append(medicao)
+        ganhos = ", ".join(
+            f"{nome} {c['df_largo_s']['p50'] / max(c['normalizadas_s']['p50'], 1e-9):.1f}x"
+            for nome, c in medicao["consultas"].items()
+        )
+        print(
+            f"{fator}x ({medicao['linhas']} linhas, {medicao['etapas']} etapas):"
+            f" normalização {medicao['normalizacao_s']:.2f}s"
+            f" | tabelas {medicao['memoria_tabelas_mb']} MB vs df {medicao['memoria_df_mb']} MB"
+            f" | {ganhos}"
+        )
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark do orçamento de observações da ferramenta `python_repl_ast`.
+
+1. Ferramenta: para cada escala de dados sintéticos executa trechos com saídas
+   grandes (filtros, listas, `to_string`) sem orçamento e com o orçamento
+   configurado, medindo o tamanho da observação em tokens e o tempo na
+   ferramenta, e confere que a referência citada no resumo pode ser usada na
+   execução seguinte (no pool e no próprio processo).
+2. Agente: roda as perguntas do corpus sem e com o orçamento e mede, por
+   iteração, os tokens de prompt e a latência da chamada ao LLM. Com o LLM
+   roteirizado a latência é só a local; com `--provedor openai|gemini|ollama`
+   mede o provedor real.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.observacoes --escalas 1,10,100 --saida benchmark_observacoes.json
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+
+# Configura o pipeline antes de importar o chatbot: sem cache de respostas, roteador nem cache de execuções
+os.environ.setdefault("MONITOR_DADOS_ATIVO", "false")
+os.environ["CACHE_RESPOSTAS_ATIVO"] = "false"
+os.environ["ROTEADOR_ATIVO"] = "false"
+os.environ["CACHE_EXECUCOES_ATIVO"] = "false"
+
+from langchain_core.callbacks import BaseCallbackHandler  # noqa: E402
+
+from benchmarks.comum import (  # noqa: E402
+    CORPUS, contar_tokens, gravar_csv_sintetico, gravar_resultado, metadados_ambiente, percentis,
+)
+from carregador_dados import carregar_dataset  # noqa: E402
+import chatbot  # noqa: E402
+from llm_roteirizado import LLMRoteirizado  # noqa: E402
+
+TRECHOS = [
+    "df[df['etapa'] == 'REVISÃO']",
+    "df[df['etapa'] == 'REVISÃO']['seqFluxo'].unique().tolist()",
+    "df.groupby('seqFluxo')['tempoTotal'].sum().to_dict()",
+    "df[df['nomeCampo'] == 'TAXA'][['seqFluxo', 'valor']].to_string()",
+    "print(df[['seqEtapa', 'etapa', 'executor']].to_string())",
+]
+REFERENCIA = re.compile(r"`(resultado_[0-9a-f]{8})`")
+
+
+class _PorIteracao(BaseCallbackHandler):
+    """Tokens de prompt e latência de cada chamada ao LLM."""
+
+    def __init__(self):
+        self.tokens = []
+        self.latencias = []
+        self._inicio = None
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.tokens.append(sum(contar_tokens(p) for p in prompts))
+        self._inicio = time.perf_counter()
+
+    def on_llm_end(self, response, **kwargs):
+        if self._inicio is not None:
+            self.latencias.append(time.perf_counter() - self._inicio)
+            self._inicio = None
+
+
+def medir_ferramenta(dataset, orcamento_tokens, processos):
+    chatbot.OBSERVACAO_ORCAMENTO_TOKENS = orcamento_tokens
+    chatbot.SANDBOX_PROCESSOS = processos
+    agente = chatbot.criar_agente_pandas(dataset, LLMRoteirizado.de_arquivo(CORPUS))
+    ferramenta = agente.tools[0]
+    trechos = []
+    try:
+        for trecho in TRECHOS:
+            inicio = time.perf_counter()
+            saida = str(ferramenta.run(trecho))
+            duracao = time.perf_counter() - inicio
+            medicao = {"trecho": trecho, "tokens": contar_tokens(saida), "ferramenta_s": round(duracao, 6)}
+            referencia = REFERENCIA.search(saida)
+            if referencia:
+                seguinte = str(ferramenta.run(f"len({referencia.group(1)})"))
+                medicao["referencia_utilizavel"] = seguinte.isdigit()
+            trechos.append(medicao)
+    finally:
+        ferramenta.encerrar()
+    return trechos
+
+
+def medir_agente(dataset, llm, perguntas, orcamento_tokens):
+    chatbot.OBSERVACAO_ORCAMENTO_TOKENS = orcamento_tokens
+    agente = chatbot.criar_agente_pandas(dataset, llm, "react")
+    agente.verbose = False
+    medidor = _PorIteracao()
+    inicio = time.perf_counter()
+    try:
+        for pergunta in perguntas:
+            chatbot._consultar_agente(pergunta, callbacks=[medidor], agente=agente)
+    finally:
+        agente.tools[0].encerrar()
+    return {
+        "chamadas_llm": len(medidor.tokens),
+        "tokens_prompt_total": sum(medidor.tokens),
+        "tokens_prompt_por_iteracao": percentis(medidor.tokens),
+        "tokens_prompt_max": max(medidor.tokens, default=0),
+        "latencia_llm_s": percentis(medidor.latencias),
+        "total_s": round(time.perf_counter() - inicio, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", default="1,10,100")
+    parser.add_argument("--orcamento", type=int, default=chatbot.OBSERVACAO_ORCAMENTO_TOKENS,
+                        help="Orçamento de cada observação, em tokens")
+    parser.add_argument("--provedor", default="roteirizado")
+    parser.add_argument("--saida", default="benchmark_observacoes.json")
+    args = parser.parse_args()
+
+    resultado = {"ambiente": metadados_ambiente(), "configuracao": vars(args), "ferramenta": [], "agente": {}}
+    processos_sandbox = chatbot.SANDBOX_PROCESSOS or 1
+    with tempfile.TemporaryDirectory(prefix="bench_observacoes_") as diretorio:
+        for fator in [int(e) for e in args.escalas.split(",") if e.strip()]:
+            dataset = carregar_dataset(gravar_csv_sintetico(fator, diretorio),
+                                       diretorio_cache=os.path.join(diretorio, f"cache_x{fator}"))
+            chatbot.preparar_derivados(dataset)
+            medicao = {
+                "fator": fator,
+                "linhas": len(dataset.df),
+                "sem_orcamento": medir_ferramenta(dataset, 0, processos_sandbox),
+                "com_orcamento": medir_ferramenta(dataset, args.orcamento, processos_sandbox),
+                "com_orcamento_sem_pool": medir_ferramenta(dataset, args.orcamento, 0),
+            }
+            resultado["ferramenta"].append(medicao)
+            print(f"{fator}x ({medicao['linhas']} linhas): tokens da observação (sem -> com orçamento)"
+                  " | ferramenta (ms) | referência utilizável (pool, próprio processo)")
+            for sem, com, local in zip(medicao["sem_orcamento"], medicao["com_orcamento"],
+                                       medicao["com_orcamento_sem_pool"]):
+                print(f"  {sem['tokens']:>9} -> {com['tokens']:>5} | {sem['ferramenta_s'] * 1000:8.1f} ->"
+                      f" {com['ferramenta_s'] * 1000:8.1f} | {com.get('referencia_utilizavel', '-')!s:>5},"
+                      f" {local.get('referencia_utilizavel', '-')!s:>5} | {sem['trecho'][:60]}")
+
+    chatbot.SANDBOX_PROCESSOS = processos_sandbox
+    if args.provedor == "roteirizado":
+        llm = LLMRoteirizado.de_arquivo(CORPUS)
+    else:
+        chatbot.LLM_PROVIDER = args.provedor
+        llm = chatbot.criar_llm("react")
+    perguntas = list(LLMRoteirizado.de_arquivo(CORPUS).roteiros)
+    dataset = chatbot.recursos.obter_dataset()
+    for nome, orcamento in (("sem_orcamento", 0), ("com_orcamento", args.orcamento)):
+        medicao = resultado["agente"][nome] = medir_agente(dataset, llm, perguntas, orcamento)
+        print(f"agente {nome:>13}: {medicao['chamadas_llm']} chamadas | tokens de prompt total"
+              f" {medicao['tokens_prompt_total']} | por iteração p50 {medicao['tokens_prompt_por_iteracao']['p50']:.0f}"
+              f" p95 {medicao['tokens_prompt_por_iteracao']['p95']:.0f} máx {medicao['tokens_prompt_max']}"
+              f" | latência do LLM p50 {medicao['latencia_llm_s']['p50'] * 1000:.1f} ms"
+              f" p95 {medicao['latencia_llm_s']['p95'] * 1000:.1f} ms")
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compara o prompt do agente com `df.head()` e com o perfil compacto dos dados.
+
+Para cada modo roda as perguntas do corpus e mede tokens de prompt, latência,
+iterações e falhas. Por padrão usa o LLM roteirizado (mede apenas o tamanho do
+prompt e o custo local); com LLM_PROVIDER=openai|gemini|ollama o mesmo script
+mede também o efeito no provedor real.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.perfil_prompt --repeticoes 3 --saida benchmark_perfil.json
+"""
+import argparse
+import time
+
+from benchmarks.pipeline import MedidorFases
+from benchmarks.comum import (
+    CORPUS, contar_tokens, gravar_resultado, metadados_ambiente, percentis,
+)
+import chatbot
+from llm_roteirizado import LLMRoteirizado
+from perfil_dados import obter_perfil
+
+
+def medir_modo(perfil_ativo, dataset, llm, perguntas, repeticoes):
+    chatbot.PERFIL_ATIVO = perfil_ativo
+    agente = chatbot.criar_agente_pandas(dataset, llm)
+    agente.verbose = False
+
+    totais, iteracoes, tokens, falhas = [], [], [], 0
+    try:
+        for _ in range(repeticoes):
+            for pergunta in perguntas:
+                medidor = MedidorFases()
+                inicio = time.perf_counter()
+                resposta, _ = chatbot._consultar_agente(pergunta, callbacks=[medidor], agente=agente)
+                totais.append(time.perf_counter() - inicio)
+                iteracoes.append(medidor.iteracoes)
+                tokens.append(medidor.tokens_prompt)
+                falhas += chatbot._eh_mensagem_erro(resposta) or medidor.falha_parsing
+    finally:
+        agente.tools[0].encerrar()
+
+    return {
+        "modo": "perfil" if perfil_ativo else "head",
+        "total_s": percentis(totais),
+        "iteracoes": percentis(iteracoes),
+        "tokens_prompt": percentis(tokens),
+        "perguntas_com_falha": int(falhas),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--saida", default="benchmark_perfil.json")
+    args = parser.parse_args()
+
+    perguntas = list(LLMRoteirizado.de_arquivo(CORPUS).roteiros)
+    dataset = chatbot.recursos.obter_dataset()
+    llm = chatbot.recursos.obter_llm()
+
+    perfil = obter_perfil(dataset, chatbot.PERFIL_ORCAMENTO_TOKENS)
+    resultado = {
+        "ambiente": metadados_ambiente(),
+        "configuracao": {
+            "provedor": chatbot.LLM_PROVIDER,
+            "repeticoes": args.repeticoes,
+            "orcamento_tokens": chatbot.PERFIL_ORCAMENTO_TOKENS,
+        },
+        "tokens_contexto": {
+            "head": contar_tokens(dataset.df.head().to_markdown()),
+            "perfil": contar_tokens(perfil),
+        },
+        "modos": [],
+    }
+    for perfil_ativo in (False, True):
+        medicao = medir_modo(perfil_ativo, dataset, llm, perguntas, args.repeticoes)
+        resultado["modos"].append(medicao)
+        print(
+            f"{medicao['modo']:>6}: tokens de prompt p50 {medicao['tokens_prompt']['p50']:.0f}"
+            f" | total p50 {medicao['total_s']['p50'] * 1000:.1f} ms"
+            f" | iterações p50 {medicao['iteracoes']['p50']:.1f} | falhas {medicao['perguntas_com_falha']}"
+        )
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
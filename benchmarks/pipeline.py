@@ -0,0 +1,181 @@
+"""
+Benchmark offline do pipeline de perguntas e respostas.
+
+Usa o LLM roteirizado (transcrições em benchmarks/corpus.json), portanto não
+precisa de rede nem de chave de API. Para cada escala de dados sintéticos
+mede carga do CSV, construção do agente e, por pergunta, as fases de espera
+do LLM, execução da ferramenta e parsing/orquestração, além de iterações,
+tokens de prompt e pico de memória.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.pipeline --escalas 1,10,100 --repeticoes 3 --saida benchmark_pipeline.json
+"""
+import argparse
+import os
+import tempfile
+import time
+
+# Configura o pipeline antes de importar o chatbot: LLM local, sem caches que mascarariam o custo real
+os.environ.setdefault("LLM_PROVIDER", "roteirizado")
+os.environ["CACHE_RESPOSTAS_ATIVO"] = "false"
+os.environ["ROTEADOR_ATIVO"] = "false"
+
+from langchain_core.callbacks import BaseCallbackHandler  # noqa: E402
+from langchain_core.exceptions import OutputParserException  # noqa: E402
+
+import chatbot  # noqa: E402
+from carregador_dados import carregar_dataset  # noqa: E402
+from benchmarks.comum import (  # noqa: E402
+    CORPUS, contar_tokens, gravar_csv_sintetico, gravar_resultado,
+    metadados_ambiente, percentis, pico_rss_mb,
+)
+from llm_roteirizado import CHAMADA_MALFORMADA, LLMRoteirizado  # noqa: E402
+
+
+class MedidorFases(BaseCallbackHandler):
+    """Acumula o tempo gasto no LLM e na ferramenta durante uma pergunta."""
+
+    def __init__(self):
+        self.tempo_llm = 0.0
+        self.tempo_ferramenta = 0.0
+        self.iteracoes = 0
+        self.tokens_prompt = 0
+        self.falha_parsing = False
+        self._inicio_llm = None
+        self._inicio_ferramenta = None
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.iteracoes += 1
+        self.tokens_prompt += sum(contar_tokens(p) for p in prompts)
+        self._inicio_llm = time.perf_counter()
+
+    def on_llm_end(self, response, **kwargs):
+        if self._inicio_llm is not None:
+            self.tempo_llm += time.perf_counter() - self._inicio_llm
+            self._inicio_llm = None
+        # No modo ferramentas, a chamada malformada equivale à falha de parsing do ReAct
+        for geracoes in response.generations:
+            for geracao in geracoes:
+                metadados = getattr(getattr(geracao, "message", None), "response_metadata", None) or {}
+                if metadados.get("finish_reason") == CHAMADA_MALFORMADA:
+                    self.falha_parsing = True
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self._inicio_ferramenta = time.perf_counter()
+
+    def on_tool_end(self, output, **kwargs):
+        if self._inicio_ferramenta is not None:
+            self.tempo_ferramenta += time.perf_counter() - self._inicio_ferramenta
+            self._inicio_ferramenta = None
+
+    on_tool_error = on_tool_end
+
+    def on_chain_error(self, error, **kwargs):
+        if isinstance(error, OutputParserException) or "OUTPUT_PARSING_FAILURE" in str(error):
+            self.falha_parsing = True
+
+
+def medir_escala(fator, perguntas, repeticoes, latencia_s, diretorio):
+    caminho = gravar_csv_sintetico(fator, diretorio)
+    cache = os.path.join(diretorio, f"cache_x{fator}")
+
+    inicio = time.perf_counter()
+    dataset = carregar_dataset(caminho, diretorio_cache=cache)
+    carga_fria = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    dataset = carregar_dataset(caminho, diretorio_cache=cache)
+    carga_snapshot = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    chatbot.preparar_derivados(dataset)
+    derivados = time.perf_counter() - inicio
+
+    llm = LLMRoteirizado.de_arquivo(CORPUS, latencia_s=latencia_s)
+    inicio = time.perf_counter()
+    agente = chatbot.criar_agente_pandas(dataset, llm)
+    construcao = time.perf_counter() - inicio
+    agente.verbose = False
+
+    fases = {"total": [], "llm": [], "ferramenta": [], "parsing": []}
+    iteracoes, tokens, falhas, falhas_parsing, por_pergunta = [], [], 0, 0, {}
+    try:
+        for _ in range(repeticoes):
+            for pergunta in perguntas:
+                medidor = MedidorFases()
+                inicio = time.perf_counter()
+                resposta, _ = chatbot._consultar_agente(pergunta, callbacks=[medidor], agente=agente)
+                total = time.perf_counter() - inicio
+                fases["total"].append(total)
+                fases["llm"].append(medidor.tempo_llm)
+                fases["ferramenta"].append(medidor.tempo_ferramenta)
+                fases["parsing"].append(max(0.0, total - medidor.tempo_llm - medidor.tempo_ferramenta))
+                iteracoes.append(medidor.iteracoes)
+                tokens.append(medidor.tokens_prompt)
+                falhou = chatbot._eh_mensagem_erro(resposta)
+                falhas += falhou
+                falhas_parsing += medidor.falha_parsing
+                por_pergunta.setdefault(pergunta, []).append({
+                    "total_s": round(total, 6),
+                    "iteracoes": medidor.iteracoes,
+                    "falhou": bool(falhou),
+                    "falha_parsing": medidor.falha_parsing,
+                })
+    finally:
+        agente.tools[0].encerrar()
+
+    return {
+        "fator": fator,
+        "linhas": len(dataset.df),
+        "carga_fria_s": round(carga_fria, 6),
+        "carga_snapshot_s": round(carga_snapshot, 6),
+        "derivados_s": round(derivados, 6),
+        "construcao_agente_s": round(construcao, 6),
+        "fases_s": {nome: percentis(valores) for nome, valores in fases.items()},
+        "iteracoes": percentis(iteracoes),
+        "tokens_prompt": percentis(tokens),
+        "perguntas_com_falha": falhas,
+        "perguntas_com_falha_parsing": falhas_parsing,
+        "pico_rss_mb": pico_rss_mb(),
+        "por_pergunta": por_pergunta,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", default="1,10,100", help="Fatores de multiplicação do data.csv (ex.: 1,10,100)")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--latencia-llm", type=float, default=0.0, help="Atraso simulado por chamada ao LLM (s)")
+    parser.add_argument("--saida", default="benchmark_pipeline.json")
+    args = parser.parse_args()
+
+    llm = LLMRoteirizado.de_arquivo(CORPUS)
+    perguntas = list(llm.roteiros)
+    escalas = [int(e) for e in args.escalas.split(",") if e.strip()]
+
+    resultado = {
+        "ambiente": metadados_ambiente(),
+        "configuracao": {
+            "escalas": escalas,
+            "repeticoes": args.repeticoes,
+            "latencia_llm_s": args.latencia_llm,
+            "perguntas": len(perguntas),
+            "sandbox_processos": chatbot.SANDBOX_PROCESSOS,
+        },
+        "escalas": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="bench_chatbot_") as diretorio:
+        for fator in escalas:
+            print(f"Escala {fator}x...")
+            medicao = medir_escala(fator, perguntas, args.repeticoes, args.latencia_llm, diretorio)
+            resultado["escalas"].append(medicao)
+            fases = medicao["fases_s"]
+            print(
+                f"  {medicao['linhas']} linhas | carga {medicao['carga_fria_s']:.3f}s (snapshot {medicao['carga_snapshot_s']:.3f}s)"
+                f" | total p50 {fases['total']['p50'] * 1000:.1f} ms p95 {fases['total']['p95'] * 1000:.1f} ms"
+                f" | ferramenta p95 {fases['ferramenta']['p95'] * 1000:.1f} ms | falhas {medicao['perguntas_com_falha']}"
+                f" (parsing {medicao['perguntas_com_falha_parsing']})"
+            )
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Benchmark do registro de datasets (vários departamentos em um só processo).
+
+Grava `--datasets` extratos sintéticos (cada um no seu diretório, todos com o
+nome data.csv, de `--fator` a 3x `--fator` vezes o data.csv) e compara:
+  - processo_por_dataset: uma implantação por extrato (um processo que importa
+    o chatbot, carrega o seu dataset e responde uma pergunta pelo roteador e
+    uma pelo agente): memória residente somada e tempo até a primeira resposta;
+  - sem_limite: um processo com todos os datasets, sem orçamento de memória;
+  - orcamento: o mesmo processo com REGISTRO_MEMORIA_MAX_MB abaixo do total
+    (padrão: metade da memória estimada de todos os datasets), descarregando os
+    menos usados.
+Nos dois últimos, a mesma sequência de `--acessos` perguntas com popularidade
+desigual entre os datasets (Zipf), a maioria respondida pelo roteador e uma
+fração pelo agente (LLM roteirizado). Mede a latência das perguntas servidas
+com o dataset em memória e das que precisaram recarregá-lo (snapshot Arrow e
+cubo gravados em disco), cargas, acertos e remoções, o pico da memória
+estimada e a memória residente do processo.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.registro_datasets --datasets 6 --fator 10 --acessos 300 --saida benchmark_registro_datasets.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Os snapshots e cubos ficam em um diretório temporário (DADOS_CACHE_DIR é lido na importação)
+DIRETORIO = tempfile.mkdtemp(prefix="bench_registro_")
+os.environ["DADOS_CACHE_DIR"] = os.path.join(DIRETORIO, "cache")
+os.environ["LLM_PROVIDER"] = "roteirizado"
+os.environ["CACHE_RESPOSTAS_ATIVO"] = "false"
+os.environ["MONITOR_DADOS_ATIVO"] = "false"
+os.environ["AQUECIMENTO_AGENTE"] = "primeira_pergunta"
+
+from benchmarks.comum import CORPUS, RAIZ, gravar_resultado, metadados_ambiente, percentis, sintetizar  # noqa: E402
+from carregador_dados import _rss_atual_mb  # noqa: E402
+import chatbot  # noqa: E402
+from llm_roteirizado import LLMRoteirizado  # noqa: E402
+from registro_datasets import RegistroDatasets  # noqa: E402
+
+PERGUNTAS_ROTEADOR = [
+    "Quantas linhas e colunas o DataFrame possui?",
+    "Quais são as colunas do DataFrame?",
+    "Qual a média de tempoTotal?",
+]
+PERGUNTA_PROCESSO = PERGUNTAS_ROTEADOR[0]
+
+# Executado em um processo novo por dataset (a implantação separada de cada departamento)
+SCRIPT = """
+import json, time
+inicio = time.perf_counter()
+import chatbot
+from carregador_dados import _rss_atual_mb
+chatbot.gerar_resposta({pergunta!r})
+primeira = time.perf_counter() - inicio
+chatbot.gerar_resposta({pergunta_agente!r})
+print("\\x00" + json.dumps({{"rss_mb": _rss_atual_mb(), "primeira_resposta_s": primeira}}))
+"""
+
+
+def gravar_extratos(quantidade, fator):
+    """{id: caminho} de extratos com conteúdos (e versões) diferentes, de `fator` a 3x `fator` vezes o data.csv."""
+    fontes = {}
+    for i in range(quantidade):
+        diretorio = os.path.join(DIRETORIO, f"dep{i}")
+        os.makedirs(diretorio, exist_ok=True)
+        caminho = os.path.join(diretorio, "data.csv")
+        sintetizar(fator * (1 + i % 3)).iloc[i:].to_csv(caminho, index=False)
+        fontes[f"dep{i}"] = caminho
+    return fontes
+
+
+def sequencia_acessos(ids, acessos, fracao_agente, perguntas_agente, semente):
+    """(id, pergunta) com popularidade Zipf entre os datasets: o primeiro é o mais consultado."""
+    aleatorio = random.Random(semente)
+    pesos = [1 / (posicao + 1) for posicao in range(len(ids))]
+    sequencia = []
+    for _ in range(acessos):
+        id_dataset = aleatorio.choices(ids, pesos)[0]
+        if aleatorio.random() < fracao_agente:
+            sequencia.append((id_dataset, aleatorio.choice(perguntas_agente)))
+        else:
+            sequencia.append((id_dataset, aleatorio.choice(PERGUNTAS_ROTEADOR)))
+    return sequencia
+
+
+def _criar_agente(dataset, llm):
+    agente = chatbot.criar_agente(dataset, llm)
+    agente.verbose = False
+    return agente
+
+
+def novo_registro(fontes, max_mb):
+    return RegistroDatasets(
+        fontes, chatbot.carregar_dados, chatbot.criar_llm, _criar_agente,
+        max_bytes=int(max_mb * 1024 * 1024), ao_descarregar=chatbot._ao_descarregar_dataset,
+    )
+
+
+def medir_registro(fontes, max_mb, sequencia):
+    registro = chatbot.registro = novo_registro(fontes, max_mb)
+    em_memoria, recargas = [], []
+    pico_mb = 0.0
+    inicio = time.perf_counter()
+    for id_dataset, pergunta in sequencia:
+        cargas = registro.estatisticas()["datasets"][id_dataset]["cargas"]
+        comeco = time.perf_counter()
+        chatbot.gerar_resposta(pergunta, id_dataset=id_dataset)
+        duracao = time.perf_counter() - comeco
+        estatisticas = registro.estatisticas()
+        (recargas if estatisticas["datasets"][id_dataset]["cargas"] > cargas else em_memoria).append(duracao)
+        pico_mb = max(pico_mb, estatisticas["memoria_mb"])
+    total = time.perf_counter() - inicio
+    estatisticas = registro.estatisticas()
+    for id_dataset in registro.ids():
+        # Encerra agentes e pools do sandbox antes do próximo cenário
+        descartados = registro.recursos(id_dataset).descarregar()
+        if descartados is not None:
+            chatbot._encerrar_versao(descartados[1], descartados[0].derivados.get("sql"))
+    por_dataset = estatisticas["datasets"]
+    return {
+        "limite_mb": estatisticas["limite_mb"],
+        "total_s": round(total, 4),
+        "em_memoria_s": percentis(em_memoria),
+        "com_carga_s": percentis(recargas),
+        "cargas": sum(d["cargas"] for d in por_dataset.values()),
+        "acertos": sum(d["acertos"] for d in por_dataset.values()),
+        "remocoes": sum(d["remocoes"] for d in por_dataset.values()),
+        "pico_memoria_estimada_mb": round(pico_mb, 2),
+        "memoria_total_datasets_mb": round(sum(d["memoria_mb"] for d in por_dataset.values() if d["carregado"]), 2),
+        "rss_final_mb": round(_rss_atual_mb(), 1),
+        "por_dataset": por_dataset,
+    }
+
+
+def medir_processo_por_dataset(fontes, pergunta_agente):
+    processos = {}
+    for id_dataset, caminho in fontes.items():
+        ambiente = dict(os.environ, DATASETS=f"{id_dataset}={caminho}",
+                        DADOS_CACHE_DIR=os.path.join(DIRETORIO, "cache_processos", id_dataset))
+        codigo = SCRIPT.format(pergunta=PERGUNTA_PROCESSO, pergunta_agente=pergunta_agente)
+        # A primeira execução grava o snapshot e o cubo; mede a segunda (como um processo reiniciado)
+        for _ in range(2):
+            saida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=ambiente,
+                                   capture_output=True, text=True, check=True).stdout
+        processos[id_dataset] = json.loads(saida.rsplit("\x00", 1)[1])
+    return {
+        "rss_total_mb": round(sum(p["rss_mb"] for p in processos.values()), 1),
+        "primeira_resposta_s": percentis([p["primeira_resposta_s"] for p in processos.values()]),
+        "por_dataset": processos,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--datasets", type=int, default=6)
+    parser.add_argument("--fator", type=int, default=10, help="Tamanho do menor extrato (vezes o data.csv)")
+    parser.add_argument("--acessos", type=int, default=300)
+    parser.add_argument("--fracao-agente", type=float, default=0.1,
+                        help="Fração das perguntas que vão ao agente (as demais, ao roteador)")
+    parser.add_argument("--orcamento-mb", type=float, default=None,
+                        help="REGISTRO_MEMORIA_MAX_MB do cenário com orçamento (padrão: 50%% do total)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", default="benchmark_registro_datasets.json")
+    args = parser.parse_args()
+
+    resultado = {"ambiente": metadados_ambiente(), "configuracao": vars(args)}
+    try:
+        fontes = gravar_extratos(args.datasets, args.fator)
+        perguntas_agente = list(LLMRoteirizado.de_arquivo(CORPUS).roteiros)
+        sequencia = sequencia_acessos(list(fontes), args.acessos, args.fracao_agente, perguntas_agente, args.semente)
+        # Aquecimento: snapshots e cubos gravados em disco, como em um processo que já rodou antes
+        aquecimento = novo_registro(fontes, 0)
+        for id_dataset in fontes:
+            aquecimento.obter_dataset(id_dataset)
+            aquecimento.recursos(id_dataset).descarregar()
+
+        resultado["processo_por_dataset"] = processos = medir_processo_por_dataset(fontes, perguntas_agente[0])
+        print(f"processo_por_dataset: {len(fontes)} processos, memória residente somada {processos['rss_total_mb']:.0f} MB"
+              f" | primeira resposta p50 {processos['primeira_resposta_s']['p50'] * 1000:.0f} ms")
+
+        resultado["sem_limite"] = sem_limite = medir_registro(fontes, 0, sequencia)
+        orcamento_mb = args.orcamento_mb or round(0.5 * sem_limite["memoria_total_datasets_mb"], 1)
+        resultado["orcamento"] = medir_registro(fontes, orcamento_mb, sequencia)
+        for nome in ("sem_limite", "orcamento"):
+            medicao = resultado[nome]
+            print(f"{nome:>20}: limite {medicao['limite_mb'] or '-'} MB | pico estimado"
+                  f" {medicao['pico_memoria_estimada_mb']:.1f} MB | RSS {medicao['rss_final_mb']:.0f} MB"
+                  f" | cargas {medicao['cargas']}, acertos {medicao['acertos']}, remoções {medicao['remocoes']}"
+                  f" | em memória p50 {medicao['em_memoria_s']['p50'] * 1000:.1f} ms"
+                  f" | com carga p50 {medicao['com_carga_s']['p50'] * 1000:.0f} ms | total {medicao['total_s']:.1f}s")
+    finally:
+        shutil.rmtree(DIRETORIO, ignore_errors=True)
+    gravar_resultado(args.saida, resultado)
+
+
+if __name__ == "__main__":
+    main()
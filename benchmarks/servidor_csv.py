@@ -0,0 +1,206 @@
+"""
+Servidor HTTP local que faz o papel da CSV_URL em benchmarks e testes manuais.
+
+Serve os arquivos de um diretório com ETag e Last-Modified derivados do
+tamanho e do mtime, responde 304 a requisições condicionais e 206 a pedidos
+de intervalo (`Range: bytes=N-`), como um servidor de arquivos estáticos ou
+um bucket de objetos. Respostas completas saem comprimidas em zstd ou gzip
+quando o cliente aceita (a versão comprimida é gerada uma vez por ETag, como
+em um CDN). Com --sem-range ignora o Range e sempre devolve o arquivo inteiro
+(para exercitar o caminho de servidores sem esse suporte).
+
+Uso (na raiz do repositório):
+    python -m benchmarks.servidor_csv --diretorio . --porta 8765
+    CSV_URL=http://127.0.0.1:8765/data.csv streamlit run app.py
+"""
+import argparse
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+_comprimidos = {}  # (caminho, etag, codificação) -> arquivo comprimido
+_lock_comprimidos = threading.Lock()
+_diretorio_comprimidos = None
+
+
+def _versao_comprimida(caminho, etag, codificacao):
+    global _diretorio_comprimidos
+    with _lock_comprimidos:
+        chave = (caminho, etag, codificacao)
+        if chave not in _comprimidos:
+            if _diretorio_comprimidos is None:
+                _diretorio_comprimidos = tempfile.mkdtemp(prefix="servidor_csv_")
+            destino = os.path.join(_diretorio_comprimidos, f"{len(_comprimidos)}.{codificacao}")
+            with open(caminho, "rb") as origem:
+                if codificacao == "zstd":
+                    with open(destino, "wb") as f:
+                        zstandard.ZstdCompressor(level=3).copy_stream(origem, f)
+                else:
+                    with gzip.open(destino, "wb", compresslevel=6) as f:
+                        shutil.copyfileobj(origem, f, 1024 * 1024)
+            _comprimidos[chave] = destino
+        return _comprimidos[chave]
+
+
+def _etag(info):
+    return f'"{info.st_size:x}-{info.st_mtime_ns:x}"'
+
+
+def aquecer(caminho):
+    """Gera antes das requisições as versões comprimidas do arquivo (como um CDN já aquecido)."""
+    caminho = os.path.abspath(caminho)
+    for codificacao in ("zstd", "gzip") if ZSTD_AVAILABLE else ("gzip",):
+        _versao_comprimida(caminho, _etag(os.stat(caminho)), codificacao)
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    diretorio = "."
+    aceitar_range = True
+    comprimir = True
+
+    def log_message(self, formato, *args):
+        pass
+
+    def do_HEAD(self):
+        self._servir(corpo=False)
+
+    def do_GET(self):
+        self._servir(corpo=True)
+
+    def _servir(self, corpo):
+        caminho = os.path.join(self.diretorio, os.path.basename(self.path.split("?")[0]))
+        try:
+            arquivo = open(caminho, "rb")
+        except OSError:
+            self.send_error(404)
+            return
+        with arquivo:
+            info = os.fstat(arquivo.fileno())
+            etag = _etag(info)
+            ultima_modificacao = formatdate(info.st_mtime, usegmt=True)
+            if self._nao_modificado(etag, info.st_mtime):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            intervalo = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            codificacao = self._codificacao() if not (intervalo and self.aceitar_range) else None
+            if codificacao:
+                with open(_versao_comprimida(caminho, etag, codificacao), "rb") as comprimido:
+                    tamanho = os.fstat(comprimido.fileno()).st_size
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/csv")
+                    self.send_header("Content-Encoding", codificacao)
+                    self.send_header("Content-Length", str(tamanho))
+                    self.send_header("ETag", f'{etag[:-1]}-{codificacao}"')
+                    self.send_header("Last-Modified", ultima_modificacao)
+                    self.send_header("Vary", "Accept-Encoding")
+                    self.end_headers()
+                    if corpo:
+                        self._enviar(comprimido, tamanho)
+                return
+
+            inicio, fim = 0, info.st_size - 1
+            if intervalo and self.aceitar_range:
+                inicio = int(intervalo.group(1))
+                if intervalo.group(2):
+                    fim = min(fim, int(intervalo.group(2)))
+                if inicio >= info.st_size:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{info.st_size}")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {inicio}-{fim}/{info.st_size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "text/csv")
+            self.send_header("Content-Length", str(fim - inicio + 1))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", ultima_modificacao)
+            self.send_header("Accept-Ranges", "bytes" if self.aceitar_range else "none")
+            self.end_headers()
+            if corpo:
+                arquivo.seek(inicio)
+                self._enviar(arquivo, fim - inicio + 1)
+
+    def _enviar(self, arquivo, restante):
+        while restante > 0:
+            bloco = arquivo.read(min(1024 * 1024, restante))
+            if not bloco:
+                break
+            self.wfile.write(bloco)
+            self.server.bytes_enviados += len(bloco)
+            restante -= len(bloco)
+
+    def _codificacao(self):
+        if not self.comprimir:
+            return None
+        aceitas = [c.split(";")[0].strip() for c in self.headers.get("Accept-Encoding", "").split(",")]
+        if ZSTD_AVAILABLE and "zstd" in aceitas:
+            return "zstd"
+        return "gzip" if "gzip" in aceitas else None
+
+    def _nao_modificado(self, etag, mtime):
+        if "If-None-Match" in self.headers:
+            # As versões comprimidas têm o sufixo da codificação no ETag
+            etags = [re.sub(r'-(gzip|zstd)"$', '"', e.strip()) for e in self.headers["If-None-Match"].split(",")]
+            return etag in etags
+        if "If-Modified-Since" in self.headers:
+            try:
+                return int(mtime) <= parsedate_to_datetime(self.headers["If-Modified-Since"]).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+def _criar_servidor(diretorio, porta, aceitar_range, comprimir):
+    manipulador = type("Manipulador", (_Manipulador,), {
+        "diretorio": os.path.abspath(diretorio), "aceitar_range": aceitar_range, "comprimir": comprimir,
+    })
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), manipulador)
+    servidor.daemon_threads = True
+    servidor.bytes_enviados = 0
+    return servidor
+
+
+def iniciar_servidor(diretorio, porta=0, aceitar_range=True, comprimir=True):
+    """
+    Sobe o servidor em uma thread daemon. Retorna (servidor, URL base); pare com
+    `servidor.shutdown()`. `servidor.bytes_enviados` soma os bytes de corpo enviados.
+    """
+    servidor = _criar_servidor(diretorio, porta, aceitar_range, comprimir)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--diretorio", default=".")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--sem-range", action="store_true", help="Ignora Range (sempre responde 200)")
+    parser.add_argument("--sem-compressao", action="store_true", help="Nunca comprime a resposta")
+    args = parser.parse_args()
+
+    servidor = _criar_servidor(args.diretorio, args.porta, not args.sem_range, not args.sem_compressao)
+    print(f"Servindo {os.path.abspath(args.diretorio)} em http://127.0.0.1:{args.porta}/")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
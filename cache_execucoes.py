@@ -0,0 +1,222 @@
+"""
+Cache em memória das saídas do código executado pela ferramenta `python_repl_ast`.
+
+O LLM costuma gerar o mesmo trecho (ou quase o mesmo) em perguntas e sessões
+diferentes, ex.: `df['status'].value_counts()`. A chave é a árvore sintática
+do código (ignora espaços, comentários e o tipo de aspas) mais a versão do
+dataset, então uma nova versão dos dados nunca reaproveita saídas antigas.
+Só entram no cache trechos sem efeitos colaterais: código que altera o `df`
+(ou outro objeto), grava arquivos, importa módulos além dos de cálculo
+(pandas, numpy...) ou depende do relógio ou de números aleatórios sempre é
+executado, assim como, quando as variáveis persistem entre execuções, código
+que lê uma variável criada antes. Erros de execução não são guardados.
+"""
+import ast
+import builtins
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Métodos que alteram o objeto em que são chamados (listas, dicionários, conjuntos e pandas)
+METODOS_MUTANTES = {
+    "append", "extend", "insert", "pop", "popitem", "remove", "clear", "update", "setdefault",
+    "sort", "reverse", "discard",
+}
+# Chamadas com efeitos fora do processo ou resultado que muda a cada execução
+METODOS_COM_EFEITOS = {
+    "to_csv", "to_excel", "to_parquet", "to_pickle", "to_sql", "to_hdf", "to_feather", "to_clipboard",
+    "to_json", "to_html", "to_latex", "to_stata", "to_orc", "to_xml", "savefig", "show", "plot", "hist",
+    "write", "writelines", "unlink", "rmdir", "mkdir", "system", "popen", "sample", "now", "today",
+    "random", "rand", "randn", "randint", "choice", "shuffle", "seed", "sleep",
+}
+NOMES_COM_EFEITOS = {
+    "open", "exec", "eval", "compile", "__import__", "input", "globals", "locals", "vars", "setattr",
+    "delattr", "exit", "quit", "breakpoint", "os", "sys", "subprocess", "shutil", "pathlib", "socket",
+    "random", "time", "datetime", "urllib", "requests", "io",
+}
+# Módulos sem efeitos colaterais que o LLM costuma importar de novo (ex.: `import pandas as pd`)
+MODULOS_PUROS = {"pandas", "numpy", "math", "statistics", "collections", "itertools", "functools", "operator", "re"}
+# Saída no formato de erro da ferramenta ("KeyError: ...") ou do pool ("TimeoutError: ...")
+_ERRO = re.compile(r"^\w*(Error|Exception|Excedido|Interrupt|Exit): ")
+
+
+def _nomes_livres(arvore):
+    """Nomes lidos pelo código que ele mesmo não define (nem em compreensões ou lambdas)."""
+    lidos, definidos = set(), set()
+    for no in ast.walk(arvore):
+        if isinstance(no, ast.Name):
+            (lidos if isinstance(no.ctx, ast.Load) else definidos).add(no.id)
+        elif isinstance(no, ast.arg):
+            definidos.add(no.arg)
+    return lidos - definidos
+
+
+def saida_com_erro(saida):
+    """Se a saída é uma mensagem de erro da ferramenta ou do pool."""
+    return bool(_ERRO.match(str(saida)))
+
+
+def motivo_nao_cacheavel(arvore, variaveis_persistem=False, nomes_iniciais=None):
+    """
+    Motivo para não guardar a saída do código (ou None se ele é só uma consulta).
+
+    Com `variaveis_persistem` (execução no próprio processo, em que as variáveis
+    criadas ficam para a próxima execução), atribuir a qualquer nome também
+    conta como efeito: a execução seguinte pode depender dele. Reatribuir um
+    dos `nomes_iniciais` (ex.: `df = df[...]`) é uma alteração, e ler um nome
+    fora deles e dos builtins (variável de uma execução anterior) impede o
+    cache, já que a chave não inclui o seu valor.
+    """
+    iniciais = set(nomes_iniciais or ()) | set(dir(builtins))
+    for no in ast.walk(arvore):
+        if isinstance(no, ast.Import):
+            if any(alias.name.split(".")[0] not in MODULOS_PUROS for alias in no.names):
+                return "importacao"
+        if isinstance(no, ast.ImportFrom):
+            if (no.module or "").split(".")[0] not in MODULOS_PUROS:
+                return "importacao"
+        if isinstance(no, (ast.Global, ast.Nonlocal)):
+            return "efeito_colateral"
+        if isinstance(no, (ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Delete)):
+            alvos = no.targets if isinstance(no, (ast.Assign, ast.Delete)) else [no.target]
+            for alvo in alvos:
+                for parte in ast.walk(alvo):
+                    if isinstance(parte, (ast.Subscript, ast.Attribute)):
+                        return "alteracao"
+                    if isinstance(parte, ast.Name) and (variaveis_persistem or isinstance(no, ast.Delete)):
+                        return "alteracao" if variaveis_persistem and parte.id in iniciais else "variavel"
+        if isinstance(no, ast.NamedExpr) and variaveis_persistem:
+            return "variavel"
+        if isinstance(no, ast.Name) and no.id in NOMES_COM_EFEITOS:
+            return "efeito_colateral"
+        if isinstance(no, ast.Attribute) and no.attr.startswith("__"):
+            return "efeito_colateral"
+        if isinstance(no, ast.Call):
+            if any(k.arg == "inplace" for k in no.keywords):
+                return "alteracao"
+            if isinstance(no.func, ast.Attribute):
+                if no.func.attr in METODOS_MUTANTES:
+                    return "alteracao"
+                if no.func.attr in METODOS_COM_EFEITOS:
+                    return "efeito_colateral"
+    if variaveis_persistem and nomes_iniciais is not None and _nomes_livres(arvore) - iniciais:
+        return "variavel"
+    return None
+
+
+def motivo_codigo(codigo, variaveis_persistem=False, nomes_iniciais=None):
+    """`motivo_nao_cacheavel` a partir do texto ("sintaxe" se não compila, "vazio" sem instruções)."""
+    try:
+        arvore = ast.parse(codigo)
+    except SyntaxError:
+        return "sintaxe"
+    if not arvore.body:
+        return "vazio"
+    return motivo_nao_cacheavel(arvore, variaveis_persistem, nomes_iniciais)
+
+
+class CacheExecucoes:
+    """
+    Saídas de execução por (código normalizado, versão do dataset), com remoção
+    das menos usadas recentemente (LRU) quando o total passa de `max_bytes`.
+
+    Args:
+        max_bytes: Orçamento total das saídas guardadas.
+        max_bytes_entrada: Saídas maiores que isso não são guardadas.
+        ao_evento: Função chamada com o nome de eventos (ex.: telemetria).
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_bytes_entrada=64 * 1024, ao_evento=None):
+        self.max_bytes = max_bytes
+        self.max_bytes_entrada = max_bytes_entrada
+        self._ao_evento = ao_evento
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # chave -> (saída, bytes, duração da execução)
+        self._bytes = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.ignoradas = 0
+        self.removidas = 0
+        self.tempo_economizado_s = 0.0
+
+    @staticmethod
+    def chave(codigo, versao_dados, variaveis_persistem=False, nomes_iniciais=None):
+        """Chave do código para esta versão dos dados, ou None se ele não pode ir para o cache."""
+        if motivo_codigo(codigo, variaveis_persistem, nomes_iniciais):
+            return None
+        arvore = ast.parse(codigo)
+        normalizado = ast.dump(arvore, annotate_fields=False, include_attributes=False)
+        return hashlib.sha256(f"{versao_dados}\x1f{normalizado}".encode("utf-8")).hexdigest()
+
+    def executar(self, codigo, versao_dados, funcao, variaveis_persistem=False, nomes_iniciais=None):
+        """Retorna a saída em cache do código ou a de `funcao(codigo)`, guardando-a quando possível."""
+        chave = self.chave(codigo, versao_dados, variaveis_persistem, nomes_iniciais)
+        if chave is None:
+            with self._lock:
+                self.ignoradas += 1
+            self._evento("ignorada")
+            return funcao(codigo)
+
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                self.tempo_economizado_s += entrada[2]
+            else:
+                self.falhas += 1
+        if entrada is not None:
+            self._evento("acerto")
+            return entrada[0]
+        self._evento("falha")
+
+        inicio = time.perf_counter()
+        saida = funcao(codigo)
+        self._gravar(chave, saida, time.perf_counter() - inicio)
+        return saida
+
+    def _gravar(self, chave, saida, duracao):
+        if saida_com_erro(saida):
+            return
+        texto = str(saida)
+        tamanho = len(texto.encode("utf-8"))
+        if tamanho > self.max_bytes_entrada:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= anterior[1]
+            # A saída guardada é o texto que o agente veria como observação
+            self._entradas[chave] = (texto, tamanho, duracao)
+            self._bytes += tamanho
+            while self._bytes > self.max_bytes and self._entradas:
+                _, (_, tamanho_removido, _) = self._entradas.popitem(last=False)
+                self._bytes -= tamanho_removido
+                self.removidas += 1
+
+    def _evento(self, nome):
+        if self._ao_evento is not None:
+            self._ao_evento(f"cache_execucoes_{nome}")
+
+    def limpar(self):
+        """Remove todas as entradas."""
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        """Acertos, falhas e trechos ignorados (com efeitos), tempo de execução economizado e ocupação."""
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "ignoradas": self.ignoradas,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+                "tempo_economizado_s": round(self.tempo_economizado_s, 4),
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "removidas": self.removidas,
+            }
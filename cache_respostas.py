@@ -0,0 +1,147 @@
+"""
+Cache persistente (SQLite) das respostas de `gerar_resposta`.
+
+A chave combina a pergunta normalizada, o provedor, o modelo, a versão do
+dataset e a configuração do agente (motor de consulta e modo do agente).
+Assim, trocar o `data.csv` ou o modelo faz as entradas antigas deixarem de ser
+encontradas, e elas são descartadas na próxima gravação; as de outra
+configuração saem pela expiração ou pelo limite de tamanho.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+def normalizar_pergunta(pergunta):
+    """Normaliza a pergunta para que variações triviais usem a mesma entrada do cache."""
+    texto = unicodedata.normalize("NFKD", pergunta.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"\s+", " ", texto).strip()
+    return texto.rstrip("?!. ")
+
+
+class CacheRespostas:
+    """
+    Cache de pares (resposta, raciocínio) com expiração (TTL), limite de
+    tamanho e remoção das entradas menos usadas recentemente (LRU).
+    """
+
+    def __init__(self, caminho, max_entradas=1000, max_bytes=50 * 1024 * 1024, ttl_segundos=7 * 24 * 3600):
+        self.caminho = caminho
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl_segundos = ttl_segundos
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=10)
+        # WAL permite leituras simultâneas de vários processos (réplicas no mesmo host)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            """
+            CREATE TABLE IF NOT EXISTS respostas (
+                chave TEXT PRIMARY KEY,
+                pergunta TEXT NOT NULL,
+                fonte TEXT NOT NULL,
+                versao_dados TEXT NOT NULL,
+                provedor TEXT NOT NULL,
+                modelo TEXT NOT NULL,
+                resposta TEXT NOT NULL,
+                raciocinio TEXT NOT NULL,
+                tamanho INTEGER NOT NULL,
+                criado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL
+            )
+            """
+        )
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acesso ON respostas (acessado_em)")
+        self._conexao.commit()
+
+    @staticmethod
+    def _chave(pergunta_normalizada, provedor, modelo, versao_dados, configuracao):
+        bruto = "\x1f".join([pergunta_normalizada, provedor, modelo, versao_dados, configuracao])
+        return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+    def obter(self, pergunta, provedor, modelo, versao_dados, configuracao=""):
+        """Retorna (resposta, raciocínio) em cache ou None."""
+        chave = self._chave(normalizar_pergunta(pergunta), provedor, modelo, versao_dados, configuracao)
+        agora = time.time()
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT resposta, raciocinio, criado_em FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is None or agora - linha[2] > self.ttl_segundos:
+                self.falhas += 1
+                return None
+            self._conexao.execute("UPDATE respostas SET acessado_em = ? WHERE chave = ?", (agora, chave))
+            self._conexao.commit()
+            self.acertos += 1
+            return linha[0], linha[1]
+
+    def gravar(self, pergunta, provedor, modelo, versao_dados, resposta, raciocinio, fonte="", configuracao=""):
+        """
+        Grava a resposta e aplica as políticas de expiração e tamanho.
+        `configuracao` identifica como a resposta foi gerada (ex.: "pandas/react").
+        """
+        normalizada = normalizar_pergunta(pergunta)
+        chave = self._chave(normalizada, provedor, modelo, versao_dados, configuracao)
+        agora = time.time()
+        tamanho = len(resposta.encode("utf-8")) + len(raciocinio.encode("utf-8"))
+        with self._lock:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (chave, normalizada, fonte, versao_dados, provedor, modelo, resposta, raciocinio,
+                 tamanho, agora, agora),
+            )
+            # Entradas da mesma fonte com outra versão dos dados ou outro modelo nunca mais serão usadas
+            self._conexao.execute(
+                "DELETE FROM respostas WHERE fonte = ? AND (versao_dados != ? OR provedor != ? OR modelo != ?)",
+                (fonte, versao_dados, provedor, modelo),
+            )
+            self._conexao.execute("DELETE FROM respostas WHERE criado_em < ?", (agora - self.ttl_segundos,))
+            self._aplicar_limites()
+            self._conexao.commit()
+
+    def _aplicar_limites(self):
+        total, tamanho = self._conexao.execute("SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()
+        if total <= self.max_entradas and tamanho <= self.max_bytes:
+            return
+        # Remove as menos acessadas recentemente até caber nos dois limites
+        removidas = 0
+        for chave, tamanho_entrada in self._conexao.execute(
+            "SELECT chave, tamanho FROM respostas ORDER BY acessado_em ASC"
+        ).fetchall():
+            if total - removidas <= self.max_entradas and tamanho <= self.max_bytes:
+                break
+            self._conexao.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+            removidas += 1
+            tamanho -= tamanho_entrada
+
+    def limpar(self):
+        """Remove todas as entradas."""
+        with self._lock:
+            self._conexao.execute("DELETE FROM respostas")
+            self._conexao.commit()
+
+    def estatisticas(self):
+        """Contadores de acertos/falhas deste processo e ocupação atual do cache."""
+        with self._lock:
+            total, tamanho = self._conexao.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM respostas"
+            ).fetchone()
+        consultas = self.acertos + self.falhas
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+            "entradas": total,
+            "bytes": tamanho,
+        }
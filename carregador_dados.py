@@ -0,0 +1,437 @@
+"""
+Carregamento tipado do CSV de dados com snapshot colunar (Arrow/Feather).
+
+Na primeira carga o esquema é inferido (datas, categóricos e numéricos
+reduzidos) e o DataFrame é gravado como snapshot Arrow não comprimido,
+identificado pelo tamanho, mtime e hash do arquivo de origem. Nas cargas
+seguintes o snapshot é mapeado em memória em vez de reprocessar o CSV.
+
+Uso para comparar com a leitura simples:
+    python carregador_dados.py [caminho_csv]
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Diretório onde ficam snapshots e manifestos (pode ser alterado por variável de ambiente)
+DIRETORIO_CACHE = os.getenv("DADOS_CACHE_DIR", ".cache_dados")
+
+# Colunas de texto com proporção de valores distintos até este limite viram categóricas
+LIMITE_CATEGORICO = 0.5
+
+# Colunas inteiras de identificadores e códigos ("seq"/"cod" seguidos de outra palavra, como
+# seqEtapa e cod_campo, ou "id") usam o menor tipo que comporta os valores. As demais (tempos,
+# status, sequencia...) ficam em int64: o código do agente faz contas com elas e um int8
+# estouraria sem erro ((df.tempoTotal * 10).max() == 124)
+IDENTIFICADOR = re.compile(r"(?:seq|cod)[A-Z_0-9]|id(?:[A-Z_0-9]|$)")
+
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+# Linhas lidas e convertidas por vez em `ler_csv_em_blocos`
+LINHAS_POR_BLOCO = 25_000
+
+# Bytes do início e do fim do conteúdo guardados para conferir, em uma nova versão
+# maior, que os bytes já lidos não mudaram (só houve linhas acrescentadas)
+JANELA_VERIFICACAO = 4096
+
+
+@dataclass
+class DatasetCarregado:
+    """DataFrame carregado junto com a versão (impressão digital) da origem."""
+    df: pd.DataFrame
+    versao: str
+    caminho: str
+    origem: str
+    tempo_carga: float
+    esquema: dict = field(default_factory=dict)
+    # Estruturas calculadas a partir do df (ex.: cubo de agregados), por nome
+    derivados: dict = field(default_factory=dict)
+    # O que foi lido da origem: tamanho em bytes, mtime ou ETag/Last-Modified...
+    metadados_origem: dict = field(default_factory=dict)
+
+
+def _rss_atual_mb():
+    """Memória residente do processo atual em MB (Linux via /proc, senão pico via resource)."""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS reporta em bytes, Linux em KB
+        return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+    except ImportError:
+        return 0.0
+
+
+def _hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def _caminho_manifesto(caminho, diretorio_cache):
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    return os.path.join(diretorio_cache, f"{nome}.manifesto.json")
+
+
+def _ler_manifesto(caminho, diretorio_cache):
+    try:
+        with open(_caminho_manifesto(caminho, diretorio_cache), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _gravar_json_atomico(destino, conteudo):
+    temporario = f"{destino}.tmp{os.getpid()}"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(conteudo, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, destino)
+
+
+def impressao_digital(caminho, diretorio_cache=DIRETORIO_CACHE):
+    """
+    Retorna tamanho, mtime e hash SHA-256 do arquivo.
+
+    O hash só é recalculado quando tamanho ou mtime mudaram em relação ao
+    manifesto gravado, evitando reler o arquivo inteiro a cada inicialização.
+    """
+    info = os.stat(caminho)
+    manifesto = _ler_manifesto(caminho, diretorio_cache)
+    if manifesto.get("tamanho") == info.st_size and manifesto.get("mtime_ns") == info.st_mtime_ns:
+        sha256 = manifesto["sha256"]
+    else:
+        sha256 = _hash_arquivo(caminho)
+    return {"tamanho": info.st_size, "mtime_ns": info.st_mtime_ns, "sha256": sha256}
+
+
+def inferir_esquema(df):
+    """
+    Infere um esquema compacto para o DataFrame lido sem tipos.
+
+    Retorna um dicionário {coluna: tipo}, onde tipo é "datetime", "category",
+    "string" ou o nome de um dtype numérico (ex.: "int16" para um código, "int64"
+    para uma medida, "float32").
+    """
+    esquema = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if pd.api.types.is_integer_dtype(serie):
+            if _eh_identificador(coluna):
+                esquema[coluna] = str(pd.to_numeric(serie, downcast="integer").dtype)
+            else:
+                esquema[coluna] = "int64"
+        elif pd.api.types.is_float_dtype(serie):
+            reduzida = serie.astype("float32")
+            sem_perda = reduzida.astype("float64").equals(serie)
+            esquema[coluna] = "float32" if sem_perda else "float64"
+        elif pd.api.types.is_bool_dtype(serie):
+            esquema[coluna] = "bool"
+        else:
+            nao_nulos = serie.dropna()
+            if coluna.lower().startswith("data") and len(nao_nulos):
+                datas = pd.to_datetime(nao_nulos, format=FORMATO_DATA, errors="coerce")
+                if datas.notna().all():
+                    esquema[coluna] = "datetime"
+                    continue
+            distintos = nao_nulos.nunique()
+            if len(nao_nulos) and distintos / len(nao_nulos) <= LIMITE_CATEGORICO:
+                esquema[coluna] = "category"
+            else:
+                esquema[coluna] = "string"
+    return esquema
+
+
+def _eh_identificador(coluna):
+    return IDENTIFICADOR.match(coluna) is not None
+
+
+def esquema_atual(esquema):
+    """
+    True se o esquema segue as regras atuais de `inferir_esquema`. Esquemas
+    gravados antes (medidas reduzidas a int8/int16) são descartados com o
+    snapshot, e o CSV é relido.
+    """
+    return bool(esquema) and all(
+        tipo == "int64" for coluna, tipo in esquema.items()
+        if tipo.startswith(("int", "uint")) and not _eh_identificador(coluna)
+    )
+
+
+def aplicar_esquema(df, esquema):
+    """
+    Converte as colunas do DataFrame para os tipos do esquema.
+
+    Levanta ValueError se o DataFrame não for compatível (colunas diferentes
+    ou valores que não cabem no tipo inferido).
+    """
+    return pd.DataFrame(_converter_colunas(df, esquema), index=df.index)
+
+
+def _converter_colunas(df, esquema):
+    """Colunas convertidas para o esquema, por nome (ainda fora de um DataFrame)."""
+    if list(df.columns) != list(esquema):
+        raise ValueError(
+            f"Colunas do arquivo não correspondem ao esquema em cache: "
+            f"esperado {list(esquema)}, recebido {list(df.columns)}"
+        )
+    convertidas = {}
+    for coluna, tipo in esquema.items():
+        serie = df[coluna]
+        try:
+            if tipo == "datetime":
+                convertidas[coluna] = pd.to_datetime(serie, format=FORMATO_DATA)
+            elif tipo == "category":
+                convertidas[coluna] = serie.astype("category")
+            elif tipo == "string":
+                convertidas[coluna] = serie
+            else:
+                convertida = serie.astype(tipo)
+                if pd.api.types.is_integer_dtype(convertida) and not (convertida == serie).all():
+                    raise ValueError("valor fora do intervalo do tipo inferido")
+                convertidas[coluna] = convertida
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Coluna '{coluna}' incompatível com o tipo '{tipo}': {e}")
+    return convertidas
+
+
+class _ArquivoLimitado(io.RawIOBase):
+    """Expõe só os primeiros `limite` bytes de um arquivo aberto."""
+
+    def __init__(self, arquivo, limite):
+        self._arquivo = arquivo
+        self._restante = limite
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        quantidade = min(len(buffer), self._restante)
+        if quantidade <= 0:
+            return 0
+        lidos = self._arquivo.readinto(memoryview(buffer)[:quantidade])
+        self._restante -= lidos
+        return lidos
+
+
+def ler_csv_tipado(fonte, esquema=None, **kwargs):
+    """
+    Lê um CSV (caminho, URL ou arquivo aberto) e aplica o esquema informado.
+    Sem esquema, infere um a partir dos dados. Retorna (df, esquema).
+    """
+    bruto = pd.read_csv(fonte, **kwargs)
+    if esquema is None:
+        esquema = inferir_esquema(bruto)
+    return aplicar_esquema(bruto, esquema), esquema
+
+
+def ler_csv_em_blocos(fonte, esquema=None, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """
+    Como `ler_csv_tipado`, mas lê e converte `linhas_por_bloco` linhas por vez,
+    de modo que só um bloco fica sem tipos na memória (útil para fluxos de rede).
+    Sem esquema, ele é inferido do primeiro bloco; se um bloco seguinte não
+    couber nele, levanta ValueError.
+    """
+    partes = []
+    with pd.read_csv(fonte, chunksize=linhas_por_bloco) as leitor:
+        for bloco in leitor:
+            if esquema is None:
+                esquema = inferir_esquema(bloco)
+            partes.append(_converter_colunas(bloco, esquema))
+    return _concatenar_blocos(partes, list(esquema)), esquema
+
+
+def _concatenar_blocos(partes, colunas_esquema):
+    """
+    Concatena coluna a coluna, liberando a coluna dos blocos assim que ela é
+    copiada. Os blocos ficam como dicionários de colunas e o DataFrame final é
+    montado sem consolidar as colunas, para não ter duas cópias dos dados.
+    """
+    colunas = {}
+    for coluna in colunas_esquema:
+        series = [parte.pop(coluna) for parte in partes]
+        if isinstance(series[0].dtype, pd.CategoricalDtype):
+            categorias = series[0].cat.categories
+            for serie in series[1:]:
+                categorias = categorias.union(serie.cat.categories, sort=False)
+            series = [serie.cat.set_categories(categorias) for serie in series]
+        colunas[coluna] = pd.concat(series, ignore_index=True)
+        del series
+    return pd.DataFrame(colunas, copy=False)
+
+
+def _caminho_snapshot(caminho, sha256, diretorio_cache):
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    return os.path.join(diretorio_cache, f"{nome}-{sha256[:16]}.arrow")
+
+
+def _gravar_snapshot(df, destino):
+    temporario = f"{destino}.tmp{os.getpid()}"
+    # Sem compressão para que a leitura possa mapear o arquivo em memória
+    feather.write_feather(df, temporario, compression="uncompressed")
+    os.replace(temporario, destino)
+
+
+def _ler_snapshot(origem):
+    tabela = feather.read_table(origem, memory_map=True)
+    return tabela.to_pandas(split_blocks=True)
+
+
+def anexar_linhas(df, novas):
+    """
+    Concatena linhas novas (já com o esquema do dataset) ao DataFrame.
+
+    Colunas categóricas recebem a união das categorias dos dois lados, para
+    que o resultado continue categórico em vez de virar `object`.
+    """
+    for coluna in df.columns:
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            categorias = df[coluna].cat.categories.union(novas[coluna].cat.categories, sort=False)
+            if len(categorias) != len(df[coluna].cat.categories):
+                df = df.assign(**{coluna: df[coluna].cat.set_categories(categorias)})
+            novas = novas.assign(**{coluna: novas[coluna].cat.set_categories(categorias)})
+    return pd.concat([df, novas], ignore_index=True)
+
+
+def _remover_snapshots_antigos(caminho, atual, diretorio_cache):
+    prefixo = os.path.splitext(os.path.basename(caminho))[0] + "-"
+    for nome in os.listdir(diretorio_cache):
+        completo = os.path.join(diretorio_cache, nome)
+        if nome.startswith(prefixo) and nome.endswith(".arrow") and completo != atual:
+            try:
+                os.remove(completo)
+            except OSError:
+                pass
+
+
+def carregar_dataset(caminho, diretorio_cache=DIRETORIO_CACHE, usar_snapshot=True):
+    """
+    Carrega o CSV usando o snapshot colunar quando ele corresponde à versão atual do arquivo.
+
+    Args:
+        caminho: Caminho do arquivo CSV de origem.
+        diretorio_cache: Diretório dos snapshots e manifestos.
+        usar_snapshot: Se False, sempre lê o CSV (ainda assim com tipos).
+
+    Returns:
+        DatasetCarregado com o DataFrame tipado e a versão (prefixo do hash).
+    """
+    inicio = time.perf_counter()
+    os.makedirs(diretorio_cache, exist_ok=True)
+    digital = impressao_digital(caminho, diretorio_cache)
+    manifesto = _ler_manifesto(caminho, diretorio_cache)
+    versao = digital["sha256"][:16]
+    snapshot = _caminho_snapshot(caminho, digital["sha256"], diretorio_cache)
+    origem = {"tamanho": digital["tamanho"], "mtime_ns": digital["mtime_ns"]}
+    if not esquema_atual(manifesto.get("esquema")):
+        manifesto.pop("esquema", None)
+
+    if usar_snapshot and PYARROW_AVAILABLE and os.path.exists(snapshot) and "esquema" in manifesto:
+        try:
+            df = _ler_snapshot(snapshot)
+            return DatasetCarregado(df, versao, caminho, "snapshot", time.perf_counter() - inicio,
+                                    manifesto["esquema"], metadados_origem=origem)
+        except Exception as e:
+            print(f"Snapshot inválido em {snapshot}, relendo o CSV: {e}")
+
+    # O esquema é inferido uma única vez e reaproveitado quando o arquivo muda.
+    # Só os bytes contados na impressão digital são lidos: linhas acrescentadas
+    # durante a leitura ficam para o monitor de atualização
+    esquema = manifesto.get("esquema")
+    with open(caminho, "rb") as f:
+        try:
+            df, esquema = ler_csv_tipado(io.BufferedReader(_ArquivoLimitado(f, digital["tamanho"])), esquema)
+        except ValueError as e:
+            print(f"Esquema em cache incompatível com {caminho}, inferindo novamente: {e}")
+            f.seek(0)
+            df, esquema = ler_csv_tipado(io.BufferedReader(_ArquivoLimitado(f, digital["tamanho"])))
+
+    gravar_versao(caminho, df, esquema, digital, diretorio_cache, usar_snapshot)
+    return DatasetCarregado(df, versao, caminho, "csv", time.perf_counter() - inicio, esquema,
+                            metadados_origem=origem)
+
+
+def gravar_versao(caminho, df, esquema, digital, diretorio_cache=DIRETORIO_CACHE, usar_snapshot=True, **extras):
+    """
+    Grava o snapshot do DataFrame e o manifesto da versão `digital` do arquivo.
+    Outras chaves do manifesto (ex.: URL e ETag de um espelho) são mantidas ou
+    substituídas por `extras`.
+    """
+    os.makedirs(diretorio_cache, exist_ok=True)
+    manifesto = dict(_ler_manifesto(caminho, diretorio_cache), **digital, esquema=esquema, **extras)
+    if usar_snapshot and PYARROW_AVAILABLE:
+        snapshot = _caminho_snapshot(caminho, digital["sha256"], diretorio_cache)
+        try:
+            _gravar_snapshot(df, snapshot)
+            manifesto["snapshot"] = os.path.basename(snapshot)
+            _remover_snapshots_antigos(caminho, snapshot, diretorio_cache)
+        except Exception as e:
+            print(f"Não foi possível gravar o snapshot {snapshot}: {e}")
+    _gravar_json_atomico(_caminho_manifesto(caminho, diretorio_cache), manifesto)
+
+
+def _medir_modo(caminho, modo):
+    """Executa uma carga em um subprocesso limpo e retorna tempo e memória."""
+    saida = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--medir", modo, caminho],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def medir_carregamento(caminho):
+    """
+    Compara a leitura simples (`pd.read_csv` sem tipos) com o carregador tipado.
+
+    Cada modo roda em um processo separado para que a memória residente de um
+    não contamine a medição do outro.
+    """
+    carregar_dataset(caminho)  # garante que o snapshot existe
+    return {modo: _medir_modo(caminho, modo) for modo in ("csv_simples", "csv_tipado", "snapshot")}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "--medir":
+        modo, caminho_csv = sys.argv[2], sys.argv[3]
+        rss_base = _rss_atual_mb()
+        inicio = time.perf_counter()
+        if modo == "csv_simples":
+            df = pd.read_csv(caminho_csv)
+        else:
+            df = carregar_dataset(caminho_csv, usar_snapshot=(modo == "snapshot")).df
+        tempo = time.perf_counter() - inicio
+        print(json.dumps({
+            "tempo_s": round(tempo, 4),
+            "rss_mb": round(_rss_atual_mb() - rss_base, 1),
+            "memoria_df_mb": round(df.memory_usage(deep=True).sum() / (1024 * 1024), 2),
+            "linhas": len(df),
+        }))
+    else:
+        caminho_csv = sys.argv[1] if len(sys.argv) > 1 else "data.csv"
+        print(f"Medindo carregamento de {caminho_csv}...")
+        for modo, resultado in medir_carregamento(caminho_csv).items():
+            print(
+                f"{modo:>12}: {resultado['tempo_s'] * 1000:8.1f} ms | "
+                f"RSS +{resultado['rss_mb']:6.1f} MB | DataFrame {resultado['memoria_df_mb']:6.2f} MB"
+            )
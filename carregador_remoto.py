@@ -0,0 +1,235 @@
+"""
+Carregamento do CSV remoto (CSV_URL) com cache em disco e revalidação condicional.
+
+A resposta é pedida comprimida (gzip, ou zstd quando o pacote `zstandard`
+está instalado) e processada em streaming: os bytes descomprimidos são
+gravados em uma cópia local do arquivo (o espelho) e, ao mesmo tempo, lidos
+pelo pandas em blocos já convertidos para o esquema. Assim o pico de memória
+fica perto do tamanho do DataFrame final, sem o conteúdo inteiro em memória
+nem o DataFrame sem tipos.
+
+O espelho usa o mesmo snapshot Arrow e manifesto do carregador local
+(`carregador_dados`), acrescido de URL, ETag e Last-Modified. Nas cargas
+seguintes um GET condicional (If-None-Match / If-Modified-Since) respondido
+com 304 reaproveita o snapshot sem baixar nada. Falhas de rede têm timeout e
+novas tentativas com espera exponencial; se todas falharem e houver cópia em
+cache, ela é usada.
+"""
+import gzip
+import hashlib
+import http.client
+import io
+import os
+import time
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+from carregador_dados import (DIRETORIO_CACHE, DatasetCarregado, _caminho_manifesto, _gravar_json_atomico,
+                              _ler_manifesto, carregar_dataset, esquema_atual, gravar_versao, ler_csv_em_blocos,
+                              ler_csv_tipado)
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Timeout (s) de conexão e de cada leitura do socket, e tentativas por download
+TIMEOUT_S = 30
+TENTATIVAS = 3
+ESPERA_INICIAL_S = 0.5
+
+# Erros de rede que valem uma nova tentativa (além de HTTP 429 e 5xx)
+ERROS_TRANSITORIOS = (URLError, TimeoutError, ConnectionError, http.client.HTTPException, EOFError)
+
+
+class _Fluxo(io.RawIOBase):
+    """Lê de `fonte` contando os bytes e, opcionalmente, copiando-os para `destino` e para o hash."""
+
+    def __init__(self, fonte, destino=None, sha=None):
+        self._fonte = fonte
+        self._destino = destino
+        self._sha = sha
+        self.bytes = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        dados = self._fonte.read(len(buffer))
+        quantidade = len(dados)
+        buffer[:quantidade] = dados
+        self.bytes += quantidade
+        if self._destino is not None:
+            self._destino.write(dados)
+        if self._sha is not None:
+            self._sha.update(dados)
+        return quantidade
+
+
+def caminho_espelho(url, diretorio_cache=DIRETORIO_CACHE):
+    """Cópia local do CSV da URL; o hash da URL evita colisão com o arquivo local de mesmo nome."""
+    nome = os.path.splitext(os.path.basename(urlparse(url).path))[0] or "dados"
+    return os.path.join(diretorio_cache, f"{nome}_url{hashlib.sha256(url.encode()).hexdigest()[:8]}.csv")
+
+
+def _descomprimir(fluxo, codificacao):
+    if codificacao == "gzip":
+        return gzip.GzipFile(fileobj=fluxo)
+    if codificacao == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise ValueError("Resposta em zstd sem o pacote zstandard instalado")
+        return zstandard.ZstdDecompressor().stream_reader(fluxo)
+    if codificacao not in ("", "identity"):
+        raise ValueError(f"Content-Encoding não suportado: {codificacao}")
+    return fluxo
+
+
+def _baixar(url, cabecalhos, espelho, timeout, ler=None):
+    """
+    Baixa a URL para o espelho em streaming, passando o conteúdo também para
+    `ler(fluxo)` quando informado. Retorna None em 304 ou um dicionário com o
+    hash, os validadores, os bytes transferidos e o resultado de `ler`.
+    """
+    try:
+        resposta = urlopen(Request(url, headers=cabecalhos), timeout=timeout)
+    except HTTPError as e:
+        if e.code == 304:
+            return None
+        raise
+    temporario = f"{espelho}.tmp{os.getpid()}"
+    try:
+        with resposta, open(temporario, "wb") as destino:
+            transferido = _Fluxo(resposta)
+            codificacao = resposta.headers.get("Content-Encoding", "").strip().lower()
+            sha = hashlib.sha256()
+            fluxo = io.BufferedReader(_Fluxo(_descomprimir(transferido, codificacao), destino, sha), 1024 * 1024)
+            lido = ler(fluxo) if ler is not None else None
+            while fluxo.read(1024 * 1024):
+                pass  # o que o leitor não consumiu ainda vai para o espelho e para o hash
+            esperado = resposta.headers.get("Content-Length")
+            if esperado is not None and transferido.bytes != int(esperado):
+                raise ConnectionError(f"Download incompleto: {transferido.bytes} de {esperado} bytes")
+        os.replace(temporario, espelho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return {
+        "sha256": sha.hexdigest(),
+        "etag": resposta.headers.get("ETag"),
+        "last_modified": resposta.headers.get("Last-Modified"),
+        "bytes_transferidos": transferido.bytes,
+        "codificacao": codificacao or "identity",
+        "lido": lido,
+    }
+
+
+def _com_tentativas(funcao, tentativas, espera_inicial=ESPERA_INICIAL_S):
+    for tentativa in range(1, tentativas + 1):
+        try:
+            return funcao()
+        except HTTPError as e:
+            if (e.code != 429 and e.code < 500) or tentativa == tentativas:
+                raise
+            erro = e
+        except ERROS_TRANSITORIOS as e:
+            if tentativa == tentativas:
+                raise
+            erro = e
+        espera = espera_inicial * 2 ** (tentativa - 1)
+        print(f"Falha ao baixar o CSV ({erro}); nova tentativa em {espera:.1f}s")
+        time.sleep(espera)
+
+
+def _cabecalhos(url, manifesto, espelho):
+    cabecalhos = {"Accept-Encoding": "zstd, gzip" if ZSTD_AVAILABLE else "gzip"}
+    if manifesto.get("url") == url and os.path.exists(espelho):
+        if manifesto.get("etag"):
+            cabecalhos["If-None-Match"] = manifesto["etag"]
+        if manifesto.get("last_modified"):
+            cabecalhos["If-Modified-Since"] = manifesto["last_modified"]
+    return cabecalhos
+
+
+def _metadados(manifesto, espelho, **extras):
+    return dict({
+        "tamanho": manifesto.get("tamanho"),
+        "etag": manifesto.get("etag"),
+        "last_modified": manifesto.get("last_modified"),
+        "espelho": espelho,
+    }, **extras)
+
+
+def baixar_espelho(url, diretorio_cache=DIRETORIO_CACHE, timeout=TIMEOUT_S, tentativas=TENTATIVAS):
+    """
+    Atualiza o espelho local da URL sem ler o CSV (ex.: para o motor SQL).
+    Retorna (caminho do espelho, metadados da origem).
+    """
+    os.makedirs(diretorio_cache, exist_ok=True)
+    espelho = caminho_espelho(url, diretorio_cache)
+    manifesto = _ler_manifesto(espelho, diretorio_cache)
+    cabecalhos = _cabecalhos(url, manifesto, espelho)
+    try:
+        info = _com_tentativas(lambda: _baixar(url, cabecalhos, espelho, timeout), tentativas)
+    except Exception as e:
+        if "If-None-Match" not in cabecalhos and "If-Modified-Since" not in cabecalhos:
+            raise
+        print(f"Não foi possível revalidar {url}, usando a cópia em cache: {e}")
+        info = None
+    if info is not None:
+        estado = os.stat(espelho)
+        manifesto = dict(manifesto, url=url, etag=info["etag"], last_modified=info["last_modified"],
+                         tamanho=estado.st_size, mtime_ns=estado.st_mtime_ns, sha256=info["sha256"])
+        _gravar_json_atomico(_caminho_manifesto(espelho, diretorio_cache), manifesto)
+    return espelho, _metadados(manifesto, espelho)
+
+
+def carregar_dataset_url(url, esquema=None, diretorio_cache=DIRETORIO_CACHE, timeout=TIMEOUT_S,
+                         tentativas=TENTATIVAS, usar_snapshot=True):
+    """
+    Carrega o CSV da URL com tipos, revalidando a cópia em cache.
+
+    A versão é o hash do conteúdo (descomprimido), de modo que a mesma URL
+    servindo os mesmos bytes produz a mesma versão que o arquivo local equivalente.
+    """
+    inicio = time.perf_counter()
+    os.makedirs(diretorio_cache, exist_ok=True)
+    espelho = caminho_espelho(url, diretorio_cache)
+    manifesto = _ler_manifesto(espelho, diretorio_cache)
+    cabecalhos = _cabecalhos(url, manifesto, espelho)
+    esquema = esquema or (manifesto["esquema"] if esquema_atual(manifesto.get("esquema")) else None)
+
+    def ler(fluxo):
+        try:
+            return ler_csv_em_blocos(fluxo, esquema)
+        except ValueError as e:
+            # Esquema em cache (ou inferido do primeiro bloco) não serve: lê o espelho inteiro depois
+            print(f"Esquema incompatível com {url}, inferindo a partir do arquivo inteiro: {e}")
+            return None
+
+    try:
+        info = _com_tentativas(lambda: _baixar(url, cabecalhos, espelho, timeout, ler), tentativas)
+    except Exception as e:
+        if "If-None-Match" not in cabecalhos and "If-Modified-Since" not in cabecalhos:
+            raise
+        print(f"Não foi possível revalidar {url}, usando a cópia em cache: {e}")
+        info = None
+
+    if info is None:
+        # 304 (ou origem fora do ar): o snapshot do espelho é a versão atual
+        local = carregar_dataset(espelho, diretorio_cache, usar_snapshot)
+        manifesto = _ler_manifesto(espelho, diretorio_cache)
+        return DatasetCarregado(local.df, local.versao, url, "url_cache", time.perf_counter() - inicio,
+                                local.esquema, metadados_origem=_metadados(manifesto, espelho, bytes_transferidos=0))
+
+    df, esquema = info["lido"] or ler_csv_tipado(espelho)
+    estado = os.stat(espelho)
+    digital = {"tamanho": estado.st_size, "mtime_ns": estado.st_mtime_ns, "sha256": info["sha256"]}
+    gravar_versao(espelho, df, esquema, digital, diretorio_cache, usar_snapshot,
+                  url=url, etag=info["etag"], last_modified=info["last_modified"])
+    metadados = _metadados(dict(digital, etag=info["etag"], last_modified=info["last_modified"]), espelho,
+                           bytes_transferidos=info["bytes_transferidos"], codificacao=info["codificacao"])
+    return DatasetCarregado(df, info["sha256"][:16], url, "url", time.perf_counter() - inicio, esquema,
+                            metadados_origem=metadados)
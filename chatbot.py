@@ -1,14 +1,55 @@
+import time
+
+from inicializacao import TemposInicializacao
+
+_inicio_importacoes = time.perf_counter()
+import asyncio
+import concurrent.futures
+import json
 import os
-import pandas as pd
+import sys
+import threading
+from functools import partial
+from urllib.request import Request, urlopen
 from dotenv import load_dotenv
-from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
+from carregador_dados import DIRETORIO_CACHE, carregar_dataset
+from carregador_remoto import baixar_espelho, carregar_dataset_url
+from cache_respostas import CacheRespostas, normalizar_pergunta
+from cache_execucoes import CacheExecucoes
+from roteador import RoteadorIntencoes
+from sandbox import PoolSandbox, processos_padrao
+from observacoes import caracteres_do_orcamento
+from registro_datasets import DatasetDesconhecido, RegistroDatasets, ler_fontes
+from eventos_agente import ColetorEventos
+from telemetria import Telemetria
+from perfil_dados import obter_perfil
+from cubo_agregados import CuboAgregados
+from tabelas_normalizadas import TabelasNormalizadas
+from agendador import AgendadorRequisicoes, FilaCheia
+from erros_provedor import erro_transitorio
+from monitor_dados import MonitorDados
+# O agente do LangChain (langchain_experimental, ~1,3 s), o motor SQL e os SDKs dos
+# provedores são importados só quando o agente é criado (criar_agente, criar_llm),
+# de preferência pelo aquecimento em segundo plano: a interface aparece antes
+
+# Streamlit só é importado para ler secrets quando já está carregado (app.py) ou há um
+# secrets.toml: a API e os benchmarks não pagam a importação (~0,2 s)
+ARQUIVOS_SECRETS = (
+    os.path.join(".streamlit", "secrets.toml"),
+    os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+)
+STREAMLIT_AVAILABLE = False
+if "streamlit" in sys.modules or any(os.path.exists(arquivo) for arquivo in ARQUIVOS_SECRETS):
+    try:
+        import streamlit as st
+        STREAMLIT_AVAILABLE = True
+    except ImportError:
+        pass
 
-# Tenta importar streamlit para usar secrets (se disponível)
-try:
-    import streamlit as st
-    STREAMLIT_AVAILABLE = True
-except:
-    STREAMLIT_AVAILABLE = False
+# Tempos da partida a frio por fase (importações, dados, LLM, agente...), em /saude
+tempos_inicializacao = TemposInicializacao()
+tempos_inicializacao.registrar("importacoes", time.perf_counter() - _inicio_importacoes)
+_inicio_configuracao = time.perf_counter()
 
 # Carrega as variáveis de ambiente do arquivo .env (apenas localmente)
 load_dotenv()
@@ -29,22 +70,178 @@ def get_secret(key, default=None):
 # O nome do arquivo CSV foi padronizado para 'data.csv' na fase 1
 CSV_FILE_PATH = "data.csv"
 
+# Suporte para CSV via URL (útil para Streamlit Cloud)
+CSV_URL = get_secret("CSV_URL", None)
+
+# Datasets servidos pelo processo, por id: DATASETS="vendas=dados/vendas.csv,rh=https://.../rh.csv"
+# (ou uma tabela [DATASETS] no secrets.toml). Sem ela, só o data.csv (ou a CSV_URL), com o id
+# "padrao". O primeiro é o padrão das perguntas que não informam o dataset
+FONTES_DADOS = ler_fontes(get_secret("DATASETS", None), {"padrao": CSV_URL or CSV_FILE_PATH})
+DATASET_PADRAO = next(iter(FONTES_DADOS))
+# Memória estimada dos datasets carregados (com as estruturas derivadas); acima dela os
+# menos usados recentemente são descarregados e recarregados do snapshot em disco (0 = sem limite)
+REGISTRO_MEMORIA_MAX_MB = float(get_secret("REGISTRO_MEMORIA_MAX_MB", 1024))
+
+# Motor de consulta do agente: "pandas" (DataFrame em memória) ou "duckdb" (SQL sobre
+# um snapshot Parquet, para dados maiores que a memória)
+MOTOR_CONSULTA = get_secret("MOTOR_CONSULTA", "pandas").lower()
+SQL_THREADS = get_secret("SQL_THREADS", None)
+SQL_LIMITE_MEMORIA = get_secret("SQL_LIMITE_MEMORIA", None)
+
+# Monitor de atualização: acrescenta as linhas novas do arquivo (ou da CSV_URL, com
+# requisições condicionais) sem reiniciar o processo
+MONITOR_DADOS_ATIVO = str(get_secret("MONITOR_DADOS_ATIVO", "true")).lower() in ("1", "true", "sim", "yes")
+MONITOR_INTERVALO_S = float(get_secret("MONITOR_INTERVALO_S", 60 if CSV_URL else 5))
+
+# Tempo máximo de uma pergunta no agente; o agente de uma versão substituída é
+# encerrado depois desse tempo, quando as perguntas que o usavam já terminaram
+AGENTE_TEMPO_MAXIMO_S = 60
+
+# Rastreamento por requisição (JSONL) e métricas no formato Prometheus
+telemetria = Telemetria(
+    ativa=str(get_secret("TELEMETRIA_ATIVA", "false")).lower() in ("1", "true", "sim", "yes"),
+    arquivo=get_secret("TELEMETRIA_ARQUIVO", os.path.join(DIRETORIO_CACHE, "telemetria.jsonl")),
+)
+
+# Perguntas comuns (linhas/colunas, contagens, médias...) respondidas sem o LLM
+ROTEADOR_ATIVO = str(get_secret("ROTEADOR_ATIVO", "true")).lower() in ("1", "true", "sim", "yes")
+roteador = RoteadorIntencoes() if ROTEADOR_ATIVO else None
+
+# Execução do código gerado em processos separados, com limites de CPU, tempo e memória
+# (SANDBOX_PROCESSOS=0 executa no próprio processo, como antes)
+SANDBOX_PROCESSOS = int(get_secret("SANDBOX_PROCESSOS", processos_padrao()))
+SANDBOX_LIMITE_CPU_S = int(get_secret("SANDBOX_LIMITE_CPU_S", 30))
+SANDBOX_LIMITE_TEMPO_S = float(get_secret("SANDBOX_LIMITE_TEMPO_S", 60))
+SANDBOX_LIMITE_MEMORIA_MB = int(get_secret("SANDBOX_LIMITE_MEMORIA_MB", 1024))
+
+# Perfil compacto dos dados no prompt do agente, no lugar do df.head()
+PERFIL_ATIVO = str(get_secret("PERFIL_ATIVO", "true")).lower() in ("1", "true", "sim", "yes")
+PERFIL_ORCAMENTO_TOKENS = int(get_secret("PERFIL_ORCAMENTO_TOKENS", 800))
+# Orçamento de cada saída do código gerado no prompt; acima dele vai um resumo (0 desativa)
+OBSERVACAO_ORCAMENTO_TOKENS = int(get_secret("OBSERVACAO_ORCAMENTO_TOKENS", 600))
+
+# Cubo de agregados (contagens, somas, mín/máx e percentis por dimensão) calculado na carga
+CUBO_ATIVO = str(get_secret("CUBO_ATIVO", "true")).lower() in ("1", "true", "sim", "yes")
+
+# Tabelas sem a repetição do layout EAV (fluxos, etapas e campos por etapa) para o agente
+NORMALIZACAO_ATIVA = str(get_secret("NORMALIZACAO_ATIVA", "true")).lower() in ("1", "true", "sim", "yes")
+
 # Configuração do provedor LLM (openai, ollama, gemini)
 LLM_PROVIDER = get_secret("LLM_PROVIDER", "openai").lower()
 
-def criar_llm():
+# Modelo padrão de cada provedor (sobrescrito por OLLAMA_MODEL, GEMINI_MODEL ou OPENAI_MODEL)
+MODELOS_PADRAO = {
+    "ollama": ("OLLAMA_MODEL", "llama3.2"),
+    "gemini": ("GEMINI_MODEL", "gemini-2.5-flash"),
+    "openai": ("OPENAI_MODEL", "gpt-3.5-turbo"),
+    "roteirizado": ("LLM_ROTEIRO", "benchmarks/corpus.json"),
+}
+
+def obter_nome_modelo():
+    """Retorna o nome do modelo configurado para o provedor atual."""
+    chave, padrao = MODELOS_PADRAO.get(LLM_PROVIDER, MODELOS_PADRAO["openai"])
+    return get_secret(chave, padrao)
+
+# Cache do prefixo do prompt no provedor (a parte fixa do prompt do agente é a mesma em
+# todas as chamadas): chave de roteamento do cache da OpenAI, cache de contexto do Gemini e,
+# no Ollama, o modelo fica carregado (keep_alive) com contexto suficiente para o prompt
+# inteiro, sem o que o início do prompt seria truncado e o cache KV não seria reaproveitado
+OPENAI_PROMPT_CACHE_KEY = get_secret("OPENAI_PROMPT_CACHE_KEY", f"chatbot-{MOTOR_CONSULTA}")
+GEMINI_CACHE_CONTEXTO = str(get_secret("GEMINI_CACHE_CONTEXTO", "true")).lower() in ("1", "true", "sim", "yes")
+GEMINI_CACHE_TTL_S = int(get_secret("GEMINI_CACHE_TTL_S", 3600))
+OLLAMA_KEEP_ALIVE = get_secret("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = int(get_secret("OLLAMA_NUM_CTX", 8192))
+
+# Modo do agente: "ferramentas" (chamada nativa de funções do provedor, com argumentos em
+# JSON: sem falhas de parsing do texto), "react" (Thought/Action/Final Answer em texto livre)
+# ou "auto" (ferramentas quando o provedor e o modelo suportam, senão ReAct)
+AGENTE_MODO = get_secret("AGENTE_MODO", "auto").lower()
+
+# Limites de cada provedor usados pelo agendador: (execuções simultâneas, tokens por minuto; 0 = sem limite).
+# Sobrescreva com AGENDADOR_CONCORRENCIA e AGENDADOR_TOKENS_POR_MINUTO.
+LIMITES_PROVEDOR = {
+    "openai": (4, 60000),
+    "gemini": (2, 250000),
+    "ollama": (1, 0),
+    "roteirizado": (8, 0),
+}
+
+# Agendador assíncrono das consultas ao agente (desative com AGENDADOR_ATIVO=false)
+AGENDADOR_ATIVO = str(get_secret("AGENDADOR_ATIVO", "true")).lower() in ("1", "true", "sim", "yes")
+_concorrencia_padrao, _tpm_padrao = LIMITES_PROVEDOR.get(LLM_PROVIDER, LIMITES_PROVEDOR["openai"])
+AGENDADOR_CONCORRENCIA = int(get_secret("AGENDADOR_CONCORRENCIA", _concorrencia_padrao))
+AGENDADOR_TOKENS_POR_MINUTO = int(get_secret("AGENDADOR_TOKENS_POR_MINUTO", _tpm_padrao))
+AGENDADOR_MAX_FILA = int(get_secret("AGENDADOR_MAX_FILA", 32))
+# Pausa do provedor quando um erro 429/5xx persiste depois das novas tentativas do LLM
+AGENDADOR_PAUSA_S = float(get_secret("AGENDADOR_PAUSA_S", 10))
+# Tentativas por chamada ao LLM em erros 429/5xx: a única camada de novas tentativas
+# (o agendador não repete a pergunta inteira)
+LLM_MAX_TENTATIVAS = int(get_secret("LLM_MAX_TENTATIVAS", 3))
+
+# Cache persistente de respostas (desative com CACHE_RESPOSTAS_ATIVO=false)
+CACHE_RESPOSTAS_ATIVO = str(get_secret("CACHE_RESPOSTAS_ATIVO", "true")).lower() in ("1", "true", "sim", "yes")
+# Modo efetivo do agente ("auto" vira "ferramentas" ou "react" conforme o LLM), guardado por `criar_agente`
+_modo_efetivo = None
+cache_respostas = None
+if CACHE_RESPOSTAS_ATIVO:
+    try:
+        cache_respostas = CacheRespostas(
+            get_secret("CACHE_RESPOSTAS_ARQUIVO", os.path.join(DIRETORIO_CACHE, "respostas.sqlite3")),
+            max_entradas=int(get_secret("CACHE_RESPOSTAS_MAX_ENTRADAS", 1000)),
+            max_bytes=int(get_secret("CACHE_RESPOSTAS_MAX_MB", 50)) * 1024 * 1024,
+            ttl_segundos=float(get_secret("CACHE_RESPOSTAS_TTL_HORAS", 168)) * 3600,
+        )
+    except Exception as e:
+        print(f"Cache de respostas desativado: {e}")
+
+# Saídas do código gerado, reaproveitadas entre perguntas e sessões na mesma versão dos dados
+CACHE_EXECUCOES_ATIVO = str(get_secret("CACHE_EXECUCOES_ATIVO", "true")).lower() in ("1", "true", "sim", "yes")
+cache_execucoes = None
+if CACHE_EXECUCOES_ATIVO:
+    cache_execucoes = CacheExecucoes(
+        max_bytes=int(get_secret("CACHE_EXECUCOES_MAX_MB", 32)) * 1024 * 1024,
+        max_bytes_entrada=int(get_secret("CACHE_EXECUCOES_MAX_KB_ENTRADA", 64)) * 1024,
+        ao_evento=telemetria.registrar_evento,
+    )
+
+def criar_llm(modo=None):
     """
     Cria e retorna o LLM baseado no provedor configurado.
     Suporta: OpenAI, Ollama (gratuito/local), Google Gemini (gratuito)
+    e "roteirizado" (transcrições gravadas, sem rede, usado nos benchmarks)
+
+    Args:
+        modo: Modo do agente (padrão: AGENTE_MODO). Fora do modo "react", usa o
+            modelo de chat com chamada de ferramentas quando o provedor o oferece.
     """
-    if LLM_PROVIDER == "ollama":
+    modo = modo or AGENTE_MODO
+    if LLM_PROVIDER == "roteirizado":
+        from llm_roteirizado import ChatRoteirizado, LLMRoteirizado
+        roteiro = obter_nome_modelo()
+        latencia = float(get_secret("LLM_ROTEIRO_LATENCIA_S", 0))
+        print(f"Usando LLM roteirizado com transcrições de: {roteiro}")
+        # As transcrições são ReAct: o modo "auto" as reproduz como texto
+        if modo == "ferramentas":
+            return ChatRoteirizado.de_arquivo(roteiro, latencia_s=latencia)
+        return LLMRoteirizado.de_arquivo(roteiro, latencia_s=latencia)
+
+    elif LLM_PROVIDER == "ollama":
         try:
-            from langchain_community.llms import Ollama
-            model_name = get_secret("OLLAMA_MODEL", "llama3.2")  # Modelo padrão
+            model_name = obter_nome_modelo()
             base_url = get_secret("OLLAMA_BASE_URL", "http://localhost:11434")
+            if modo != "react" and _ollama_suporta_ferramentas(base_url, model_name):
+                try:
+                    from langchain_ollama import ChatOllama
+                    print(f"Usando Ollama com modelo: {model_name} (chamada de ferramentas)")
+                    return ChatOllama(model=model_name, base_url=base_url, temperature=0,
+                                      keep_alive=OLLAMA_KEEP_ALIVE, num_ctx=OLLAMA_NUM_CTX)
+                except ImportError:
+                    print("Chamada de ferramentas no Ollama requer: pip install langchain-ollama (usando ReAct)")
+            from langchain_community.llms import Ollama
             print(f"Usando Ollama com modelo: {model_name}")
             # Ollama usa LLM (não ChatLLM) para compatibilidade com create_pandas_dataframe_agent
-            return Ollama(model=model_name, base_url=base_url, temperature=0)
+            return Ollama(model=model_name, base_url=base_url, temperature=0,
+                          keep_alive=OLLAMA_KEEP_ALIVE, num_ctx=OLLAMA_NUM_CTX)
         except ImportError:
             raise ImportError("Para usar Ollama, instale: pip install langchain-community")
         except Exception as e:
@@ -52,134 +249,32 @@ def criar_llm():
     
     elif LLM_PROVIDER == "gemini":
         try:
-            # Usa google-generativeai diretamente com wrapper customizado
-            from langchain_core.language_models.llms import LLM
-            from langchain_core.callbacks.manager import CallbackManagerForLLMRun
-            from typing import Optional, List, Any
-            import google.generativeai as genai
+            # Usa google-generativeai diretamente com wrappers customizados (ver llm_gemini.py):
+            # o mesmo cliente, novas tentativas e cache de contexto nos dois modos do agente
+            from llm_gemini import ChatGemini, GeminiLLM
             
             api_key = get_secret("GOOGLE_API_KEY")
             if not api_key:
                 raise ValueError("GOOGLE_API_KEY não encontrada. Configure nos Secrets do Streamlit Cloud ou no arquivo .env")
             
-            model_name = get_secret("GEMINI_MODEL", "gemini-2.5-flash")
-            
-            # Configura o Google Generative AI
-            genai.configure(api_key=api_key)
-            
+            model_name = obter_nome_modelo()
+            # GEMINI_TRANSPORT=rest e GEMINI_API_ENDPOINT permitem apontar para outro
+            # endereço (ex.: o servidor local de benchmarks/gemini_local.py)
+            opcoes = dict(
+                gemini_model_name=model_name,
+                gemini_api_key=api_key,
+                transport=get_secret("GEMINI_TRANSPORT", None),
+                api_endpoint=get_secret("GEMINI_API_ENDPOINT", None),
+                ao_evento=telemetria.registrar_evento,
+                cache_contexto=GEMINI_CACHE_CONTEXTO,
+                cache_ttl_s=GEMINI_CACHE_TTL_S,
+                max_tentativas=LLM_MAX_TENTATIVAS,
+            )
+            if modo != "react":
+                print(f"Usando Google Gemini com modelo: {model_name} (chamada de ferramentas)")
+                return ChatGemini(**opcoes)
             print(f"Usando Google Gemini com modelo: {model_name}")
-            
-            # Cria um wrapper LLM customizado para compatibilidade com LangChain
-            class GeminiLLM(LLM):
-                gemini_model_name: str = ""
-                gemini_api_key: str = ""
-                model: Any = None
-                
-                def __init__(self, gemini_model_name: str = "", gemini_api_key: str = "", **kwargs):
-                    # Remove os parâmetros customizados antes de passar para super()
-                    filtered_kwargs = {k: v for k, v in kwargs.items() if k not in ['gemini_model_name', 'gemini_api_key']}
-                    super().__init__(**filtered_kwargs)
-                    
-                    # Define os valores do modelo e API key
-                    self.gemini_model_name = gemini_model_name or model_name
-                    self.gemini_api_key = gemini_api_key or api_key
-                    
-                    # Configura e cria o modelo
-                    genai.configure(api_key=self.gemini_api_key)
-                    try:
-                        self.model = genai.GenerativeModel(self.gemini_model_name)
-                    except Exception as e:
-                        # Se falhar, tenta listar modelos disponíveis
-                        try:
-                            available = [m.name.replace('models/', '') for m in genai.list_models() 
-                                        if 'generateContent' in m.supported_generation_methods]
-                            raise Exception(
-                                f"Modelo '{self.gemini_model_name}' não encontrado. "
-                                f"Modelos disponíveis: {', '.join(available[:5])}"
-                            )
-                        except:
-                            raise Exception(f"Erro ao criar modelo '{self.gemini_model_name}': {e}")
-                
-                @property
-                def _llm_type(self) -> str:
-                    return "gemini"
-                
-                def _call(
-                    self,
-                    prompt: str,
-                    stop: Optional[List[str]] = None,
-                    run_manager: Optional[CallbackManagerForLLMRun] = None,
-                    **kwargs: Any,
-                ) -> str:
-                    try:
-                        # Configura parâmetros de geração
-                        generation_config = genai.types.GenerationConfig(
-                            temperature=0,
-                            max_output_tokens=4096,
-                            top_p=0.95,
-                            top_k=40
-                        )
-                        
-                        response = self.model.generate_content(
-                            prompt,
-                            generation_config=generation_config
-                        )
-                        
-                        # Extrai o texto da resposta de forma mais robusta
-                        text = None
-                        
-                        # Tenta diferentes formas de extrair o texto
-                        if hasattr(response, 'text') and response.text:
-                            text = response.text
-                        elif hasattr(response, 'candidates') and response.candidates:
-                            if len(response.candidates) > 0:
-                                candidate = response.candidates[0]
-                                if hasattr(candidate, 'content') and candidate.content:
-                                    if hasattr(candidate.content, 'parts') and candidate.content.parts:
-                                        if len(candidate.content.parts) > 0:
-                                            text = candidate.content.parts[0].text
-                                    elif hasattr(candidate.content, 'text'):
-                                        text = candidate.content.text
-                        elif hasattr(response, 'parts') and response.parts:
-                            if len(response.parts) > 0:
-                                text = response.parts[0].text
-                        
-                        # Se não conseguiu extrair, tenta converter para string
-                        if not text:
-                            text = str(response)
-                        
-                        # Limpa a resposta removendo caracteres problemáticos
-                        if text:
-                            text = text.strip()
-                            # Remove possíveis prefixos/sufixos indesejados
-                            if text.startswith("```"):
-                                # Remove blocos de código markdown se não for necessário
-                                pass
-                        
-                        return text if text else "Resposta vazia do modelo."
-                    except Exception as e:
-                        error_msg = str(e)
-                        # Se o modelo não for encontrado, sugere modelos disponíveis
-                        if "404" in error_msg or "não foi encontrado" in error_msg.lower() or "not found" in error_msg.lower():
-                            try:
-                                genai.configure(api_key=self.gemini_api_key)
-                                available_models = [m.name.replace('models/', '') for m in genai.list_models() 
-                                                   if 'generateContent' in m.supported_generation_methods]
-                                raise Exception(
-                                    f"Modelo '{self.gemini_model_name}' não encontrado. "
-                                    f"Modelos disponíveis: {', '.join(available_models[:5])}. "
-                                    f"Atualize GEMINI_MODEL no arquivo .env"
-                                )
-                            except Exception as inner_e:
-                                if "Modelo" in str(inner_e):
-                                    raise inner_e
-                                raise Exception(
-                                    f"Modelo '{self.gemini_model_name}' não encontrado. "
-                                    f"Tente usar: gemini-2.5-flash, gemini-2.0-flash, ou gemini-2.5-pro"
-                                )
-                        raise
-            
-            return GeminiLLM(gemini_model_name=model_name, gemini_api_key=api_key)
+            return GeminiLLM(**opcoes)
             
         except ImportError as e:
             raise ImportError(f"Para usar Gemini, instale: pip install google-generativeai. Erro: {e}")
@@ -192,197 +287,852 @@ def criar_llm():
             api_key = get_secret("OPENAI_API_KEY")
             if not api_key:
                 raise ValueError("OPENAI_API_KEY não encontrada. Configure nos Secrets do Streamlit Cloud ou no arquivo .env")
-            model_name = get_secret("OPENAI_MODEL", "gpt-3.5-turbo")
+            model_name = obter_nome_modelo()
             print(f"Usando OpenAI com modelo: {model_name}")
-            return ChatOpenAI(model=model_name, temperature=0)
+            return ChatOpenAI(model=model_name, temperature=0, max_retries=max(0, LLM_MAX_TENTATIVAS - 1),
+                              model_kwargs={"prompt_cache_key": OPENAI_PROMPT_CACHE_KEY})
         except ImportError:
             raise ImportError("Para usar OpenAI, instale: pip install langchain-openai")
         except Exception as e:
             raise Exception(f"Erro ao inicializar OpenAI: {e}")
 
-def criar_agente_pandas():
+def _ollama_suporta_ferramentas(base_url, modelo):
+    """Modelos do Ollama com chamada de ferramentas informam a capacidade "tools" em /api/show."""
+    try:
+        requisicao = Request(f"{base_url}/api/show", data=json.dumps({"model": modelo}).encode(),
+                             headers={"Content-Type": "application/json"})
+        with urlopen(requisicao, timeout=5) as resposta:
+            return "tools" in (json.load(resposta).get("capabilities") or [])
+    except (OSError, ValueError):
+        return False
+
+def suporta_ferramentas(llm):
+    """True se o LLM é um modelo de chat com chamada nativa de ferramentas (`bind_tools`)."""
+    from langchain_core.language_models import BaseChatModel
+    return isinstance(llm, BaseChatModel) and type(llm).bind_tools is not BaseChatModel.bind_tools
+
+def modo_agente(llm):
+    """Modo efetivo do agente para este LLM ("ferramentas" ou "react"), segundo AGENTE_MODO."""
+    if AGENTE_MODO == "react":
+        return "react"
+    if suporta_ferramentas(llm):
+        return "ferramentas"
+    if AGENTE_MODO == "ferramentas":
+        print("O LLM configurado não tem chamada de ferramentas; usando o agente ReAct")
+    return "react"
+
+def carregar_dados(id_dataset=None, origem=None):
     """
-    Cria e retorna o agente LangChain para consultas em DataFrame Pandas.
+    Carrega um dataset do registro (padrão: o primeiro de DATASETS) para o agente e a interface.
+    A origem é um arquivo local ou uma URL (ex.: CSV_URL, útil no Streamlit Cloud).
+    Com MOTOR_CONSULTA=duckdb o `df` é só uma amostra e as consultas vão ao motor SQL.
+    """
+    id_dataset = id_dataset or DATASET_PADRAO
+    origem = origem or FONTES_DADOS[id_dataset]
+    diretorio_cache = diretorio_cache_dataset(id_dataset)
+    with tempos_inicializacao.medir("leitura_dados", substituir=False):
+        dataset = _carregar_origem(origem, diretorio_cache)
+    if "sql" not in dataset.derivados:
+        with tempos_inicializacao.medir("derivados", substituir=False):
+            preparar_derivados(dataset, diretorio_cache=diretorio_cache)
+    if MONITOR_DADOS_ATIVO:
+        _iniciar_monitor(id_dataset, origem, dataset, diretorio_cache)
+    return dataset
+
+def diretorio_cache_dataset(id_dataset):
+    """
+    Snapshots, manifestos e espelhos do dataset. Os do padrão ficam na raiz do cache (como
+    antes do registro); os demais em um subdiretório, pois os nomes vêm do nome do arquivo.
+    """
+    if id_dataset == DATASET_PADRAO:
+        return DIRETORIO_CACHE
+    return os.path.join(DIRETORIO_CACHE, "datasets", id_dataset)
+
+def _carregar_origem(origem, diretorio_cache=DIRETORIO_CACHE):
+    """Lê a origem (arquivo ou URL), sem as estruturas derivadas (também usada pelo monitor ao recarregar)."""
+    url = origem.startswith(("http://", "https://"))
+    if MOTOR_CONSULTA == "duckdb":
+        caminho, metadados = origem, None
+        if url:
+            # O DuckDB lê a cópia local mantida pelo carregador remoto
+            caminho, metadados = baixar_espelho(origem, diretorio_cache)
+        from motor_sql import carregar_dataset_sql
+        dataset = carregar_dataset_sql(caminho, diretorio_cache, threads=SQL_THREADS, limite_memoria=SQL_LIMITE_MEMORIA)
+        if url:
+            dataset.caminho, dataset.metadados_origem = origem, metadados
+        motor = dataset.derivados["sql"]
+        print(f"Motor DuckDB pronto ({motor.linhas} linhas) em {dataset.tempo_carga * 1000:.0f} ms")
+        return dataset
+    if url:
+        dataset = carregar_dataset_url(origem, diretorio_cache=diretorio_cache)
+    else:
+        dataset = carregar_dataset(origem, diretorio_cache)
+    print(f"Dados carregados ({dataset.origem}) em {dataset.tempo_carga * 1000:.0f} ms")
+    return dataset
+
+# Um monitor por dataset carregado (parado quando o registro descarrega o dataset)
+monitores = {}
+_lock_monitores = threading.Lock()
+
+def _iniciar_monitor(id_dataset, origem, dataset, diretorio_cache=DIRETORIO_CACHE):
+    def atualizar(novo, anterior, novas_linhas=None):
+        # Monitor de uma carga já descarregada pelo registro: a nova versão é descartada
+        if monitores.get(id_dataset) is monitor:
+            ao_atualizar_dados(novo, anterior, novas_linhas, id_dataset)
+
+    monitor = MonitorDados(
+        dataset,
+        ao_atualizar=atualizar,
+        recarregar=partial(_carregar_origem, origem, diretorio_cache),
+        intervalo_s=MONITOR_INTERVALO_S,
+        incremental="sql" not in dataset.derivados,
+        diretorio_cache=diretorio_cache,
+        ao_evento=telemetria.registrar_evento,
+    )
+    with _lock_monitores:
+        anterior = monitores.get(id_dataset)
+        monitores[id_dataset] = monitor
+    if anterior is not None:
+        anterior.parar(0)
+    monitor.iniciar()
+    print(f"Monitor de dados verificando {dataset.caminho} a cada {MONITOR_INTERVALO_S:.0f}s")
+
+def ao_atualizar_dados(novo, anterior, novas_linhas=None, id_dataset=None):
     """
+    Troca o dataset compartilhado por uma nova versão (chamada pelo monitor, fora
+    do caminho das perguntas). As estruturas derivadas são atualizadas antes da
+    troca; o agente e o motor SQL da versão anterior são encerrados só depois que
+    as perguntas em andamento tiveram tempo de terminar.
+    """
+    if "sql" not in novo.derivados:
+        preparar_derivados(novo, anterior, novas_linhas)
+    recursos_dataset = registro.recursos(id_dataset)
+    agente_anterior = recursos_dataset.substituir_dataset(novo)
+    descricao = f"+{len(novas_linhas)} linhas" if novas_linhas is not None else "recarga completa"
+    print(f"Dados atualizados ({id_dataset or DATASET_PADRAO}, {descricao}): versão {anterior.versao} -> "
+          f"{novo.versao}, {len(novo.df)} linhas")
+
+    _encerrar_depois(agente_anterior, anterior.derivados.get("sql"))
+    if agente_anterior is not None:
+        # Recria o agente agora, para a próxima pergunta não pagar a construção
+        try:
+            recursos_dataset.obter_agente()
+        except Exception as e:
+            print(f"Agente da nova versão será criado na próxima pergunta: {e}")
+
+def _ao_descarregar_dataset(id_dataset, dataset, agente):
+    """
+    Dataset removido da memória pelo registro: para o seu monitor e encerra o agente
+    (pool do sandbox) e o motor SQL. O registro só chama depois que a última pergunta
+    que reservou o agente terminou, então o encerramento é imediato e a memória volta.
+    """
+    with _lock_monitores:
+        monitor = monitores.get(id_dataset)
+        # O monitor pode ter relido a mesma versão (outro objeto); um monitor de outra
+        # versão é de uma carga feita depois da remoção e continua
+        if monitor is not None and monitor.dataset.versao == dataset.versao:
+            del monitores[id_dataset]
+        else:
+            monitor = None
+    if monitor is not None:
+        monitor.parar(0)
+    _encerrar_versao(agente, dataset.derivados.get("sql"))
+
+def _encerrar_depois(agente, motor):
+    """Encerra o agente e o motor SQL de uma versão substituída depois do tempo máximo de uma pergunta."""
+    if agente is not None or motor is not None:
+        temporizador = threading.Timer(AGENTE_TEMPO_MAXIMO_S + 5, _encerrar_versao, (agente, motor))
+        temporizador.daemon = True
+        temporizador.start()
+
+def _encerrar_versao(agente, motor):
+    for ferramenta in getattr(agente, "tools", []):
+        if hasattr(ferramenta, "encerrar"):
+            ferramenta.encerrar()
+    if motor is not None:
+        motor.encerrar()
+
+def preparar_derivados(dataset, anterior=None, novas_linhas=None, diretorio_cache=None):
+    """
+    Calcula as estruturas derivadas do DataFrame usadas pelo agente (tabelas normalizadas e cubo de agregados).
+    Com a versão anterior e as linhas acrescentadas, o cubo é atualizado em vez de reconstruído.
+    Com `diretorio_cache`, o cubo de cada versão é gravado ao lado do snapshot e lido de lá
+    nas cargas seguintes (ex.: quando o registro recarrega um dataset descarregado).
+    """
+    if NORMALIZACAO_ATIVA:
+        try:
+            tabelas = TabelasNormalizadas.construir(dataset.df)
+            dataset.derivados["tabelas"] = tabelas
+            print(
+                f"Tabelas normalizadas: {len(tabelas.etapas)} etapas, {len(tabelas.fluxos)} fluxos "
+                f"em {tabelas.tempo_construcao * 1000:.0f} ms"
+            )
+        except KeyError as e:
+            print(f"Tabelas normalizadas desativadas: coluna ausente {e}")
+    if CUBO_ATIVO:
+        inicio = time.perf_counter()
+        base = anterior.derivados.get("cubo") if anterior is not None and novas_linhas is not None else None
+        try:
+            if base is not None:
+                # Cópia: o cubo anterior continua servindo as perguntas em andamento
+                cubo = base.copiar().atualizar(novas_linhas)
+            else:
+                cubo = _cubo_da_versao(dataset, diretorio_cache)
+            cubo.tabela  # materializa antes de o agente (e o fork do sandbox) usar
+            dataset.derivados["cubo"] = cubo
+            print(f"Cubo de agregados: {len(cubo.tabela)} linhas em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        except KeyError as e:
+            # Dataset sem alguma das colunas de dimensão/medida: segue sem o cubo
+            print(f"Cubo de agregados desativado: coluna ausente {e}")
+    return dataset
+
+def _cubo_da_versao(dataset, diretorio_cache=None):
+    """Cubo gravado para esta versão dos dados, ou construído (e gravado) a partir do DataFrame."""
+    if diretorio_cache is None:
+        return CuboAgregados.construir(dataset.df)
+    arquivo = os.path.join(diretorio_cache, f"cubo-{dataset.versao}.pickle")
+    if os.path.exists(arquivo):
+        try:
+            return CuboAgregados.carregar(arquivo)
+        except Exception as e:
+            print(f"Cubo em cache inválido em {arquivo}, reconstruindo: {e}")
+    cubo = CuboAgregados.construir(dataset.df)
     try:
-        # 1. Carregar o DataFrame
-        df = pd.read_csv(CSV_FILE_PATH)
-        
-        # 2. Inicializar o LLM baseado no provedor configurado
-        llm = criar_llm()
-        
-        # 3. Criar o agente Pandas
-        # O agente utiliza o LLM e o DataFrame para responder perguntas.
-        # verbose=True é importante para mostrar o raciocínio (código Python gerado)
-        agent = create_pandas_dataframe_agent(
-            llm,
-            df,
-            verbose=True,
-            allow_dangerous_code=True,
-            max_iterations=5,
-            max_execution_time=60
+        os.makedirs(diretorio_cache, exist_ok=True)
+        cubo.salvar(arquivo)
+        # Só a versão atual fica em disco
+        for nome in os.listdir(diretorio_cache):
+            if nome.startswith("cubo-") and nome.endswith(".pickle") and nome != os.path.basename(arquivo):
+                os.remove(os.path.join(diretorio_cache, nome))
+    except OSError as e:
+        print(f"Cubo de agregados não gravado em {diretorio_cache}: {e}")
+    return cubo
+
+def criar_agente(dataset, llm):
+    """Cria o agente do motor configurado em MOTOR_CONSULTA, no modo que o LLM suporta."""
+    global _modo_efetivo
+    modo = _modo_efetivo = modo_agente(llm)
+    print(f"Agente no modo: {modo}")
+    if "sql" in dataset.derivados:
+        from motor_sql import criar_agente_sql
+        agente = criar_agente_sql(dataset.derivados["sql"], llm, max_execution_time=AGENTE_TEMPO_MAXIMO_S, modo=modo)
+    else:
+        agente = criar_agente_pandas(dataset, llm, modo)
+    # Gemini: a parte fixa do prompt vai para o cache de contexto do provedor
+    if modo == "react" and hasattr(llm, "usar_cache_contexto"):
+        llm.usar_cache_contexto(prefixo_estavel(agente))
+    return agente
+
+def criar_agente_pandas(dataset, llm, modo=None):
+    """
+    Cria e retorna o agente LangChain para consultas em DataFrame Pandas.
+    
+    Args:
+        dataset: DatasetCarregado compartilhado (o mesmo exibido na interface).
+        llm: LLM criado por `criar_llm()`.
+        modo: "ferramentas" ou "react" (padrão: o que `modo_agente` escolhe para o LLM).
+    """
+    df = dataset.df
+    modo = modo or modo_agente(llm)
+
+    # Em vez do df.head() com todas as colunas, o prompt recebe um perfil compacto
+    # (tipos, nulos, cardinalidade, valores frequentes e intervalos), calculado
+    # uma vez por versão dos dados, e a descrição das estruturas pré-calculadas
+    contexto = []
+    if PERFIL_ATIVO:
+        contexto.append(
+            "Perfil das colunas (tipo | % de nulos | valores distintos | valores mais frequentes ou mínimo e máximo):\n"
+            + obter_perfil(dataset, PERFIL_ORCAMENTO_TOKENS)
         )
-        
-        return agent
+    tabelas = dataset.derivados.get("tabelas")
+    if tabelas is not None:
+        contexto.append(tabelas.descricao())
+    cubo = dataset.derivados.get("cubo")
+    if cubo is not None:
+        contexto.append(cubo.descricao())
+    opcoes_prompt = {}
+    if modo == "ferramentas":
+        # O prompt vira a mensagem de sistema, sem formatação: as chaves ficam como estão.
+        # Com include_df_in_prompt, o LangChain preenche o {df_head} do sufixo
+        if contexto:
+            opcoes_prompt["prefix"] = PREFIXO_AGENTE_FERRAMENTAS.format(contexto="\n\n".join(contexto))
+        opcoes_prompt["suffix"] = SUFIXO_AGENTE_FERRAMENTAS if PERFIL_ATIVO else SUFIXO_AGENTE_FERRAMENTAS_COM_HEAD
+        opcoes_prompt["include_df_in_prompt"] = not PERFIL_ATIVO
+        opcoes_prompt["agent_type"] = "tool-calling"
+    else:
+        if contexto:
+            texto = "\n\n".join(contexto).replace("{", "{{").replace("}", "}}")
+            opcoes_prompt["prefix"] = PREFIXO_AGENTE.format(contexto=texto)
+        # Com o sufixo próprio, o df.head() só entra no prompt se o sufixo tiver {df_head}
+        # (o LangChain recusa include_df_in_prompt junto com suffix)
+        opcoes_prompt["suffix"] = SUFIXO_AGENTE if PERFIL_ATIVO else SUFIXO_AGENTE_COM_HEAD
+        opcoes_prompt["include_df_in_prompt"] = None
 
-    except FileNotFoundError:
-        print(f"Erro: Arquivo CSV não encontrado em {CSV_FILE_PATH}")
+    # O agente utiliza o LLM e o DataFrame para responder perguntas.
+    # verbose=True é importante para mostrar o raciocínio (código Python gerado);
+    # os passos intermediários trazem o código realmente executado
+    from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
+    agent = create_pandas_dataframe_agent(
+        llm,
+        df,
+        verbose=True,
+        allow_dangerous_code=True,
+        max_iterations=5,
+        max_execution_time=AGENTE_TEMPO_MAXIMO_S,
+        return_intermediate_steps=True,
+        **opcoes_prompt
+    )
+
+    # Estruturas pré-calculadas ficam disponíveis no código do agente ao lado do `df`
+    if tabelas is not None:
+        agent.tools[0].locals.update(tabelas.como_dicionario())
+    if cubo is not None:
+        agent.tools[0].locals.update(cubo=cubo.tabela, agregar=cubo.agregar)
+
+    # Troca a ferramenta Python padrão pela que executa no pool de processos
+    from ferramenta_python import FerramentaPython
+    pool = None
+    if SANDBOX_PROCESSOS > 0:
+        pool = PoolSandbox(
+            agent.tools[0].locals,
+            processos=SANDBOX_PROCESSOS,
+            limite_cpu_s=SANDBOX_LIMITE_CPU_S,
+            limite_tempo_s=SANDBOX_LIMITE_TEMPO_S,
+            limite_memoria_mb=SANDBOX_LIMITE_MEMORIA_MB,
+            max_caracteres_saida=caracteres_do_orcamento(OBSERVACAO_ORCAMENTO_TOKENS),
+        )
+        print(f"Código gerado será executado em {SANDBOX_PROCESSOS} processo(s) isolado(s)")
+    ferramenta = FerramentaPython.substituir(agent.tools[0], pool, cache_execucoes, dataset.versao,
+                                             caracteres_do_orcamento(OBSERVACAO_ORCAMENTO_TOKENS))
+    agent.tools = [ferramenta] + list(agent.tools[1:])
+    return agent
+
+# Início do prompt do agente: perfil dos dados e estruturas pré-calculadas disponíveis
+PREFIXO_AGENTE = """
+Você está trabalhando com um DataFrame pandas em Python chamado `df`.
+{contexto}
+
+Use as ferramentas abaixo para responder à pergunta:"""
+
+# Fim do prompt do agente. A instrução sobre o código fica antes da pergunta (e não
+# depois dela): assim tudo até "Question:" é idêntico, byte a byte, em todas as
+# perguntas e iterações, e o provedor reaproveita esse prefixo em cache
+SUFIXO_AGENTE = """
+IMPORTANTE: Depois de responder à pergunta, inclua o código Python completo que você gerou e executou para obter a resposta, formatado em um bloco de código Markdown (```python...```). Se a resposta for trivial e não envolver código, apenas responda à pergunta.
+
+Begin!
+Question: {input}
+{agent_scratchpad}"""
+SUFIXO_AGENTE_COM_HEAD = "\nThis is the result of `print(df.head())`:\n{df_head}\n" + SUFIXO_AGENTE
+
+# Modo ferramentas: o mesmo contexto vai na mensagem de sistema e a pergunta em uma mensagem
+# do usuário. O código chega nos argumentos da chamada da ferramenta e é registrado a partir
+# dos passos intermediários, então a resposta não precisa repeti-lo
+PREFIXO_AGENTE_FERRAMENTAS = """
+Você está trabalhando com um DataFrame pandas em Python chamado `df`.
+{contexto}"""
+
+SUFIXO_AGENTE_FERRAMENTAS = """
+
+Para calcular a resposta, execute código Python com a ferramenta `python_repl_ast` (uma expressão por chamada \
+ou um bloco cuja última linha é o valor a exibir). Quando tiver o resultado, responda à pergunta em português, \
+sem repetir o código."""
+SUFIXO_AGENTE_FERRAMENTAS_COM_HEAD = "\nThis is the result of `print(df.head())`:\n{df_head}" + SUFIXO_AGENTE_FERRAMENTAS
+
+MARCADOR_PERGUNTA = "\x00pergunta\x00"
+
+
+def prefixo_estavel(agente):
+    """
+    Parte fixa do prompt do agente (instruções, dados e ferramentas), que
+    antecede a pergunta em todas as chamadas ao LLM desta versão dos dados.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    prompt = agente.agent.runnable.get_prompts()[0]
+    # No modo ferramentas o prompt é de chat e o scratchpad é uma lista de mensagens
+    rascunho = [] if isinstance(prompt, ChatPromptTemplate) else ""
+    return prompt.format(input=MARCADOR_PERGUNTA, agent_scratchpad=rascunho).split(MARCADOR_PERGUNTA)[0]
+
+# Datasets, LLM e agentes são criados sob demanda e compartilhados por todas as sessões;
+# o LLM é um só para os agentes de todos os datasets
+registro = RegistroDatasets(
+    FONTES_DADOS, carregar_dados, criar_llm, criar_agente,
+    max_bytes=int(REGISTRO_MEMORIA_MAX_MB * 1024 * 1024),
+    ao_descarregar=_ao_descarregar_dataset,
+    ao_construir=lambda id_dataset, nome, duracao: tempos_inicializacao.registrar(nome, duracao, substituir=False),
+    ao_evento=telemetria.registrar_evento,
+)
+# Recursos do dataset padrão (carregar sem passar pelo registro não conta como uso)
+recursos = registro.recursos()
+
+# Aquecimento: "segundo_plano" cria o LLM e o agente em uma thread logo que a interface
+# ou a API sobe (a primeira pergunta não espera por eles); "primeira_pergunta" os cria
+# só quando a primeira pergunta chega
+AQUECIMENTO_AGENTE = get_secret("AQUECIMENTO_AGENTE", "segundo_plano").lower()
+_aquecimento = None
+_lock_aquecimento = threading.Lock()
+
+def iniciar_aquecimento():
+    """
+    Inicia, uma vez por processo, a thread que carrega o dataset padrão e cria o LLM e o
+    agente. Retorna a thread (ou None com AQUECIMENTO_AGENTE=primeira_pergunta).
+    Uma pergunta que chega antes do fim espera o mesmo agente, sem criá-lo de novo.
+    """
+    global _aquecimento
+    if AQUECIMENTO_AGENTE != "segundo_plano":
         return None
+    with _lock_aquecimento:
+        if _aquecimento is None:
+            _aquecimento = threading.Thread(target=_aquecer, name="aquecimento-agente", daemon=True)
+            _aquecimento.start()
+    return _aquecimento
+
+def _aquecer():
+    inicio = time.perf_counter()
+    try:
+        registro.obter_agente()
     except Exception as e:
-        print(f"Erro ao inicializar o agente: {e}")
-        return None
+        # A falha fica registrada nos recursos; a primeira pergunta tenta de novo
+        print(f"Aquecimento do agente incompleto: {e}")
+        return
+    tempos_inicializacao.registrar("aquecimento", time.perf_counter() - inicio, substituir=False)
+
+# Perguntas que precisam do LLM passam pelo agendador: fila limitada, limites do
+# provedor, pausa em 429/5xx persistentes e deduplicação de perguntas em andamento
+agendador = None
+if AGENDADOR_ATIVO:
+    agendador = AgendadorRequisicoes(
+        lambda pergunta, callbacks, id_dataset=None: _consultar_agente_async(
+            pergunta, callbacks, propagar_transitorios=True, id_dataset=id_dataset),
+        concorrencia=AGENDADOR_CONCORRENCIA,
+        tokens_por_minuto=AGENDADOR_TOKENS_POR_MINUTO,
+        max_fila=AGENDADOR_MAX_FILA,
+        pausa_s=AGENDADOR_PAUSA_S,
+        ao_evento=telemetria.registrar_evento,
+    )
 
-# Inicializa o agente uma vez
-pandas_agent = criar_agente_pandas()
+MENSAGEM_FILA_CHEIA = "⏳ **Muitas perguntas em andamento.** Aguarde alguns segundos e tente novamente."
 
-def gerar_resposta(pergunta: str):
+# Prefixos das mensagens de erro produzidas por `_consultar_agente` e sua classe (para métricas)
+CLASSES_ERRO = {
+    "⚠️": "quota",
+    "🔑": "autenticacao",
+    "❌": "erro_agente",
+    "⏳": "fila_cheia",
+    "O agente não pôde": "inicializacao",
+}
+
+def classificar_erro(resposta):
+    """Retorna a classe do erro se a resposta for uma mensagem de erro, senão None."""
+    for prefixo, classe in CLASSES_ERRO.items():
+        if resposta.startswith(prefixo):
+            return classe
+    return None
+
+def _eh_mensagem_erro(resposta):
+    """Mensagens de erro (as mesmas destacadas pela interface) não vão para o cache."""
+    return classificar_erro(resposta) is not None
+
+def gerar_resposta(pergunta: str, callbacks=None, cancelamento=None, id_dataset=None):
     """
     Recebe uma pergunta e retorna a resposta do agente e o raciocínio.
     
+    Perguntas comuns com resposta exata (esquema, contagens, médias) são
+    calculadas diretamente pelo roteador de intenções, e perguntas repetidas
+    sobre a mesma versão dos dados e o mesmo modelo são respondidas a partir
+    do cache persistente, sem chamar o LLM. As demais vão para o agente
+    através do agendador.
+    
     Args:
         pergunta: A pergunta do usuário.
+        callbacks: Callbacks do LangChain repassados ao agente (opcional).
+        cancelamento: threading.Event que, quando sinalizado, desiste da pergunta
+            (ex.: o usuário saiu da página). Gera `concurrent.futures.CancelledError`.
+        id_dataset: Dataset consultado (padrão: o primeiro de DATASETS). Um id fora
+            do registro gera `DatasetDesconhecido`.
         
     Returns:
         Uma tupla (resposta, raciocínio).
     """
-    if pandas_agent is None:
-        return "O agente não pôde ser inicializado. Verifique o arquivo CSV e a chave da API.", ""
+    rastreador = telemetria.iniciar(pergunta)
+    if rastreador is not None:
+        callbacks = list(callbacks or []) + [rastreador]
+    try:
+        resposta, raciocinio, origem = _responder(pergunta, callbacks, rastreador, cancelamento, id_dataset)
+    except BaseException as e:
+        telemetria.finalizar(rastreador, "excecao", classe_erro=type(e).__name__)
+        raise
+    telemetria.finalizar(rastreador, origem, resposta, classificar_erro(resposta))
+    return resposta, raciocinio
 
-    # O LangChain executa a cadeia e retorna o resultado.
-    # Para obter o raciocínio (código Python gerado), precisamos inspecionar a saída
-    # do `verbose=True` ou usar um callback. Como o `create_pandas_dataframe_agent`
-    # é uma abstração, vamos focar na resposta final e instruir o LLM a incluir
-    # o raciocínio na resposta.
-    
-    # Adicionamos uma instrução ao prompt para que o agente inclua o código Python
-    # que ele usou para chegar à resposta.
-    prompt_com_instrucao = (
-        f"{pergunta}\n\n"
-        "IMPORTANTE: Depois de responder à pergunta, inclua o código Python completo "
-        "que você gerou e executou para obter a resposta, formatado em um bloco de código "
-        "Markdown (```python...```). Se a resposta for trivial e não envolver código, "
-        "apenas responda à pergunta."
-    )
-    
+async def gerar_resposta_async(pergunta: str, callbacks=None, id_dataset=None):
+    """
+    Versão assíncrona de `gerar_resposta` (para a API HTTP). Cancelar a tarefa
+    que aguarda desiste da pergunta no agendador.
+    """
+    rastreador = telemetria.iniciar(pergunta)
+    if rastreador is not None:
+        callbacks = list(callbacks or []) + [rastreador]
+    try:
+        dataset, pronta = await asyncio.to_thread(_responder_sem_llm, pergunta, rastreador, id_dataset)
+        if pronta is not None:
+            resposta, raciocinio, origem = pronta
+        else:
+            if agendador is not None:
+                try:
+                    resposta, raciocinio = await agendador.responder(
+                        pergunta, callbacks, _chave_agendador(pergunta, dataset), {"id_dataset": id_dataset})
+                except Exception as e:
+                    resposta, raciocinio = _mensagem_falha_agendador(e)
+            else:
+                resposta, raciocinio = await _consultar_agente_async(pergunta, callbacks, id_dataset=id_dataset)
+            _gravar_no_cache(pergunta, dataset, resposta, raciocinio)
+            origem = "agente"
+    except BaseException as e:
+        telemetria.finalizar(rastreador, "excecao", classe_erro=type(e).__name__)
+        raise
+    telemetria.finalizar(rastreador, origem, resposta, classificar_erro(resposta))
+    return resposta, raciocinio
+
+def configuracao_agente():
+    """
+    Motor e modo efetivo do agente, que entram na chave do cache de respostas: respostas
+    do ReAct sobre pandas não servem para o SQL nem para o agente com chamada de ferramentas.
+    Antes do primeiro agente, o modo vem do LLM do registro.
+    """
+    global _modo_efetivo
+    if _modo_efetivo is None:
+        _modo_efetivo = modo_agente(registro.obter_llm())
+    return f"{MOTOR_CONSULTA}/{_modo_efetivo}"
+
+def _responder_sem_llm(pergunta, rastreador, id_dataset=None):
+    """
+    Dados, roteador e cache. Retorna (dataset, (resposta, raciocínio, origem)) quando
+    a pergunta já foi respondida, ou (dataset, None) quando precisa do agente.
+    """
+    try:
+        dataset = registro.obter_dataset(id_dataset)
+    except DatasetDesconhecido:
+        raise
+    except FileNotFoundError:
+        return None, (f"O agente não pôde ser inicializado: arquivo CSV não encontrado em "
+                      f"{registro.origem(id_dataset)}.", "", "dados")
+    except Exception as e:
+        print(f"Erro ao carregar os dados: {e}")
+        return None, (f"O agente não pôde ser inicializado. Verifique o arquivo CSV. Erro: {e}", "", "dados")
+
+    # No modo SQL o `df` é só uma amostra: o roteador calcularia sobre ela
+    if roteador is not None and "sql" not in dataset.derivados:
+        roteada = roteador.responder(pergunta, dataset.df, dataset.derivados.get("tabelas"))
+        if roteada is not None:
+            return dataset, roteada + ("roteador",)
+
+    if cache_respostas is not None:
+        try:
+            configuracao = configuracao_agente()
+        except Exception as e:
+            # Sem LLM também não há agente: o erro aparece na resposta dele
+            print(f"Cache de respostas não consultado: {e}")
+            return dataset, None
+        em_cache = cache_respostas.obter(pergunta, LLM_PROVIDER, obter_nome_modelo(), dataset.versao,
+                                         configuracao=configuracao)
+        telemetria.registrar_cache(rastreador, em_cache is not None)
+        if em_cache is not None:
+            return dataset, em_cache + ("cache",)
+    return dataset, None
+
+def _gravar_no_cache(pergunta, dataset, resposta, raciocinio):
+    if cache_respostas is not None and not _eh_mensagem_erro(resposta):
+        cache_respostas.gravar(pergunta, LLM_PROVIDER, obter_nome_modelo(), dataset.versao, resposta, raciocinio,
+                               fonte=dataset.caminho, configuracao=configuracao_agente())
+
+def _responder(pergunta, callbacks, rastreador, cancelamento=None, id_dataset=None):
+    """Roteador, cache e agente, nessa ordem. Retorna (resposta, raciocínio, origem)."""
+    dataset, pronta = _responder_sem_llm(pergunta, rastreador, id_dataset)
+    if pronta is not None:
+        return pronta
+
+    if agendador is not None:
+        futuro = agendador.submeter(pergunta, callbacks, _chave_agendador(pergunta, dataset),
+                                    {"id_dataset": id_dataset})
+        resposta, raciocinio = _aguardar_agendador(futuro, cancelamento)
+    else:
+        resposta, raciocinio = _consultar_agente(pergunta, callbacks, id_dataset=id_dataset)
+
+    _gravar_no_cache(pergunta, dataset, resposta, raciocinio)
+    return resposta, raciocinio, "agente"
+
+def _chave_agendador(pergunta, dataset):
+    """Perguntas iguais (como no cache) sobre a mesma versão dos dados compartilham a execução."""
+    return f"{dataset.versao}:{normalizar_pergunta(pergunta)}"
+
+def _aguardar_agendador(futuro, cancelamento=None):
+    """Aguarda o resultado do agendador; sinalizar `cancelamento` desiste da pergunta."""
+    while cancelamento is not None and not futuro.done():
+        if cancelamento.wait(0.25):
+            futuro.cancel()
+            break
+    try:
+        return futuro.result()
+    except concurrent.futures.CancelledError:
+        raise
+    except Exception as e:
+        return _mensagem_falha_agendador(e)
+
+def _mensagem_falha_agendador(e):
+    """Fila cheia ou erro que persistiu após as novas tentativas do LLM."""
+    if isinstance(e, FilaCheia):
+        return MENSAGEM_FILA_CHEIA, ""
+    return _tratar_erro_agente(e)
+
+def _obter_agente(agente=None, id_dataset=None):
+    """
+    Retorna (agente, None) ou (None, mensagem de erro) se não for possível criá-lo.
+    O agente do registro fica reservado até `_liberar_agente`.
+    """
+    try:
+        return (agente if agente is not None else registro.reservar_agente(id_dataset)), None
+    except FileNotFoundError:
+        return None, f"O agente não pôde ser inicializado: arquivo CSV não encontrado em {registro.origem(id_dataset)}."
+    except Exception as e:
+        print(f"Erro ao inicializar o agente: {e}")
+        return None, f"O agente não pôde ser inicializado. Verifique o arquivo CSV e a chave da API. Erro: {e}"
+
+def _liberar_agente(pandas_agent, agente=None):
+    """Devolve ao registro o agente reservado por `_obter_agente` (não o informado pelo chamador)."""
+    if agente is None:
+        registro.liberar_agente(pandas_agent)
+
+def _liberar_agente_obtido(obtencao, agente=None):
+    """Desfaz a reserva feita por `_obter_agente` em uma tarefa cujo resultado ninguém usará."""
+    if obtencao.cancelled() or obtencao.exception() is not None:
+        return
+    pandas_agent, erro = obtencao.result()
+    if not erro:
+        _liberar_agente(pandas_agent, agente)
+
+def _consultar_agente(pergunta: str, callbacks=None, agente=None, id_dataset=None):
+    """
+    Executa a pergunta no agente e separa a resposta do código gerado.
+    Sem `agente`, usa o agente compartilhado do dataset `id_dataset` (padrão: o primeiro).
+    """
+    pandas_agent, erro = _obter_agente(agente, id_dataset)
+    if erro:
+        return erro, ""
     try:
         # A chamada `agent.invoke` retorna um dicionário com a chave 'output'
-        response = pandas_agent.invoke({"input": prompt_com_instrucao})
-        
-        # Extrai a resposta do output
-        resposta_completa = response.get("output", "Não foi possível obter uma resposta.")
-        
-        # Se houver intermediate_steps, tenta extrair o código executado
-        raciocinio = ""
-        if "intermediate_steps" in response:
-            for step in response["intermediate_steps"]:
-                if len(step) >= 2 and hasattr(step[0], 'tool_input'):
-                    tool_input = step[0].tool_input
-                    if isinstance(tool_input, str) and 'python' in tool_input.lower():
-                        raciocinio += tool_input + "\n\n"
-        
-        # Tentativa de separar a resposta do código (raciocínio)
-        # O código estará dentro de ```python...```
+        response = pandas_agent.invoke({"input": pergunta}, config={"callbacks": callbacks})
+    except Exception as e:
+        return _tratar_erro_agente(e)
+    finally:
+        _liberar_agente(pandas_agent, agente)
+    return _separar_resposta(response)
+
+async def _consultar_agente_async(pergunta: str, callbacks=None, agente=None, propagar_transitorios=False,
+                                  id_dataset=None):
+    """
+    Versão assíncrona de `_consultar_agente` (usa `agent.ainvoke`).
+    Com `propagar_transitorios`, erros 429/5xx são relançados para o agendador pausar o provedor.
+    """
+    obtencao = asyncio.ensure_future(asyncio.to_thread(_obter_agente, agente, id_dataset))
+    try:
+        pandas_agent, erro = await asyncio.shield(obtencao)
+    except asyncio.CancelledError:
+        # A thread continua e reserva o agente mesmo assim: a reserva é desfeita quando ela terminar
+        obtencao.add_done_callback(partial(_liberar_agente_obtido, agente=agente))
+        raise
+    if erro:
+        return erro, ""
+    try:
+        response = await pandas_agent.ainvoke({"input": pergunta}, config={"callbacks": callbacks})
+    except Exception as e:
+        if propagar_transitorios and erro_transitorio(e):
+            raise
+        return _tratar_erro_agente(e)
+    finally:
+        _liberar_agente(pandas_agent, agente)
+    return _separar_resposta(response)
+
+def _entrada_ferramenta(acao):
+    """Texto enviado à ferramenta (no modo ferramentas os argumentos chegam como dicionário)."""
+    entrada = acao.tool_input
+    if isinstance(entrada, dict):
+        entrada = entrada.get("query", next(iter(entrada.values()), ""))
+    return str(entrada)
+
+def _texto_saida(saida):
+    """Texto da resposta final; modelos de chat podem devolver uma lista de partes."""
+    if isinstance(saida, list):
+        return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in saida)
+    return str(saida)
+
+def _separar_resposta(response):
+    """Separa a resposta final do código executado (raciocínio) na saída do agente."""
+    import re
+    from langchain_experimental.tools.python.tool import sanitize_input
+    from motor_sql import limpar_sql
+
+    resposta_completa = _texto_saida(response.get("output", "Não foi possível obter uma resposta."))
+
+    # O código e as consultas realmente executados vêm dos passos intermediários
+    codigos, consultas_sql = [], []
+    for acao, _ in response.get("intermediate_steps", []):
+        entrada = _entrada_ferramenta(acao)
+        if acao.tool == "consulta_sql":
+            consultas_sql.append(limpar_sql(entrada).rstrip(";"))
+        elif acao.tool == "python_repl_ast":
+            codigos.append(sanitize_input(entrada))
+
+    # Bloco de código citado na resposta (```python...``` ou ```sql...``` no motor SQL):
+    # sai da resposta final e só serve de raciocínio quando nenhuma ferramenta rodou
+    match = re.search(r"```(?:python|sql)\n(.*?)```", resposta_completa, re.DOTALL)
+    resposta_final = resposta_completa.replace(match.group(0), "").strip() if match else resposta_completa
+
+    if consultas_sql:
+        raciocinio = ";\n\n".join(consultas_sql) + ";"
+    elif codigos:
+        raciocinio = "\n\n".join(codigos)
+    elif match:
+        raciocinio = match.group(1).strip()
+    else:
+        raciocinio = "O agente não forneceu o código Python para esta consulta."
+    return resposta_final, raciocinio
+
+def _tratar_erro_agente(e):
+    """Converte uma exceção do agente em (resposta, raciocínio) para o usuário."""
+    error_msg = str(e)
+    print(f"Erro durante a invocação do agente: {error_msg}")
+    
+    # Tratamento para erros de parsing - tenta extrair a resposta mesmo assim
+    if "OUTPUT_PARSING_FAILURE" in error_msg or "parsing error" in error_msg.lower() or "parse-able action" in error_msg.lower() or "Parsing LLM output" in error_msg or "Could not parse LLM output" in error_msg:
+        # Tenta extrair a resposta final do erro
         import re
-        match = re.search(r"```python\n(.*?)```", resposta_completa, re.DOTALL)
         
-        if match:
-            raciocinio = match.group(1).strip()
-            # Remove o bloco de código da resposta final para o usuário
-            resposta_final = resposta_completa.replace(match.group(0), "").strip()
-        else:
-            resposta_final = resposta_completa
-            if not raciocinio:
-                raciocinio = "O agente não forneceu o código Python para esta consulta."
-            
-        return resposta_final, raciocinio
+        # Procura por "Final Answer:" na mensagem de erro
+        final_answer_match = re.search(r"Final Answer:\s*(.+?)(?:\n\n|Resposta:|```|$)", error_msg, re.IGNORECASE | re.DOTALL)
+        if not final_answer_match:
+            # Tenta procurar por "Resposta:"
+            final_answer_match = re.search(r"Resposta:\s*(.+?)(?:\n\n|```|$)", error_msg, re.IGNORECASE | re.DOTALL)
         
-    except Exception as e:
-        error_msg = str(e)
-        print(f"Erro durante a invocação do agente: {error_msg}")
+        # Se não encontrou "Final Answer" ou "Resposta", tenta extrair do output direto
+        if not final_answer_match:
+            # Procura por texto entre backticks (resposta do LLM)
+            output_match = re.search(r"Could not parse LLM output: `(.+?)`", error_msg, re.DOTALL)
+            if output_match:
+                resposta_final = output_match.group(1).strip()
+                # Se é uma resposta simples (saudação), retorna ela
+                if resposta_final and len(resposta_final) < 200:
+                    return resposta_final, ""
         
-        # Tratamento para erros de parsing - tenta extrair a resposta mesmo assim
-        if "OUTPUT_PARSING_FAILURE" in error_msg or "parsing error" in error_msg.lower() or "parse-able action" in error_msg.lower() or "Parsing LLM output" in error_msg or "Could not parse LLM output" in error_msg:
-            # Tenta extrair a resposta final do erro
-            import re
+        if final_answer_match:
+            resposta_final = final_answer_match.group(1).strip()
+            # Remove código markdown e informações técnicas
+            resposta_final = re.sub(r'```python.*?```', '', resposta_final, flags=re.DOTALL).strip()
+            resposta_final = re.sub(r'For troubleshooting.*', '', resposta_final, flags=re.DOTALL).strip()
             
-            # Procura por "Final Answer:" na mensagem de erro
-            final_answer_match = re.search(r"Final Answer:\s*(.+?)(?:\n\n|Resposta:|```|$)", error_msg, re.IGNORECASE | re.DOTALL)
-            if not final_answer_match:
-                # Tenta procurar por "Resposta:"
-                final_answer_match = re.search(r"Resposta:\s*(.+?)(?:\n\n|```|$)", error_msg, re.IGNORECASE | re.DOTALL)
-            
-            # Se não encontrou "Final Answer" ou "Resposta", tenta extrair do output direto
-            if not final_answer_match:
-                # Procura por texto entre backticks (resposta do LLM)
-                output_match = re.search(r"Could not parse LLM output: `(.+?)`", error_msg, re.DOTALL)
-                if output_match:
-                    resposta_final = output_match.group(1).strip()
-                    # Se é uma resposta simples (saudação), retorna ela
-                    if resposta_final and len(resposta_final) < 200:
-                        return resposta_final, ""
-            
-            if final_answer_match:
-                resposta_final = final_answer_match.group(1).strip()
-                # Remove código markdown e informações técnicas
-                resposta_final = re.sub(r'```python.*?```', '', resposta_final, flags=re.DOTALL).strip()
-                resposta_final = re.sub(r'For troubleshooting.*', '', resposta_final, flags=re.DOTALL).strip()
-                
-                # Tenta extrair o código executado
-                raciocinio = ""
-                # Procura por "Action Input:" que contém o código
-                action_input_match = re.search(r"Action Input:\s*(.+?)(?:\n|Observation:|Thought:|$)", error_msg, re.DOTALL)
-                if action_input_match:
-                    raciocinio = action_input_match.group(1).strip()
+            # Tenta extrair o código executado
+            raciocinio = ""
+            # Procura por "Action Input:" que contém o código
+            action_input_match = re.search(r"Action Input:\s*(.+?)(?:\n|Observation:|Thought:|$)", error_msg, re.DOTALL)
+            if action_input_match:
+                raciocinio = action_input_match.group(1).strip()
+            else:
+                # Tenta extrair de blocos de código markdown
+                code_match = re.search(r"```python\n(.*?)```", error_msg, re.DOTALL)
+                if code_match:
+                    raciocinio = code_match.group(1).strip()
                 else:
-                    # Tenta extrair de blocos de código markdown
-                    code_match = re.search(r"```python\n(.*?)```", error_msg, re.DOTALL)
-                    if code_match:
-                        raciocinio = code_match.group(1).strip()
-                    else:
-                        raciocinio = ""
-                
-                return resposta_final, raciocinio
-        
-        # Tratamento específico para erros de quota da API
-        if "429" in error_msg or "quota" in error_msg.lower() or "insufficient_quota" in error_msg.lower():
-            mensagem = (
-                "⚠️ **Erro de Quota da API OpenAI**\n\n"
-                "A quota da sua conta OpenAI foi excedida.\n\n"
-                "**💡 Soluções GRATUITAS:**\n\n"
-                "1. **Ollama (100% Gratuito, roda localmente):**\n"
-                "   - Instale: https://ollama.ai/\n"
-                "   - Baixe um modelo: `ollama pull llama3.2`\n"
-                "   - No arquivo `.env`, adicione: `LLM_PROVIDER=ollama`\n\n"
-                "2. **Google Gemini (Gratuito):**\n"
-                "   - Obtenha API key: https://makersuite.google.com/app/apikey\n"
-                "   - No arquivo `.env`, adicione:\n"
-                "     `LLM_PROVIDER=gemini`\n"
-                "     `GOOGLE_API_KEY=sua_chave_aqui`\n\n"
-                "**Ou resolva o problema da OpenAI:**\n"
-                "- Verifique sua conta: https://platform.openai.com/account/billing\n"
-                "- Adicione créditos ou aguarde o reset do limite"
-            )
-            return mensagem, ""
-        
-        # Tratamento para outros erros de API
-        if "401" in error_msg or "authentication" in error_msg.lower() or "invalid" in error_msg.lower():
-            mensagem = (
-                "🔑 **Erro de Autenticação da API**\n\n"
-                "A chave da API OpenAI é inválida ou expirou. Verifique:\n\n"
-                "1. Se a chave no arquivo `.env` está correta\n"
-                "2. Se a chave não expirou\n"
-                "3. Se a chave tem permissões adequadas\n\n"
-                "Gere uma nova chave em: https://platform.openai.com/api-keys"
-            )
-            return mensagem, ""
-        
-        # Erro genérico
+                    raciocinio = ""
+            
+            return resposta_final, raciocinio
+    
+    # Tratamento específico para erros de quota da API
+    if "429" in error_msg or "quota" in error_msg.lower() or "insufficient_quota" in error_msg.lower():
         mensagem = (
-            f"❌ **Erro ao processar sua pergunta**\n\n"
-            f"Detalhes do erro: {error_msg}\n\n"
-            "Por favor, tente novamente ou verifique sua conexão com a API da OpenAI."
+            "⚠️ **Erro de Quota da API OpenAI**\n\n"
+            "A quota da sua conta OpenAI foi excedida.\n\n"
+            "**💡 Soluções GRATUITAS:**\n\n"
+            "1. **Ollama (100% Gratuito, roda localmente):**\n"
+            "   - Instale: https://ollama.ai/\n"
+            "   - Baixe um modelo: `ollama pull llama3.2`\n"
+            "   - No arquivo `.env`, adicione: `LLM_PROVIDER=ollama`\n\n"
+            "2. **Google Gemini (Gratuito):**\n"
+            "   - Obtenha API key: https://makersuite.google.com/app/apikey\n"
+            "   - No arquivo `.env`, adicione:\n"
+            "     `LLM_PROVIDER=gemini`\n"
+            "     `GOOGLE_API_KEY=sua_chave_aqui`\n\n"
+            "**Ou resolva o problema da OpenAI:**\n"
+            "- Verifique sua conta: https://platform.openai.com/account/billing\n"
+            "- Adicione créditos ou aguarde o reset do limite"
         )
         return mensagem, ""
+    
+    # Tratamento para outros erros de API
+    if "401" in error_msg or "authentication" in error_msg.lower() or "invalid" in error_msg.lower():
+        mensagem = (
+            "🔑 **Erro de Autenticação da API**\n\n"
+            "A chave da API OpenAI é inválida ou expirou. Verifique:\n\n"
+            "1. Se a chave no arquivo `.env` está correta\n"
+            "2. Se a chave não expirou\n"
+            "3. Se a chave tem permissões adequadas\n\n"
+            "Gere uma nova chave em: https://platform.openai.com/api-keys"
+        )
+        return mensagem, ""
+    
+    # Erro genérico
+    mensagem = (
+        f"❌ **Erro ao processar sua pergunta**\n\n"
+        f"Detalhes do erro: {error_msg}\n\n"
+        "Por favor, tente novamente ou verifique sua conexão com a API da OpenAI."
+    )
+    return mensagem, ""
+
+def gerar_resposta_stream(pergunta: str, id_dataset=None):
+    """
+    Versão de `gerar_resposta` que produz eventos enquanto o agente trabalha.
+    
+    Os eventos vêm dos callbacks do LangChain (ver `ColetorEventos`): "pensamento",
+    "codigo", "observacao" e "token" (pedaços da resposta final). O último evento
+    é sempre {"tipo": "final", "resposta": ..., "raciocinio": ...}, com a resposta
+    já tratada como em `gerar_resposta`.
+    
+    Args:
+        pergunta: A pergunta do usuário.
+        id_dataset: Dataset consultado (padrão: o primeiro de DATASETS).
+        
+    Yields:
+        Dicionários de evento.
+    """
+    coletor = ColetorEventos()
+    fila = coletor.fila
+    cancelamento = threading.Event()
+
+    def executar():
+        try:
+            resposta, raciocinio = gerar_resposta(pergunta, callbacks=[coletor], cancelamento=cancelamento,
+                                                  id_dataset=id_dataset)
+        except concurrent.futures.CancelledError:
+            return
+        except Exception as e:
+            resposta, raciocinio = f"❌ **Erro inesperado:** {str(e)}", ""
+        fila.put({"tipo": "final", "resposta": resposta, "raciocinio": raciocinio})
+
+    threading.Thread(target=executar, name="agente-stream", daemon=True).start()
+    concluido = False
+    try:
+        while True:
+            evento = fila.get()
+            yield evento
+            if evento["tipo"] == "final":
+                concluido = True
+                break
+    finally:
+        # Gerador fechado antes do fim (o usuário saiu ou enviou outra pergunta)
+        if not concluido:
+            cancelamento.set()
+
+# Configuração do módulo (caches, agendador, roteador...) depois das importações
+tempos_inicializacao.registrar("configuracao", time.perf_counter() - _inicio_configuracao)
 
 # Exemplo de uso (opcional, para testes rápidos)
 if __name__ == "__main__":
@@ -0,0 +1,387 @@
+"""
+Cubo de agregados materializado sobre as colunas de dimensão do dataset.
+
+A maioria das perguntas é um group-by sobre poucas dimensões (etapa, status,
+executor, formulário, serviço, fluxo, statusFluxo e o mês de dataCriacao ou
+de dataExeFim) com as medidas tempoTotal, tempoInicioFim e tempoParaIniciar.
+O cubo guarda, para cada dimensão isolada e para cada par de dimensões,
+contagem, soma, mínimo, máximo e percentis (p50/p90/p95) de cada medida.
+Os percentis vêm de esboços mescláveis com erro relativo limitado, o que
+permite atualizar o cubo com linhas novas sem reprocessar o DataFrame.
+
+No layout EAV do dataset cada etapa repete o cabeçalho (executor, status,
+tempos...) em uma linha por campo de formulário. Com a coluna `seqEtapa`, o
+cubo agrega uma linha por etapa (a primeira, como `TabelasNormalizadas.etapas`),
+e as atualizações ignoram linhas de etapas já contadas; sem ela, cada linha
+conta uma vez.
+
+O agente recebe a tabela (`cubo`, alguns milhares de linhas) e a função
+`agregar(por, medida)`.
+"""
+import itertools
+import math
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+DIMENSOES = ("etapa", "status", "executor", "formulario", "servico", "fluxo", "statusFluxo",
+             "mesCriacao", "mesExeFim")
+MEDIDAS = ("tempoTotal", "tempoInicioFim", "tempoParaIniciar")
+# Dimensões de mês derivadas das colunas de data
+MESES = {"mesCriacao": "dataCriacao", "mesExeFim": "dataExeFim"}
+PERCENTIS = (0.5, 0.9, 0.95)
+# Erro relativo máximo dos percentis
+ERRO_RELATIVO = 0.01
+# Maior combinação de dimensões materializada (1 = só dimensões isoladas, 2 = pares)
+MAX_DIMENSOES = 2
+# Chave da etapa: as linhas de uma mesma etapa contam uma vez
+CHAVE_ETAPA = "seqEtapa"
+# Versão do formato gravado por `salvar` (cubos de outro formato são reconstruídos)
+FORMATO = 2
+
+_GAMA = (1 + ERRO_RELATIVO) / (1 - ERRO_RELATIVO)
+_LOG_GAMA = math.log(_GAMA)
+# Desloca os índices dos baldes para que valores positivos fiquem > 0, negativos < 0 e zero = 0
+_DESLOCAMENTO = 2000
+# Chaves estáveis: 21 bits por código de dimensão e, nos esboços, 14 bits para o balde
+_BITS_CODIGO = 21
+_MASCARA_CODIGO = (1 << _BITS_CODIGO) - 1
+_BITS_BALDE = 14
+_DESLOCAMENTO_ESBOCO = 1 << (_BITS_BALDE - 1)
+
+
+def _baldes(valores):
+    """Índice do balde de cada valor, monotônico no valor (como no DDSketch)."""
+    valores = np.asarray(valores, dtype="float64")
+    absolutos = np.abs(valores)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        indices = np.ceil(np.log(absolutos) / _LOG_GAMA) + _DESLOCAMENTO
+    indices = np.where(absolutos > 0, np.clip(indices, 1, _DESLOCAMENTO_ESBOCO - 1), 0) * np.sign(valores)
+    return indices.astype("int32")
+
+
+def _valor_balde(indices):
+    """Valor representativo de cada balde (erro relativo ≤ ERRO_RELATIVO)."""
+    indices = np.asarray(indices, dtype="float64")
+    valores = 2 * _GAMA ** (np.abs(indices) - _DESLOCAMENTO) / (_GAMA + 1)
+    return np.where(indices == 0, 0.0, np.sign(indices) * valores)
+
+
+def _mes(valor):
+    return f"{int(valor) // 100}-{int(valor) % 100:02d}" if valor == valor else valor
+
+
+def _agrupar(chave, tamanho):
+    """
+    Como np.unique(chave, return_inverse=True, return_counts=True) para chaves em
+    [0, tamanho); quando o espaço de chaves é pequeno usa contagem direta, sem ordenar.
+    """
+    if tamanho > 2 * len(chave) + 1024:
+        return np.unique(chave, return_inverse=True, return_counts=True)
+    contagens = np.bincount(chave, minlength=tamanho)
+    grupos = np.flatnonzero(contagens)
+    mapa = np.empty(tamanho, dtype="int64")
+    mapa[grupos] = np.arange(len(grupos))
+    return grupos, mapa[chave], contagens[grupos]
+
+
+def _cuboides():
+    for tamanho in range(1, MAX_DIMENSOES + 1):
+        yield from itertools.combinations(DIMENSOES, tamanho)
+
+
+class CuboAgregados:
+    """
+    Use `CuboAgregados.construir(df)`; depois `atualizar(novas_linhas)` mescla
+    linhas acrescentadas ao dataset, e `tabela` / `agregar` consultam o cubo.
+
+    Internamente cada valor de dimensão tem um código inteiro estável (novos
+    valores recebem o próximo código), e cada combinação do cuboide vira uma
+    chave int64 com os códigos lado a lado; assim mesclar linhas novas é uma
+    união de índices inteiros, sem alinhar MultiIndex de texto.
+    """
+
+    def __init__(self):
+        self._codigos = {d: {} for d in DIMENSOES}  # dimensão -> valor -> código
+        self._valores = {d: [] for d in DIMENSOES}  # dimensão -> valores na ordem dos códigos
+        self._estatisticas = {}  # cuboide -> DataFrame indexado pela chave do cuboide
+        self._esbocos = {}  # (cuboide, medida) -> Series de contagens indexada por chave + balde
+        self.linhas = 0
+        self._etapas = np.empty(0, dtype="int64")  # seqEtapa já agregadas, ordenadas
+        self.formato = FORMATO
+        self._resumos = {}
+        self._tabela = None
+
+    @classmethod
+    def construir(cls, df):
+        return cls().atualizar(df)
+
+    def copiar(self):
+        """
+        Cópia que pode receber `atualizar` sem alterar este cubo (ainda em uso por
+        perguntas em andamento). As tabelas de estatísticas e esboços não são
+        alteradas no lugar, então só os dicionários são copiados.
+        """
+        copia = CuboAgregados()
+        copia._codigos = {d: dict(c) for d, c in self._codigos.items()}
+        copia._valores = {d: list(v) for d, v in self._valores.items()}
+        copia._estatisticas = dict(self._estatisticas)
+        copia._esbocos = dict(self._esbocos)
+        copia.linhas = self.linhas
+        copia._etapas = self._etapas
+        return copia
+
+    def _uma_por_etapa(self, linhas):
+        """Primeira linha de cada etapa ainda fora do cubo (todas as linhas sem a coluna seqEtapa)."""
+        if CHAVE_ETAPA not in linhas.columns:
+            return linhas
+        chaves = linhas[CHAVE_ETAPA]
+        novas = ~chaves.duplicated().to_numpy()
+        valores = chaves.to_numpy()
+        if len(self._etapas):
+            novas &= ~np.isin(valores, self._etapas)
+        self._etapas = np.union1d(self._etapas, valores[novas])
+        return linhas[novas]
+
+    def _codificar(self, df):
+        """Códigos estáveis de cada dimensão; valores ausentes têm código próprio e os meses viram AAAA-MM."""
+        codificadas = {}
+        for dimensao in DIMENSOES:
+            if dimensao in MESES:
+                datas = pd.to_datetime(df[MESES[dimensao]], errors="coerce")
+                serie = datas.dt.year * 100 + datas.dt.month
+            else:
+                serie = df[dimensao]
+            codigos, valores = pd.factorize(serie, use_na_sentinel=False)
+            conhecidos, lista = self._codigos[dimensao], self._valores[dimensao]
+            mapa = np.empty(len(valores), dtype="int64")
+            for posicao, valor in enumerate(np.asarray(valores, dtype=object)):
+                if dimensao in MESES:
+                    valor = _mes(valor)
+                chave = None if pd.isna(valor) else valor
+                if chave not in conhecidos:
+                    if len(lista) > _MASCARA_CODIGO:
+                        raise ValueError(f"Valores distintos demais em {dimensao} para o cubo")
+                    conhecidos[chave] = len(lista)
+                    lista.append(valor)
+                mapa[posicao] = conhecidos[chave]
+            codificadas[dimensao] = mapa[codigos]
+        return codificadas
+
+    def _parciais(self, df):
+        """Estatísticas e esboços só das linhas de `df`, nas chaves estáveis do cubo."""
+        dimensoes = self._codificar(df)
+        medidas = {m: pd.to_numeric(df[m], errors="coerce").to_numpy(dtype="float64") for m in MEDIDAS}
+        baldes = {}
+        for medida, valores in medidas.items():
+            validos = ~np.isnan(valores)
+            distintos, codigos = np.unique(_baldes(valores[validos]), return_inverse=True)
+            baldes[medida] = (validos, distintos, codigos)
+
+        estatisticas, esbocos = {}, {}
+        for cuboide in _cuboides():
+            # Chave densa só para agrupar estas linhas; depois vira a chave estável do cuboide
+            chave = np.zeros(len(df), dtype="int64")
+            tamanho = 1
+            for dimensao in cuboide:
+                cardinalidade = len(self._valores[dimensao])
+                chave = chave * cardinalidade + dimensoes[dimensao]
+                tamanho *= cardinalidade
+            grupos, inversa, tamanhos = _agrupar(chave, tamanho)
+            estavel = np.zeros(len(grupos), dtype="int64")
+            resto = grupos
+            for deslocamento, dimensao in enumerate(reversed(cuboide)):
+                cardinalidade = len(self._valores[dimensao])
+                estavel |= (resto % cardinalidade) << (_BITS_CODIGO * deslocamento)
+                resto = resto // cardinalidade
+
+            colunas = {"n": tamanhos}
+            for medida, valores in medidas.items():
+                validos, distintos, codigos_balde = baldes[medida]
+                grupo = inversa[validos]
+                contagem = np.bincount(grupo, minlength=len(grupos))
+                minimo = np.full(len(grupos), np.inf)
+                maximo = np.full(len(grupos), -np.inf)
+                np.minimum.at(minimo, grupo, valores[validos])
+                np.maximum.at(maximo, grupo, valores[validos])
+                colunas[f"{medida}_count"] = contagem
+                colunas[f"{medida}_sum"] = np.bincount(grupo, weights=valores[validos], minlength=len(grupos))
+                colunas[f"{medida}_min"] = np.where(contagem > 0, minimo, np.nan)
+                colunas[f"{medida}_max"] = np.where(contagem > 0, maximo, np.nan)
+
+                # Esboço: contagem de valores por (grupo, balde)
+                pares, _, quantidades = _agrupar(grupo * len(distintos) + codigos_balde, len(grupos) * len(distintos))
+                balde = distintos[pares % len(distintos)].astype("int64") + _DESLOCAMENTO_ESBOCO
+                indice = (estavel[pares // len(distintos)] << _BITS_BALDE) | balde
+                esbocos[(cuboide, medida)] = pd.Series(quantidades, index=indice, name="contagem")
+            estatisticas[cuboide] = pd.DataFrame(colunas, index=estavel)
+        return estatisticas, esbocos
+
+    def atualizar(self, novas_linhas):
+        """Mescla as linhas novas (mesmo esquema do dataset) sem reprocessar as antigas."""
+        novas_linhas = self._uma_por_etapa(novas_linhas)
+        if len(novas_linhas) == 0:
+            return self
+        estatisticas, esbocos = self._parciais(novas_linhas)
+        for cuboide, extra in estatisticas.items():
+            atual = self._estatisticas.get(cuboide)
+            if atual is None:
+                self._estatisticas[cuboide] = extra.sort_index()
+                continue
+            # Índices ordenados: alinha as duas partes por busca binária na união das chaves
+            chaves = np.union1d(atual.index.to_numpy(), extra.index.to_numpy())
+            pos_atual = np.searchsorted(chaves, atual.index.to_numpy())
+            pos_extra = np.searchsorted(chaves, extra.index.to_numpy())
+            colunas = {}
+            for coluna in atual.columns:
+                if coluna.endswith(("_min", "_max")):
+                    juntos = np.full(len(chaves), np.nan)
+                    juntos[pos_atual] = atual[coluna].to_numpy()
+                    combinar = np.fmin if coluna.endswith("_min") else np.fmax
+                    juntos[pos_extra] = combinar(juntos[pos_extra], extra[coluna].to_numpy())
+                else:
+                    juntos = np.zeros(len(chaves), dtype=atual[coluna].dtype)
+                    juntos[pos_atual] = atual[coluna].to_numpy()
+                    juntos[pos_extra] += extra[coluna].to_numpy()
+                colunas[coluna] = juntos
+            self._estatisticas[cuboide] = pd.DataFrame(colunas, index=chaves)
+        for chave, extra in esbocos.items():
+            atual = self._esbocos.get(chave)
+            if atual is None:
+                self._esbocos[chave] = extra.sort_index()
+                continue
+            indice = np.union1d(atual.index.to_numpy(), extra.index.to_numpy())
+            contagens = np.zeros(len(indice), dtype="int64")
+            contagens[np.searchsorted(indice, atual.index.to_numpy())] = atual.to_numpy()
+            contagens[np.searchsorted(indice, extra.index.to_numpy())] += extra.to_numpy()
+            self._esbocos[chave] = pd.Series(contagens, index=indice, name="contagem")
+        self.linhas += len(novas_linhas)
+        self._resumos = {}
+        self._tabela = None
+        return self
+
+    def _indice(self, cuboide, chaves):
+        """Converte chaves estáveis de volta nos valores das dimensões."""
+        niveis = []
+        for deslocamento, dimensao in enumerate(reversed(cuboide)):
+            codigos = (chaves >> (_BITS_CODIGO * deslocamento)) & _MASCARA_CODIGO
+            niveis.insert(0, np.asarray(self._valores[dimensao], dtype=object)[codigos])
+        if len(cuboide) == 1:
+            return pd.Index(niveis[0], name=cuboide[0])
+        return pd.MultiIndex.from_arrays(niveis, names=list(cuboide))
+
+    def _percentis(self, cuboide, medida, chaves):
+        """Percentis de `medida` como arrays alinhados a `chaves` (NaN onde não há valores)."""
+        contagens = self._esbocos[(cuboide, medida)]
+        # O índice está ordenado e a chave do grupo ocupa os bits altos: cada grupo é um
+        # trecho contíguo, e o percentil p é o primeiro balde cujo acumulado alcança
+        # (acumulado antes do grupo + p * total do grupo)
+        indice = contagens.index.to_numpy()
+        grupos = indice >> _BITS_BALDE
+        valores = contagens.to_numpy()
+        acumulado = np.cumsum(valores)
+        inicios = np.r_[0, np.flatnonzero(np.diff(grupos)) + 1] if len(grupos) else np.array([], dtype="int64")
+        totais = np.add.reduceat(valores, inicios) if len(inicios) else valores[:0]
+        anteriores = acumulado[inicios] - valores[inicios]
+        baldes = (indice & ((1 << _BITS_BALDE) - 1)) - _DESLOCAMENTO_ESBOCO
+        posicoes = np.searchsorted(chaves, grupos[inicios])
+        resultado = {}
+        for p in PERCENTIS:
+            percentil = np.full(len(chaves), np.nan)
+            percentil[posicoes] = _valor_balde(baldes[np.searchsorted(acumulado, anteriores + p * totais, side="left")])
+            resultado[f"{medida}_p{int(p * 100)}"] = percentil
+        return resultado
+
+    def _resumo(self, cuboide):
+        if cuboide in self._resumos:
+            return self._resumos[cuboide]
+        agregado = self._estatisticas[cuboide]
+        chaves = agregado.index.to_numpy()
+        colunas = {"n": agregado["n"].to_numpy().astype("int64")}
+        for medida in MEDIDAS:
+            contagem = agregado[f"{medida}_count"].to_numpy()
+            soma = agregado[f"{medida}_sum"].to_numpy()
+            with np.errstate(divide="ignore", invalid="ignore"):
+                colunas[f"{medida}_media"] = np.where(contagem > 0, soma / contagem, np.nan)
+            colunas[f"{medida}_soma"] = soma
+            colunas[f"{medida}_min"] = agregado[f"{medida}_min"].to_numpy()
+            colunas[f"{medida}_max"] = agregado[f"{medida}_max"].to_numpy()
+            colunas.update(self._percentis(cuboide, medida, chaves))
+        resumo = pd.DataFrame(colunas, index=self._indice(cuboide, chaves))
+        self._resumos[cuboide] = resumo
+        return resumo
+
+    @property
+    def tabela(self):
+        """
+        Todas as combinações em um só DataFrame: a coluna `dimensoes` diz quais
+        dimensões definem a linha (ex.: "etapa" ou "etapa,executor"); as demais
+        colunas de dimensão ficam vazias.
+        """
+        if self._tabela is None:
+            partes = []
+            for cuboide in self._estatisticas:
+                parte = self._resumo(cuboide).reset_index()
+                parte.insert(0, "dimensoes", ",".join(cuboide))
+                partes.append(parte)
+            tabela = pd.concat(partes, ignore_index=True)
+            colunas = ["dimensoes", *DIMENSOES]
+            self._tabela = tabela[colunas + [c for c in tabela.columns if c not in colunas]]
+        return self._tabela
+
+    def agregar(self, por, medida=None):
+        """
+        Agregados de `medida` (ou de todas) agrupados por uma dimensão ou um par de
+        dimensões, ex.: agregar("etapa", "tempoTotal") ou agregar(["executor", "mesCriacao"]).
+        """
+        por = [por] if isinstance(por, str) else list(por)
+        desconhecidas = [d for d in por if d not in DIMENSOES]
+        if desconhecidas:
+            raise ValueError(f"Dimensões fora do cubo: {desconhecidas}. Disponíveis: {', '.join(DIMENSOES)}")
+        if len(set(por)) > MAX_DIMENSOES:
+            raise ValueError(f"O cubo guarda até {MAX_DIMENSOES} dimensões por consulta; use `df` para mais.")
+        if medida is not None and medida not in MEDIDAS:
+            raise ValueError(f"Medida fora do cubo: {medida}. Disponíveis: {', '.join(MEDIDAS)}")
+        cuboide = tuple(d for d in DIMENSOES if d in por)
+        resumo = self._resumo(cuboide)
+        if medida is not None:
+            resumo = resumo[["n"] + [c for c in resumo.columns if c.startswith(f"{medida}_")]]
+            resumo.columns = ["n"] + [c[len(medida) + 1:] for c in resumo.columns[1:]]
+        return resumo.reorder_levels(por) if len(por) > 1 else resumo
+
+    def salvar(self, caminho):
+        """Grava o cubo (com a tabela materializada) para as próximas cargas da mesma versão dos dados."""
+        self.tabela
+        temporario = f"{caminho}.tmp{os.getpid()}"
+        with open(temporario, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho):
+        """Cubo gravado por `salvar` (arquivo do próprio diretório de cache do processo)."""
+        with open(caminho, "rb") as f:
+            cubo = pickle.load(f)
+        if not isinstance(cubo, cls):
+            raise ValueError(f"{caminho} não contém um cubo de agregados")
+        if getattr(cubo, "formato", 1) != FORMATO:
+            raise ValueError(f"{caminho} é de um formato anterior do cubo")
+        return cubo
+
+    def memoria_bytes(self):
+        return (sum(int(e.memory_usage(deep=True).sum()) for e in self._estatisticas.values())
+                + sum(int(s.memory_usage(deep=True)) for s in self._esbocos.values())
+                + sum(len(v) * 64 for v in self._valores.values()) + self._etapas.nbytes)
+
+    def descricao(self):
+        """Texto curto para o prompt do agente."""
+        return (
+            f"`cubo`: DataFrame pré-calculado ({len(self.tabela)} linhas) com contagem de etapas (n) e, para "
+            f"{', '.join(MEDIDAS)}, media, soma, min, max e percentis p50/p90/p95 (aproximados, erro ≤ "
+            f"{ERRO_RELATIVO:.0%}) agrupados por cada dimensão e por cada par de dimensões: "
+            f"{', '.join(DIMENSOES)} (meses no formato AAAA-MM, de dataCriacao e dataExeFim). "
+            "Prefira `agregar(por, medida)` para essas perguntas, ex.: agregar('etapa', 'tempoTotal') "
+            "ou agregar(['executor', 'mesCriacao']); use `df` para filtros ou outras colunas."
+        )
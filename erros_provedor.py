@@ -0,0 +1,44 @@
+"""
+Classificação dos erros dos provedores de LLM.
+
+Usada pelos clientes (novas tentativas de cada chamada, em `llm_gemini.py`)
+e pelo agendador (pausa do provedor quando o erro persiste), sem que um
+dependa do outro.
+"""
+
+# Status HTTP e trechos de mensagens que indicam falha passageira do provedor
+CODIGOS_TRANSITORIOS = {429, 500, 502, 503, 504}
+TRECHOS_TRANSITORIOS = (
+    "429", "rate limit", "rate_limit", "resource_exhausted", "too many requests",
+    "500 internal", "502", "503", "504", "overloaded", "unavailable", "timed out",
+)
+
+
+def _codigo_http(erro):
+    for candidato in (erro, getattr(erro, "response", None)):
+        for atributo in ("status_code", "code"):
+            valor = getattr(candidato, atributo, None)
+            if isinstance(valor, int) and 100 <= valor < 600:
+                return valor
+    return None
+
+
+def erro_transitorio(erro):
+    """True para erros em que esperar e tentar de novo pode resolver (429, 5xx, timeouts)."""
+    mensagem = str(erro).lower()
+    if "insufficient_quota" in mensagem:
+        # OpenAI sem créditos: a espera não resolve
+        return False
+    codigo = _codigo_http(erro)
+    if codigo is not None:
+        return codigo in CODIGOS_TRANSITORIOS
+    return any(trecho in mensagem for trecho in TRECHOS_TRANSITORIOS)
+
+
+def espera_sugerida(erro):
+    """Valor do cabeçalho Retry-After da resposta de erro, se houver."""
+    cabecalhos = getattr(getattr(erro, "response", None), "headers", None) or {}
+    try:
+        return float(cabecalhos.get("retry-after"))
+    except (TypeError, ValueError, AttributeError):
+        return None
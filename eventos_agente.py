@@ -0,0 +1,84 @@
+"""
+Coleta, via callbacks do LangChain, os eventos de uma execução do agente
+(pensamentos, código gerado, observações e tokens da resposta final) para
+que a interface possa exibi-los enquanto o agente ainda está trabalhando.
+"""
+import queue
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+MARCADOR_RESPOSTA_FINAL = "Final Answer:"
+
+
+class ColetorEventos(BaseCallbackHandler):
+    """
+    Converte callbacks do agente em eventos colocados em uma fila.
+
+    Cada evento é um dicionário com a chave "tipo":
+      - "pensamento": texto do raciocínio antes de uma ação
+      - "codigo": código Python enviado à ferramenta
+      - "observacao": saída da execução do código
+      - "token": pedaço da resposta final, à medida que o LLM o gera
+
+    No agente ReAct a resposta final é o texto depois de "Final Answer:"; no modo
+    ferramentas, o texto que o modelo gera (as chamadas de ferramentas vêm à parte).
+    """
+
+    def __init__(self, fila=None):
+        self.fila = fila if fila is not None else queue.Queue()
+        self._ferramentas = False
+        self._texto_llm = ""
+        self._inicio_final = None
+        self._emitido = 0
+
+    def _emitir(self, tipo, texto):
+        self.fila.put({"tipo": tipo, "texto": texto})
+
+    def on_llm_start(self, serialized, prompts, **kwargs: Any) -> None:
+        self._texto_llm = ""
+        self._inicio_final = None
+        self._emitido = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs: Any) -> None:
+        self.on_llm_start(serialized, [], **kwargs)
+        self._ferramentas = bool((kwargs.get("invocation_params") or {}).get("tools"))
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if self._ferramentas:
+            if token:
+                self._emitir("token", token)
+            return
+        # Só repassa o que vem depois de "Final Answer:"; o restante é o pensamento/ação do ReAct
+        self._texto_llm += token
+        if self._inicio_final is None:
+            posicao = self._texto_llm.find(MARCADOR_RESPOSTA_FINAL)
+            if posicao < 0:
+                return
+            self._inicio_final = self._emitido = posicao + len(MARCADOR_RESPOSTA_FINAL)
+        novo = self._texto_llm[self._emitido:]
+        if self._emitido == self._inicio_final:
+            # Descarta o espaço logo após o marcador
+            self._emitido += len(novo) - len(novo.lstrip())
+            novo = novo.lstrip()
+        if novo:
+            self._emitido += len(novo)
+            self._emitir("token", novo)
+
+    def on_agent_action(self, action, **kwargs: Any) -> None:
+        if hasattr(action, "tool_call_id"):
+            # Chamada nativa de ferramenta: o pensamento é o texto que acompanha a chamada
+            mensagens = getattr(action, "message_log", None) or []
+            pensamento = "".join(str(m.content) for m in mensagens if isinstance(m.content, str)).strip()
+        else:
+            log = getattr(action, "log", "") or ""
+            pensamento = log.split("Action:")[0].replace("Thought:", "").strip()
+        if pensamento:
+            self._emitir("pensamento", pensamento)
+        entrada = action.tool_input
+        if isinstance(entrada, dict):
+            entrada = entrada.get("query", str(entrada))
+        self._emitir("codigo", str(entrada))
+
+    def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        self._emitir("observacao", str(getattr(output, "content", output)))
@@ -0,0 +1,214 @@
+"""
+Ferramenta `python_repl_ast` usada pelo agente, com execução opcional no pool
+sandbox, saídas reaproveitadas do cache de execuções e observações grandes
+resumidas antes de voltar ao LLM.
+"""
+import ast
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from langchain_core.callbacks.manager import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from langchain_core.runnables.config import run_in_executor
+from langchain_experimental.tools.python.tool import PythonAstREPLTool, sanitize_input
+
+from cache_execucoes import motivo_codigo, saida_com_erro
+from observacoes import PREFIXO_RESUMO, definicao_referencia, limitar_observacao, nome_referencia
+from sandbox import executar_codigo
+
+# Referências a resultados grandes lembradas por ferramenta
+MAX_REFERENCIAS = 256
+_LOCK_REFERENCIAS = threading.Lock()
+# No pool: execuções do agente (perguntas) com atribuições lembradas e atribuições por execução
+MAX_CONVERSAS = 64
+MAX_ATRIBUICOES = 32
+_LOCK_ATRIBUICOES = threading.Lock()
+
+
+def _nomes_lidos(instrucoes):
+    return {no.id for instrucao in instrucoes for no in ast.walk(instrucao)
+            if isinstance(no, ast.Name) and isinstance(no.ctx, ast.Load)}
+
+
+def _nomes_definidos(instrucoes):
+    """Nomes atribuídos, importados ou definidos (funções e classes) pelas instruções."""
+    nomes = set()
+    for instrucao in instrucoes:
+        for no in ast.walk(instrucao):
+            if isinstance(no, ast.Name) and not isinstance(no.ctx, ast.Load):
+                nomes.add(no.id)
+            elif isinstance(no, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                nomes.add(no.name)
+            elif isinstance(no, (ast.Import, ast.ImportFrom)):
+                nomes.update((alias.asname or alias.name).split(".")[0] for alias in no.names)
+    return nomes
+
+
+class FerramentaPython(PythonAstREPLTool):
+    """
+    Mesma interface e nome da `PythonAstREPLTool` (o prompt do agente não muda),
+    mas, quando há um pool configurado, o código roda em um processo separado.
+
+    No pool cada execução começa com as variáveis originais (`df`...) em um
+    processo qualquer. Para que as variáveis criadas em uma iteração do agente
+    (`filtrado = df[...]`) existam nas seguintes da mesma pergunta, a ferramenta
+    guarda as atribuições de cada execução do agente e as refaz, antes do
+    código, quando ele lê os nomes que elas definem. O processo que executou
+    código que altera os objetos (`df["x"] = ...`) é reciclado, porque a cópia
+    do namespace é rasa.
+
+    Com um `CacheExecucoes`, consultas já executadas nesta versão dos dados
+    (`versao_dados`) devolvem a saída guardada sem rodar de novo. No próprio
+    processo, depois de um código que altera as variáveis originais, a
+    ferramenta deixa de usar o cache: as saídas guardadas são dos dados intactos.
+
+    Com `max_caracteres_observacao`, saídas maiores voltam como resumo e o
+    resultado completo fica na variável `resultado_<hash>` citada nele. No
+    próprio processo ela é guardada nas variáveis da ferramenta; no pool (ou
+    quando a saída veio do cache) o código que a produziu é executado antes do
+    código que a usa.
+    """
+
+    pool: Any = None
+    cache: Any = None
+    versao_dados: str = ""
+    max_caracteres_observacao: int = 0
+    referencias: Any = None
+    nomes_iniciais: Any = None
+    namespace_alterado: bool = False
+    atribuicoes: Any = None
+
+    @classmethod
+    def substituir(cls, ferramenta, pool=None, cache=None, versao_dados="", max_caracteres_observacao=0):
+        """Cria a ferramenta a partir da `PythonAstREPLTool` construída pelo agente."""
+        return cls(globals=ferramenta.globals, locals=ferramenta.locals,
+                   sanitize_input=ferramenta.sanitize_input, pool=pool, cache=cache, versao_dados=versao_dados,
+                   max_caracteres_observacao=max_caracteres_observacao, referencias=OrderedDict(),
+                   atribuicoes=OrderedDict(),
+                   nomes_iniciais=frozenset(ferramenta.locals or ()) | frozenset(ferramenta.globals or ()))
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> Any:
+        if self.sanitize_input:
+            query = sanitize_input(query)
+        codigo = self._expandir_referencias(query)
+        # Todas as iterações de uma pergunta têm como pai a mesma execução do agente
+        conversa = run_manager.parent_run_id if run_manager is not None else None
+        preambulo = self._preambulo(conversa, codigo)
+        if self.cache is None or self.namespace_alterado or preambulo:
+            saida = self._executar(codigo, preambulo)
+        else:
+            # As variáveis criadas persistem entre execuções (no pool, refeitas pelo preâmbulo):
+            # atribuições e leituras de variáveis criadas antes não vão para o cache
+            saida = self.cache.executar(codigo, self.versao_dados, self._executar, variaveis_persistem=True,
+                                        nomes_iniciais=self.nomes_iniciais)
+        if isinstance(saida, str) and saida.startswith(PREFIXO_RESUMO):
+            self._registrar_referencia(codigo)
+        self._registrar_atribuicoes(conversa, codigo, saida)
+        return saida
+
+    async def _arun(
+        self,
+        query: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+    ) -> Any:
+        # A PythonAstREPLTool não repassa o run_manager, que identifica a pergunta
+        return await run_in_executor(None, self._run, query, run_manager.get_sync() if run_manager else None)
+
+    def _executar(self, codigo, preambulo=""):
+        if self.pool is not None:
+            # O preâmbulo é refeito no mesmo processo: se ele altera os objetos, o processo também é reciclado
+            alteracao = any(motivo_codigo(trecho, False, self.nomes_iniciais) == "alteracao"
+                            for trecho in (preambulo, codigo))
+            return self.pool.executar(codigo, reciclar=alteracao, preambulo=preambulo)
+        alteracao = motivo_codigo(codigo, True, self.nomes_iniciais) == "alteracao"
+        if alteracao:
+            self.namespace_alterado = True
+        # Mesma execução da PythonAstREPLTool, sem limpar a entrada de novo
+        try:
+            saida = executar_codigo(codigo, self.globals, self.locals)
+        except MemoryError as e:
+            saida = "MemoryError: {}".format(str(e))
+        if not self.max_caracteres_observacao:
+            return saida
+        referencia = nome_referencia(codigo)
+        texto = limitar_observacao(saida, self.max_caracteres_observacao, referencia)
+        if not isinstance(saida, str) and texto.startswith(PREFIXO_RESUMO):
+            self.locals[referencia] = saida
+        return texto
+
+    def _registrar_referencia(self, codigo):
+        nome = nome_referencia(codigo)
+        definicao = definicao_referencia(codigo, nome)
+        if definicao is None:
+            return
+        with _LOCK_REFERENCIAS:
+            self.referencias[nome] = definicao
+            self.referencias.move_to_end(nome)
+            while len(self.referencias) > MAX_REFERENCIAS:
+                self.referencias.popitem(last=False)
+
+    def _registrar_atribuicoes(self, conversa, codigo, saida):
+        """No pool, guarda as instruções do código que definem nomes (sem a expressão final)."""
+        if self.pool is None or saida_com_erro(saida):
+            return
+        try:
+            corpo = ast.parse(codigo).body
+        except SyntaxError:
+            return
+        if corpo and isinstance(corpo[-1], ast.Expr):
+            corpo = corpo[:-1]
+        definidos = _nomes_definidos(corpo)
+        if not definidos:
+            return
+        trecho = ast.unparse(ast.Module(body=corpo, type_ignores=[]))
+        with _LOCK_ATRIBUICOES:
+            atribuicoes = self.atribuicoes.setdefault(conversa, [])
+            self.atribuicoes.move_to_end(conversa)
+            atribuicoes.append((definidos, _nomes_lidos(corpo), trecho))
+            del atribuicoes[:-MAX_ATRIBUICOES]
+            while len(self.atribuicoes) > MAX_CONVERSAS:
+                self.atribuicoes.popitem(last=False)
+
+    def _preambulo(self, conversa, codigo):
+        """Atribuições anteriores da pergunta de que o código depende, na ordem em que foram feitas."""
+        if self.pool is None:
+            return ""
+        with _LOCK_ATRIBUICOES:
+            atribuicoes = list(self.atribuicoes.get(conversa, ()))
+        if not atribuicoes:
+            return ""
+        try:
+            necessarios = _nomes_lidos(ast.parse(codigo).body)
+        except SyntaxError:
+            return ""
+        trechos = []
+        for definidos, lidos, trecho in reversed(atribuicoes):
+            if definidos & necessarios:
+                trechos.append(trecho)
+                necessarios |= lidos
+        return "\n".join(reversed(trechos))
+
+    def _expandir_referencias(self, codigo):
+        """Antepõe ao código a definição das referências usadas que não existem no namespace."""
+        if not self.referencias:
+            return codigo
+        try:
+            nomes = {no.id for no in ast.walk(ast.parse(codigo)) if isinstance(no, ast.Name)}
+        except SyntaxError:
+            return codigo
+        with _LOCK_REFERENCIAS:
+            definicoes = [self.referencias[nome] for nome in sorted(nomes)
+                          if nome in self.referencias and (self.pool is not None or nome not in self.locals)]
+        if not definicoes:
+            return codigo
+        return "\n".join(definicoes + [codigo])
+
+    def encerrar(self):
+        """Libera os processos do pool, se houver."""
+        if self.pool is not None:
+            self.pool.encerrar()
+
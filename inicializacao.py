@@ -0,0 +1,52 @@
+"""
+Tempos da inicialização do processo, por fase.
+
+Importado logo no início do `chatbot`: o relógio começa na primeira
+importação deste módulo. Cada fase (importações, carga dos dados, estruturas
+derivadas, LLM, agente, primeira renderização da interface...) registra a
+sua duração e o instante em que terminou, para acompanhar regressões no
+tempo de partida a frio (`/saude` na API e `benchmarks/inicializacao.py`).
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+INICIO_PROCESSO = time.perf_counter()
+
+
+class TemposInicializacao:
+    """
+    Duração de cada fase da inicialização.
+
+    Args:
+        inicio: Instante (perf_counter) que conta como o início do processo.
+    """
+
+    def __init__(self, inicio=INICIO_PROCESSO):
+        self.inicio = inicio
+        self._lock = threading.Lock()
+        self._fases = {}  # fase -> (duração, instante do fim desde o início)
+
+    def registrar(self, fase, duracao_s, substituir=True):
+        """Grava a duração da fase (com `substituir=False`, só a primeira medição vale)."""
+        with self._lock:
+            if not substituir and fase in self._fases:
+                return
+            self._fases[fase] = (duracao_s, time.perf_counter() - self.inicio)
+        print(f"Inicialização: {fase} em {duracao_s * 1000:.0f} ms")
+
+    @contextmanager
+    def medir(self, fase, substituir=True):
+        """Mede o bloco como a fase `fase` (só quando ele termina sem exceção)."""
+        inicio = time.perf_counter()
+        yield
+        self.registrar(fase, time.perf_counter() - inicio, substituir)
+
+    def resumo(self):
+        """{fase: {"duracao_ms", "pronto_em_ms"}} na ordem em que as fases terminaram."""
+        with self._lock:
+            fases = sorted(self._fases.items(), key=lambda item: item[1][1])
+        return {
+            fase: {"duracao_ms": round(duracao * 1000, 1), "pronto_em_ms": round(fim * 1000, 1)}
+            for fase, (duracao, fim) in fases
+        }
@@ -0,0 +1,789 @@
+"""
+LLM do Google Gemini (google-generativeai) para o LangChain.
+
+Um único `GenerativeModel` (e, com ele, o cliente HTTP/gRPC) é criado por
+instância e reaproveitado em todas as chamadas; a configuração de geração é
+montada uma vez e a lista de modelos disponíveis é consultada no máximo uma
+vez por processo. Implementa chamada simples, streaming, versão assíncrona e
+lotes (os prompts de um `generate` rodam em paralelo), com novas tentativas
+com espera aleatória em erros 429/5xx.
+
+Com `cache_contexto`, a parte fixa do prompt do agente (registrada com
+`usar_cache_contexto`) é enviada uma vez ao cache de contexto do Gemini e as
+chamadas levam só o restante; o provedor cobra menos e processa menos tokens
+por chamada. Se o cache não puder ser criado (ex.: prefixo abaixo do mínimo de
+tokens do modelo), o prompt inteiro é enviado, como antes.
+
+`ChatGemini` é o modelo de chat com chamada de ferramentas (agente no modo
+"ferramentas") sobre o mesmo cliente, com as mesmas novas tentativas e o
+mesmo cache de contexto: a mensagem de sistema e as declarações das
+ferramentas, fixas para um agente, vão para o cache, e as chamadas levam só
+a conversa.
+"""
+import asyncio
+import datetime
+import json
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.llms import LLM
+from langchain_core.messages import AIMessage, AIMessageChunk, SystemMessage, ToolMessage
+from langchain_core.outputs import (
+    ChatGeneration, ChatGenerationChunk, ChatResult, Generation, GenerationChunk, LLMResult,
+)
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from erros_provedor import erro_transitorio
+
+MODELOS_SUGERIDOS = "gemini-2.5-flash, gemini-2.0-flash, ou gemini-2.5-pro"
+# Combinações de instrução de sistema e ferramentas (um agente por dataset) com modelo e cache guardados
+MAX_MODELOS_CHAT = 8
+# Campos de JSON Schema que as declarações de função do Gemini aceitam
+CAMPOS_ESQUEMA = {"type", "description", "properties", "required", "items", "enum", "format", "nullable"}
+
+_lock_configuracao = threading.Lock()
+_configuracao_atual = None
+_modelos_em_cache = {}
+
+
+def configurar_cliente(api_key, transport=None, api_endpoint=None):
+    """
+    Chama `genai.configure` apenas quando a configuração muda. A biblioteca guarda
+    um cliente global; reconfigurá-lo a cada chamada descartaria as conexões abertas.
+    """
+    global _configuracao_atual
+    import google.generativeai as genai
+
+    configuracao = (api_key, transport, api_endpoint)
+    with _lock_configuracao:
+        if configuracao != _configuracao_atual:
+            opcoes = {"api_key": api_key}
+            if transport:
+                opcoes["transport"] = transport
+            if api_endpoint:
+                opcoes["client_options"] = {"api_endpoint": api_endpoint}
+            genai.configure(**opcoes)
+            _configuracao_atual = configuracao
+
+
+def listar_modelos(api_key, ao_evento=None):
+    """Modelos com `generateContent`, consultados uma vez por chave de API e processo."""
+    import google.generativeai as genai
+
+    if api_key not in _modelos_em_cache:
+        if ao_evento is not None:
+            ao_evento("gemini_list_models")
+        _modelos_em_cache[api_key] = [
+            m.name.replace("models/", "") for m in genai.list_models()
+            if "generateContent" in m.supported_generation_methods
+        ]
+    return _modelos_em_cache[api_key]
+
+
+def _extrair_texto(response):
+    """Texto da resposta, tolerando respostas sem `.text` (ex.: bloqueadas ou só com metadados)."""
+    try:
+        if response.text:
+            return response.text.strip()
+    except (ValueError, AttributeError):
+        pass
+    for candidato in getattr(response, "candidates", None) or []:
+        partes = getattr(getattr(candidato, "content", None), "parts", None) or []
+        texto = "".join(getattr(parte, "text", "") for parte in partes)
+        if texto:
+            return texto.strip()
+    return ""
+
+
+def _uso_tokens(response):
+    uso = getattr(response, "usage_metadata", None)
+    if not uso:
+        return {}
+    return {
+        "prompt_tokens": getattr(uso, "prompt_token_count", 0),
+        "completion_tokens": getattr(uso, "candidates_token_count", 0),
+        "cached_tokens": getattr(uso, "cached_content_token_count", 0),
+    }
+
+
+def _erro_modelo_nao_encontrado(erro):
+    mensagem = str(erro).lower()
+    if "cachedcontent" in mensagem:
+        return False  # cache de contexto removido ou vencido, não o modelo
+    return "404" in mensagem or "not found" in mensagem or "não foi encontrado" in mensagem
+
+
+class _NovasTentativas:
+    """Novas tentativas em erros 429/5xx e tradução de modelo inexistente, comuns aos dois modelos."""
+
+    def _espera(self, tentativa):
+        teto = min(self.espera_max_s, self.espera_base_s * 2 ** (tentativa - 1))
+        return random.uniform(teto / 2, teto)
+
+    def _traduzir_erro(self, erro):
+        """Modelo inexistente vira uma mensagem com os modelos disponíveis."""
+        if not _erro_modelo_nao_encontrado(erro):
+            return erro
+        try:
+            disponiveis = listar_modelos(self.gemini_api_key, self.ao_evento)
+            sugestao = ", ".join(disponiveis[:5])
+        except Exception:
+            sugestao = MODELOS_SUGERIDOS
+        return Exception(
+            f"Modelo '{self.gemini_model_name}' não encontrado. "
+            f"Modelos disponíveis: {sugestao}. Atualize GEMINI_MODEL no arquivo .env"
+        )
+
+    def _com_novas_tentativas(self, funcao):
+        for tentativa in range(1, self.max_tentativas + 1):
+            try:
+                return funcao()
+            except Exception as e:
+                if tentativa == self.max_tentativas or not erro_transitorio(e):
+                    traduzido = self._traduzir_erro(e)
+                    if traduzido is e:
+                        raise
+                    raise traduzido from e
+                time.sleep(self._espera(tentativa))
+
+    async def _com_novas_tentativas_async(self, funcao):
+        for tentativa in range(1, self.max_tentativas + 1):
+            try:
+                return await funcao()
+            except Exception as e:
+                if tentativa == self.max_tentativas or not erro_transitorio(e):
+                    traduzido = self._traduzir_erro(e)
+                    if traduzido is e:
+                        raise
+                    raise traduzido from e
+                await asyncio.sleep(self._espera(tentativa))
+
+
+class GeminiLLM(_NovasTentativas, LLM):
+    """
+    Args:
+        gemini_model_name: Nome do modelo (ex.: gemini-2.5-flash).
+        gemini_api_key: Chave da API.
+        transport: "grpc" (padrão da biblioteca) ou "rest".
+        api_endpoint: Endereço alternativo da API (ex.: servidor local de testes).
+        max_tentativas: Tentativas por chamada em erros 429/5xx.
+        max_paralelo: Prompts de um mesmo lote executados ao mesmo tempo.
+        ao_evento: Função chamada com o nome de eventos (ex.: telemetria).
+        cache_contexto: Envia o prefixo registrado ao cache de contexto do Gemini.
+        cache_ttl_s: Validade de cada cache de contexto (renovado ao expirar).
+    """
+
+    gemini_model_name: str = "gemini-2.5-flash"
+    gemini_api_key: str = ""
+    transport: Optional[str] = None
+    api_endpoint: Optional[str] = None
+    temperature: float = 0
+    max_output_tokens: int = 4096
+    top_p: float = 0.95
+    top_k: int = 40
+    max_tentativas: int = 3
+    espera_base_s: float = 0.5
+    espera_max_s: float = 8.0
+    max_paralelo: int = 4
+    ao_evento: Optional[Callable[[str], Any]] = None
+    cache_contexto: bool = False
+    cache_ttl_s: int = 3600
+
+    model: Any = None
+    generation_config: Any = None
+    # Cache de contexto: prefixo registrado, modelo ligado ao cache e sua validade
+    prefixo_cache: Optional[str] = None
+    modelo_cache: Any = None
+    cache_expira: float = 0.0
+    conteudo_cache: Any = None
+    lock_cache: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        import google.generativeai as genai
+
+        configurar_cliente(self.gemini_api_key, self.transport, self.api_endpoint)
+        self.generation_config = genai.types.GenerationConfig(
+            temperature=self.temperature,
+            max_output_tokens=self.max_output_tokens,
+            top_p=self.top_p,
+            top_k=self.top_k,
+        )
+        self.model = genai.GenerativeModel(self.gemini_model_name, generation_config=self.generation_config)
+        self.lock_cache = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "gemini"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.gemini_model_name, "temperature": self.temperature}
+
+    # --- cache de contexto -----------------------------------------------------
+
+    def usar_cache_contexto(self, prefixo):
+        """Registra a parte fixa dos prompts; o cache é criado na primeira chamada que a usar."""
+        if not self.cache_contexto:
+            return
+        with self.lock_cache:
+            if prefixo != self.prefixo_cache:
+                self._descartar_cache()
+                self.prefixo_cache = prefixo
+
+    def _descartar_cache(self):
+        conteudo, self.conteudo_cache, self.modelo_cache, self.cache_expira = self.conteudo_cache, None, None, 0.0
+        if conteudo is not None:
+            try:
+                conteudo.delete()
+            except Exception:
+                pass  # expira sozinho pelo TTL
+
+    def _modelo_para(self, prompt):
+        """(modelo, conteúdo a enviar): o modelo do cache e o restante do prompt, ou o prompt inteiro."""
+        prefixo = self.prefixo_cache
+        if not prefixo or not prompt.startswith(prefixo):
+            return self.model, prompt
+        with self.lock_cache:
+            if prefixo != self.prefixo_cache:
+                return self.model, prompt
+            # Renova um pouco antes de expirar, para nenhuma chamada usar um cache vencido
+            if self.modelo_cache is None or time.monotonic() > self.cache_expira - 60:
+                self._criar_cache(prefixo)
+            modelo = self.modelo_cache
+        if modelo is None:
+            return self.model, prompt
+        return modelo, prompt[len(prefixo):]
+
+    def _criar_cache(self, prefixo):
+        import google.generativeai as genai
+
+        self._descartar_cache()
+        try:
+            self.conteudo_cache = genai.caching.CachedContent.create(
+                model=f"models/{self.gemini_model_name}",
+                contents=[prefixo],
+                ttl=datetime.timedelta(seconds=self.cache_ttl_s),
+            )
+        except Exception as e:
+            # Não tenta de novo para este prefixo; o prompt inteiro segue funcionando
+            print(f"Cache de contexto do Gemini indisponível, enviando o prompt inteiro: {e}")
+            self.prefixo_cache = None
+            if self.ao_evento is not None:
+                self.ao_evento("gemini_cache_contexto_falha")
+            return
+        self.modelo_cache = genai.GenerativeModel.from_cached_content(
+            self.conteudo_cache, generation_config=self.generation_config)
+        self.cache_expira = time.monotonic() + self.cache_ttl_s
+        if self.ao_evento is not None:
+            self.ao_evento("gemini_cache_contexto_criado")
+
+    def _cache_recusado(self, modelo):
+        """
+        Erro definitivo de uma chamada com o cache (ex.: cache removido no provedor):
+        descarta-o e retorna True para a chamada ser refeita com o prompt inteiro.
+        """
+        if modelo is self.model:
+            return False
+        with self.lock_cache:
+            if self.modelo_cache is modelo:
+                self._descartar_cache()
+        return True
+
+    # --- chamadas -------------------------------------------------------------
+
+    def _gerar(self, prompt):
+        modelo, conteudo = self._modelo_para(prompt)
+        try:
+            response = self._com_novas_tentativas(lambda: modelo.generate_content(conteudo))
+        except Exception as e:
+            if erro_transitorio(e) or not self._cache_recusado(modelo):
+                raise
+            response = self._com_novas_tentativas(lambda: self.model.generate_content(prompt))
+        return _extrair_texto(response) or "Resposta vazia do modelo.", _uso_tokens(response)
+
+    async def _agerar(self, prompt):
+        if self.transport == "rest":
+            # A biblioteca não tem cliente assíncrono REST: usa o síncrono em uma thread
+            return await asyncio.to_thread(self._gerar, prompt)
+        modelo, conteudo = await asyncio.to_thread(self._modelo_para, prompt)
+        try:
+            response = await self._com_novas_tentativas_async(lambda: modelo.generate_content_async(conteudo))
+        except Exception as e:
+            if erro_transitorio(e) or not self._cache_recusado(modelo):
+                raise
+            response = await self._com_novas_tentativas_async(lambda: self.model.generate_content_async(prompt))
+        return _extrair_texto(response) or "Resposta vazia do modelo.", _uso_tokens(response)
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        return self._gerar(prompt)[0]
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        return (await self._agerar(prompt))[0]
+
+    @staticmethod
+    def _resultado(saidas):
+        uso = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        for _, tokens in saidas:
+            for chave in uso:
+                uso[chave] += tokens.get(chave, 0)
+        return LLMResult(generations=[[Generation(text=texto)] for texto, _ in saidas],
+                         llm_output={"token_usage": uso})
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        if len(prompts) == 1:
+            return self._resultado([self._gerar(prompts[0])])
+        with ThreadPoolExecutor(max_workers=min(self.max_paralelo, len(prompts))) as executor:
+            return self._resultado(list(executor.map(self._gerar, prompts)))
+
+    async def _agenerate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        limite = asyncio.Semaphore(self.max_paralelo)
+
+        async def gerar(prompt):
+            async with limite:
+                return await self._agerar(prompt)
+
+        return self._resultado(await asyncio.gather(*(gerar(p) for p in prompts)))
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        # A biblioteca já busca o primeiro pedaço ao abrir o stream; erros até ali
+        # têm nova tentativa, depois disso o texto já foi entregue
+        modelo, conteudo = self._modelo_para(prompt)
+        try:
+            response = self._com_novas_tentativas(lambda: modelo.generate_content(conteudo, stream=True))
+        except Exception as e:
+            if erro_transitorio(e) or not self._cache_recusado(modelo):
+                raise
+            response = self._com_novas_tentativas(lambda: self.model.generate_content(prompt, stream=True))
+        for parte in response:
+            texto = _extrair_texto_parcial(parte)
+            if not texto:
+                continue
+            chunk = GenerationChunk(text=texto)
+            if run_manager:
+                run_manager.on_llm_new_token(texto, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        if self.transport == "rest":
+            async for chunk in super()._astream(prompt, stop, run_manager, **kwargs):
+                yield chunk
+            return
+        modelo, conteudo = await asyncio.to_thread(self._modelo_para, prompt)
+        try:
+            response = await self._com_novas_tentativas_async(
+                lambda: modelo.generate_content_async(conteudo, stream=True))
+        except Exception as e:
+            if erro_transitorio(e) or not self._cache_recusado(modelo):
+                raise
+            response = await self._com_novas_tentativas_async(
+                lambda: self.model.generate_content_async(prompt, stream=True))
+        async for parte in response:
+            texto = _extrair_texto_parcial(parte)
+            if not texto:
+                continue
+            chunk = GenerationChunk(text=texto)
+            if run_manager:
+                await run_manager.on_llm_new_token(texto, chunk=chunk)
+            yield chunk
+
+
+def _extrair_texto_parcial(parte):
+    try:
+        return parte.text
+    except ValueError:
+        # Partes sem texto (ex.: apenas metadados de segurança)
+        return ""
+
+
+def _texto_mensagem(conteudo):
+    if isinstance(conteudo, list):
+        return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in conteudo)
+    return str(conteudo or "")
+
+
+def _conversa(messages):
+    """(instrução de sistema, conteúdos) no formato do Gemini a partir das mensagens do LangChain."""
+    sistema, conteudos, nomes = [], [], {}
+    for mensagem in messages:
+        if isinstance(mensagem, SystemMessage):
+            sistema.append(_texto_mensagem(mensagem.content))
+        elif isinstance(mensagem, AIMessage):
+            texto = _texto_mensagem(mensagem.content)
+            partes = [{"text": texto}] if texto else []
+            for chamada in mensagem.tool_calls:
+                nomes[chamada["id"]] = chamada["name"]
+                partes.append({"function_call": {"name": chamada["name"], "args": chamada["args"]}})
+            if partes:
+                conteudos.append({"role": "model", "parts": partes})
+        elif isinstance(mensagem, ToolMessage):
+            parte = {"function_response": {"name": nomes.get(mensagem.tool_call_id, mensagem.name or ""),
+                                           "response": {"result": _texto_mensagem(mensagem.content)}}}
+            # Os resultados de chamadas paralelas vão juntos, em um só conteúdo
+            anterior = conteudos[-1] if conteudos else None
+            if anterior and anterior["role"] == "user" and "function_response" in anterior["parts"][0]:
+                anterior["parts"].append(parte)
+            else:
+                conteudos.append({"role": "user", "parts": [parte]})
+        else:
+            conteudos.append({"role": "user", "parts": [{"text": _texto_mensagem(mensagem.content)}]})
+    return "\n\n".join(sistema), conteudos
+
+
+def _esquema(esquema):
+    """JSON Schema de uma ferramenta no subconjunto aceito pelo Gemini (sem title, default...)."""
+    resultado = {}
+    for campo, valor in esquema.items():
+        if campo not in CAMPOS_ESQUEMA:
+            continue
+        if campo == "properties":
+            valor = {nome: _esquema(propriedade) for nome, propriedade in valor.items()}
+        elif campo == "items":
+            valor = _esquema(valor)
+        resultado[campo] = valor
+    return resultado
+
+
+def _declaracoes(ferramentas):
+    """Ferramentas no formato da OpenAI (`bind_tools`) como declarações de função do Gemini."""
+    declaracoes = []
+    for ferramenta in ferramentas or []:
+        funcao = ferramenta.get("function", ferramenta)
+        declaracao = {"name": funcao["name"], "description": funcao.get("description", "")}
+        if (funcao.get("parameters") or {}).get("properties"):
+            declaracao["parameters"] = _esquema(funcao["parameters"])
+        declaracoes.append(declaracao)
+    return [{"function_declarations": declaracoes}] if declaracoes else []
+
+
+def _uso_langchain(uso):
+    if not uso:
+        return None
+    return {
+        "input_tokens": uso["prompt_tokens"],
+        "output_tokens": uso["completion_tokens"],
+        "total_tokens": uso["prompt_tokens"] + uso["completion_tokens"],
+        "input_token_details": {"cache_read": uso["cached_tokens"]},
+    }
+
+
+def _partes_resposta(response):
+    """(texto, chamadas de função, finish_reason) do primeiro candidato da resposta."""
+    candidatos = getattr(response, "candidates", None) or []
+    if not candidatos:
+        return "", [], ""
+    candidato = candidatos[0]
+    texto, chamadas = [], []
+    for parte in getattr(getattr(candidato, "content", None), "parts", None) or []:
+        if "function_call" in parte:
+            chamada = type(parte.function_call).to_dict(parte.function_call)
+            chamadas.append({"name": chamada["name"], "args": chamada.get("args") or {},
+                             "id": chamada.get("id") or f"chamada_{uuid.uuid4().hex[:12]}"})
+        elif parte.text:
+            texto.append(parte.text)
+    motivo = candidato.finish_reason
+    return "".join(texto), chamadas, (motivo.name if motivo else "")
+
+
+class ChatGemini(_NovasTentativas, BaseChatModel):
+    """
+    Modelo de chat do Gemini com chamada nativa de ferramentas (`bind_tools`).
+
+    Args:
+        gemini_model_name: Nome do modelo (ex.: gemini-2.5-flash).
+        gemini_api_key: Chave da API.
+        transport: "grpc" (padrão da biblioteca) ou "rest".
+        api_endpoint: Endereço alternativo da API (ex.: servidor local de testes).
+        max_tentativas: Tentativas por chamada em erros 429/5xx.
+        ao_evento: Função chamada com o nome de eventos (ex.: telemetria).
+        cache_contexto: Envia a instrução de sistema e as ferramentas ao cache de contexto do Gemini.
+        cache_ttl_s: Validade de cada cache de contexto (renovado ao expirar).
+    """
+
+    gemini_model_name: str = "gemini-2.5-flash"
+    gemini_api_key: str = ""
+    transport: Optional[str] = None
+    api_endpoint: Optional[str] = None
+    temperature: float = 0
+    max_output_tokens: int = 4096
+    top_p: float = 0.95
+    top_k: int = 40
+    max_tentativas: int = 3
+    espera_base_s: float = 0.5
+    espera_max_s: float = 8.0
+    ao_evento: Optional[Callable[[str], Any]] = None
+    cache_contexto: bool = False
+    cache_ttl_s: int = 3600
+
+    generation_config: Any = None
+    # (instrução de sistema, ferramentas) -> modelo, cache de contexto e validade
+    modelos: Any = None
+    lock_modelos: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        import google.generativeai as genai
+
+        configurar_cliente(self.gemini_api_key, self.transport, self.api_endpoint)
+        self.generation_config = genai.types.GenerationConfig(
+            temperature=self.temperature,
+            max_output_tokens=self.max_output_tokens,
+            top_p=self.top_p,
+            top_k=self.top_k,
+        )
+        self.modelos = OrderedDict()
+        self.lock_modelos = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "gemini-chat"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.gemini_model_name, "temperature": self.temperature}
+
+    def bind_tools(self, tools, **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    # --- modelos e cache de contexto -------------------------------------------
+
+    def _criar_modelo(self, sistema, declaracoes, com_cache):
+        import google.generativeai as genai
+
+        entrada = {"sistema": sistema, "declaracoes": declaracoes, "conteudo": None, "expira": 0.0}
+        if com_cache and sistema:
+            try:
+                entrada["conteudo"] = genai.caching.CachedContent.create(
+                    model=f"models/{self.gemini_model_name}",
+                    system_instruction=sistema,
+                    tools=declaracoes or None,
+                    ttl=datetime.timedelta(seconds=self.cache_ttl_s),
+                )
+            except Exception as e:
+                # Não tenta de novo para esta combinação; o prompt inteiro segue funcionando
+                print(f"Cache de contexto do Gemini indisponível, enviando o prompt inteiro: {e}")
+                if self.ao_evento is not None:
+                    self.ao_evento("gemini_cache_contexto_falha")
+            else:
+                entrada["modelo"] = genai.GenerativeModel.from_cached_content(
+                    entrada["conteudo"], generation_config=self.generation_config)
+                entrada["expira"] = time.monotonic() + self.cache_ttl_s
+                if self.ao_evento is not None:
+                    self.ao_evento("gemini_cache_contexto_criado")
+                return entrada
+        entrada["modelo"] = genai.GenerativeModel(
+            self.gemini_model_name, generation_config=self.generation_config,
+            system_instruction=sistema or None, tools=declaracoes or None)
+        return entrada
+
+    def _modelo_para(self, sistema, declaracoes):
+        """(chave, modelo) da instrução de sistema e das ferramentas, com o cache de contexto criado uma vez."""
+        chave = (sistema, json.dumps(declaracoes, sort_keys=True))
+        with self.lock_modelos:
+            entrada = self.modelos.get(chave)
+            if entrada is not None and not _cache_vencido(entrada):
+                self.modelos.move_to_end(chave)
+                return chave, entrada["modelo"]
+        # O cache de contexto é criado fora do lock: as chamadas das outras combinações não esperam a API
+        nova = self._criar_modelo(sistema, declaracoes, self.cache_contexto)
+        apagar = []
+        with self.lock_modelos:
+            entrada = self.modelos.get(chave)
+            if entrada is not None and not _cache_vencido(entrada):
+                # Outra thread criou o modelo antes: fica o dela, e o cache duplicado é apagado
+                apagar.append(nova["conteudo"])
+            else:
+                if entrada is not None:
+                    apagar.append(entrada["conteudo"])
+                entrada = self.modelos[chave] = nova
+            self.modelos.move_to_end(chave)
+            while len(self.modelos) > MAX_MODELOS_CHAT:
+                apagar.append(self.modelos.popitem(last=False)[1]["conteudo"])
+        for conteudo in apagar:
+            _apagar_cache(conteudo)
+        return chave, entrada["modelo"]
+
+    def _sem_cache(self, chave, modelo):
+        """
+        Erro definitivo de uma chamada com o cache (ex.: cache removido no provedor): troca o
+        modelo da combinação por um sem cache e o retorna, para a chamada ser refeita.
+        """
+        with self.lock_modelos:
+            entrada = self.modelos.get(chave)
+            if entrada is None or entrada["conteudo"] is None or entrada["modelo"] is not modelo:
+                return None
+            conteudo = entrada["conteudo"]
+            entrada = self.modelos[chave] = self._criar_modelo(entrada["sistema"], entrada["declaracoes"], False)
+        _apagar_cache(conteudo)
+        return entrada["modelo"]
+
+    def _chamar(self, messages, tools, chamada):
+        """`chamada(modelo, conteúdos)` com novas tentativas, refeita sem o cache se ele for recusado."""
+        sistema, conteudos = _conversa(messages)
+        chave, modelo = self._modelo_para(sistema, _declaracoes(tools))
+        try:
+            return self._com_novas_tentativas(lambda: chamada(modelo, conteudos))
+        except Exception as e:
+            sem_cache = None if erro_transitorio(e) else self._sem_cache(chave, modelo)
+            if sem_cache is None:
+                raise
+            return self._com_novas_tentativas(lambda: chamada(sem_cache, conteudos))
+
+    async def _achamar(self, messages, tools, chamada):
+        sistema, conteudos = _conversa(messages)
+        chave, modelo = await asyncio.to_thread(self._modelo_para, sistema, _declaracoes(tools))
+        try:
+            return await self._com_novas_tentativas_async(lambda: chamada(modelo, conteudos))
+        except Exception as e:
+            sem_cache = None if erro_transitorio(e) else self._sem_cache(chave, modelo)
+            if sem_cache is None:
+                raise
+            return await self._com_novas_tentativas_async(lambda: chamada(sem_cache, conteudos))
+
+    # --- chamadas -------------------------------------------------------------
+
+    @staticmethod
+    def _resultado(response):
+        texto, chamadas, motivo = _partes_resposta(response)
+        uso = _uso_tokens(response)
+        mensagem = AIMessage(content=texto, tool_calls=chamadas, usage_metadata=_uso_langchain(uso),
+                             response_metadata={"finish_reason": motivo})
+        return ChatResult(generations=[ChatGeneration(message=mensagem)], llm_output={"token_usage": uso})
+
+    @staticmethod
+    def _pedaco(parte, indice):
+        """Pedaço do streaming; as chamadas de função chegam inteiras, cada uma com o seu índice."""
+        texto, chamadas, motivo = _partes_resposta(parte)
+        pedacos_chamadas = [
+            {"name": c["name"], "args": json.dumps(c["args"], ensure_ascii=False), "id": c["id"], "index": indice + i}
+            for i, c in enumerate(chamadas)
+        ]
+        # O uso de tokens vem no último pedaço (o que tem finish_reason); somado a cada pedaço seria contado várias vezes
+        final = motivo not in ("", "FINISH_REASON_UNSPECIFIED")
+        mensagem = AIMessageChunk(
+            content=texto, tool_call_chunks=pedacos_chamadas,
+            usage_metadata=_uso_langchain(_uso_tokens(parte)) if final else None,
+            response_metadata={"finish_reason": motivo} if final else {},
+        )
+        return ChatGenerationChunk(message=mensagem), len(chamadas)
+
+    def _generate(
+        self,
+        messages,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return self._resultado(self._chamar(messages, tools, lambda modelo, conteudos: modelo.generate_content(conteudos)))
+
+    async def _agenerate(
+        self,
+        messages,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.transport == "rest":
+            # A biblioteca não tem cliente assíncrono REST: usa o síncrono em uma thread
+            return await asyncio.to_thread(self._generate, messages, stop, None, tools)
+        response = await self._achamar(
+            messages, tools, lambda modelo, conteudos: modelo.generate_content_async(conteudos))
+        return self._resultado(response)
+
+    def _stream(
+        self,
+        messages,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        response = self._chamar(
+            messages, tools, lambda modelo, conteudos: modelo.generate_content(conteudos, stream=True))
+        indice = 0
+        for parte in response:
+            chunk, quantidade = self._pedaco(parte, indice)
+            indice += quantidade
+            if run_manager and chunk.text:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        if self.transport == "rest":
+            async for chunk in super()._astream(messages, stop, run_manager, tools=tools, **kwargs):
+                yield chunk
+            return
+        response = await self._achamar(
+            messages, tools, lambda modelo, conteudos: modelo.generate_content_async(conteudos, stream=True))
+        indice = 0
+        async for parte in response:
+            chunk, quantidade = self._pedaco(parte, indice)
+            indice += quantidade
+            if run_manager and chunk.text:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def _cache_vencido(entrada):
+    """Se o cache de contexto da entrada está perto de expirar (renovado antes, para nenhuma chamada usá-lo vencido)."""
+    return entrada["conteudo"] is not None and time.monotonic() > entrada["expira"] - 60
+
+
+def _apagar_cache(conteudo):
+    if conteudo is not None:
+        try:
+            conteudo.delete()
+        except Exception:
+            pass  # expira sozinho pelo TTL
@@ -0,0 +1,158 @@
+"""
+LLM local e determinístico que reproduz transcrições ReAct gravadas.
+
+Usado pelos benchmarks (LLM_PROVIDER=roteirizado) para medir o pipeline sem
+rede e sem custo: para cada pergunta conhecida, devolve a resposta gravada
+correspondente à iteração atual do agente (contada pelas observações já
+presentes no prompt).
+
+`ChatRoteirizado` reproduz as mesmas transcrições como modelo de chat com
+chamada de ferramentas (AGENTE_MODO=ferramentas): cada "Action/Action Input"
+vira uma chamada da ferramenta com argumentos estruturados e o "Final Answer"
+vira a resposta em texto. Saídas malformadas continuam malformadas: a
+comparação entre os modos não pode corrigir no modo ferramentas o que falha
+no ReAct.
+"""
+import json
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks.manager import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.llms import LLM
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult, GenerationChunk
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# finish_reason de uma chamada de ferramenta que o modelo não conseguiu formatar (nome usado pelo Gemini)
+CHAMADA_MALFORMADA = "MALFORMED_FUNCTION_CALL"
+RESPOSTA_DESCONHECIDA = "Thought: Não tenho uma transcrição para esta pergunta.\nFinal Answer: Pergunta fora do roteiro."
+
+
+def carregar_roteiros(caminho):
+    """{pergunta: [saídas por iteração]} de um JSON no formato do corpus de benchmark."""
+    with open(caminho, encoding="utf-8") as f:
+        corpus = json.load(f)
+    return {item["pergunta"]: item["respostas"] for item in corpus["perguntas"]}
+
+
+class LLMRoteirizado(LLM):
+    """
+    Args:
+        roteiros: {pergunta: [saída da iteração 1, saída da iteração 2, ...]}.
+        latencia_s: Atraso artificial por chamada, para simular o provedor.
+    """
+
+    roteiros: Dict[str, List[str]] = {}
+    latencia_s: float = 0.0
+
+    @classmethod
+    def de_arquivo(cls, caminho, latencia_s=0.0):
+        """Carrega as transcrições de um JSON no formato do corpus de benchmark."""
+        return cls(roteiros=carregar_roteiros(caminho), latencia_s=latencia_s)
+
+    @property
+    def _llm_type(self) -> str:
+        return "roteirizado"
+
+    def _resposta_para(self, prompt):
+        for pergunta, respostas in self.roteiros.items():
+            posicao = prompt.rfind(pergunta)
+            if posicao < 0:
+                continue
+            # Cada iteração anterior do agente deixou uma "Observation:" no prompt
+            iteracao = prompt.count("Observation:", posicao)
+            return respostas[min(iteracao, len(respostas) - 1)]
+        return RESPOSTA_DESCONHECIDA
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        if self.latencia_s:
+            time.sleep(self.latencia_s)
+        return self._resposta_para(prompt)
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        texto = self._call(prompt, stop, run_manager, **kwargs)
+        for posicao in range(0, len(texto), 16):
+            chunk = GenerationChunk(text=texto[posicao:posicao + 16])
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class ChatRoteirizado(BaseChatModel):
+    """
+    Modelo de chat com chamada de ferramentas que reproduz as transcrições ReAct.
+
+    Args:
+        roteiros: {pergunta: [saída da iteração 1, saída da iteração 2, ...]}.
+        latencia_s: Atraso artificial por chamada, para simular o provedor.
+    """
+
+    roteiros: Dict[str, List[str]] = {}
+    latencia_s: float = 0.0
+
+    @classmethod
+    def de_arquivo(cls, caminho, latencia_s=0.0):
+        """Carrega as transcrições de um JSON no formato do corpus de benchmark."""
+        return cls(roteiros=carregar_roteiros(caminho), latencia_s=latencia_s)
+
+    @property
+    def _llm_type(self) -> str:
+        return "roteirizado-chat"
+
+    def bind_tools(self, tools, **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _resposta_para(self, messages):
+        # A pergunta é a última mensagem do usuário; cada resultado de ferramenta depois dela é uma iteração
+        posicao = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        pergunta = str(messages[posicao].content) if posicao >= 0 else ""
+        iteracao = sum(isinstance(m, ToolMessage) for m in messages[posicao + 1:])
+        respostas = self.roteiros.get(pergunta)
+        if not respostas:
+            return _mensagem_ferramentas(RESPOSTA_DESCONHECIDA, iteracao)
+        return _mensagem_ferramentas(respostas[min(iteracao, len(respostas) - 1)], iteracao)
+
+    def _generate(
+        self,
+        messages,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latencia_s:
+            time.sleep(self.latencia_s)
+        return ChatResult(generations=[ChatGeneration(message=self._resposta_para(messages))])
+
+
+def _mensagem_ferramentas(saida, iteracao):
+    """
+    Converte uma saída ReAct na mensagem equivalente de um modelo com chamada de ferramentas.
+    "Action" seguido de "Action Input" (o que o parser do ReAct aceita) vira a chamada; uma
+    ação sem "Action Input:" vira uma chamada malformada, como o Gemini a devolve
+    (finish_reason MALFORMED_FUNCTION_CALL e nenhuma chamada), e conta como falha nos
+    dois modos. Texto sem ação nem "Final Answer:" vira a resposta, como o modelo de chat
+    a devolveria.
+    """
+    final = re.search(r"Final Answer:\s*(.*)", saida, re.DOTALL)
+    acao = re.search(r"Action\s*:\s*(.*?)\s*Action\s*Input\s*:\s*(.*)", saida, re.DOTALL)
+    if acao and not final:
+        pensamento = saida[:acao.start()].replace("Thought:", "").strip()
+        chamada = {"name": acao.group(1), "args": {"query": acao.group(2).strip()}, "id": f"chamada_{iteracao}"}
+        return AIMessage(content=pensamento, tool_calls=[chamada])
+    if not final and re.search(r"Action\s*:", saida):
+        return AIMessage(content=saida.strip(), response_metadata={"finish_reason": CHAMADA_MALFORMADA})
+    return AIMessage(content=(final.group(1) if final else saida).strip())
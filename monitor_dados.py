@@ -0,0 +1,279 @@
+"""
+Monitor de atualização do dataset em segundo plano.
+
+Uma thread consulta a origem dos dados a cada `intervalo_s` segundos:
+  - arquivo local: tamanho e mtime (`os.stat`), sem reler o arquivo;
+  - CSV_URL: GET condicional (If-None-Match / If-Modified-Since) que pede só
+    os bytes a partir do fim já lido (Range), com uma pequena sobreposição.
+
+Quando a origem só cresceu (os bytes já lidos continuam iguais), apenas as
+linhas completas acrescentadas desde o último deslocamento são lidas,
+validadas contra o esquema em cache e concatenadas ao DataFrame. O hash
+SHA-256 continua de onde parou, então a nova versão é a mesma de uma carga
+completa do arquivo. Qualquer outra mudança (arquivo truncado ou reescrito,
+linhas incompatíveis com o esquema) leva a uma recarga completa.
+
+A nova versão é entregue a `ao_atualizar(novo, anterior, novas_linhas)`, que
+faz a troca; perguntas em andamento continuam com a versão anterior.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from carregador_dados import (DIRETORIO_CACHE, JANELA_VERIFICACAO, DatasetCarregado, anexar_linhas,
+                              esquema_atual, gravar_versao, ler_csv_tipado)
+
+# Resultado da detecção quando só uma recarga completa serve
+RECARREGAR = "recarregar"
+
+
+def _eh_url(caminho):
+    return caminho.startswith(("http://", "https://"))
+
+
+class MonitorDados:
+    """
+    Args:
+        dataset: DatasetCarregado atual (com `metadados_origem` preenchido pelo carregador).
+        ao_atualizar: Recebe (novo dataset, dataset anterior, linhas novas ou None se foi recarga completa).
+        recarregar: Função sem argumentos que carrega a origem inteira de novo.
+        intervalo_s: Intervalo entre verificações.
+        incremental: Se False, qualquer mudança leva a uma recarga completa (ex.: motor SQL).
+        timeout_s: Timeout das requisições HTTP.
+        ao_evento: Callback opcional (nome do evento) para métricas.
+    """
+
+    def __init__(self, dataset, ao_atualizar, recarregar, intervalo_s=5.0, incremental=True, timeout_s=30.0,
+                 diretorio_cache=DIRETORIO_CACHE, ao_evento=None):
+        self._dataset = dataset
+        self._ao_atualizar = ao_atualizar
+        self._recarregar = recarregar
+        self.intervalo_s = intervalo_s
+        self.incremental = incremental
+        self.timeout_s = timeout_s
+        self.diretorio_cache = diretorio_cache
+        self._ao_evento = ao_evento
+
+        self._lock = threading.Lock()
+        self._estado = None
+        self._parar = threading.Event()
+        self._thread = None
+        self.estatisticas = {
+            "verificacoes": 0,
+            "anexacoes": 0,
+            "recargas": 0,
+            "falhas": 0,
+            "linhas_anexadas": 0,
+            "ultima_atualizacao_s": None,
+        }
+
+    @property
+    def dataset(self):
+        return self._dataset
+
+    def iniciar(self):
+        """Inicia a thread de verificação (daemon: não impede o processo de terminar)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._laco, name="monitor-dados", daemon=True)
+            self._thread.start()
+        return self
+
+    def parar(self, timeout=None):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _laco(self):
+        while not self._parar.wait(self.intervalo_s):
+            try:
+                self.verificar()
+            except Exception as e:
+                # Origem fora do ar ou arquivo sendo reescrito: tenta de novo no próximo intervalo
+                self.estatisticas["falhas"] += 1
+                self._registrar("dados_falha")
+                print(f"Monitor de dados: falha ao verificar {self._dataset.caminho}: {e}")
+
+    def _registrar(self, evento):
+        if self._ao_evento is not None:
+            self._ao_evento(evento)
+
+    def verificar(self):
+        """Uma rodada de verificação. Retorna "sem_mudanca", "anexado" ou "recarregado"."""
+        with self._lock:
+            self.estatisticas["verificacoes"] += 1
+            if self._estado is None:
+                self._estado = self._sincronizar(self._dataset)
+            mudanca = self._detectar_url() if _eh_url(self._dataset.caminho) else self._detectar_local()
+            if mudanca is None:
+                return "sem_mudanca"
+
+            inicio = time.perf_counter()
+            anterior, novo, novas, proximo = self._dataset, None, None, None
+            if mudanca != RECARREGAR:
+                novos_bytes, validadores = mudanca
+                corte = novos_bytes.rfind(b"\n") + 1
+                if corte == 0:
+                    # Só uma linha incompleta por enquanto: espera o restante dela
+                    return "sem_mudanca"
+                bloco = novos_bytes[:corte]
+                novo, novas, proximo = self._anexar(bloco, validadores)
+
+            if novo is None:
+                novo = self._recarregar()
+                if novo.versao == anterior.versao:
+                    self._dataset, self._estado = novo, self._sincronizar(novo)
+                    return "sem_mudanca"
+
+            self._ao_atualizar(novo, anterior, novas)
+            self._dataset = novo
+            self.estatisticas["ultima_atualizacao_s"] = round(time.perf_counter() - inicio, 4)
+            if novas is None:
+                self._estado = self._sincronizar(novo)
+                self.estatisticas["recargas"] += 1
+                self._registrar("dados_recarregados")
+                return "recarregado"
+            self._estado = proximo
+            self._persistir(novo, bloco)
+            self.estatisticas["anexacoes"] += 1
+            self.estatisticas["linhas_anexadas"] += len(novas)
+            self._registrar("dados_anexados")
+            return "anexado"
+
+    def _sincronizar(self, dataset):
+        """Estado da última leitura: deslocamento, janelas de verificação e hash dos bytes já lidos."""
+        estado = dict(dataset.metadados_origem)
+        estado.setdefault("tamanho", None)
+        if not self.incremental or estado["tamanho"] is None:
+            return estado
+        # Da URL vale a cópia local gravada pelo carregador remoto (o espelho)
+        arquivo = estado.get("espelho") if _eh_url(dataset.caminho) else dataset.caminho
+        if not arquivo or not os.path.exists(arquivo):
+            estado["tamanho"] = None  # sem os bytes já lidos não dá para continuar a versão: recarrega
+            return estado
+        # Relê os bytes já carregados uma vez (só I/O, sem parsear)
+        sha = hashlib.sha256()
+        restante = estado["tamanho"]
+        inicio, cauda = b"", b""
+        with open(arquivo, "rb") as f:
+            while restante > 0:
+                bloco = f.read(min(1024 * 1024, restante))
+                if not bloco:
+                    break
+                if len(inicio) < JANELA_VERIFICACAO:
+                    inicio += bloco[:JANELA_VERIFICACAO - len(inicio)]
+                cauda = (cauda + bloco)[-JANELA_VERIFICACAO:]
+                sha.update(bloco)
+                restante -= len(bloco)
+        if restante > 0 or sha.hexdigest()[:16] != dataset.versao:
+            # O arquivo mudou entre a carga e agora: a próxima verificação recarrega
+            estado["tamanho"] = None
+        estado.update(inicio=inicio, cauda=cauda, sha256=sha)
+        return estado
+
+    def _detectar_local(self):
+        """None se nada mudou, RECARREGAR ou (bytes novos, validadores)."""
+        estado = self._estado
+        try:
+            info = os.stat(self._dataset.caminho)
+        except FileNotFoundError:
+            return None  # arquivo sendo substituído: verifica de novo depois
+        if info.st_size == estado["tamanho"] and info.st_mtime_ns == estado.get("mtime_ns"):
+            return None
+        if not self.incremental or estado["tamanho"] is None or info.st_size <= estado["tamanho"]:
+            return RECARREGAR
+        with open(self._dataset.caminho, "rb") as f:
+            inicio = f.read(len(estado["inicio"]))
+            f.seek(estado["tamanho"] - len(estado["cauda"]))
+            cauda = f.read(len(estado["cauda"]))
+            if inicio != estado["inicio"] or cauda != estado["cauda"]:
+                return RECARREGAR
+            return f.read(), {"mtime_ns": info.st_mtime_ns}
+
+    def _detectar_url(self):
+        """GET condicional; com Range quando dá para continuar do último deslocamento."""
+        estado = self._estado
+        cabecalhos = {"Accept-Encoding": "identity"}
+        if estado.get("etag"):
+            cabecalhos["If-None-Match"] = estado["etag"]
+        if estado.get("last_modified"):
+            cabecalhos["If-Modified-Since"] = estado["last_modified"]
+        inicio_range, metodo = None, "HEAD"
+        if self.incremental and estado["tamanho"] is not None:
+            inicio_range, metodo = max(0, estado["tamanho"] - len(estado["cauda"])), "GET"
+            cabecalhos["Range"] = f"bytes={inicio_range}-"
+        requisicao = Request(self._dataset.caminho, headers=cabecalhos, method=metodo)
+        try:
+            with urlopen(requisicao, timeout=self.timeout_s) as resposta:
+                status, corpo = resposta.status, resposta.read()
+                validadores = {"etag": resposta.headers.get("ETag"),
+                               "last_modified": resposta.headers.get("Last-Modified")}
+                intervalo = resposta.headers.get("Content-Range", "")
+        except HTTPError as e:
+            if e.code == 304:
+                return None
+            if e.code == 416:
+                return RECARREGAR  # o conteúdo ficou menor que o já lido
+            raise
+        if inicio_range is None:
+            return RECARREGAR
+        if status == 206 and intervalo.startswith(f"bytes {inicio_range}-"):
+            sobreposicao = len(estado["cauda"])
+            if corpo[:sobreposicao] != estado["cauda"]:
+                return RECARREGAR
+            return corpo[sobreposicao:], validadores
+        # Servidor sem suporte a Range: veio o conteúdo inteiro, confere o que já foi lido
+        tamanho = estado["tamanho"]
+        if len(corpo) < tamanho or hashlib.sha256(corpo[:tamanho]).hexdigest() != estado["sha256"].hexdigest():
+            return RECARREGAR
+        return corpo[tamanho:], validadores
+
+    def _anexar(self, bloco, validadores):
+        """
+        Lê só as linhas novas com o esquema em cache. Retorna (novo dataset, linhas,
+        próximo estado) ou Nones quando é preciso recarregar tudo.
+        """
+        inicio = time.perf_counter()
+        anterior, estado = self._dataset, self._estado
+        cabecalho = estado["inicio"][:estado["inicio"].find(b"\n") + 1]
+        if not cabecalho or not esquema_atual(anterior.esquema):
+            return None, None, None
+        try:
+            novas, _ = ler_csv_tipado(io.BytesIO(cabecalho + bloco), anterior.esquema)
+        except ValueError as e:
+            print(f"Monitor de dados: linhas novas incompatíveis com o esquema, recarregando: {e}")
+            return None, None, None
+
+        sha = estado["sha256"].copy()
+        sha.update(bloco)
+        tamanho = estado["tamanho"] + len(bloco)
+        metadados = dict(anterior.metadados_origem, **validadores, tamanho=tamanho)
+        novo = DatasetCarregado(anexar_linhas(anterior.df, novas), sha.hexdigest()[:16], anterior.caminho,
+                                "incremental", time.perf_counter() - inicio, anterior.esquema,
+                                metadados_origem=metadados)
+        cauda = (estado["cauda"] + bloco)[-JANELA_VERIFICACAO:]
+        return novo, novas, dict(estado, **validadores, tamanho=tamanho, sha256=sha, cauda=cauda)
+
+    def _persistir(self, dataset, bloco):
+        """Snapshot da nova versão (e, para a URL, os bytes novos no espelho): reiniciar o processo não relê o CSV."""
+        estado = self._estado
+        digital = {"tamanho": estado["tamanho"], "mtime_ns": estado.get("mtime_ns"),
+                   "sha256": estado["sha256"].hexdigest()}
+        if not _eh_url(dataset.caminho):
+            gravar_versao(dataset.caminho, dataset.df, dataset.esquema, digital, self.diretorio_cache)
+            return
+        espelho = estado.get("espelho")
+        if not espelho or os.path.getsize(espelho) != estado["tamanho"] - len(bloco):
+            return  # espelho mudou por fora: a próxima carga baixa de novo
+        with open(espelho, "ab") as f:
+            f.write(bloco)
+        digital["mtime_ns"] = os.stat(espelho).st_mtime_ns
+        gravar_versao(espelho, dataset.df, dataset.esquema, digital, os.path.dirname(espelho),
+                      url=dataset.caminho, etag=estado.get("etag"), last_modified=estado.get("last_modified"))
+
+    def resumo(self):
+        """Versão atual e contadores (útil para diagnóstico e métricas)."""
+        return dict(self.estatisticas, versao=self._dataset.versao, linhas=len(self._dataset.df))
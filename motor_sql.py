@@ -0,0 +1,325 @@
+"""
+Motor de consulta SQL (DuckDB) para datasets que não cabem em memória no pandas.
+
+Em vez de carregar o CSV inteiro em um DataFrame por processo, o CSV é
+convertido uma única vez (por versão do arquivo) em um snapshot Parquet em
+`.cache_dados/`, sem passar pelo pandas. O DuckDB consulta o snapshot com
+filtros aplicados na leitura (predicate pushdown), leitura apenas das colunas
+usadas e varredura paralela dos grupos de linhas.
+
+O agente recebe a ferramenta `consulta_sql` e escreve SQL em vez de pandas;
+as views `etapas` e `fluxos` removem a repetição do layout EAV (uma linha
+por seqEtapa / seqFluxo), como as tabelas normalizadas do modo pandas.
+"""
+import os
+import re
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.callbacks.manager import CallbackManagerForToolRun
+from langchain_core.tools import BaseTool
+
+from carregador_dados import (
+    DIRETORIO_CACHE,
+    DatasetCarregado,
+    _caminho_manifesto,
+    _gravar_json_atomico,
+    _ler_manifesto,
+    impressao_digital,
+)
+from tabelas_normalizadas import COLUNAS_CAMPO, COLUNAS_FLUXO
+
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+
+# Linhas do resultado devolvidas ao agente (o restante é resumido)
+MAX_LINHAS_RESULTADO = 50
+# Tamanho dos grupos de linhas do Parquet: a unidade de paralelismo e de descarte por estatísticas
+LINHAS_POR_GRUPO = 122_880
+# Tipos de comando aceitos da ferramenta (somente leitura)
+COMANDOS_PERMITIDOS = ("SELECT", "EXPLAIN", "PRAGMA")
+
+
+def _aspas(texto):
+    return "'" + str(texto).replace("'", "''") + "'"
+
+
+def _caminho_parquet(caminho, sha256, diretorio_cache):
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    return os.path.join(diretorio_cache, f"{nome}-{sha256[:16]}.parquet")
+
+
+def _remover_parquets_antigos(caminho, atual, diretorio_cache):
+    prefixo = os.path.splitext(os.path.basename(caminho))[0] + "-"
+    for nome in os.listdir(diretorio_cache):
+        completo = os.path.join(diretorio_cache, nome)
+        if nome.startswith(prefixo) and nome.endswith(".parquet") and completo != atual:
+            try:
+                os.remove(completo)
+            except OSError:
+                pass
+
+
+def converter_para_parquet(caminho_csv, destino, conexao=None):
+    """Converte o CSV em Parquet dentro do DuckDB (em streaming, sem DataFrame intermediário)."""
+    conexao = conexao or duckdb.connect()
+    temporario = f"{destino}.tmp{os.getpid()}"
+    conexao.execute(
+        f"COPY (SELECT * FROM read_csv_auto({_aspas(caminho_csv)}, header=true)) "
+        f"TO {_aspas(temporario)} (FORMAT parquet, ROW_GROUP_SIZE {LINHAS_POR_GRUPO})"
+    )
+    os.replace(temporario, destino)
+
+
+def preparar_snapshot(caminho, diretorio_cache=DIRETORIO_CACHE):
+    """
+    Retorna (caminho do Parquet, impressão digital) para o CSV, convertendo-o só
+    quando o arquivo mudou. A versão é a mesma do carregador pandas (prefixo do hash).
+    """
+    os.makedirs(diretorio_cache, exist_ok=True)
+    digital = impressao_digital(caminho, diretorio_cache)
+    destino = _caminho_parquet(caminho, digital["sha256"], diretorio_cache)
+    if not os.path.exists(destino):
+        inicio = time.perf_counter()
+        converter_para_parquet(caminho, destino)
+        print(f"Snapshot Parquet criado em {time.perf_counter() - inicio:.1f}s: {destino}")
+        _remover_parquets_antigos(caminho, destino, diretorio_cache)
+    # Mantém o esquema do modo pandas no manifesto; só atualiza a impressão digital
+    manifesto = dict(_ler_manifesto(caminho, diretorio_cache), **digital, parquet=os.path.basename(destino))
+    _gravar_json_atomico(_caminho_manifesto(caminho, diretorio_cache), manifesto)
+    return destino, digital
+
+
+class MotorDuckDB:
+    """
+    Conexão DuckDB com a view `dados` sobre o snapshot (e as views derivadas).
+
+    Args:
+        fonte: Arquivo Parquet ou CSV registrado como `dados`.
+        threads: Threads de varredura (None = núcleos disponíveis).
+        limite_memoria: Limite de memória do DuckDB (ex.: "2GB"); acima dele usa disco.
+        max_linhas: Linhas do resultado devolvidas por `executar`.
+    """
+
+    def __init__(self, fonte, threads=None, limite_memoria=None, max_linhas=MAX_LINHAS_RESULTADO):
+        if not DUCKDB_AVAILABLE:
+            raise ImportError("MOTOR_CONSULTA=duckdb requer o pacote duckdb (pip install duckdb)")
+        # As views guardam o caminho: absoluto, para não depender do diretório atual
+        self.fonte = fonte = os.path.abspath(fonte)
+        self.max_linhas = max_linhas
+        configuracao = {}
+        if threads:
+            configuracao["threads"] = int(threads)
+        if limite_memoria:
+            configuracao["memory_limit"] = str(limite_memoria)
+        # Sem ORDER BY a ordem das linhas não importa; liberar isso reduz memória em agregações grandes
+        configuracao["preserve_insertion_order"] = False
+        self._conexao = duckdb.connect(":memory:", config=configuracao)
+        self._parquet = fonte.endswith(".parquet")
+        if self._parquet:
+            # A posição da linha no arquivo permite escolher a primeira linha de cada etapa/fluxo
+            self._conexao.execute(f"CREATE VIEW _bruto AS SELECT * FROM read_parquet({_aspas(fonte)}, file_row_number=true)")
+            self._conexao.execute("CREATE VIEW dados AS SELECT * EXCLUDE (file_row_number) FROM _bruto")
+        else:
+            self._conexao.execute(f"CREATE VIEW dados AS SELECT * FROM read_csv_auto({_aspas(fonte)})")
+        self.colunas = [linha[0] for linha in self._conexao.execute("DESCRIBE dados").fetchall()]
+        self._criar_views()
+        # O SQL vem do LLM: a partir daqui só o snapshot pode ser lido, e a configuração não muda mais
+        self._conexao.execute(f"SET allowed_paths=[{_aspas(fonte)}]")
+        self._conexao.execute("SET enable_external_access=false")
+        self._conexao.execute("SET lock_configuration=true")
+        self._local = threading.local()
+        self._linhas = None
+
+    def _criar_views(self):
+        """Views sem a repetição do layout EAV (a primeira linha de cada chave), quando as chaves existem."""
+        colunas = set(self.colunas)
+        self.views = ["dados"]
+        if "seqFluxo" in colunas:
+            self._criar_view_unica("fluxos", "seqFluxo", ["seqFluxo", *[c for c in COLUNAS_FLUXO if c in colunas]])
+        if "seqEtapa" in colunas:
+            etapa = ["seqEtapa", *[c for c in self.colunas
+                                   if c not in COLUNAS_FLUXO and c not in COLUNAS_CAMPO and c != "seqEtapa"]]
+            self._criar_view_unica("etapas", "seqEtapa", etapa)
+
+    def _criar_view_unica(self, nome, chave, colunas):
+        lista = ", ".join(f'"{c}"' for c in colunas)
+        if self._parquet:
+            # min(posição) por chave + semi join: só estados de tamanho fixo, que o DuckDB
+            # consegue levar ao disco; DISTINCT ON/any_value com textos estouram a memória
+            # com ~100 milhões de chaves
+            self._conexao.execute(
+                f"CREATE VIEW {nome} AS SELECT {lista} FROM _bruto SEMI JOIN "
+                f'(SELECT min(file_row_number) AS primeira FROM _bruto GROUP BY "{chave}") p '
+                "ON _bruto.file_row_number = p.primeira"
+            )
+        else:
+            self._conexao.execute(f'CREATE VIEW {nome} AS SELECT DISTINCT ON ("{chave}") {lista} FROM dados')
+        self.views.append(nome)
+
+    def _cursor(self):
+        # Uma conexão DuckDB não deve ser usada por várias threads ao mesmo tempo;
+        # cada thread usa seu próprio cursor sobre o mesmo banco
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self._conexao.cursor()
+        return cursor
+
+    @property
+    def linhas(self):
+        if self._linhas is None:
+            self._linhas = self._cursor().execute("SELECT count(*) FROM dados").fetchone()[0]
+        return self._linhas
+
+    def consultar(self, sql):
+        """Executa uma consulta somente leitura e retorna um DataFrame."""
+        comandos = duckdb.extract_statements(sql)
+        if len(comandos) != 1:
+            raise ValueError("Envie exatamente uma consulta SQL por vez.")
+        tipo = comandos[0].type.name
+        if tipo not in COMANDOS_PERMITIDOS:
+            raise ValueError(f"Apenas consultas de leitura são permitidas (recebido: {tipo}).")
+        return self._cursor().execute(sql).fetchdf()
+
+    def executar(self, sql):
+        """Texto do resultado para o agente; erros voltam como texto para o LLM corrigir a consulta."""
+        try:
+            resultado = self.consultar(sql)
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+        if len(resultado) > self.max_linhas:
+            return (f"{resultado.head(self.max_linhas).to_string()}\n"
+                    f"... ({len(resultado)} linhas no total; use LIMIT ou agregue)")
+        return resultado.to_string()
+
+    def amostra(self, linhas=5):
+        return self._cursor().execute(f"SELECT * FROM dados LIMIT {int(linhas)}").fetchdf()
+
+    def descricao(self):
+        """Esquema das views para o prompt do agente."""
+        tipos = self._cursor().execute("DESCRIBE dados").fetchall()
+        partes = [
+            f"`dados` ({self.linhas} linhas; cada linha é um campo de formulário de uma etapa, "
+            "o cabeçalho da etapa se repete): " + ", ".join(f"{nome} {tipo}" for nome, tipo, *_ in tipos)
+        ]
+        if "fluxos" in self.views:
+            partes.append("`fluxos`: uma linha por seqFluxo (" + ", ".join(
+                ["seqFluxo", *[c for c in COLUNAS_FLUXO if c in self.colunas]]) + ")")
+        if "etapas" in self.views:
+            partes.append("`etapas`: uma linha por seqEtapa, com as colunas de `dados` exceto as do fluxo e "
+                          "as do campo; junte com `fluxos` por seqFluxo. Use-a para contagens e médias por etapa")
+        partes.append("Para contar valores distintos prefira SELECT count(*) FROM (SELECT col FROM ... GROUP BY col) "
+                      "a count(DISTINCT col), que precisa caber na memória")
+        return "\n".join(partes)
+
+    def encerrar(self):
+        self._conexao.close()
+
+
+def carregar_dataset_sql(caminho, diretorio_cache=DIRETORIO_CACHE, threads=None, limite_memoria=None,
+                         linhas_amostra=1000):
+    """
+    Prepara o motor DuckDB para o CSV e retorna um DatasetCarregado cujo `df`
+    é só uma amostra (para a interface); o motor fica em `derivados["sql"]`.
+    """
+    inicio = time.perf_counter()
+    fonte, digital = preparar_snapshot(caminho, diretorio_cache)
+    motor = MotorDuckDB(fonte, threads=threads, limite_memoria=limite_memoria)
+    dataset = DatasetCarregado(motor.amostra(linhas_amostra), digital["sha256"][:16], caminho, "duckdb",
+                               time.perf_counter() - inicio,
+                               metadados_origem={"tamanho": digital["tamanho"], "mtime_ns": digital["mtime_ns"]})
+    dataset.derivados["sql"] = motor
+    return dataset
+
+
+def limpar_sql(consulta):
+    """Remove cercas de Markdown e crases que o LLM costuma colocar em volta do SQL."""
+    consulta = consulta.strip()
+    consulta = re.sub(r"^```(?:sql)?\s*|\s*```$", "", consulta, flags=re.IGNORECASE)
+    return consulta.strip().strip("`").strip()
+
+
+class FerramentaSQL(BaseTool):
+    """Ferramenta do agente que executa SQL no motor DuckDB."""
+
+    name: str = "consulta_sql"
+    description: str = (
+        "Executa uma consulta SQL (dialeto DuckDB, somente leitura) nas tabelas `dados`, `etapas` e `fluxos` "
+        "e retorna o resultado. A entrada deve ser uma única consulta SELECT válida."
+    )
+    motor: Any = None
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> Any:
+        return self.motor.executar(limpar_sql(query))
+
+    def encerrar(self):
+        """Mesma interface da FerramentaPython; a conexão pertence ao dataset."""
+
+
+PREFIXO_AGENTE_SQL = """
+Você está trabalhando com dados em um banco DuckDB. Responda à pergunta escrevendo consultas SQL (dialeto DuckDB).
+Tabelas disponíveis:
+{contexto}"""
+
+# A instrução sobre a consulta fica antes da pergunta, para que a parte fixa do
+# prompt seja a mesma em todas as chamadas (e reaproveitada no cache do provedor)
+SUFIXO_AGENTE_SQL = """
+IMPORTANTE: Depois de responder à pergunta, inclua a consulta SQL completa que você executou para obter a resposta, formatada em um bloco de código Markdown (```sql...```). Se a resposta for trivial e não envolver consultas, apenas responda à pergunta.
+
+Begin!
+Question: {input}
+{agent_scratchpad}"""
+
+# Modo ferramentas: a consulta chega nos argumentos da chamada e é registrada a partir dos
+# passos intermediários, então a resposta não precisa repeti-la
+SUFIXO_AGENTE_SQL_FERRAMENTAS = """
+
+Para calcular a resposta, execute consultas com a ferramenta `consulta_sql`. Quando tiver o resultado, \
+responda à pergunta em português, sem repetir a consulta."""
+
+
+def criar_agente_sql(motor, llm, max_iterations=5, max_execution_time=60, modo="react"):
+    """
+    Agente com a ferramenta `consulta_sql`; devolve os passos intermediários (o SQL executado).
+    No modo "ferramentas" usa a chamada nativa de ferramentas do LLM em vez do ReAct.
+    """
+    from langchain_classic.agents import AgentExecutor, create_react_agent, create_tool_calling_agent
+    from langchain_classic.agents.mrkl.prompt import FORMAT_INSTRUCTIONS
+    from langchain_core.messages import SystemMessage
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
+
+    ferramenta = FerramentaSQL(motor=motor)
+    if modo == "ferramentas":
+        sistema = PREFIXO_AGENTE_SQL.format(contexto=motor.descricao()) + SUFIXO_AGENTE_SQL_FERRAMENTAS
+        prompt = ChatPromptTemplate.from_messages([
+            SystemMessage(content=sistema),
+            ("human", "{input}"),
+            MessagesPlaceholder("agent_scratchpad"),
+        ])
+        agente = create_tool_calling_agent(llm, [ferramenta], prompt)
+    else:
+        contexto = motor.descricao().replace("{", "{{").replace("}", "}}")
+        modelo = "\n\n".join([
+            PREFIXO_AGENTE_SQL.format(contexto=contexto),
+            "Use as ferramentas abaixo para responder à pergunta:",
+            "{tools}",
+            FORMAT_INSTRUCTIONS,
+            SUFIXO_AGENTE_SQL,
+        ])
+        agente = create_react_agent(llm, [ferramenta], PromptTemplate.from_template(modelo))
+    return AgentExecutor(
+        agent=agente,
+        tools=[ferramenta],
+        verbose=True,
+        return_intermediate_steps=True,
+        max_iterations=max_iterations,
+        max_execution_time=max_execution_time,
+    )
@@ -0,0 +1,145 @@
+"""
+Limite de tamanho das observações que a ferramenta Python devolve ao LLM.
+
+Quando o código gerado imprime um DataFrame ou uma Series grande (ex.:
+`df[df['etapa'] == 'REVISÃO']`), o texto inteiro entraria no prompt de todas
+as iterações seguintes. Acima do orçamento, a observação vira um resumo
+(formato, tipos, primeiras e últimas linhas e estatísticas) e o resultado
+completo fica em uma variável `resultado_<hash>` que o agente pode usar nas
+próximas execuções. O nome depende só do código, então o mesmo código gera a
+mesma referência (e a mesma saída no cache de execuções).
+"""
+import ast
+import hashlib
+import re
+
+import pandas as pd
+
+# Início de toda observação resumida (a ferramenta registra a referência ao vê-lo)
+PREFIXO_RESUMO = "[Resultado resumido"
+PADRAO_REFERENCIA = re.compile(r"^resultado_[0-9a-f]{8}$")
+# Colunas mostradas nas primeiras/últimas linhas do resumo (da mais completa à mais curta)
+# e largura máxima de cada valor
+COLUNAS_RESUMO = (12, 6, 3)
+MAX_LARGURA_VALOR = 30
+
+
+def nome_referencia(codigo):
+    """Nome da variável com o resultado completo do código (o mesmo para o mesmo código)."""
+    try:
+        normalizado = ast.dump(ast.parse(codigo), annotate_fields=False, include_attributes=False)
+    except SyntaxError:
+        normalizado = codigo
+    return "resultado_" + hashlib.sha1(normalizado.encode("utf-8")).hexdigest()[:8]
+
+
+def definicao_referencia(codigo, nome):
+    """
+    Código que recria a referência: as instruções do código original e a
+    última expressão atribuída a `nome`. None se a última instrução não é uma
+    expressão (não há valor para guardar).
+    """
+    try:
+        arvore = ast.parse(codigo)
+    except SyntaxError:
+        return None
+    if not arvore.body or not isinstance(arvore.body[-1], ast.Expr):
+        return None
+    atribuicao = ast.Assign(targets=[ast.Name(id=nome, ctx=ast.Store())], value=arvore.body[-1].value)
+    modulo = ast.Module(body=arvore.body[:-1] + [atribuicao], type_ignores=[])
+    return ast.unparse(ast.fix_missing_locations(modulo))
+
+
+def _cortar(texto, max_caracteres):
+    """Início e fim do texto, com a quantidade de caracteres omitidos no meio."""
+    if len(texto) <= max_caracteres:
+        return texto
+    metade = max(0, (max_caracteres - 40) // 2)
+    return f"{texto[:metade]}\n... [{len(texto) - 2 * metade} caracteres omitidos] ...\n{texto[-metade:]}"
+
+
+def _tabelas(df, titulo):
+    return [f"{titulo}:\n{df.to_string(max_cols=colunas, max_colwidth=MAX_LARGURA_VALOR)}" for colunas in COLUNAS_RESUMO]
+
+
+def _secoes_dataframe(df):
+    """Seções do resumo; cada uma é uma lista de alternativas, da mais completa à mais curta."""
+    tipos = [f"{coluna} {tipo}" for coluna, tipo in df.dtypes.astype(str).items()]
+    secoes = [
+        [f"Tipos: {', '.join(tipos)}", f"Tipos: {', '.join(tipos[:10])}... (+{len(tipos) - 10} colunas)"],
+        _tabelas(df.head(5), "Primeiras linhas"),
+        _tabelas(df.tail(3), "Últimas linhas"),
+    ]
+    numericas = df.select_dtypes("number")
+    if not numericas.empty and len(df):
+        estatisticas = numericas.describe().T[["count", "mean", "min", "50%", "max"]].round(2)
+        secoes.append([f"Estatísticas das colunas numéricas:\n{estatisticas.to_string()}",
+                       f"Estatísticas das colunas numéricas:\n{estatisticas.head(5).to_string()}"])
+    return secoes
+
+
+def _secoes_series(serie):
+    secoes = [[f"Primeiros valores:\n{serie.head(8).to_string()}", f"Primeiros valores:\n{serie.head(3).to_string()}"],
+              [f"Últimos valores:\n{serie.tail(3).to_string()}"]]
+    if len(serie) and pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        estatisticas = serie.describe()[["count", "mean", "min", "50%", "max"]].round(2)
+        secoes.append([f"Estatísticas: {', '.join(f'{k} {v}' for k, v in estatisticas.items())}"])
+    elif len(serie):
+        frequentes = serie.astype(str).value_counts().head(5)
+        secoes.append([f"Valores mais frequentes ({serie.nunique()} distintos): "
+                       + ", ".join(f"{valor} ({n})" for valor, n in frequentes.items())])
+    return secoes
+
+
+def resumir_resultado(valor, texto, max_caracteres, referencia=None):
+    """Resumo de um resultado grande que cabe em `max_caracteres`."""
+    if isinstance(valor, pd.DataFrame):
+        descricao = f"DataFrame com {len(valor)} linhas e {valor.shape[1]} colunas"
+        secoes = _secoes_dataframe(valor)
+    elif isinstance(valor, pd.Series):
+        descricao = f"Series {valor.name or ''} com {len(valor)} valores ({valor.dtype})".replace("  ", " ")
+        secoes = _secoes_series(valor)
+    else:
+        tamanho = f" com {len(valor)} itens" if hasattr(valor, "__len__") and not isinstance(valor, str) else ""
+        descricao = f"{type(valor).__name__}{tamanho}"
+        secoes = []
+
+    cabecalho = f"{PREFIXO_RESUMO}: {descricao}, {len(texto)} caracteres."
+    if referencia:
+        cabecalho += f" Completo na variável `{referencia}`: use-a nas próximas execuções em vez de mostrar tudo.]"
+    else:
+        cabecalho += " Filtre ou agregue em vez de mostrar tudo.]"
+
+    partes = [cabecalho]
+    restante = max_caracteres - len(cabecalho)
+    for alternativas in secoes:
+        secao = next((a for a in alternativas if len(a) + 1 <= restante), None)
+        if secao is not None:
+            partes.append(secao)
+            restante -= len(secao) + 1
+    if not secoes and restante > 80:
+        partes.append(_cortar(texto, restante - 1))
+    return "\n".join(partes)
+
+
+def limitar_observacao(valor, max_caracteres, referencia=None):
+    """
+    Texto da saída da execução dentro de `max_caracteres` (sem limite se for 0
+    ou None). Saídas impressas (texto) são cortadas no meio; objetos grandes
+    viram um resumo que aponta para `referencia`.
+    """
+    texto = valor if isinstance(valor, str) else str(valor)
+    if not max_caracteres or len(texto) <= max_caracteres:
+        return texto
+    if isinstance(valor, str):
+        return _cortar(texto, max_caracteres)
+    try:
+        return resumir_resultado(valor, texto, max_caracteres, referencia)
+    except Exception:
+        return _cortar(texto, max_caracteres)
+
+
+def caracteres_do_orcamento(orcamento_tokens):
+    """Orçamento em caracteres para um orçamento em tokens (≈ 4 caracteres por token, como no perfil)."""
+    return max(0, int(orcamento_tokens)) * 4 if orcamento_tokens else 0
+
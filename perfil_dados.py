@@ -0,0 +1,136 @@
+"""
+Perfil compacto do dataset para o prompt do agente.
+
+Substitui o `df.head()` (34 colunas, várias com textos longos) por um resumo
+de uma linha por coluna: tipo, proporção de nulos, quantidade de valores
+distintos, valores mais frequentes e mínimo/máximo. O texto respeita um
+orçamento de tokens e é calculado uma vez por versão do dataset; de cada
+origem ficam só os perfis da versão atual, em memória e no diretório de cache.
+"""
+import hashlib
+import os
+import re
+import threading
+
+import pandas as pd
+
+from carregador_dados import DIRETORIO_CACHE
+
+_cache_memoria = {}  # caminho da origem -> (versão, {orçamento: perfil})
+_lock = threading.Lock()
+
+# Arquivos do formato anterior, sem o nome da origem: perfil-<versão>-<orçamento>.txt
+_PERFIL_SEM_ORIGEM = re.compile(r"perfil-[^-]+-\d+\.txt")
+
+
+def estimar_tokens(texto):
+    """Estimativa simples (≈ 4 caracteres por token), suficiente para o orçamento."""
+    return len(texto) // 4 + 1
+
+
+def _curto(valor, limite):
+    texto = str(valor)
+    return texto if len(texto) <= limite else texto[:limite - 1] + "…"
+
+
+def _formatar_valor(valor):
+    if hasattr(valor, "item") and not isinstance(valor, pd.Timestamp):
+        valor = valor.item()  # escalares numpy -> tipos Python
+    if isinstance(valor, pd.Timestamp):
+        return valor.strftime("%Y-%m-%d")
+    if isinstance(valor, float):
+        return f"{valor:g}"
+    return str(valor)
+
+
+def _descrever_coluna(serie, top, limite_texto):
+    total = len(serie)
+    nulos = int(serie.isna().sum())
+    partes = [f"{serie.name} ({serie.dtype})"]
+    if nulos:
+        partes.append(f"nulos {100 * nulos / total:.0f}%")
+    distintos = int(serie.nunique())
+    partes.append(f"distintos {distintos}")
+    if pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_datetime64_any_dtype(serie):
+        partes.append(f"min {_formatar_valor(serie.min())} max {_formatar_valor(serie.max())}")
+        if distintos <= top:
+            valores = sorted(serie.dropna().unique())
+            partes.append("valores " + ", ".join(_formatar_valor(v) for v in valores))
+    elif top:
+        frequentes = serie.value_counts().head(top)
+        itens = ", ".join(f"{_curto(valor, limite_texto)} ({quantidade})" for valor, quantidade in frequentes.items())
+        partes.append(f"top: {itens}")
+    return " | ".join(partes)
+
+
+def construir_perfil(df, orcamento_tokens=800):
+    """
+    Gera o resumo textual do DataFrame dentro do orçamento de tokens.
+
+    O nível de detalhe (quantidade de valores frequentes e tamanho dos textos)
+    é reduzido até o resumo caber no orçamento; colunas sempre vazias são
+    agrupadas em uma única linha.
+    """
+    vazias = [c for c in df.columns if df[c].isna().all()]
+    preenchidas = [c for c in df.columns if c not in vazias]
+    cabecalho = f"{len(df)} linhas, {df.shape[1]} colunas."
+    rodape = f"Colunas sempre vazias: {', '.join(vazias)}." if vazias else ""
+
+    texto = ""
+    for top, limite_texto in ((3, 40), (2, 30), (1, 24), (0, 0)):
+        linhas = [cabecalho] + [f"- {_descrever_coluna(df[c], top, limite_texto)}" for c in preenchidas]
+        if rodape:
+            linhas.append(rodape)
+        texto = "\n".join(linhas)
+        if estimar_tokens(texto) <= orcamento_tokens:
+            return texto
+    # Mesmo no nível mínimo não coube: corta as últimas linhas
+    return texto[: orcamento_tokens * 4].rsplit("\n", 1)[0] + "\n- (demais colunas omitidas)"
+
+
+def obter_perfil(dataset, orcamento_tokens=800, diretorio_cache=DIRETORIO_CACHE):
+    """
+    Retorna o perfil do DatasetCarregado, reaproveitando o já calculado para a
+    mesma versão e os mesmos tipos das colunas (em memória ou no diretório de cache).
+    """
+    # O perfil mostra os tipos: mudar o esquema (sem mudar os dados) também gera outro perfil
+    tipos = hashlib.sha256(str(list(dataset.df.dtypes.astype(str).items())).encode()).hexdigest()[:8]
+    chave = f"{dataset.versao}.{tipos}"
+    with _lock:
+        versao, perfis = _cache_memoria.get(dataset.caminho, (None, {}))
+        if versao == chave and orcamento_tokens in perfis:
+            return perfis[orcamento_tokens]
+    prefixo = f"perfil-{os.path.splitext(os.path.basename(dataset.caminho))[0]}-"
+    caminho = os.path.join(diretorio_cache, f"{prefixo}{chave}-{orcamento_tokens}.txt")
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            perfil = f.read()
+    except OSError:
+        perfil = construir_perfil(dataset.df, orcamento_tokens)
+        try:
+            os.makedirs(diretorio_cache, exist_ok=True)
+            with open(caminho, "w", encoding="utf-8") as f:
+                f.write(perfil)
+            _remover_perfis_antigos(prefixo, chave, diretorio_cache)
+        except OSError as e:
+            print(f"Não foi possível gravar o perfil em {caminho}: {e}")
+    with _lock:
+        # Só a versão atual de cada origem fica em memória
+        versao, perfis = _cache_memoria.get(dataset.caminho, (None, {}))
+        if versao != chave:
+            perfis = {}
+            _cache_memoria[dataset.caminho] = (chave, perfis)
+        perfis[orcamento_tokens] = perfil
+    return perfil
+
+
+def _remover_perfis_antigos(prefixo, versao, diretorio_cache):
+    """Remove os perfis da mesma origem com outra versão e os do formato sem o nome da origem."""
+    atual = f"{prefixo}{versao}-"
+    for nome in os.listdir(diretorio_cache):
+        antigo = nome.startswith(prefixo) and not nome.startswith(atual)
+        if nome.endswith(".txt") and (antigo or _PERFIL_SEM_ORIGEM.fullmatch(nome)):
+            try:
+                os.remove(os.path.join(diretorio_cache, nome))
+            except OSError:
+                pass
@@ -0,0 +1,140 @@
+"""
+Recursos compartilhados pelo processo inteiro (dataset, LLM e agente).
+
+Cada dataset do registro (`registro_datasets`) tem uma instância de
+GerenciadorRecursos, reaproveitada por todas as sessões do Streamlit: o CSV é
+lido uma vez, e a interface e o agente enxergam sempre a mesma versão dos
+dados (até o monitor de atualização trocá-la por uma nova com
+`substituir_dataset`, ou o registro descarregá-la com `descarregar`).
+"""
+import threading
+import time
+
+
+class GerenciadorRecursos:
+    """
+    Carrega o dataset, o LLM e o agente sob demanda, uma única vez por processo.
+
+    Falhas na criação do LLM ou do agente não ficam gravadas para sempre: o
+    erro é guardado por `intervalo_nova_tentativa` segundos (para não repetir
+    chamadas caras a cada pergunta) e depois uma nova tentativa é feita.
+
+    `ao_construir(nome, duracao_s)`, se informado, é chamado após cada recurso
+    ("dataset", "llm" ou "agente") criado com sucesso.
+    """
+
+    def __init__(self, carregar_dados, criar_llm, criar_agente, intervalo_nova_tentativa=30, ao_construir=None):
+        self._carregar_dados = carregar_dados
+        self._criar_llm = criar_llm
+        self._criar_agente = criar_agente
+        self.intervalo_nova_tentativa = intervalo_nova_tentativa
+        self._ao_construir = ao_construir
+
+        self._lock = threading.RLock()
+        self._dataset = None
+        self._llm = None
+        self._agente = None
+        self._falhas = {}  # nome do recurso -> (instante da falha, exceção)
+
+    def _verificar_falha_recente(self, nome):
+        falha = self._falhas.get(nome)
+        if falha and time.monotonic() - falha[0] < self.intervalo_nova_tentativa:
+            raise falha[1]
+
+    def _construir(self, nome, fabrica):
+        self._verificar_falha_recente(nome)
+        inicio = time.perf_counter()
+        try:
+            recurso = fabrica()
+        except Exception as e:
+            self._falhas[nome] = (time.monotonic(), e)
+            raise
+        self._falhas.pop(nome, None)
+        if self._ao_construir is not None:
+            self._ao_construir(nome, time.perf_counter() - inicio)
+        return recurso
+
+    def obter_dataset(self):
+        """Retorna o DatasetCarregado compartilhado, carregando-o na primeira chamada."""
+        if self._dataset is None:
+            with self._lock:
+                if self._dataset is None:
+                    self._dataset = self._construir("dataset", self._carregar_dados)
+        return self._dataset
+
+    def obter_llm(self):
+        """Retorna o LLM compartilhado, criando-o na primeira chamada."""
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = self._construir("llm", self._criar_llm)
+        return self._llm
+
+    def obter_agente(self):
+        """Retorna o agente construído a partir do dataset e do LLM compartilhados."""
+        if self._agente is None:
+            with self._lock:
+                if self._agente is None:
+                    dataset = self.obter_dataset()
+                    llm = self.obter_llm()
+                    self._agente = self._construir("agente", lambda: self._criar_agente(dataset, llm))
+        return self._agente
+
+    def substituir_dataset(self, dataset):
+        """
+        Troca o dataset por uma nova versão e descarta o agente da versão anterior.
+
+        A troca é uma atribuição sob o lock: quem já obteve o dataset ou o agente
+        antigos (perguntas em andamento) continua com eles, e o próximo
+        `obter_agente` cria o agente da nova versão. Retorna o agente anterior
+        (ou None), para ser encerrado quando essas perguntas terminarem.
+        """
+        with self._lock:
+            anterior = self._agente
+            self._dataset = dataset
+            self._agente = None
+            self._falhas.pop("dataset", None)
+            self._falhas.pop("agente", None)
+        return anterior
+
+    @property
+    def carregado(self):
+        """True se o dataset está em memória (sem carregá-lo)."""
+        return self._dataset is not None
+
+    @property
+    def agente_atual(self):
+        """O agente já criado para o dataset atual, ou None (sem criá-lo)."""
+        return self._agente
+
+    def descarregar(self):
+        """
+        Descarta o dataset e o agente para liberar memória; o próximo
+        `obter_dataset` ou `obter_agente` os cria de novo. O LLM fica.
+
+        Como em `substituir_dataset`, as perguntas em andamento continuam com
+        os objetos que já obtiveram. Retorna (dataset, agente) descartados, ou
+        None se nada estava carregado.
+        """
+        with self._lock:
+            if self._dataset is None:
+                return None
+            descartados = (self._dataset, self._agente)
+            self._dataset = None
+            self._agente = None
+        return descartados
+
+    def estado(self):
+        """
+        Resumo do que já foi carregado e das últimas falhas (útil para diagnóstico).
+
+        Não usa o lock: quem verifica a saúde do processo não deve esperar o
+        fim de uma carga em andamento.
+        """
+        dataset = self._dataset
+        return {
+            "dataset": dataset.versao if dataset is not None else None,
+            "llm": self._llm is not None,
+            "agente": self._agente is not None,
+            "falhas": {nome: str(erro) for nome, (_, erro) in dict(self._falhas).items()},
+        }
@@ -0,0 +1,284 @@
+"""
+Registro dos datasets servidos pelo processo, com orçamento de memória.
+
+Cada dataset configurado (id -> arquivo local ou URL) tem o seu
+GerenciadorRecursos: é carregado na primeira vez em que é usado e fica em
+memória com o agente e as estruturas derivadas (tabelas normalizadas, cubo).
+O LLM é um só para todos os agentes, assim como as importações do pandas e do
+LangChain, então um processo atende vários departamentos.
+
+Quando a memória estimada dos datasets carregados passa de `max_bytes`, os
+menos usados recentemente (LRU) são descarregados: o dataset e o agente saem
+da memória e a próxima pergunta sobre eles mapeia de novo o snapshot Arrow
+gravado em disco na primeira carga, em vez de reler o CSV. O agente de um
+dataset descarregado é encerrado quando a última pergunta que o reservou
+(`reservar_agente`) termina, e não depois de um tempo fixo: a memória volta
+logo, mesmo quando os datasets se alternam rápido.
+"""
+import re
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from recursos import GerenciadorRecursos
+
+# Ids viram nomes de diretório (cache de cada dataset) e aparecem na URL da API
+PADRAO_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class DatasetDesconhecido(KeyError):
+    """Id de dataset que não está no registro."""
+
+    def __str__(self):
+        return str(self.args[0])
+
+
+def ler_fontes(configuracao, padrao):
+    """
+    Datasets configurados: texto "id=caminho ou URL" separado por vírgulas ou
+    um dicionário (ex.: uma tabela do secrets.toml). Sem configuração, `padrao`.
+    A ordem é mantida: o primeiro é o dataset padrão.
+    """
+    if not configuracao:
+        return dict(padrao)
+    if hasattr(configuracao, "items"):
+        pares = [(str(id_dataset), str(origem)) for id_dataset, origem in configuracao.items()]
+    else:
+        pares = []
+        for item in str(configuracao).split(","):
+            if not item.strip():
+                continue
+            id_dataset, separador, origem = item.partition("=")
+            if not separador:
+                raise ValueError(f"Dataset sem origem em DATASETS: {item.strip()!r} (use id=caminho)")
+            pares.append((id_dataset.strip(), origem.strip()))
+    fontes = {}
+    for id_dataset, origem in pares:
+        if not PADRAO_ID.match(id_dataset):
+            raise ValueError(f"Id de dataset inválido: {id_dataset!r} (use letras, números, _ ou -)")
+        fontes[id_dataset] = origem
+    if not fontes:
+        raise ValueError("Nenhum dataset configurado em DATASETS")
+    return fontes
+
+
+def memoria_dataset(dataset):
+    """Memória estimada do dataset em bytes: o DataFrame (com o conteúdo dos textos) e as estruturas derivadas."""
+    total = int(dataset.df.memory_usage(index=True, deep=True).sum())
+    for derivado in dataset.derivados.values():
+        if hasattr(derivado, "memoria_bytes"):
+            total += int(derivado.memoria_bytes())
+    return total
+
+
+class RegistroDatasets:
+    """
+    Datasets por id, carregados sob demanda e descarregados por ordem de uso
+    recente quando a memória estimada passa do orçamento.
+
+    Args:
+        fontes: {id: origem (caminho ou URL)}; o primeiro é o dataset padrão.
+        carregar_dados: `carregar_dados(id, origem)` -> DatasetCarregado.
+        criar_llm: Cria o LLM, compartilhado pelos agentes de todos os datasets.
+        criar_agente: `criar_agente(dataset, llm)`.
+        max_bytes: Orçamento de memória dos datasets carregados (0 = sem limite).
+            O dataset em uso nunca é descarregado, mesmo sozinho acima do orçamento.
+        ao_descarregar: `ao_descarregar(id, dataset, agente)` depois que um dataset
+            sai da memória e nenhuma pergunta usa mais o seu agente (ex.: encerrar
+            o agente e o monitor de atualização).
+        ao_construir: `ao_construir(id, nome, duracao_s)` após cada recurso criado.
+        ao_evento: Função chamada com o nome de eventos (ex.: telemetria).
+    """
+
+    def __init__(self, fontes, carregar_dados, criar_llm, criar_agente, max_bytes=0, ao_descarregar=None,
+                 ao_construir=None, ao_evento=None, intervalo_nova_tentativa=30):
+        if not fontes:
+            raise ValueError("Nenhum dataset configurado")
+        self.fontes = dict(fontes)
+        self.padrao = next(iter(self.fontes))
+        self.max_bytes = max_bytes
+        self._criar_llm = criar_llm
+        self._ao_descarregar = ao_descarregar
+        self._ao_construir = ao_construir
+        self._ao_evento = ao_evento
+
+        self._lock = threading.Lock()
+        self._lock_llm = threading.Lock()
+        self._llm = None
+        # Perguntas em andamento por agente e agentes descarregados à espera da última delas
+        self._lock_uso = threading.Lock()
+        self._em_uso = {}  # id(agente) -> perguntas
+        self._pendentes = {}  # id(agente) -> argumentos de ao_descarregar
+        # id -> (identidade do DatasetCarregado medido, bytes), do menos ao mais usado recentemente
+        self._residentes = OrderedDict()
+        self._recursos = {
+            id_dataset: GerenciadorRecursos(
+                partial(carregar_dados, id_dataset, origem), self.obter_llm, criar_agente,
+                intervalo_nova_tentativa, ao_construir=partial(self._construido, id_dataset),
+            )
+            for id_dataset, origem in self.fontes.items()
+        }
+        self._estatisticas = {
+            id_dataset: {"cargas": 0, "acertos": 0, "falhas": 0, "remocoes": 0,
+                         "tempo_ultima_carga_s": None, "tempo_total_carga_s": 0.0}
+            for id_dataset in self.fontes
+        }
+
+    def ids(self):
+        """Ids dos datasets configurados, o padrão primeiro."""
+        return list(self.fontes)
+
+    def _id(self, id_dataset):
+        id_dataset = id_dataset or self.padrao
+        if id_dataset not in self._recursos:
+            raise DatasetDesconhecido(
+                f"Dataset desconhecido: {id_dataset!r}. Disponíveis: {', '.join(self.fontes)}")
+        return id_dataset
+
+    def origem(self, id_dataset=None):
+        """Caminho ou URL do dataset."""
+        return self.fontes[self._id(id_dataset)]
+
+    def recursos(self, id_dataset=None):
+        """GerenciadorRecursos do dataset (sem contar como uso nem carregar)."""
+        return self._recursos[self._id(id_dataset)]
+
+    def obter_llm(self):
+        """LLM compartilhado pelos agentes de todos os datasets, criado no primeiro uso."""
+        if self._llm is None:
+            with self._lock_llm:
+                if self._llm is None:
+                    self._llm = self._criar_llm()
+        return self._llm
+
+    def obter_dataset(self, id_dataset=None):
+        """Dataset `id_dataset` (padrão: o primeiro), carregando-o se não está em memória."""
+        id_dataset = self._id(id_dataset)
+        recursos = self._recursos[id_dataset]
+        residente = recursos.carregado
+        dataset = recursos.obter_dataset()
+        with self._lock:
+            self._estatisticas[id_dataset]["acertos" if residente else "falhas"] += 1
+        self._evento("acerto" if residente else "falha")
+        self._usar(id_dataset, dataset)
+        return dataset
+
+    def obter_agente(self, id_dataset=None):
+        """Agente do dataset, criado com o LLM compartilhado (carrega o dataset se preciso)."""
+        id_dataset = self._id(id_dataset)
+        recursos = self._recursos[id_dataset]
+        dataset = recursos.obter_dataset()
+        agente = recursos.obter_agente()
+        self._usar(id_dataset, dataset)
+        return agente
+
+    def reservar_agente(self, id_dataset=None):
+        """
+        Agente do dataset para uma pergunta. Até `liberar_agente`, o agente não é
+        encerrado: se o dataset for descarregado, o encerramento espera a pergunta.
+        """
+        id_dataset = self._id(id_dataset)
+        recursos = self._recursos[id_dataset]
+        while True:
+            agente = self.obter_agente(id_dataset)
+            with self._lock_uso:
+                # Ainda é o agente atual: a remoção, se vier, verá a reserva
+                if recursos.agente_atual is agente:
+                    self._em_uso[id(agente)] = self._em_uso.get(id(agente), 0) + 1
+                    return agente
+            # Descarregado (ou trocado pelo monitor) entre a criação e a reserva: obtém de novo
+
+    def liberar_agente(self, agente):
+        """Fim da pergunta que reservou o agente; encerra-o se o dataset já foi descarregado."""
+        with self._lock_uso:
+            restantes = self._em_uso.get(id(agente), 0) - 1
+            if restantes > 0:
+                self._em_uso[id(agente)] = restantes
+                return
+            self._em_uso.pop(id(agente), None)
+            pendente = self._pendentes.pop(id(agente), None)
+        if pendente is not None and self._ao_descarregar is not None:
+            self._ao_descarregar(*pendente)
+
+    def _construido(self, id_dataset, nome, duracao_s):
+        if nome == "dataset":
+            with self._lock:
+                estatisticas = self._estatisticas[id_dataset]
+                estatisticas["cargas"] += 1
+                estatisticas["tempo_ultima_carga_s"] = round(duracao_s, 4)
+                estatisticas["tempo_total_carga_s"] += duracao_s
+            self._evento("carga")
+        if self._ao_construir is not None:
+            self._ao_construir(id_dataset, nome, duracao_s)
+
+    def _usar(self, id_dataset, dataset):
+        """Marca o dataset como o usado mais recentemente e descarrega os menos usados acima do orçamento."""
+        with self._lock:
+            registrado = self._residentes.get(id_dataset)
+            if registrado is not None and registrado[0] == id(dataset):
+                self._residentes.move_to_end(id_dataset)
+                return
+        # Carga nova (ou nova versão trazida pelo monitor): mede fora do lock
+        tamanho = memoria_dataset(dataset)
+        remover = []
+        with self._lock:
+            self._residentes[id_dataset] = (id(dataset), tamanho)
+            self._residentes.move_to_end(id_dataset)
+            total = sum(medido for _, medido in self._residentes.values())
+            while self.max_bytes and total > self.max_bytes and len(self._residentes) > 1:
+                id_removido, (_, bytes_removidos) = self._residentes.popitem(last=False)
+                total -= bytes_removidos
+                remover.append((id_removido, bytes_removidos))
+        for id_removido, bytes_removidos in remover:
+            self._descarregar(id_removido, bytes_removidos)
+
+    def _descarregar(self, id_dataset, bytes_removidos):
+        with self._lock:
+            if id_dataset in self._residentes:
+                return  # usado de novo desde que foi escolhido para sair
+        descartados = self._recursos[id_dataset].descarregar()
+        if descartados is None:
+            return
+        with self._lock:
+            self._estatisticas[id_dataset]["remocoes"] += 1
+        self._evento("remocao")
+        print(f"Registro de datasets: {id_dataset} descarregado ({bytes_removidos / 2 ** 20:.1f} MB)"
+              f" para ficar em {self.max_bytes / 2 ** 20:.0f} MB")
+        dataset, agente = descartados
+        with self._lock_uso:
+            if agente is not None and self._em_uso.get(id(agente)):
+                # Perguntas em andamento: a última a liberar o agente o encerra
+                self._pendentes[id(agente)] = (id_dataset, dataset, agente)
+                return
+        if self._ao_descarregar is not None:
+            self._ao_descarregar(id_dataset, dataset, agente)
+
+    def _evento(self, nome):
+        if self._ao_evento is not None:
+            self._ao_evento(f"registro_datasets_{nome}")
+
+    def estatisticas(self):
+        """Memória e ordem de uso dos datasets carregados e, por dataset, cargas, acertos e remoções."""
+        with self._lock:
+            residentes = {id_dataset: tamanho for id_dataset, (_, tamanho) in self._residentes.items()}
+            por_dataset = {}
+            for id_dataset, origem in self.fontes.items():
+                estatisticas = dict(self._estatisticas[id_dataset])
+                consultas = estatisticas["acertos"] + estatisticas["falhas"]
+                estatisticas["tempo_total_carga_s"] = round(estatisticas["tempo_total_carga_s"], 4)
+                por_dataset[id_dataset] = dict(
+                    estatisticas,
+                    origem=origem,
+                    carregado=id_dataset in residentes,
+                    versao=self._recursos[id_dataset].estado()["dataset"],
+                    memoria_mb=round(residentes.get(id_dataset, 0) / 2 ** 20, 2),
+                    taxa_acerto=estatisticas["acertos"] / consultas if consultas else 0.0,
+                )
+        return {
+            "padrao": self.padrao,
+            "limite_mb": round(self.max_bytes / 2 ** 20, 2) if self.max_bytes else None,
+            "memoria_mb": round(sum(residentes.values()) / 2 ** 20, 2),
+            # Do menos ao mais usado recentemente (o primeiro é o próximo a sair)
+            "carregados": list(residentes),
+            "datasets": por_dataset,
+        }
@@ -0,0 +1,281 @@
+"""
+Roteador de intenções: responde perguntas comuns sobre o esquema e agregações
+simples diretamente com pandas, sem chamar o LLM.
+
+Cada modelo de pergunta é uma expressão regular sobre a pergunta normalizada
+(minúsculas, sem acentos) e uma função que calcula a resposta. Perguntas que
+não casam com nenhum modelo seguem para o agente normalmente.
+
+No layout EAV cada etapa se repete uma vez por campo de formulário. Quando as
+tabelas normalizadas existem, contagens e médias de colunas da etapa ou do
+fluxo são calculadas sobre `etapas` e `fluxos` (uma linha por seqEtapa e por
+seqFluxo), como o agente faria; colunas de campo continuam sobre `df`.
+"""
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from cache_respostas import normalizar_pergunta
+
+# Palavras de preenchimento aceitas ao redor das perguntas ("... tem o dataframe?")
+_PREENCHIMENTO = (
+    r"(?:\s+(?:o|a|os|as|no|na|nos|nas|do|da|dos|das|de|em|neste|nesse|tem|possui|contem|"
+    r"existem|existe|ha|sao|e|dataframe|dataset|df|arquivo|tabela|base|dados|csv|planilha|atual))*"
+)
+_INICIO = r"(?:(?:me\s+)?(?:diga|mostre|informe|exiba|mostra)(?:\s+me)?\s+)?"
+
+# Apelidos para colunas de medida citadas de forma abreviada
+_APELIDOS = {
+    "tempo": "tempoTotal",
+}
+
+
+def _modelo(padrao):
+    return re.compile(_INICIO + padrao + _PREENCHIMENTO)
+
+
+def _normalizar_termo(texto):
+    return normalizar_pergunta(texto).replace(" ", "")
+
+
+def resolver_coluna(df, termo, numerica=False):
+    """
+    Encontra a coluna citada na pergunta (ignorando maiúsculas, acentos e plural).
+    Retorna None se não houver correspondência exata.
+    """
+    colunas = {_normalizar_termo(c): c for c in df.columns}
+    termo = _normalizar_termo(termo)
+    candidatos = [termo, termo[:-1] if termo.endswith("s") else None,
+                  termo[:-2] if termo.endswith("es") else None]
+    for candidato in candidatos:
+        if not candidato:
+            continue
+        coluna = colunas.get(candidato) or colunas.get(_normalizar_termo(_APELIDOS.get(candidato, "")))
+        if coluna is not None:
+            if numerica and not _eh_numerica(df[coluna]):
+                return None
+            return coluna
+    return None
+
+
+def _eh_numerica(serie):
+    return serie.dtype.kind in "iuf"
+
+
+# O que cada linha representa, por tabela de origem
+_UNIDADES = {"df": "registros", "etapas": "etapas", "fluxos": "fluxos"}
+
+
+def _origem(df, tabelas, coluna):
+    """(quadro, nome) da tabela sem repetição que tem a coluna, ou (df, "df")."""
+    if tabelas is not None:
+        for nome in ("etapas", "fluxos"):
+            quadro = getattr(tabelas, nome)
+            if coluna in quadro.columns:
+                return quadro, nome
+    return df, "df"
+
+
+def _tabela(objeto, nome_valor):
+    quadro = objeto.to_frame(nome_valor) if hasattr(objeto, "to_frame") else objeto
+    return quadro.to_markdown()
+
+
+# --- Cálculos de cada modelo: recebem (df, match, tabelas) e retornam (resposta, código) ou None ---
+
+def _linhas_colunas(df, *_):
+    linhas, colunas = df.shape
+    return f"O DataFrame possui {linhas} linhas e {colunas} colunas.", "df.shape"
+
+
+def _linhas(df, *_):
+    return f"O DataFrame possui {len(df)} linhas.", "len(df)"
+
+
+def _quantidade_colunas(df, *_):
+    return f"O DataFrame possui {df.shape[1]} colunas.", "df.shape[1]"
+
+
+def _lista_colunas(df, *_):
+    nomes = ", ".join(f"`{c}`" for c in df.columns)
+    return f"O DataFrame possui {df.shape[1]} colunas: {nomes}.", "df.columns.tolist()"
+
+
+def _contagem_por(df, match, tabelas):
+    coluna = resolver_coluna(df, match.group("col"))
+    if coluna is None:
+        return None
+    quadro, nome = _origem(df, tabelas, coluna)
+    contagem = quadro[coluna].value_counts(dropna=False)
+    resposta = f"Contagem de {_UNIDADES[nome]} por `{coluna}`:\n\n{_tabela(contagem, 'quantidade')}"
+    return resposta, f"{nome}['{coluna}'].value_counts(dropna=False)"
+
+
+def _distintos(df, match, _):
+    coluna = resolver_coluna(df, match.group("col"))
+    if coluna is None:
+        return None
+    return (f"A coluna `{coluna}` possui {df[coluna].nunique()} valores distintos.",
+            f"df['{coluna}'].nunique()")
+
+
+def _media_por(df, match, tabelas):
+    medida = resolver_coluna(df, match.group("medida"), numerica=True)
+    coluna = resolver_coluna(df, match.group("col"))
+    if medida is None or coluna is None:
+        return None
+    quadro, origem = _origem(df, tabelas, medida)
+    if coluna not in quadro.columns:
+        if origem == "etapas" and coluna in tabelas.fluxos.columns:
+            # Medida da etapa agrupada por coluna do fluxo: junta pelo seqFluxo
+            quadro = quadro.merge(tabelas.fluxos[["seqFluxo", coluna]], on="seqFluxo", how="left")
+            origem = f"etapas.merge(fluxos[['seqFluxo', '{coluna}']], on='seqFluxo', how='left')"
+        else:
+            quadro, origem = df, "df"
+    medias = quadro.groupby(coluna, observed=True)[medida].mean().round(2).sort_values(ascending=False)
+    resposta = f"Média de `{medida}` por `{coluna}`:\n\n{_tabela(medias, f'media_{medida}')}"
+    return resposta, f"{origem}.groupby('{coluna}', observed=True)['{medida}'].mean().round(2).sort_values(ascending=False)"
+
+
+def _media(df, match, tabelas):
+    medida = resolver_coluna(df, match.group("medida"), numerica=True)
+    if medida is None:
+        return None
+    quadro, nome = _origem(df, tabelas, medida)
+    return f"A média de `{medida}` é {quadro[medida].mean():.2f}.", f"{nome}['{medida}'].mean()"
+
+
+def _nulos(df, *_):
+    nulos = df.isna().sum()
+    nulos = nulos[nulos > 0].sort_values(ascending=False)
+    if nulos.empty:
+        return "Nenhuma coluna possui valores nulos.", "df.isna().sum()"
+    resposta = f"Colunas com valores nulos:\n\n{_tabela(nulos, 'nulos')}"
+    return resposta, "df.isna().sum()[lambda s: s > 0].sort_values(ascending=False)"
+
+
+def _mais_frequentes(df, match, tabelas):
+    coluna = resolver_coluna(df, match.group("col"))
+    if coluna is None:
+        return None
+    quantidade = int(match.groupdict().get("n") or 1)
+    quadro, nome = _origem(df, tabelas, coluna)
+    top = quadro[coluna].value_counts().head(quantidade)
+    if quantidade == 1 and len(top):
+        return (f"O valor mais frequente de `{coluna}` é **{top.index[0]}** ({top.iloc[0]} {_UNIDADES[nome]}).",
+                f"{nome}['{coluna}'].value_counts().head(1)")
+    resposta = f"Valores mais frequentes de `{coluna}`:\n\n{_tabela(top, 'quantidade')}"
+    return resposta, f"{nome}['{coluna}'].value_counts().head({quantidade})"
+
+
+@dataclass
+class ModeloPergunta:
+    """Um padrão de pergunta e a função que a responde."""
+    nome: str
+    padroes: list
+    executar: Callable
+
+
+MODELOS = [
+    ModeloPergunta("linhas_colunas", [
+        _modelo(r"quant[ao]s linhas e (?:quantas )?colunas"),
+        _modelo(r"(?:qual (?:e )?)?(?:o |a )?(?:tamanho|formato|shape|dimensao|dimensoes)"),
+    ], _linhas_colunas),
+    ModeloPergunta("linhas", [
+        _modelo(r"(?:quant[ao]s|(?:qual (?:e )?)?(?:o )?numero de) (?:linhas|registros)"),
+    ], _linhas),
+    ModeloPergunta("quantidade_colunas", [
+        _modelo(r"(?:quantas|(?:qual (?:e )?)?(?:o )?numero de) colunas"),
+    ], _quantidade_colunas),
+    ModeloPergunta("lista_colunas", [
+        _modelo(r"(?:quais (?:sao )?(?:as )?colunas|(?:liste|listar|mostre|mostrar) (?:as )?colunas|(?:os )?nomes? das colunas)(?: disponiveis)?"),
+    ], _lista_colunas),
+    ModeloPergunta("contagem_por", [
+        _modelo(r"(?:contagem|quantidade|total|numero)(?: de (?:registros|linhas))? (?:por|de cada|para cada|em cada) (?:coluna |campo )?(?P<col>\w+)"),
+        _modelo(r"quant[ao]s (?:registros|linhas) (?:por|de cada|para cada|em cada|ha em cada|existem por) (?:coluna |campo )?(?P<col>\w+)"),
+        _modelo(r"(?:distribuicao|contagem) (?:de |da |do |dos |das )?(?:coluna |campo )?(?P<col>\w+)"),
+    ], _contagem_por),
+    ModeloPergunta("valores_distintos", [
+        _modelo(r"quant[ao]s (?:valores )?(?:unicos|distintos|diferentes)(?: (?:tem|existem|ha))? (?:na|no|em|de|da|do|para (?:a|o)) (?:coluna |campo )?(?P<col>\w+)"),
+        _modelo(r"quant[ao]s (?P<col>\w+) (?:unic[ao]s|distint[ao]s|diferentes)"),
+    ], _distintos),
+    ModeloPergunta("media_por", [
+        _modelo(r"(?:qual (?:e )?)?(?:a )?media (?:de |do |da )?(?P<medida>\w+) (?:por|para cada|em cada|de cada) (?P<col>\w+)"),
+        _modelo(r"(?:qual (?:e )?)?(?:o )?(?P<medida>tempo\w*) medio (?:por|para cada|em cada|de cada) (?P<col>\w+)"),
+    ], _media_por),
+    ModeloPergunta("media", [
+        _modelo(r"(?:qual (?:e )?)?(?:a )?media (?:de |do |da )?(?:coluna )?(?P<medida>\w+)"),
+        _modelo(r"(?:qual (?:e )?)?(?:o )?(?P<medida>tempo\w*) medio"),
+    ], _media),
+    ModeloPergunta("valores_nulos", [
+        _modelo(r"(?:quantos |quais (?:sao )?(?:os )?)?(?:valores )?(?:nulos|faltantes|ausentes)(?: por coluna)?"),
+        _modelo(r"(?:quais )?colunas (?:tem|possuem|com) (?:valores )?(?:nulos|faltantes|ausentes)"),
+    ], _nulos),
+    ModeloPergunta("mais_frequentes", [
+        _modelo(r"(?:qual|quais) (?:e |sao )?(?:o |a |os |as )?(?P<col>\w+) (?:mais (?:frequentes?|comuns?)|com mais registros)"),
+        _modelo(r"(?:top |os |as )?(?P<n>\d+) (?P<col>\w+) (?:mais (?:frequentes|comuns)|com mais registros)"),
+    ], _mais_frequentes),
+]
+
+
+class RoteadorIntencoes:
+    """
+    Tenta responder a pergunta com um dos modelos; registra latência e taxa de
+    acerto por modelo.
+    """
+
+    def __init__(self, modelos=None):
+        self.modelos = modelos if modelos is not None else MODELOS
+        self._lock = threading.Lock()
+        self.consultas = 0
+        self._por_modelo = {m.nome: {"acertos": 0, "tempo_total": 0.0, "tempo_max": 0.0} for m in self.modelos}
+
+    def responder(self, pergunta, df, tabelas=None):
+        """
+        Retorna (resposta, raciocínio) se algum modelo responder a pergunta, senão None.
+        `tabelas` são as TabelasNormalizadas do dataset, quando existem.
+        """
+        texto = re.sub(r"[,;:]", " ", normalizar_pergunta(pergunta))
+        texto = re.sub(r"\s+", " ", texto).strip()
+        with self._lock:
+            self.consultas += 1
+        for modelo in self.modelos:
+            for padrao in modelo.padroes:
+                match = padrao.fullmatch(texto)
+                if not match:
+                    continue
+                inicio = time.perf_counter()
+                resultado = modelo.executar(df, match, tabelas)
+                if resultado is None:
+                    continue
+                self._registrar(modelo.nome, time.perf_counter() - inicio)
+                return resultado
+        return None
+
+    def _registrar(self, nome, duracao):
+        with self._lock:
+            estatistica = self._por_modelo[nome]
+            estatistica["acertos"] += 1
+            estatistica["tempo_total"] += duracao
+            estatistica["tempo_max"] = max(estatistica["tempo_max"], duracao)
+
+    def estatisticas(self):
+        """Taxa de roteamento global e, por modelo, acertos e latência média/máxima (ms)."""
+        with self._lock:
+            roteadas = sum(e["acertos"] for e in self._por_modelo.values())
+            return {
+                "consultas": self.consultas,
+                "roteadas": roteadas,
+                "taxa_roteamento": roteadas / self.consultas if self.consultas else 0.0,
+                "modelos": {
+                    nome: {
+                        "acertos": e["acertos"],
+                        "taxa_acerto": e["acertos"] / self.consultas if self.consultas else 0.0,
+                        "latencia_media_ms": 1000 * e["tempo_total"] / e["acertos"] if e["acertos"] else 0.0,
+                        "latencia_max_ms": 1000 * e["tempo_max"],
+                    }
+                    for nome, e in self._por_modelo.items()
+                },
+            }
@@ -0,0 +1,331 @@
+"""
+Pool de processos pré-aquecidos para executar o código pandas gerado pelo agente.
+
+Cada processo executa um trecho de código por vez, com limites de tempo de
+CPU, tempo de parede e memória. Um processo que trava, estoura memória ou
+morre é substituído automaticamente, sem afetar o processo do Streamlit nem
+as demais sessões.
+
+O processo principal tem várias threads (Streamlit, API, agendador, monitor
+dos dados), e um `fork` dele pode copiar um lock no meio de uso. Por isso ele
+nunca faz `fork`: cada pool inicia, pelo `forkserver` (com o pandas já
+importado), um processo matriz de uma thread só que recebe o namespace uma
+vez e cria cada processo do pool com `os.fork()`, inclusive as substituições.
+Os processos compartilham o DataFrame da matriz por cópia sob demanda. Sem
+`fork` (Windows), os processos são iniciados com `spawn` e recebem uma cópia.
+"""
+import ast
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import threading
+from contextlib import redirect_stdout
+from io import StringIO
+from multiprocessing import reduction
+from multiprocessing.connection import Connection
+
+from observacoes import limitar_observacao, nome_referencia
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Windows
+    RESOURCE_AVAILABLE = False
+
+
+class LimiteCPUExcedido(Exception):
+    pass
+
+
+def executar_codigo(codigo, globais, locais):
+    """
+    Executa o código com a mesma semântica da ferramenta `python_repl_ast`:
+    todas as instruções menos a última são executadas, e a última é avaliada
+    para produzir a saída (ou o que foi impresso, se ela não retornar valor).
+    Erros do código voltam como texto, exceto `LimiteCPUExcedido` e
+    `MemoryError`, que quem impôs o limite informa.
+    """
+    try:
+        arvore = ast.parse(codigo)
+        exec(ast.unparse(ast.Module(arvore.body[:-1], type_ignores=[])), globais, locais)
+        ultima = ast.unparse(ast.Module(arvore.body[-1:], type_ignores=[]))
+        saida = StringIO()
+        try:
+            with redirect_stdout(saida):
+                retorno = eval(ultima, globais, locais)
+            return saida.getvalue() if retorno is None else retorno
+        except (LimiteCPUExcedido, MemoryError):
+            raise
+        except Exception:
+            with redirect_stdout(saida):
+                exec(ultima, globais, locais)
+            return saida.getvalue()
+    except (LimiteCPUExcedido, MemoryError):
+        raise
+    except Exception as e:
+        return "{}: {}".format(type(e).__name__, str(e))
+
+
+def _ao_exceder_cpu(signum, frame):
+    raise LimiteCPUExcedido("limite de tempo de CPU excedido")
+
+
+def _memoria_virtual_atual():
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for linha in f:
+                if linha.startswith("VmSize:"):
+                    return int(linha.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _executar_com_preambulo(preambulo, codigo, namespace, max_caracteres_saida=0):
+    """
+    Executa o código sobre uma cópia do namespace, depois de refazer sem saída
+    as atribuições de execuções anteriores (`preambulo`) de que ele depende.
+    """
+    locais = dict(namespace)
+    if preambulo:
+        try:
+            with redirect_stdout(StringIO()):
+                exec(preambulo, {}, locais)
+        except (LimiteCPUExcedido, MemoryError):
+            raise
+        except Exception as e:
+            return "{}: {} (ao refazer as variáveis das execuções anteriores)".format(type(e).__name__, str(e))
+    saida = executar_codigo(codigo, {}, locais)
+    return limitar_observacao(saida, max_caracteres_saida, nome_referencia(codigo))
+
+
+def _laco_worker(conexao, namespace, limite_cpu_s, limite_memoria_mb, max_caracteres_saida=0):
+    """
+    Laço principal de cada processo do pool: recebe código, devolve a saída em
+    texto (resumida acima de `max_caracteres_saida`, onde o objeto ainda existe).
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if RESOURCE_AVAILABLE:
+        if limite_memoria_mb:
+            limite = _memoria_virtual_atual() + limite_memoria_mb * 1024 * 1024
+            try:
+                resource.setrlimit(resource.RLIMIT_AS, (limite, resource.getrlimit(resource.RLIMIT_AS)[1]))
+            except (ValueError, OSError):
+                pass
+        if limite_cpu_s and hasattr(signal, "SIGXCPU"):
+            signal.signal(signal.SIGXCPU, _ao_exceder_cpu)
+
+    while True:
+        try:
+            mensagem = conexao.recv()
+        except (EOFError, OSError):
+            break
+        if mensagem is None:
+            break
+        preambulo, codigo = mensagem
+        if RESOURCE_AVAILABLE and limite_cpu_s:
+            # Só o limite "soft" é ajustado: o "hard" não pode ser elevado de novo depois de reduzido
+            usado = resource.getrusage(resource.RUSAGE_SELF)
+            consumido = int(usado.ru_utime + usado.ru_stime)
+            _, rigido = resource.getrlimit(resource.RLIMIT_CPU)
+            suave = consumido + limite_cpu_s
+            if rigido != resource.RLIM_INFINITY:
+                suave = min(suave, rigido)
+            resource.setrlimit(resource.RLIMIT_CPU, (suave, rigido))
+        try:
+            saida = _executar_com_preambulo(preambulo, codigo, namespace, max_caracteres_saida)
+        except LimiteCPUExcedido as e:
+            saida = f"TimeoutError: {e} ({limite_cpu_s}s)"
+        except MemoryError:
+            saida = f"MemoryError: limite de memória excedido ({limite_memoria_mb} MB)"
+        try:
+            conexao.send(saida)
+        except (BrokenPipeError, OSError):
+            break
+
+
+def _laco_matriz(conexao, namespace, limite_cpu_s, limite_memoria_mb, max_caracteres_saida=0):
+    """
+    Processo matriz do pool: a cada pedido cria um processo com `os.fork()` e
+    devolve o pid e o socket de comunicação com ele. Tem uma thread só, então
+    o fork é seguro; os filhos encerrados são recolhidos automaticamente.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    while True:
+        try:
+            pedido = conexao.recv()
+        except (EOFError, OSError):
+            break
+        if pedido is None:
+            break
+        nosso, do_worker = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            codigo_saida = 0
+            try:
+                nosso.close()
+                conexao.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                _laco_worker(Connection(do_worker.detach()), namespace, limite_cpu_s, limite_memoria_mb,
+                             max_caracteres_saida)
+            except BaseException:
+                codigo_saida = 1
+            finally:
+                os._exit(codigo_saida)
+        do_worker.close()
+        try:
+            conexao.send(pid)
+            reduction.send_handle(conexao, nosso.fileno(), os.getppid())
+        except (BrokenPipeError, OSError):
+            break
+        finally:
+            nosso.close()
+
+
+class _Worker:
+    def __init__(self, pid, conexao, processo=None):
+        self.pid = pid
+        self.conexao = conexao
+        self.processo = processo  # só sem a matriz (spawn)
+        self.execucoes = 0
+
+    def encerrar(self, forcar=False):
+        try:
+            if forcar:
+                os.kill(self.pid, signal.SIGKILL)
+            else:
+                self.conexao.send(None)
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+        if self.processo is not None:
+            self.processo.join(timeout=1)
+            if self.processo.is_alive():
+                self.processo.kill()
+                self.processo.join(timeout=1)
+        self.conexao.close()
+
+
+class PoolSandbox:
+    """
+    Pool de processos que executam código com o DataFrame já carregado.
+
+    Args:
+        namespace: Variáveis disponíveis para o código (ex.: {"df": df}).
+        processos: Quantidade de processos do pool.
+        limite_cpu_s: Tempo máximo de CPU por execução.
+        limite_tempo_s: Tempo máximo de parede por execução; ao estourar, o processo é morto e substituído.
+        limite_memoria_mb: Memória adicional que cada processo pode alocar.
+        max_execucoes: Após quantas execuções um processo é reciclado (evita acúmulo de estado).
+        max_caracteres_saida: Saídas maiores viram um resumo (0 devolve a saída inteira).
+    """
+
+    def __init__(self, namespace, processos=2, limite_cpu_s=30, limite_tempo_s=60,
+                 limite_memoria_mb=1024, max_execucoes=200, max_caracteres_saida=0):
+        self.namespace = namespace
+        self.limite_cpu_s = limite_cpu_s
+        self.limite_tempo_s = limite_tempo_s
+        self.limite_memoria_mb = limite_memoria_mb
+        self.max_execucoes = max_execucoes
+        self.max_caracteres_saida = max_caracteres_saida
+        self.substituicoes = 0
+        self._livres = queue.Queue()
+        self._lock = threading.Lock()
+        self._encerrado = False
+        self._matriz = None
+        self._lock_matriz = threading.Lock()
+        if hasattr(os, "fork") and "forkserver" in multiprocessing.get_all_start_methods():
+            self._contexto = multiprocessing.get_context("forkserver")
+            # Só vale antes do primeiro uso do forkserver; depois ele já tem o pandas importado
+            self._contexto.set_forkserver_preload(["__main__", "pandas", "sandbox"])
+            self._conexao_matriz, conexao_filho = self._contexto.Pipe()
+            self._matriz = self._contexto.Process(target=_laco_matriz, args=(conexao_filho, *self._argumentos()),
+                                                  daemon=True)
+            self._matriz.start()
+            conexao_filho.close()
+        else:
+            self._contexto = multiprocessing.get_context("spawn")
+        for _ in range(processos):
+            self._livres.put(self._iniciar_worker())
+
+    def _argumentos(self):
+        return self.namespace, self.limite_cpu_s, self.limite_memoria_mb, self.max_caracteres_saida
+
+    def _iniciar_worker(self):
+        if self._matriz is not None:
+            with self._lock_matriz:
+                self._conexao_matriz.send("iniciar")
+                pid = self._conexao_matriz.recv()
+                descritor = reduction.recv_handle(self._conexao_matriz)
+            return _Worker(pid, Connection(descritor))
+        conexao_pai, conexao_filho = self._contexto.Pipe()
+        processo = self._contexto.Process(target=_laco_worker, args=(conexao_filho, *self._argumentos()),
+                                          daemon=True)
+        processo.start()
+        conexao_filho.close()
+        return _Worker(processo.pid, conexao_pai, processo)
+
+    def _substituir(self, worker):
+        worker.encerrar(forcar=True)
+        if self._encerrado:
+            return worker
+        with self._lock:
+            self.substituicoes += 1
+        return self._iniciar_worker()
+
+    def executar(self, codigo, reciclar=False, preambulo=""):
+        """
+        Executa o código em um processo livre e retorna a saída em texto. O
+        `preambulo` (atribuições de execuções anteriores) roda antes, sem saída,
+        no mesmo namespace. Com `reciclar` (código que altera os objetos do
+        namespace, compartilhados pela cópia rasa), o processo é substituído
+        depois da execução.
+        """
+        if self._encerrado:
+            raise RuntimeError("O pool de execução foi encerrado.")
+        worker = self._livres.get()
+        try:
+            try:
+                worker.conexao.send((preambulo, codigo))
+                if not worker.conexao.poll(self.limite_tempo_s):
+                    worker = self._substituir(worker)
+                    return f"TimeoutError: a execução excedeu {self.limite_tempo_s}s e foi interrompida."
+                saida = worker.conexao.recv()
+            except (EOFError, BrokenPipeError, OSError):
+                worker = self._substituir(worker)
+                return "RuntimeError: o processo de execução terminou inesperadamente."
+            worker.execucoes += 1
+            if not self._encerrado and (reciclar or (self.max_execucoes and worker.execucoes >= self.max_execucoes)):
+                worker.encerrar()
+                worker = self._iniciar_worker()
+            return saida
+        finally:
+            if self._encerrado:
+                worker.encerrar()
+            else:
+                self._livres.put(worker)
+
+    def encerrar(self):
+        """Encerra todos os processos livres (os ocupados são encerrados ao terminar)."""
+        self._encerrado = True
+        while True:
+            try:
+                self._livres.get_nowait().encerrar()
+            except queue.Empty:
+                break
+        # Os processos já criados não dependem da matriz para terminar
+        if self._matriz is not None:
+            with self._lock_matriz:
+                try:
+                    self._conexao_matriz.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+                self._conexao_matriz.close()
+            self._matriz.join(timeout=1)
+
+
+def processos_padrao():
+    """Quantidade padrão de processos: metade dos núcleos, entre 1 e 4."""
+    return max(1, min(4, (os.cpu_count() or 2) // 2))
@@ -0,0 +1,76 @@
+"""
+Tabelas normalizadas a partir do layout entidade-atributo-valor do dataset.
+
+Cada linha do `data.csv` repete o cabeçalho inteiro do fluxo e da etapa
+(executor, datas, tempos, serviço...) para um único campo de formulário
+(`nomeCampo`, `valor`, `codCampo` e as colunas de campo filho). Contar etapas
+ou tirar médias por executor no DataFrame bruto conta a mesma etapa várias
+vezes e percorre N vezes mais linhas que o necessário.
+
+A normalização gera três tabelas:
+  - `fluxos`: uma linha por `seqFluxo` (fluxo, statusFluxo, servico);
+  - `etapas`: uma linha por `seqEtapa`, com `seqFluxo` como chave do fluxo;
+  - `campos`: uma linha por `seqEtapa` e uma coluna por `nomeCampo` (o `valor`).
+
+Quando a mesma chave aparece com cabeçalhos diferentes, vale a primeira linha.
+"""
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+
+# Colunas que descrevem o fluxo (além da chave seqFluxo)
+COLUNAS_FLUXO = ("fluxo", "statusFluxo", "servico")
+# Colunas de um campo de formulário (uma linha do layout EAV)
+COLUNAS_CAMPO = ("codFormularioCampo", "nomeCampo", "legenda", "ordemFilho", "codFormularioCampoFilho",
+                 "codCampo", "valor", "valorDominio", "nomeCampoFilho", "legendaCampoFilho", "codCampoFilho")
+
+
+@dataclass
+class TabelasNormalizadas:
+    fluxos: pd.DataFrame
+    etapas: pd.DataFrame
+    campos: pd.DataFrame
+    tempo_construcao: float = 0.0
+
+    @classmethod
+    def construir(cls, df):
+        """Levanta KeyError se o DataFrame não tiver as chaves seqFluxo/seqEtapa ou nomeCampo/valor."""
+        inicio = time.perf_counter()
+        presentes = set(df.columns)
+        colunas_fluxo = [c for c in COLUNAS_FLUXO if c in presentes]
+        colunas_etapa = [c for c in df.columns if c not in COLUNAS_FLUXO and c not in COLUNAS_CAMPO]
+
+        fluxos = df.drop_duplicates("seqFluxo")[["seqFluxo", *colunas_fluxo]].reset_index(drop=True)
+        etapas = df.drop_duplicates("seqEtapa")[["seqEtapa", *[c for c in colunas_etapa if c != "seqEtapa"]]]
+        etapas = etapas.reset_index(drop=True)
+
+        # Um valor por (etapa, campo); o pivot mantém o tipo categórico de `valor`
+        pares = df[["seqEtapa", "nomeCampo", "valor"]].dropna(subset=["nomeCampo"])
+        pares = pares.drop_duplicates(["seqEtapa", "nomeCampo"])
+        campos = pares.pivot(index="seqEtapa", columns="nomeCampo", values="valor")
+        campos.columns = [str(c) for c in campos.columns]
+        for coluna in campos.columns:
+            if isinstance(campos[coluna].dtype, pd.CategoricalDtype):
+                campos[coluna] = campos[coluna].cat.remove_unused_categories()
+        campos = campos.reset_index()
+        return cls(fluxos, etapas, campos, time.perf_counter() - inicio)
+
+    def como_dicionario(self):
+        """Tabelas por nome, como ficam disponíveis no código do agente."""
+        return {"fluxos": self.fluxos, "etapas": self.etapas, "campos": self.campos}
+
+    def memoria_bytes(self):
+        return sum(int(t.memory_usage(deep=True).sum()) for t in self.como_dicionario().values())
+
+    def descricao(self):
+        """Texto curto para o prompt do agente."""
+        campos = [c for c in self.campos.columns if c != "seqEtapa"]
+        return (
+            "Cada linha de `df` é um campo de formulário de uma etapa (o cabeçalho da etapa se repete). "
+            "Para contagens e médias por etapa, fluxo ou executor use as tabelas sem repetição:\n"
+            f"`fluxos` ({len(self.fluxos)} linhas, uma por seqFluxo): {', '.join(self.fluxos.columns)}\n"
+            f"`etapas` ({len(self.etapas)} linhas, uma por seqEtapa; junte com `fluxos` por seqFluxo): "
+            f"{', '.join(self.etapas.columns)}\n"
+            f"`campos` ({len(self.campos)} linhas, uma por seqEtapa; valor de cada nomeCampo): {', '.join(campos)}"
+        )
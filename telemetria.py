@@ -0,0 +1,333 @@
+"""
+Rastreamento por requisição e métricas no formato texto do Prometheus.
+
+Quando ativa (TELEMETRIA_ATIVA=true), cada chamada a `gerar_resposta` grava
+uma linha JSON com os spans da requisição (chamadas ao LLM com tokens,
+execuções do `python_repl_ast`, falhas de parsing e novas tentativas) e
+atualiza contadores e histogramas. Desativada, nenhum callback é registrado
+e o custo se resume a um teste de flag.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.exceptions import OutputParserException
+
+# Limites dos histogramas de latência (segundos) e de iterações
+BALDES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BALDES_ITERACOES = (1, 2, 3, 4, 5, 6, 8, 10, 15)
+
+
+def _formatar_rotulos(rotulos):
+    if not rotulos:
+        return ""
+    pares = ",".join(f'{chave}="{str(valor).replace(chr(34), chr(39))}"' for chave, valor in sorted(rotulos))
+    return "{" + pares + "}"
+
+
+class _Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, descricao):
+        self.nome = nome
+        self.descricao = descricao
+        self.valores = {}
+
+    def inc(self, valor=1, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        self.valores[chave] = self.valores.get(chave, 0) + valor
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} {self.tipo}"]
+        for rotulos, valor in sorted(self.valores.items()):
+            linhas.append(f"{self.nome}{_formatar_rotulos(rotulos)} {valor}")
+        return linhas
+
+
+class _Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome, descricao, baldes):
+        self.nome = nome
+        self.descricao = descricao
+        self.baldes = baldes
+        self.series = {}  # rótulos -> [contagens por balde, soma, total]
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        serie = self.series.setdefault(chave, [[0] * len(self.baldes), 0.0, 0])
+        for i, limite in enumerate(self.baldes):
+            if valor <= limite:
+                serie[0][i] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} {self.tipo}"]
+        for rotulos, (contagens, soma, total) in sorted(self.series.items()):
+            for limite, contagem in zip(self.baldes, contagens):
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(rotulos + (('le', limite),))} {contagem}")
+            linhas.append(f"{self.nome}_bucket{_formatar_rotulos(rotulos + (('le', '+Inf'),))} {total}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(rotulos)} {round(soma, 6)}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(rotulos)} {total}")
+        return linhas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas do processo, exportável no formato texto do Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas = {}
+
+    def contador(self, nome, descricao):
+        with self._lock:
+            return self._metricas.setdefault(nome, _Contador(nome, descricao))
+
+    def histograma(self, nome, descricao, baldes=BALDES_LATENCIA):
+        with self._lock:
+            return self._metricas.setdefault(nome, _Histograma(nome, descricao, baldes))
+
+    def inc(self, nome, valor=1, **rotulos):
+        with self._lock:
+            self._metricas[nome].inc(valor, **rotulos)
+
+    def observar(self, nome, valor, **rotulos):
+        with self._lock:
+            self._metricas[nome].observar(valor, **rotulos)
+
+    def exportar_prometheus(self):
+        with self._lock:
+            linhas = []
+            for metrica in self._metricas.values():
+                linhas.extend(metrica.exportar())
+        return "\n".join(linhas) + "\n"
+
+
+def extrair_tokens(response):
+    """Tokens de prompt/resposta informados pelo provedor (None se não houver)."""
+    uso = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+    if uso:
+        return uso.get("prompt_tokens"), uso.get("completion_tokens")
+    for geracoes in getattr(response, "generations", []) or []:
+        for geracao in geracoes:
+            metadados = getattr(getattr(geracao, "message", None), "usage_metadata", None)
+            if metadados:
+                return metadados.get("input_tokens"), metadados.get("output_tokens")
+    return None, None
+
+
+def extrair_tokens_cache(response):
+    """
+    Tokens do prompt lidos do cache de prefixo do provedor (None se o provedor
+    não informar): `prompt_tokens_details.cached_tokens` da OpenAI,
+    `cached_tokens` do GeminiLLM ou `input_token_details.cache_read` do LangChain.
+    """
+    uso = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+    if "cached_tokens" in uso:
+        return uso["cached_tokens"]
+    detalhes = uso.get("prompt_tokens_details") or {}
+    if "cached_tokens" in detalhes:
+        return detalhes["cached_tokens"] or 0
+    for geracoes in getattr(response, "generations", []) or []:
+        for geracao in geracoes:
+            metadados = getattr(getattr(geracao, "message", None), "usage_metadata", None) or {}
+            detalhes = metadados.get("input_token_details") or {}
+            if "cache_read" in detalhes:
+                return detalhes["cache_read"] or 0
+    return None
+
+
+def _texto_geracoes(response):
+    return "".join(g.text for geracoes in getattr(response, "generations", []) or [] for g in geracoes)
+
+
+class RastreadorRequisicao(BaseCallbackHandler):
+    """
+    Coleta os spans de uma requisição a partir dos callbacks do LangChain.
+
+    Eventos com `compartilhado=True` vêm de uma execução deduplicada pelo
+    agendador, já contada nas métricas por quem a submeteu: viram spans
+    marcados como compartilhados, sem atualizar contadores e histogramas.
+    """
+
+    def __init__(self, telemetria, pergunta):
+        self.telemetria = telemetria
+        self.id = uuid.uuid4().hex[:16]
+        self.pergunta = pergunta
+        self.inicio = time.perf_counter()
+        self.inicio_epoch = time.time()
+        self.spans = []
+        self.iteracoes = 0
+        self._abertos = {}
+
+    def _abrir(self, run_id, **atributos):
+        self._abertos[run_id] = (time.perf_counter(), atributos)
+
+    def _fechar(self, run_id, tipo, **extras):
+        inicio, atributos = self._abertos.pop(run_id, (None, {}))
+        if inicio is None:
+            return None
+        duracao = time.perf_counter() - inicio
+        span = {"tipo": tipo, "inicio_ms": round((inicio - self.inicio) * 1000, 3),
+                "duracao_ms": round(duracao * 1000, 3), **atributos, **extras}
+        self.spans.append(span)
+        return duracao
+
+    def _abrir_llm(self, run_id, caracteres, compartilhado):
+        self.iteracoes += 1
+        if compartilhado:
+            self._abrir(run_id, caracteres_prompt=caracteres, compartilhado=True)
+        else:
+            self._abrir(run_id, caracteres_prompt=caracteres)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs: Any) -> None:
+        self._abrir_llm(run_id, sum(len(p) for p in prompts), kwargs.get("compartilhado"))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs: Any) -> None:
+        self._abrir_llm(run_id, sum(len(str(m.content)) for lista in messages for m in lista),
+                        kwargs.get("compartilhado"))
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any) -> None:
+        prompt, resposta = extrair_tokens(response)
+        estimado = prompt is None
+        if estimado:
+            caracteres = self._abertos.get(run_id, (None, {}))[1].get("caracteres_prompt", 0)
+            prompt, resposta = caracteres // 4, len(_texto_geracoes(response)) // 4
+        cache = extrair_tokens_cache(response)
+        duracao = self._fechar(run_id, "llm", tokens_prompt=prompt, tokens_resposta=resposta,
+                               tokens_estimados=estimado, tokens_cache=cache)
+        if duracao is not None and not kwargs.get("compartilhado"):
+            self.telemetria.metricas.observar("chatbot_llm_duracao_segundos", duracao)
+            self.telemetria.metricas.inc("chatbot_llm_tokens_total", prompt or 0, tipo="prompt")
+            self.telemetria.metricas.inc("chatbot_llm_tokens_total", resposta or 0, tipo="resposta")
+            self.telemetria.metricas.inc("chatbot_llm_tokens_total", cache or 0, tipo="cache")
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs: Any) -> None:
+        # Tempo até o primeiro token (só quando o LLM é chamado em streaming)
+        aberto = self._abertos.get(run_id)
+        if aberto is not None and "primeiro_token_ms" not in aberto[1]:
+            espera = time.perf_counter() - aberto[0]
+            aberto[1]["primeiro_token_ms"] = round(espera * 1000, 3)
+            if not kwargs.get("compartilhado"):
+                self.telemetria.metricas.observar("chatbot_llm_primeiro_token_segundos", espera)
+
+    def on_llm_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._fechar(run_id, "llm", erro=type(error).__name__)
+        if not kwargs.get("compartilhado"):
+            self.telemetria.metricas.inc("chatbot_erros_total", classe=f"llm_{type(error).__name__}")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs: Any) -> None:
+        nome = (serialized or {}).get("name") or kwargs.get("name") or "ferramenta"
+        if kwargs.get("compartilhado"):
+            self._abrir(run_id, ferramenta=nome, codigo=input_str[:2000], compartilhado=True)
+        else:
+            self._abrir(run_id, ferramenta=nome, codigo=input_str[:2000])
+
+    def on_tool_end(self, output, *, run_id, **kwargs: Any) -> None:
+        duracao = self._fechar(run_id, "ferramenta", caracteres_saida=len(str(output)))
+        if duracao is not None and not kwargs.get("compartilhado"):
+            self.telemetria.metricas.observar("chatbot_ferramenta_duracao_segundos", duracao)
+
+    def on_tool_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._fechar(run_id, "ferramenta", erro=type(error).__name__)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        if isinstance(error, OutputParserException) or "OUTPUT_PARSING_FAILURE" in str(error):
+            if not any(s["tipo"] == "falha_parsing" for s in self.spans):
+                self.spans.append({"tipo": "falha_parsing", "inicio_ms": round((time.perf_counter() - self.inicio) * 1000, 3),
+                                   "mensagem": str(error)[:500]})
+                if not kwargs.get("compartilhado"):
+                    self.telemetria.metricas.inc("chatbot_falhas_parsing_total")
+
+    def on_retry(self, retry_state, *, run_id, **kwargs: Any) -> None:
+        self.spans.append({"tipo": "nova_tentativa", "inicio_ms": round((time.perf_counter() - self.inicio) * 1000, 3),
+                           "tentativa": getattr(retry_state, "attempt_number", None)})
+        if not kwargs.get("compartilhado"):
+            self.telemetria.metricas.inc("chatbot_novas_tentativas_total")
+
+    def registrar_span(self, tipo, **atributos):
+        """Span avulso (ex.: consultas ao cache ou chamadas feitas fora do LangChain)."""
+        self.spans.append({"tipo": tipo, "inicio_ms": round((time.perf_counter() - self.inicio) * 1000, 3), **atributos})
+
+
+class Telemetria:
+    """
+    Ponto central de rastreamento. Use `iniciar` no começo da requisição e
+    `finalizar` no fim; com a telemetria desativada, `iniciar` retorna None.
+    """
+
+    def __init__(self, ativa=False, arquivo=None):
+        self.ativa = ativa
+        self.arquivo = arquivo
+        self._lock_arquivo = threading.Lock()
+        self.metricas = RegistroMetricas()
+        self.metricas.contador("chatbot_requisicoes_total", "Perguntas respondidas, por origem da resposta")
+        self.metricas.histograma("chatbot_requisicao_duracao_segundos", "Latência total de gerar_resposta")
+        self.metricas.histograma("chatbot_iteracoes_agente", "Chamadas ao LLM por pergunta", BALDES_ITERACOES)
+        self.metricas.histograma("chatbot_llm_duracao_segundos", "Duração de cada chamada ao LLM")
+        self.metricas.histograma("chatbot_llm_primeiro_token_segundos", "Tempo até o primeiro token do LLM")
+        self.metricas.contador("chatbot_llm_tokens_total", "Tokens de prompt, de resposta e lidos do cache do provedor")
+        self.metricas.histograma("chatbot_ferramenta_duracao_segundos", "Duração de cada execução do python_repl_ast")
+        self.metricas.contador("chatbot_falhas_parsing_total", "Falhas de parsing da saída do LLM")
+        self.metricas.contador("chatbot_novas_tentativas_total", "Novas tentativas de chamadas ao provedor")
+        self.metricas.contador("chatbot_cache_total", "Consultas ao cache de respostas, por resultado")
+        self.metricas.contador("chatbot_erros_total", "Erros por classe")
+        self.metricas.contador("chatbot_eventos_total", "Eventos avulsos (ex.: listagem de modelos do Gemini)")
+
+    def iniciar(self, pergunta):
+        """Retorna um RastreadorRequisicao (também um callback do LangChain) ou None se desativada."""
+        if not self.ativa:
+            return None
+        return RastreadorRequisicao(self, pergunta)
+
+    def registrar_cache(self, rastreador, acerto):
+        if rastreador is None:
+            return
+        resultado = "acerto" if acerto else "falha"
+        rastreador.registrar_span("cache", resultado=resultado)
+        self.metricas.inc("chatbot_cache_total", resultado=resultado)
+
+    def registrar_evento(self, nome, **atributos):
+        """Conta um evento avulso; barato o suficiente para caminhos de erro."""
+        if self.ativa:
+            self.metricas.inc("chatbot_eventos_total", evento=nome)
+
+    def finalizar(self, rastreador, origem, resposta="", classe_erro=None):
+        """Fecha a requisição: atualiza métricas e grava a linha JSONL."""
+        if rastreador is None:
+            return
+        duracao = time.perf_counter() - rastreador.inicio
+        self.metricas.inc("chatbot_requisicoes_total", origem=origem)
+        self.metricas.observar("chatbot_requisicao_duracao_segundos", duracao, origem=origem)
+        if origem == "agente":
+            self.metricas.observar("chatbot_iteracoes_agente", rastreador.iteracoes)
+        if classe_erro:
+            self.metricas.inc("chatbot_erros_total", classe=classe_erro)
+        if not self.arquivo:
+            return
+        registro = {
+            "id": rastreador.id,
+            "inicio": rastreador.inicio_epoch,
+            "pergunta": rastreador.pergunta,
+            "origem": origem,
+            "duracao_ms": round(duracao * 1000, 3),
+            "iteracoes": rastreador.iteracoes,
+            "erro": classe_erro,
+            "caracteres_resposta": len(resposta),
+            "spans": rastreador.spans,
+        }
+        linha = json.dumps(registro, ensure_ascii=False, default=str)
+        with self._lock_arquivo:
+            diretorio = os.path.dirname(self.arquivo)
+            if diretorio:
+                os.makedirs(diretorio, exist_ok=True)
+            with open(self.arquivo, "a", encoding="utf-8") as f:
+                f.write(linha + "\n")
+
+    def exportar_prometheus(self):
+        return self.metricas.exportar_prometheus()